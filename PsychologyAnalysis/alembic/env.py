@@ -38,8 +38,12 @@ try:
     from app.models.user import User           # 导入 User 模型
     from app.models.assessment import Assessment # 导入 Assessment 模型
     from app.models.interrogation import InterrogationRecord # 导入审讯记录模型
+    from app.models.analysis_artifact import AnalysisArtifact # 分阶段分析产物
+    from app.models.assessment_score import AssessmentDimensionScore # 多维度量表的维度得分
+    from app.models.questionnaire import QuestionnaireQuestion # 量表题目
+    from app.models.task_outbox import TaskOutbox # 待投递的 Celery 任务 (事务性发件箱)
+    from app.models.image_blob import ImageBlob # 按内容寻址存储的上传图片
     # 如果还有其他模型，也在这里导入:
-    # from app.models.questionnaire import QuestionnaireQuestion # <--- 如果你决定保留并为其创建模型
     print("[Alembic env.py] 成功导入 settings, Base, 和模型 (User, Assessment, InterrogationRecord).") # 更新日志
 except ImportError as e:
     print(f"[Alembic env.py] 导入应用模块时出错: {e}")
@@ -0,0 +1,30 @@
+"""Add claim_task_id to analysis_data
+
+Revision ID: a7c3e5f9d2b4
+Revises: f3b9d2a6c8e1
+Create Date: 2025-06-11 09:12:40.518337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e5f9d2b4'
+down_revision: Union[str, None] = 'f3b9d2a6c8e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('claim_task_id', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.drop_column('claim_task_id')
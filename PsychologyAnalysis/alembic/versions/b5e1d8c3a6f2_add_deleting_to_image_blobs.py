@@ -0,0 +1,30 @@
+"""Add deleting tombstone flag to image_blobs
+
+Revision ID: b5e1d8c3a6f2
+Revises: a7c3e5f9d2b4
+Create Date: 2025-06-12 15:27:09.836142
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e1d8c3a6f2'
+down_revision: Union[str, None] = 'a7c3e5f9d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deleting', sa.Boolean(), server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.drop_column('deleting')
@@ -0,0 +1,45 @@
+"""Create analysis_artifacts table
+
+Revision ID: b7d2e4f1c9a0
+Revises: a43553c2237e
+Create Date: 2025-05-20 10:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e4f1c9a0'
+down_revision: Union[str, None] = 'a43553c2237e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('analysis_artifacts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('assessment_id', sa.Integer(), nullable=False),
+    sa.Column('stage', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['assessment_id'], ['analysis_data.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('assessment_id', 'stage', name='uq_analysis_artifacts_assessment_stage')
+    )
+    with op.batch_alter_table('analysis_artifacts', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_analysis_artifacts_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_analysis_artifacts_assessment_id'), ['assessment_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('analysis_artifacts', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_analysis_artifacts_assessment_id'))
+        batch_op.drop_index(batch_op.f('ix_analysis_artifacts_id'))
+
+    op.drop_table('analysis_artifacts')
@@ -0,0 +1,66 @@
+"""Add score columns to analysis_data and assessment_dimension_scores table
+
+Revision ID: c4e8a1d92f3b
+Revises: b7d2e4f1c9a0
+Create Date: 2025-05-27 15:03:26.512874
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d92f3b'
+down_revision: Union[str, None] = 'b7d2e4f1c9a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('raw_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('standard_score', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('score_band', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('scored_at', sa.TIMESTAMP(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_analysis_data_raw_score'), ['raw_score'], unique=False)
+        batch_op.create_index(batch_op.f('ix_analysis_data_score_band'), ['score_band'], unique=False)
+        batch_op.create_index(batch_op.f('ix_analysis_data_scored_at'), ['scored_at'], unique=False)
+        batch_op.create_index('ix_analysis_data_type_raw_score', ['questionnaire_type', 'raw_score'], unique=False)
+
+    op.create_table('assessment_dimension_scores',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('assessment_id', sa.Integer(), nullable=False),
+    sa.Column('dimension', sa.String(length=50), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('band', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['assessment_id'], ['analysis_data.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('assessment_id', 'dimension', name='uq_assessment_dimension_scores_assessment_dimension')
+    )
+    with op.batch_alter_table('assessment_dimension_scores', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_assessment_dimension_scores_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_assessment_dimension_scores_assessment_id'), ['assessment_id'], unique=False)
+        batch_op.create_index('ix_assessment_dimension_scores_dimension_score', ['dimension', 'score'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('assessment_dimension_scores', schema=None) as batch_op:
+        batch_op.drop_index('ix_assessment_dimension_scores_dimension_score')
+        batch_op.drop_index(batch_op.f('ix_assessment_dimension_scores_assessment_id'))
+        batch_op.drop_index(batch_op.f('ix_assessment_dimension_scores_id'))
+
+    op.drop_table('assessment_dimension_scores')
+
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.drop_index('ix_analysis_data_type_raw_score')
+        batch_op.drop_index(batch_op.f('ix_analysis_data_scored_at'))
+        batch_op.drop_index(batch_op.f('ix_analysis_data_score_band'))
+        batch_op.drop_index(batch_op.f('ix_analysis_data_raw_score'))
+        batch_op.drop_column('scored_at')
+        batch_op.drop_column('score_band')
+        batch_op.drop_column('standard_score')
+        batch_op.drop_column('raw_score')
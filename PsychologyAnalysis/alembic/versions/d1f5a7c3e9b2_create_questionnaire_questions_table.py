@@ -0,0 +1,61 @@
+"""Create questionnaire_questions table if missing
+
+Revision ID: d1f5a7c3e9b2
+Revises: c4e8a1d92f3b
+Create Date: 2025-06-03 09:41:17.205611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1f5a7c3e9b2'
+down_revision: Union[str, None] = 'c4e8a1d92f3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 旧版 SQLite 库中该表由 src/data_handler.DataHandler._init_db 创建 (Alembic 之外)，
+    # 已存在时只补齐缺少的列和索引；新库 (如 docker-compose 中的 Postgres) 则完整建表。
+    inspector = sa.inspect(op.get_bind())
+    if 'questionnaire_questions' not in inspector.get_table_names():
+        op.create_table('questionnaire_questions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('questionnaire_type', sa.String(length=100), nullable=False),
+        sa.Column('question_number', sa.Integer(), nullable=False),
+        sa.Column('question_text', sa.Text(), nullable=False),
+        sa.Column('options', sa.Text(), nullable=False),
+        sa.Column('scale_name', sa.String(length=200), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('questionnaire_type', 'question_number', name='uq_questionnaire_questions_type_number')
+        )
+        existing_columns = set()
+        existing_indexes = set()
+    else:
+        existing_columns = {c['name'] for c in inspector.get_columns('questionnaire_questions')}
+        existing_indexes = {i['name'] for i in inspector.get_indexes('questionnaire_questions')}
+
+    with op.batch_alter_table('questionnaire_questions', schema=None) as batch_op:
+        if existing_columns and 'scale_name' not in existing_columns:
+            batch_op.add_column(sa.Column('scale_name', sa.String(length=200), nullable=True))
+        if 'ix_questionnaire_questions_id' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_questionnaire_questions_id'), ['id'], unique=False)
+        if 'ix_questionnaire_questions_questionnaire_type' not in existing_indexes:
+            batch_op.create_index(batch_op.f('ix_questionnaire_questions_questionnaire_type'), ['questionnaire_type'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # 表可能早于本迁移存在并含有已导入的题库，降级时只移除本迁移添加的索引，不删除表
+    inspector = sa.inspect(op.get_bind())
+    existing_indexes = {i['name'] for i in inspector.get_indexes('questionnaire_questions')}
+    with op.batch_alter_table('questionnaire_questions', schema=None) as batch_op:
+        if 'ix_questionnaire_questions_questionnaire_type' in existing_indexes:
+            batch_op.drop_index(batch_op.f('ix_questionnaire_questions_questionnaire_type'))
+        if 'ix_questionnaire_questions_id' in existing_indexes:
+            batch_op.drop_index(batch_op.f('ix_questionnaire_questions_id'))
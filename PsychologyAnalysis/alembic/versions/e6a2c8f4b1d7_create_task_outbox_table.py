@@ -0,0 +1,51 @@
+"""Create task_outbox table
+
+Revision ID: e6a2c8f4b1d7
+Revises: d1f5a7c3e9b2
+Create Date: 2025-06-05 16:08:52.371904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a2c8f4b1d7'
+down_revision: Union[str, None] = 'd1f5a7c3e9b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('task_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_name', sa.String(length=200), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=False),
+    sa.Column('assessment_id', sa.Integer(), nullable=True),
+    sa.Column('task_id', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='pending', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('available_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('dispatched_at', sa.TIMESTAMP(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.ForeignKeyConstraint(['assessment_id'], ['analysis_data.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('task_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_task_outbox_id'), ['id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_task_outbox_assessment_id'), ['assessment_id'], unique=False)
+        batch_op.create_index('ix_task_outbox_status_available_at', ['status', 'available_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('task_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_task_outbox_status_available_at')
+        batch_op.drop_index(batch_op.f('ix_task_outbox_assessment_id'))
+        batch_op.drop_index(batch_op.f('ix_task_outbox_id'))
+
+    op.drop_table('task_outbox')
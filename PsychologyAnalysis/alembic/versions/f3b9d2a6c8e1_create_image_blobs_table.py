@@ -0,0 +1,51 @@
+"""Create image_blobs table and link assessments to stored images
+
+Revision ID: f3b9d2a6c8e1
+Revises: e6a2c8f4b1d7
+Create Date: 2025-06-09 10:41:17.204583
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d2a6c8e1'
+down_revision: Union[str, None] = 'e6a2c8f4b1d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=False),
+    sa.Column('content_type', sa.String(length=100), nullable=True),
+    sa.Column('ref_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('last_seen_at', sa.TIMESTAMP(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.create_index('ix_image_blobs_ref_count_last_seen_at', ['ref_count', 'last_seen_at'], unique=False)
+
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_sha256', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_analysis_data_image_sha256'), ['image_sha256'], unique=False)
+        batch_op.create_foreign_key('fk_analysis_data_image_sha256_image_blobs', 'image_blobs', ['image_sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('analysis_data', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_analysis_data_image_sha256_image_blobs', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_analysis_data_image_sha256'))
+        batch_op.drop_column('image_sha256')
+
+    with op.batch_alter_table('image_blobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_image_blobs_ref_count_last_seen_at')
+
+    op.drop_table('image_blobs')
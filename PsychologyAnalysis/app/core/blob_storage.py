@@ -0,0 +1,289 @@
+# app/core/blob_storage.py
+"""
+按内容寻址的图片存储。
+
+上传的图片不再以 `{身份证号}_{时间戳}_{文件名}` 平铺在 UPLOADS_DIR 中，而是：
+  - 以内容的 SHA-256 为键 (app/core/uploads.py 保存上传时顺带计算)，内容相同的图片只保存一份；
+  - 按 <sha256 前 2 位>/<第 3-4 位>/<sha256> 分片存放，单个目录中的文件数保持在较小规模；
+  - image_blobs 表记录每张图片被多少条评估引用 (Assessment.image_sha256)，
+    无引用的图片在宽限期后由 app/tasks/blob_gc.py 删除。
+
+存储后端可替换 (BLOB_STORAGE_BACKEND)：
+  - local: 本地文件系统 (BLOB_STORAGE_DIR)；
+  - s3: S3 兼容对象存储 (需要 boto3)，BLOB_S3_ENDPOINT_URL 可指向 MinIO 等本地替代服务。
+    视觉模型需要本地文件，s3 后端会把图片下载到 BLOB_CACHE_DIR (内容寻址，缓存永不过期)。
+
+读取图片统一通过 resolve_image()：有 image_sha256 时从存储后端取得本地路径，
+否则按旧的 image_path 在 UPLOADS_DIR 中查找 (迁移前的历史记录)。
+"""
+import glob
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+
+import anyio
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.uploads import SavedUpload
+from app.crud import image_blob as crud_image_blob
+
+logger = logging.getLogger(settings.APP_NAME)
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+    ClientError = None
+
+_SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def blob_key(sha256: str) -> str:
+    """图片在存储中的相对路径：ab/cd/abcd...；sha256 格式不正确时抛出 ValueError。"""
+    if not _SHA256_RE.match(sha256 or ""):
+        raise ValueError(f"无效的 SHA-256: {sha256!r}")
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def content_type_for(filename: Optional[str]) -> Optional[str]:
+    return mimetypes.guess_type(filename)[0] if filename else None
+
+
+def _remove_with_derivatives(path: str):
+    """删除文件及其旁边的派生文件 (如视觉模型预处理缓存 <文件名>.vision-*.jpg)。"""
+    for candidate in [path] + glob.glob(f"{glob.escape(path)}.*"):
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+
+
+def _atomic_move(src_path: str, dest_path: str):
+    """把 src_path 移动为 dest_path (覆盖)；跨文件系统时先复制到目标目录的临时文件再原子替换。"""
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    try:
+        os.replace(src_path, dest_path)
+    except OSError:
+        temp_path = os.path.join(os.path.dirname(dest_path), f".{os.path.basename(dest_path)}.part-{uuid.uuid4().hex}")
+        try:
+            shutil.copyfile(src_path, temp_path)
+            os.replace(temp_path, dest_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        os.remove(src_path)
+
+
+class BlobBackend(ABC):
+    """
+    存储后端接口。方法均为同步阻塞调用，异步代码中应通过线程调用 (anyio.to_thread / asyncio.to_thread)。
+    子类必须实现全部抽象方法，否则实例化时抛出 TypeError。
+    """
+    name = "base"
+
+    @abstractmethod
+    def put_file(self, src_path: str, sha256: str, content_type: Optional[str] = None) -> bool:
+        """把本地文件 src_path (内容的 SHA-256 为 sha256) 存入后端并删除 src_path；返回是否为新内容。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def local_path(self, sha256: str) -> Optional[str]:
+        """可供本地读取的文件路径 (远程后端会先下载到缓存)；图片不存在时返回 None。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def open(self, sha256: str) -> BinaryIO:
+        """以二进制流打开图片 (供图片下载接口使用)；不存在时抛出 FileNotFoundError。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, sha256: str) -> None:
+        raise NotImplementedError
+
+
+class LocalBlobBackend(BlobBackend):
+    """本地文件系统：root/ab/cd/<sha256>。"""
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, sha256: str) -> str:
+        return os.path.join(self.root, *blob_key(sha256).split("/"))
+
+    def put_file(self, src_path: str, sha256: str, content_type: Optional[str] = None) -> bool:
+        dest_path = self.path_for(sha256)
+        is_new = not os.path.exists(dest_path)
+        # 内容相同，直接覆盖：同时修复意外丢失的文件
+        _atomic_move(src_path, dest_path)
+        return is_new
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.isfile(self.path_for(sha256))
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        path = self.path_for(sha256)
+        return path if os.path.isfile(path) else None
+
+    def open(self, sha256: str) -> BinaryIO:
+        return open(self.path_for(sha256), "rb")
+
+    def delete(self, sha256: str) -> None:
+        _remove_with_derivatives(self.path_for(sha256))
+
+
+class S3BlobBackend(BlobBackend):
+    """S3 兼容对象存储：<bucket>/<prefix>ab/cd/<sha256>，本地读取时下载到 cache_dir。"""
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "", cache_dir: Optional[str] = None,
+                 endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key_id: Optional[str] = None, secret_access_key: Optional[str] = None, client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("BLOB_STORAGE_BACKEND=s3 需要安装 boto3。")
+            client = boto3.client(
+                "s3", endpoint_url=endpoint_url, region_name=region,
+                aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key,
+            )
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_dir = cache_dir or settings.BLOB_CACHE_DIR
+
+    def key_for(self, sha256: str) -> str:
+        return f"{self.prefix}{blob_key(sha256)}"
+
+    def _cache_path(self, sha256: str) -> str:
+        return os.path.join(self.cache_dir, *blob_key(sha256).split("/"))
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        code = str(error.response.get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def exists(self, sha256: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key_for(sha256))
+            return True
+        except ClientError as e:
+            if self._is_not_found(e):
+                return False
+            raise
+
+    def put_file(self, src_path: str, sha256: str, content_type: Optional[str] = None) -> bool:
+        try:
+            if self.exists(sha256):
+                return False
+            extra_args = {"ContentType": content_type} if content_type else None
+            self.client.upload_file(src_path, self.bucket, self.key_for(sha256), ExtraArgs=extra_args)
+            return True
+        finally:
+            os.remove(src_path)
+
+    def local_path(self, sha256: str) -> Optional[str]:
+        cache_path = self._cache_path(sha256)
+        if os.path.isfile(cache_path):
+            return cache_path
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temp_path = f"{cache_path}.part-{uuid.uuid4().hex}"
+        try:
+            self.client.download_file(self.bucket, self.key_for(sha256), temp_path)
+            os.replace(temp_path, cache_path)
+        except ClientError as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return cache_path
+
+    def open(self, sha256: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key_for(sha256))["Body"]
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise FileNotFoundError(self.key_for(sha256)) from e
+            raise
+
+    def delete(self, sha256: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key_for(sha256))
+        _remove_with_derivatives(self._cache_path(sha256))
+
+
+_blob_store: Optional[BlobBackend] = None
+
+
+def create_blob_store() -> BlobBackend:
+    """按 BLOB_STORAGE_BACKEND 创建存储后端。"""
+    backend = settings.BLOB_STORAGE_BACKEND.lower()
+    if backend == "local":
+        return LocalBlobBackend(settings.BLOB_STORAGE_DIR)
+    if backend == "s3":
+        if not settings.BLOB_S3_BUCKET:
+            raise RuntimeError("BLOB_STORAGE_BACKEND=s3 时必须配置 BLOB_S3_BUCKET。")
+        return S3BlobBackend(
+            settings.BLOB_S3_BUCKET, prefix=settings.BLOB_S3_PREFIX, cache_dir=settings.BLOB_CACHE_DIR,
+            endpoint_url=settings.BLOB_S3_ENDPOINT_URL, region=settings.BLOB_S3_REGION,
+            access_key_id=settings.BLOB_S3_ACCESS_KEY_ID, secret_access_key=settings.BLOB_S3_SECRET_ACCESS_KEY,
+        )
+    raise RuntimeError(f"未知的 BLOB_STORAGE_BACKEND: {settings.BLOB_STORAGE_BACKEND} (local / s3)")
+
+
+def get_blob_store() -> BlobBackend:
+    """进程内共享的存储后端 (首次调用时创建)。"""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = create_blob_store()
+        logger.info(f"图片存储后端: {_blob_store.name}")
+    return _blob_store
+
+
+async def store_upload(db: AsyncSession, saved: SavedUpload, content_type: Optional[str] = None,
+                       store: Optional[BlobBackend] = None) -> str:
+    """
+    把 save_upload_stream 保存到暂存目录的文件存入图片存储，返回其 sha256。
+    先登记 image_blobs (ref_count 不变)，再写入后端；引用计数由保存评估记录的事务增加。
+    """
+    store = store or get_blob_store()
+    try:
+        await crud_image_blob.register(db, saved.sha256, saved.size, content_type)
+        is_new = await anyio.to_thread.run_sync(store.put_file, saved.path, saved.sha256, content_type)
+    except BaseException:
+        # 不留下暂存文件 (put_file 成功时暂存文件已被移走)
+        with anyio.CancelScope(shield=True):
+            await anyio.Path(saved.path).unlink(missing_ok=True)
+        raise
+    logger.info(f"图片 {saved.sha256[:12]} ({saved.size} 字节) {'已存入' if is_new else '与已有图片相同，复用'}{store.name} 存储。")
+    return saved.sha256
+
+
+def resolve_image(image_sha256: Optional[str], image_path: Optional[str] = None,
+                  uploads_dir: Optional[str] = None) -> Optional[str]:
+    """
+    返回评估图片的本地文件路径 (同步；远程后端可能触发下载)，找不到时返回 None。
+    image_sha256 优先；为空时按旧的 image_path 在 uploads_dir (默认 UPLOADS_DIR) 中查找。
+    """
+    if image_sha256:
+        try:
+            return get_blob_store().local_path(image_sha256)
+        except ValueError as e:
+            logger.warning(f"评估记录中的图片键无效: {e}")
+            return None
+    if not image_path:
+        return None
+    uploads_dir = uploads_dir or settings.UPLOADS_DIR
+    legacy_path = image_path if os.path.isabs(image_path) else os.path.join(uploads_dir, image_path)
+    return legacy_path if os.path.isfile(legacy_path) else None
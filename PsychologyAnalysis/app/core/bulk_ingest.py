@@ -0,0 +1,264 @@
+# app/core/bulk_ingest.py
+"""
+批量导入评估记录 (POST /admin/assessments/bulk)。
+
+用于一次性导入大量纸质评估：请求体为 JSONL (每行一个 JSON 对象) 或 CSV (首行为表头)，
+边接收边解析 (request.stream()，不把整个请求体读入内存)，每条记录：
+  - 基础信息字段与单条提交相同 (name、gender、age、id_card ...)，按 BasicInfoSubmit 校验；
+  - scale_type + 答案 (JSONL 中为 "answers": {"q1": 2, ...} 或顶层 q1..qN；CSV 中为 q1..qN 列)，
+    按量表目录中的 AnswerKey 校验 (见 app/core/submission_form.validate_submission)；
+  - 可选 image_path：uploads 目录中已存在的图片文件名。
+有效记录按 BULK_INGEST_CHUNK_SIZE 分块，每块一个事务：一条多行 INSERT 写入评估记录，
+再批量写入分析任务的发件箱记录 (由发件箱中继投递，见 app/tasks/outbox_relay.py)。
+返回每条记录的结果 (新评估 ID 或错误原因)。
+"""
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.scale_catalog import ScaleCatalog
+from app.core.submission_form import BASIC_INFO_FIELDS, validate_submission
+from app.crud import assessment as crud_assessment
+from app.models.task_outbox import ANALYSIS_TASK_NAME
+
+logger = logging.getLogger(settings.APP_NAME)
+
+FORMAT_JSONL = "jsonl"
+FORMAT_CSV = "csv"
+_CONTENT_TYPES = {
+    "application/x-ndjson": FORMAT_JSONL,
+    "application/jsonl": FORMAT_JSONL,
+    "application/json-lines": FORMAT_JSONL,
+    "text/csv": FORMAT_CSV,
+}
+
+
+def detect_format(request: Request, explicit: Optional[str]) -> str:
+    """优先使用查询参数 format，否则按 Content-Type 判断；无法判断时返回 415。"""
+    if explicit:
+        if explicit not in (FORMAT_JSONL, FORMAT_CSV):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"不支持的格式: {explicit} (jsonl / csv)")
+        return explicit
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    fmt = _CONTENT_TYPES.get(content_type)
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                            detail="请求体应为 JSONL (application/x-ndjson) 或 CSV (text/csv)，或通过 ?format= 指定。")
+    return fmt
+
+
+async def iter_body_lines(request: Request, max_bytes: int) -> AsyncIterator[Tuple[int, str]]:
+    """逐块读取请求体并按行产出 (行号, 文本)；超过 max_bytes 时返回 413，非 UTF-8 时返回 400。"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    line_no = 0
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_bytes:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                                    detail=f"请求体超过 {max_bytes // (1024 * 1024)} MB 上限。")
+            lines = (pending + decoder.decode(chunk)).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                line_no += 1
+                yield line_no, line.rstrip("\r")
+        tail = pending + decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"请求体不是有效的 UTF-8 文本: {e}")
+    if tail.strip():
+        yield line_no + 1, tail.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[Tuple[int, str]], fmt: str) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """把行流解析为 (起始行号, 记录字典, 解析错误)；空行被跳过。"""
+    if fmt == FORMAT_JSONL:
+        async for line_no, line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, None, f"JSON 解析失败: {e.msg}"
+                continue
+            if not isinstance(record, dict):
+                yield line_no, None, "每行应为一个 JSON 对象"
+                continue
+            yield line_no, record, None
+        return
+
+    header: Optional[List[str]] = None
+    buffer, start_line = "", 0
+    async for line_no, line in lines:
+        buffer = f"{buffer}\n{line}" if buffer else line
+        start_line = start_line or line_no
+        # 引号未闭合时 (字段内含换行) 继续拼接下一行
+        if buffer.count('"') % 2:
+            continue
+        record_text, record_line = buffer, start_line
+        buffer, start_line = "", 0
+        if not record_text.strip():
+            continue
+        values = next(csv.reader([record_text]))
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if len(values) > len(header):
+            yield record_line, None, f"列数 ({len(values)}) 多于表头 ({len(header)})"
+            continue
+        yield record_line, dict(zip(header, values)), None
+    if buffer:
+        yield start_line, None, "CSV 引号未闭合"
+
+
+def _is_safe_image_name(name: str) -> bool:
+    return bool(name) and os.path.basename(name) == name and not name.startswith(".")
+
+
+def prepare_row(record: Dict[str, Any], catalog: ScaleCatalog, submitter_id: int) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """校验一条记录并转换为 analysis_data 的列值；返回 (列值, 错误列表)。"""
+    fields: Dict[str, Any] = {}
+    raw_answers: Dict[int, str] = {}
+    for key, value in record.items():
+        if value is None or (isinstance(value, str) and not value.strip()):
+            continue
+        if key in BASIC_INFO_FIELDS:
+            fields[key] = value
+        elif key[:1] == "q" and key[1:].isdigit():
+            raw_answers[int(key[1:])] = str(value)
+    answers_obj = record.get("answers")
+    if isinstance(answers_obj, dict):
+        for key, value in answers_obj.items():
+            key = str(key)
+            number = key[1:] if key[:1] == "q" else key
+            if number.isdigit() and value is not None:
+                raw_answers[int(number)] = str(value)
+
+    scale_type = record.get("scale_type")
+    scale_type = (str(scale_type).strip() or None) if scale_type is not None else None
+    basic_info, answers, errors = validate_submission(fields, scale_type, raw_answers, catalog)
+    image_path = record.get("image_path")
+    image_path = (str(image_path).strip() or None) if image_path is not None else None
+    if image_path and not _is_safe_image_name(image_path):
+        errors = list(errors) + [f"image_path 只能是 uploads 目录中的文件名: {image_path}"]
+    if errors:
+        return None, [_format_error(e) for e in errors]
+
+    values = basic_info.model_dump(exclude={"name"})
+    values.update({
+        "subject_name": basic_info.name,
+        "submitter_id": submitter_id,
+        "image_path": image_path,
+        "questionnaire_type": scale_type,
+        "questionnaire_data": json.dumps(answers, ensure_ascii=False, sort_keys=True) if answers else None,
+    })
+    return values, []
+
+
+def _format_error(error: Any) -> str:
+    """pydantic 错误字典转换为 '字段: 原因'。"""
+    if isinstance(error, dict):
+        loc = ".".join(str(part) for part in error.get("loc", ()))
+        return f"{loc}: {error.get('msg', '')}" if loc else str(error.get("msg", error))
+    return str(error)
+
+
+class BulkIngestor:
+    """累积有效记录并按块写库，同时记录每条记录的结果。"""
+
+    def __init__(self, db: AsyncSession, chunk_size: int):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.results: List[Dict[str, Any]] = []
+        self._chunk: List[Tuple[int, Dict[str, Any]]] = []
+        self._seen_id_cards: Set[str] = set()
+
+    def fail(self, line: int, errors: List[str]):
+        self.results.append({"line": line, "status": "error", "errors": errors})
+
+    async def add(self, line: int, values: Dict[str, Any]):
+        id_card = values.get("id_card")
+        if id_card:
+            if id_card in self._seen_id_cards:
+                self.fail(line, [f"身份证号 {id_card} 在本次导入中重复"])
+                return
+            self._seen_id_cards.add(id_card)
+        self._chunk.append((line, values))
+        if len(self._chunk) >= self.chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        chunk, self._chunk = self._chunk, []
+        if not chunk:
+            return
+        # 身份证号唯一：先排除库中已存在的，避免整块因一条冲突回滚
+        taken = await crud_assessment.get_existing_id_cards(self.db, [v["id_card"] for _, v in chunk if v.get("id_card")])
+        missing_images = await asyncio.to_thread(
+            lambda: {v["image_path"] for _, v in chunk
+                     if v.get("image_path") and not os.path.isfile(os.path.join(settings.UPLOADS_DIR, v["image_path"]))}
+        )
+        ready: List[Tuple[int, Dict[str, Any]]] = []
+        for line, values in chunk:
+            if values.get("id_card") in taken:
+                self.fail(line, [f"身份证号 {values['id_card']} 已存在"])
+            elif values.get("image_path") in missing_images:
+                self.fail(line, [f"图片文件不存在: {values['image_path']}"])
+            else:
+                ready.append((line, values))
+        if not ready:
+            return
+
+        try:
+            new_ids = await crud_assessment.bulk_create_with_outbox(self.db, [v for _, v in ready], ANALYSIS_TASK_NAME)
+            self.results.extend({"line": line, "status": "created", "assessment_id": new_id}
+                                for (line, _), new_id in zip(ready, new_ids))
+        except IntegrityError as e:
+            # 并发写入等导致的冲突：逐条重试，只有冲突的记录失败
+            logger.warning(f"批量导入: {len(ready)} 条记录整块写入冲突 ({e.orig})，改为逐条写入。")
+            for line, values in ready:
+                try:
+                    new_ids = await crud_assessment.bulk_create_with_outbox(self.db, [values], ANALYSIS_TASK_NAME)
+                    self.results.append({"line": line, "status": "created", "assessment_id": new_ids[0]})
+                except IntegrityError as row_err:
+                    self.fail(line, [f"数据保存冲突: {row_err.orig}"])
+
+
+async def ingest(request: Request, db: AsyncSession, catalog: ScaleCatalog, submitter_id: int,
+                 fmt: str) -> Dict[str, Any]:
+    """流式解析请求体并分块写库，返回 BulkIngestResponse 的字段。"""
+    started = time.perf_counter()
+    ingestor = BulkIngestor(db, settings.BULK_INGEST_CHUNK_SIZE)
+    total = 0
+    async for line, record, parse_error in iter_records(iter_body_lines(request, settings.BULK_INGEST_MAX_BYTES), fmt):
+        total += 1
+        if total > settings.BULK_INGEST_MAX_ROWS:
+            # 已写入的块保留 (各自独立提交)，剩余记录不再处理
+            ingestor.fail(line, [f"超过单次导入上限 {settings.BULK_INGEST_MAX_ROWS} 条，此后的记录未处理"])
+            break
+        if parse_error:
+            ingestor.fail(line, [parse_error])
+            continue
+        values, errors = prepare_row(record, catalog, submitter_id)
+        if errors:
+            ingestor.fail(line, errors)
+        else:
+            await ingestor.add(line, values)
+    await ingestor.flush()
+
+    results = sorted(ingestor.results, key=lambda r: r["line"])
+    created = sum(1 for r in results if r["status"] == "created")
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"批量导入完成: {total} 条记录，成功 {created} 条，失败 {len(results) - created} 条，耗时 {elapsed_ms} ms")
+    return {"total": total, "created": created, "failed": len(results) - created,
+            "elapsed_ms": elapsed_ms, "results": results}
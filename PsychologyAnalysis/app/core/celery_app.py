@@ -17,7 +17,7 @@ celery_app = Celery(
     "QingtingzheApp", # 与 FastAPI app name 保持一致或自定义
     broker=REDIS_URL,
     backend=REDIS_URL, # 使用 Redis 作为结果存储后端
-    include=['app.tasks.analysis'] # 指定包含任务定义的模块列表
+    include=['app.tasks.analysis', 'app.tasks.score_backfill'] # 指定包含任务定义的模块列表
 )
 
 # 可选：Celery 配置项 (可以放在 settings 或这里)
@@ -27,6 +27,19 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='Asia/Shanghai', # 设置时区
     enable_utc=True,
+    # 入口任务 run_ai_analysis 走默认队列 (prefork worker 与 asyncio worker 都可消费)，
+    # 分阶段任务单独走一个队列，只由 prefork worker 消费
+    task_default_queue=settings.CELERY_ANALYSIS_QUEUE,
+    task_routes={
+        'tasks.analysis_vision_stage': {'queue': settings.CELERY_STAGE_QUEUE},
+        'tasks.analysis_scoring_stage': {'queue': settings.CELERY_STAGE_QUEUE},
+        'tasks.analysis_report_stage': {'queue': settings.CELERY_STAGE_QUEUE},
+        # 维护任务不进默认队列，否则 asyncio worker 会收到它无法执行的消息
+        'tasks.backfill_assessment_scores': {'queue': settings.CELERY_MAINTENANCE_QUEUE},
+    },
+    # 分析任务 acks_late (见 app/tasks/analysis.py)：Redis broker 在 visibility_timeout 内未收到 ack 会重新投递，
+    # 该值需大于一次分析的最长耗时，与 processing 超时清扫使用同一个配置
+    broker_transport_options={'visibility_timeout': settings.OUTBOX_PROCESSING_TIMEOUT},
     # task_track_started=True, # 如果需要追踪任务开始状态
     # broker_connection_retry_on_startup=True, # 启动时自动重试连接 broker
 )
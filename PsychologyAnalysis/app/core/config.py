@@ -55,16 +55,105 @@ class Settings(BaseSettings):
     # --- 数据库 ---
     DB_PATH_SQLITE: str = os.path.join(PROJECT_ROOT, "psychology_analysis.db")
     DATABASE_URL: str = f"sqlite+aiosqlite:///{DB_PATH_SQLITE}"
+    # Celery worker 每个进程独立的连接池 (见 app/core/worker_runtime.py)
+    WORKER_DB_POOL_SIZE: int = 5
+    WORKER_DB_MAX_OVERFLOW: int = 5
+    WORKER_DB_POOL_RECYCLE: int = 1800 # 秒
 
     # --- 文件存储 ---
     UPLOADS_DIR: str = os.path.join(PROJECT_ROOT, "uploads")
     LOGS_DIR: str = os.path.join(PROJECT_ROOT, "logs")
+    # 上传图片的流式保存 (见 app/core/uploads.py)
+    UPLOAD_MAX_BYTES: int = 10 * 1024 * 1024 # 单张上传图片的最大字节数，超过时返回 413
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024 # 每次读取/写入的块大小 (字节)
+    UPLOAD_FORM_OVERHEAD_BYTES: int = 256 * 1024 # 提交请求中除图片外表单字段的余量，用于按 Content-Length 提前拒绝
+    # 按内容寻址的图片存储 (见 app/core/blob_storage.py)：按 SHA-256 去重，分片存放在 <前2位>/<第3-4位>/<sha256>
+    BLOB_STORAGE_BACKEND: str = "local" # local: 本地文件系统；s3: S3 兼容对象存储 (需要 boto3)
+    BLOB_STORAGE_DIR: str = os.path.join(PROJECT_ROOT, "uploads", "blobs") # local 后端的根目录
+    BLOB_STAGING_DIR: str = os.path.join(PROJECT_ROOT, "uploads", ".staging") # 上传暂存目录 (应与 local 根目录在同一文件系统)
+    BLOB_CACHE_DIR: str = os.path.join(PROJECT_ROOT, "uploads", ".cache") # s3 后端供视觉模型读取的本地缓存
+    BLOB_S3_BUCKET: Optional[str] = None
+    BLOB_S3_PREFIX: str = "uploads/" # 对象键前缀
+    BLOB_S3_ENDPOINT_URL: Optional[str] = None # MinIO 等 S3 兼容服务的地址，为空时使用 AWS
+    BLOB_S3_REGION: Optional[str] = None
+    BLOB_S3_ACCESS_KEY_ID: Optional[str] = None
+    BLOB_S3_SECRET_ACCESS_KEY: Optional[str] = None
+    BLOB_GC_GRACE_SECONDS: int = 24 * 3600 # 无引用的图片保留多久后才删除 (秒)
+    # 批量导入评估 (POST /admin/assessments/bulk，见 app/core/bulk_ingest.py)
+    BULK_INGEST_CHUNK_SIZE: int = 500 # 每个事务写入的评估记录数 (一条多行 INSERT)
+    BULK_INGEST_MAX_ROWS: int = 20000 # 单次请求的最大行数
+    BULK_INGEST_MAX_BYTES: int = 50 * 1024 * 1024 # 单次请求体的最大字节数
 
     # --- AI 服务 (Dashscope) API ---
     DASHSCOPE_API_KEY: Optional[str] = None
+    # OpenAI 兼容接口地址，所有大模型客户端共用
+    LLM_BASE_URL: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+    # 共享大模型客户端的连接池与超时 (见 src/llm_clients.py)
+    LLM_MAX_CONNECTIONS: int = 50 # 每个客户端的最大连接数 (asyncio worker 下应不小于 ASYNC_WORKER_CONCURRENCY)
+    LLM_MAX_KEEPALIVE: int = 20 # 保持的空闲 keep-alive 连接数
+    LLM_KEEPALIVE_EXPIRY: float = 60.0 # 空闲连接保留时间 (秒)
+    LLM_TIMEOUT: float = 120.0 # 单次请求总超时 (秒)
+    LLM_CONNECT_TIMEOUT: float = 10.0 # 建立连接超时 (秒)
+    LLM_MAX_RETRIES: int = 2 # SDK 内部对连接错误/429/5xx 的重试次数
+    # API 路由中的大模型调用并发限制 (见 app/core/llm_gateway.py)
+    LLM_ROUTE_CONCURRENCY: int = 8 # 每个路由默认同时在途的大模型调用数
+    LLM_ROUTE_LIMITS: Dict[str, int] = {} # 按路由名覆盖，例如 {"admin.ai_analysis": 2}
+    LLM_ROUTE_ACQUIRE_TIMEOUT: float = 5.0 # 等待并发名额的最长时间 (秒)，超时返回 503
 
     # --- Redis 配置 (用于 Celery Broker 和 Backend) ---
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_PUBLISHER_MAX_CONNECTIONS: int = 10 # 每个进程报告状态发布器的连接池上限
+    # 报告流式输出：LLM 片段合并后通过 Redis 推送给 SSE (report_chunk 事件)
+    REPORT_STREAMING_ENABLED: bool = True
+    REPORT_STREAM_FLUSH_CHARS: int = 48 # 累积到多少字符发布一次
+    REPORT_STREAM_FLUSH_INTERVAL_MS: int = 250 # 距上次发布超过该时间也会发布
+
+    # --- 量表目录缓存 (见 app/core/scale_catalog.py) ---
+    SCALE_CATALOG_MAX_AGE: int = 300 # /scales 响应的 Cache-Control max-age (秒)，过期后客户端凭 ETag 重新验证
+    SCALE_CATALOG_CHANNEL: str = "scale-catalog:invalidate" # 题库重新导入后发布失效通知的 Redis 频道
+    SCALE_CATALOG_LISTENER_ENABLED: bool = True # API 进程是否订阅失效通知并自动重新加载目录
+
+    # --- 分析任务流水线 ---
+    # chain: 拆分为 vision -> scoring -> report 三个 Celery 任务 (默认)；inline: 在单个任务内并发执行各阶段
+    ANALYSIS_PIPELINE_MODE: str = "chain"
+    ANALYSIS_STAGE_MAX_RETRIES: int = 3 # 视觉/报告阶段调用大模型失败时的重试次数
+    ANALYSIS_STAGE_RETRY_BACKOFF: int = 10 # 重试退避基数 (秒)，按 2 的幂递增
+    # 分阶段任务使用的队列；run_ai_analysis 仍走默认队列 (celery)，以便 asyncio worker 与 prefork worker 共享
+    CELERY_ANALYSIS_QUEUE: str = "celery"
+    CELERY_STAGE_QUEUE: str = "analysis_stages"
+    # 非分析类任务 (计分回填等) 使用的队列，只由 prefork worker 消费；默认队列只留给 run_ai_analysis
+    CELERY_MAINTENANCE_QUEUE: str = "maintenance"
+    # asyncio worker 模式 (run_async_worker.py) 每个进程同时处理的评估数
+    ASYNC_WORKER_CONCURRENCY: int = 32
+    # 事务性发件箱中继 (见 app/tasks/outbox_relay.py，启动: python run_outbox_relay.py)
+    OUTBOX_BATCH_SIZE: int = 100 # 每批投递的发件箱记录数
+    OUTBOX_POLL_INTERVAL: float = 1.0 # 没有待投递记录时的轮询间隔 (秒)
+    OUTBOX_RETRY_BACKOFF: int = 5 # 投递失败后的重试退避基数 (秒)，按 2 的幂递增
+    OUTBOX_RETRY_MAX_DELAY: int = 300 # 重试退避上限 (秒)
+    OUTBOX_SWEEP_INTERVAL: int = 60 # 清扫长期停留在 pending 的评估的间隔 (秒)
+    OUTBOX_STALE_AFTER: int = 900 # 评估已投递 (或创建) 超过该秒数仍为 pending 时重新排队
+    OUTBOX_MAX_ATTEMPTS: int = 5 # 清扫重新排队的次数上限，超过后保留现状等待人工处理
+    # 评估停留在 processing 超过该秒数 (按 updated_at) 视为 worker 已退出，清扫时重置为 pending 并重新投递；
+    # 应大于一次分析的最长耗时 (含各阶段重试退避)，且不小于 OUTBOX_STALE_AFTER
+    OUTBOX_PROCESSING_TIMEOUT: int = 3600
+
+    # --- 视觉模型调用前的图片预处理 (见 src/image_preprocess.py) ---
+    VISION_PREPROCESS_ENABLED: bool = True
+    VISION_MAX_EDGE: int = 1280 # 长边缩放上限 (像素)
+    VISION_JPEG_QUALITY: int = 85 # 重新编码的 JPEG 质量
+
+    # --- 图片描述缓存 (见 src/vision_cache.py) ---
+    VISION_CACHE_ENABLED: bool = True
+    VISION_CACHE_DB_PATH: str = os.path.join(PROJECT_ROOT, "vision_cache.db") # 本地持久化缓存 (SQLite)
+    VISION_CACHE_MAX_ENTRIES: int = 10000 # 本地缓存条目上限，超出按最近访问时间淘汰
+    VISION_CACHE_REDIS_ENABLED: bool = False # 是否启用多 worker 共享的 Redis 缓存层
+    VISION_CACHE_REDIS_TTL: int = 30 * 24 * 3600 # Redis 缓存条目过期时间 (秒)
+
+    # --- 报告 Prompt 紧凑编码与 token 预算 (见 src/prompt_builder.py) ---
+    PROMPT_COMPACT_ENABLED: bool = True # 量表答案编码为分值向量并省略未填写字段；False 时恢复缩进 JSON
+    PROMPT_SECTION_BUDGETS: Dict[str, int] = { # 各段 token 上限 (本地估算)，超出时截断
+        "description": 1500, "questionnaire": 800, "interpretation": 400, "subject_field": 120,
+    }
 
     # --- 从 config.yaml 加载的备选或默认值 ---
     TEXT_MODEL: str = "qwen-plus"
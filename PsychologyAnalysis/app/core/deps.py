@@ -11,6 +11,7 @@ from app.core.security import decode_access_token # Your JWT decoding function
 
 # --- Database and CRUD Imports ---
 from app.db.session import AsyncSessionLocal # Import the async session maker
+from app.core.scale_catalog import ScaleCatalog, get_scale_catalog
 from app import crud, models, schemas # Adjust imports based on your project structure
 
 logger = logging.getLogger(settings.APP_NAME) # Use the main app logger
@@ -42,6 +43,20 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         # Session is automatically closed when exiting the 'async with' block
 
+
+# --- 量表目录依赖 ---
+# 量表目录是进程级只读单例 (启动时加载，见 app/main.py)，请求中不访问数据库。
+async def get_catalog() -> ScaleCatalog:
+    catalog = get_scale_catalog()
+    if catalog.loaded:
+        return catalog
+    try:
+        # 启动时预加载失败 (如数据库尚未迁移) 时，在首次请求中补加载
+        return await catalog.ensure_loaded()
+    except Exception as e:
+        logger.error(f"Failed to load scale catalog: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"量表目录加载失败: {e}")
+
 # --- Asynchronous Current User Dependency ---
 async def get_current_user(
     db: AsyncSession = Depends(get_db),          # Depend on the async get_db
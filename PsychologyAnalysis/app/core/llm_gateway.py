@@ -0,0 +1,87 @@
+# app/core/llm_gateway.py
+"""
+FastAPI 路由调用大模型的异步网关。
+
+路由里的大模型调用都通过 AsyncOpenAI (src/llm_clients.py 的共享异步客户端) 完成，不会阻塞事件循环；
+本模块再给每个路由加一个并发上限：同一路由同时在途的大模型调用数不超过
+settings.LLM_ROUTE_LIMITS[name] (默认 LLM_ROUTE_CONCURRENCY)，等待名额超过
+LLM_ROUTE_ACQUIRE_TIMEOUT 秒时直接返回 503，而不是让请求无限排队。
+
+用法:
+    async with llm_slot("admin.ai_analysis"):
+        completion = await client.chat.completions.create(...)
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Tuple
+
+from fastapi import HTTPException, status
+
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+
+class RouteLimiter:
+    """单个路由的并发限制和计数。信号量绑定到首次使用它的事件循环 (即 uvicorn 的事件循环)。"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_ms_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_max": round(self.wait_ms_max, 2),
+        }
+
+
+_limiters: Dict[Tuple[str, int], RouteLimiter] = {}
+
+
+def get_limiter(name: str) -> RouteLimiter:
+    """返回当前事件循环中 name 对应的限流器 (不存在时按配置创建)。"""
+    key = (name, id(asyncio.get_running_loop()))
+    limiter = _limiters.get(key)
+    if limiter is None:
+        limit = settings.LLM_ROUTE_LIMITS.get(name, settings.LLM_ROUTE_CONCURRENCY)
+        limiter = _limiters[key] = RouteLimiter(name, max(1, limit))
+    return limiter
+
+
+@asynccontextmanager
+async def llm_slot(name: str):
+    """获取路由 name 的一个并发名额；超时未获取到时抛出 503。"""
+    limiter = get_limiter(name)
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(limiter.semaphore.acquire(), timeout=settings.LLM_ROUTE_ACQUIRE_TIMEOUT)
+    except asyncio.TimeoutError:
+        limiter.rejected += 1
+        logger.warning(f"LLM 网关: 路由 '{name}' 并发已满 ({limiter.limit})，等待 {settings.LLM_ROUTE_ACQUIRE_TIMEOUT}s 后拒绝请求。")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="AI 服务繁忙，请稍后重试")
+
+    wait_ms = (time.perf_counter() - started) * 1000
+    limiter.wait_ms_max = max(limiter.wait_ms_max, wait_ms)
+    limiter.in_flight += 1
+    try:
+        yield limiter
+    finally:
+        limiter.in_flight -= 1
+        limiter.completed += 1
+        limiter.semaphore.release()
+
+
+def gateway_stats() -> Dict[str, Dict[str, Any]]:
+    """各路由限流器的计数快照。"""
+    return {limiter.name: limiter.snapshot() for limiter in _limiters.values()}
@@ -0,0 +1,232 @@
+# app/core/redis_client.py
+"""
+进程级共享的 Redis 报告状态发布器。
+
+worker 发布报告状态时复用同一个连接池，不再为每条消息新建/关闭 TCP 连接；
+多个状态事件 (例如中间阶段 + 最终状态) 可以通过 pipeline 一次往返发出。
+报告正文的流式片段由 ReportChunkStreamer 合并后以 streaming 状态发布。
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+REPORT_CHANNEL_PREFIX = "report-ready:"
+STATUS_STREAMING = "streaming" # 报告正文流式片段
+
+# (assessment_id, status, error_msg, extra)
+StatusEvent = Tuple[int, str, Optional[str], Optional[Dict[str, Any]]]
+
+
+def report_channel(assessment_id: int) -> str:
+    """报告状态的 Pub/Sub 频道名，SSE 端点订阅同一个频道。"""
+    return f"{REPORT_CHANNEL_PREFIX}{assessment_id}"
+
+
+def build_status_message(status: str, error_msg: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> str:
+    """构造状态消息 JSON: {"status": ..., "error": ..., 其他字段}"""
+    payload: Dict[str, Any] = {"status": status}
+    if error_msg:
+        payload["error"] = error_msg
+    if extra:
+        payload.update(extra)
+    return json.dumps(payload, ensure_ascii=False)
+
+
+class PublisherStats:
+    """发布计数器：成功/失败的消息数、往返次数和往返延迟。线程安全。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages_published = 0
+        self.messages_failed = 0
+        self.round_trips = 0
+        self.failed_round_trips = 0
+        self.latency_ms_total = 0.0
+        self.latency_ms_max = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, messages: int, latency_ms: float, error: Optional[Exception] = None):
+        with self._lock:
+            self.round_trips += 1
+            self.latency_ms_total += latency_ms
+            self.latency_ms_max = max(self.latency_ms_max, latency_ms)
+            if error is None:
+                self.messages_published += messages
+            else:
+                self.failed_round_trips += 1
+                self.messages_failed += messages
+                self.last_error = f"{type(error).__name__}: {error}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "messages_published": self.messages_published,
+                "messages_failed": self.messages_failed,
+                "round_trips": self.round_trips,
+                "failed_round_trips": self.failed_round_trips,
+                "latency_ms_avg": round(self.latency_ms_total / self.round_trips, 3) if self.round_trips else 0.0,
+                "latency_ms_max": round(self.latency_ms_max, 3),
+                "last_error": self.last_error,
+            }
+
+
+class ReportStatusPublisher:
+    """基于连接池的同步发布器，供 Celery worker 使用。"""
+
+    def __init__(self, redis_url: str, max_connections: int):
+        self.pid = os.getpid()
+        self.pool = redis.ConnectionPool.from_url(
+            redis_url,
+            decode_responses=True,
+            max_connections=max_connections,
+            socket_keepalive=True,
+        )
+        self.client = redis.Redis(connection_pool=self.pool)
+        self.stats = PublisherStats()
+
+    def publish(self, assessment_id: int, status: str, error_msg: Optional[str] = None,
+                extra: Optional[Dict[str, Any]] = None) -> bool:
+        """发布单条状态消息。失败只记录日志和计数，不抛出异常。"""
+        return self.publish_many([(assessment_id, status, error_msg, extra)]) == 1
+
+    def publish_many(self, events: Iterable[StatusEvent]) -> int:
+        """
+        通过一个非事务 pipeline 在一次往返中发布多条状态消息。
+        返回成功发出的消息数 (失败时为 0)。
+        """
+        events = list(events)
+        messages = [(report_channel(aid), build_status_message(status, error_msg, extra))
+                    for aid, status, error_msg, extra in events]
+        if not messages:
+            return 0
+
+        started = time.perf_counter()
+        try:
+            if len(messages) == 1:
+                self.client.publish(*messages[0])
+            else:
+                pipe = self.client.pipeline(transaction=False)
+                for channel, body in messages:
+                    pipe.publish(channel, body)
+                pipe.execute()
+        except Exception as e:
+            self.stats.record(len(messages), (time.perf_counter() - started) * 1000, error=e)
+            logger.error(f"Redis 发布器: 发布 {len(messages)} 条状态消息失败: {e}", exc_info=True)
+            return 0
+
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.stats.record(len(messages), latency_ms)
+        for (channel, body), event in zip(messages, events):
+            # 流式片段数量多，只在 debug 级别记录
+            log = logger.debug if event[1] == STATUS_STREAMING else logger.info
+            log(f"Redis 发布器: 已向频道 '{channel}' 发布消息: {body}")
+        logger.debug(f"Redis 发布器: {len(messages)} 条消息，一次往返耗时 {latency_ms:.2f}ms")
+        return len(messages)
+
+    def close(self):
+        try:
+            self.pool.disconnect()
+        except Exception as e:
+            logger.warning(f"Redis 发布器: 关闭连接池时出错: {e}")
+
+
+class ReportChunkStreamer:
+    """
+    把 LLM 流式输出的文本片段合并后发布为 streaming 状态消息:
+        {"status": "streaming", "delta": "...", "offset": <delta 在完整报告中的起始字符位置>}
+    第一个片段立即发出 (首字节延迟)，之后累积到 flush_chars 个字符或距上次发布超过 flush_interval_ms 才发一次，
+    避免每个 token 一次 Redis 往返。重试时新一轮生成的 offset 从 0 开始，前端据此丢弃旧内容。
+    发布失败只记录日志，不影响报告生成；最终报告仍以数据库中的完整文本为准。
+    """
+
+    def __init__(self, assessment_id: int, publisher: Optional[ReportStatusPublisher] = None,
+                 flush_chars: Optional[int] = None, flush_interval_ms: Optional[int] = None):
+        self.assessment_id = assessment_id
+        self.publisher = publisher or get_status_publisher()
+        self.flush_chars = flush_chars or settings.REPORT_STREAM_FLUSH_CHARS
+        self.flush_interval = (flush_interval_ms or settings.REPORT_STREAM_FLUSH_INTERVAL_MS) / 1000.0
+        self.buffer: list = []
+        self.buffered_chars = 0
+        self.offset = 0 # 已发布内容的字符数
+        self.messages_sent = 0
+        self.last_flush = 0.0
+
+    def _should_flush(self) -> bool:
+        return (self.messages_sent == 0
+                or self.buffered_chars >= self.flush_chars
+                or time.monotonic() - self.last_flush >= self.flush_interval)
+
+    def _take(self) -> Optional[Dict[str, Any]]:
+        if not self.buffer:
+            return None
+        delta = "".join(self.buffer)
+        extra = {"delta": delta, "offset": self.offset}
+        self.offset += len(delta)
+        self.buffer = []
+        self.buffered_chars = 0
+        self.messages_sent += 1
+        self.last_flush = time.monotonic()
+        return extra
+
+    def _append(self, delta: str):
+        self.buffer.append(delta)
+        self.buffered_chars += len(delta)
+
+    def feed(self, delta: str):
+        self._append(delta)
+        if self._should_flush():
+            self.flush()
+
+    def flush(self):
+        extra = self._take()
+        if extra is not None:
+            self.publisher.publish(self.assessment_id, STATUS_STREAMING, extra=extra)
+
+
+class AsyncReportChunkStreamer(ReportChunkStreamer):
+    """ReportChunkStreamer 的协程版本：发布在线程中执行，不阻塞事件循环 (asyncio worker 使用)。"""
+
+    async def feed(self, delta: str):
+        self._append(delta)
+        if self._should_flush():
+            await self.flush()
+
+    async def flush(self):
+        extra = self._take()
+        if extra is not None:
+            await asyncio.to_thread(self.publisher.publish, self.assessment_id, STATUS_STREAMING, None, extra)
+
+
+_publisher: Optional[ReportStatusPublisher] = None
+_publisher_lock = threading.Lock()
+
+
+def get_status_publisher() -> ReportStatusPublisher:
+    """返回当前进程的共享发布器 (fork 后在子进程中重新创建连接池)。"""
+    global _publisher
+    publisher = _publisher
+    if publisher is not None and publisher.pid == os.getpid():
+        return publisher
+    with _publisher_lock:
+        if _publisher is None or _publisher.pid != os.getpid():
+            _publisher = ReportStatusPublisher(settings.REDIS_URL, settings.REDIS_PUBLISHER_MAX_CONNECTIONS)
+            logger.info(f"Redis 发布器: 已创建连接池 (PID {os.getpid()})，目标: {settings.REDIS_URL}")
+        return _publisher
+
+
+def get_publisher_stats() -> Dict[str, Any]:
+    """当前进程发布器的计数器快照；尚未发布过任何消息时返回空字典。"""
+    publisher = _publisher
+    if publisher is None or publisher.pid != os.getpid():
+        return {}
+    return publisher.stats.snapshot()
@@ -0,0 +1,294 @@
+# app/core/scale_catalog.py
+"""
+进程内只读的量表目录 (questionnaire_questions)。
+
+量表题目只在运行 src/import_questions.py 时变化，因此 API 进程启动时 (或首次请求时)
+通过异步 CRUD (app/crud/questionnaire.py) 一次性读出全部题目、完成选项分值的校验和转换，并把 /scales 与 /scales/{code}/questions
+的响应预先序列化为 JSON 字节，同时计算内容哈希作为 ETag；之后的请求直接返回这些字节，
+客户端带 If-None-Match 且内容未变时返回 304。
+同一快照还为每个量表生成 AnswerKey，提交评估时据此校验答案 (见 app/core/submission_form.py)。
+
+题库重新导入后，导入脚本向 SCALE_CATALOG_CHANNEL 发布失效通知，
+API 进程中的 listen_for_invalidation() 收到后重新加载目录 (内容未变时 ETag 也不变)。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.crud import questionnaire as crud_questionnaire
+from app.db.session import AsyncSessionLocal
+from app.schemas.scale import AvailableScalesResponse, ScaleInfo, ScaleOption, ScaleQuestion, ScaleQuestionsResponse
+
+logger = logging.getLogger(settings.APP_NAME)
+
+Number = Union[int, float]
+
+
+def _option_score(raw: Any, question_number: int, text: str):
+    """把数据库中的选项分值转换为 int/float；无法转换时返回 None (该选项被跳过)。"""
+    if isinstance(raw, bool):
+        return int(raw)
+    if isinstance(raw, (int, float)):
+        return raw
+    if isinstance(raw, str):
+        try:
+            value = float(raw)
+        except ValueError:
+            logger.error(f"Could not convert score string '{raw}' to number for Q{question_number}, option '{text}'. Skipping option.")
+            return None
+        return int(value) if value.is_integer() else value
+    logger.warning(f"Unexpected type for score ({type(raw)}) for Q{question_number}, option '{text}'. Using 0 as fallback.")
+    return 0
+
+
+def build_question(number: Any, text: Any, options_json: Optional[str]) -> Optional[ScaleQuestion]:
+    """由 questionnaire_questions 的一行构造 ScaleQuestion；选项 JSON 无法解析时返回 None。"""
+    try:
+        raw_options = json.loads(options_json) if options_json else []
+    except json.JSONDecodeError:
+        logger.warning(f"Could not decode options for question {number}, skipping question.")
+        return None
+    options: List[ScaleOption] = []
+    if not isinstance(raw_options, list):
+        logger.warning(f"Options data for Q{number} is not a list, skipping options. Data: {raw_options}")
+        raw_options = []
+    for opt in raw_options:
+        if not isinstance(opt, dict):
+            logger.warning(f"Skipping invalid option data for Q{number}: {opt}")
+            continue
+        option_text = opt.get("text", opt.get("name", "N/A"))
+        score = _option_score(opt.get("score", 0), number, option_text)
+        if score is None:
+            continue
+        options.append(ScaleOption(text=str(option_text), score=score))
+    try:
+        return ScaleQuestion(number=int(number), text=str(text), options=options)
+    except Exception as e:
+        logger.error(f"Pydantic error creating ScaleQuestion for Q{number}: {e}")
+        return None
+
+
+class CatalogEntry:
+    """一个预先序列化的响应：JSON 字节 + 强 ETag (内容 SHA-256 前 32 位)。"""
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """If-None-Match 是否命中当前内容 (支持多个 ETag、W/ 前缀和 *)。"""
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*" or tag.removeprefix("W/") == self.etag:
+                return True
+        return False
+
+
+def _score_aliases(score: Number) -> List[str]:
+    """表单中可能出现的分值写法：整数分值同时接受 '2' 和 '2.0'。"""
+    if isinstance(score, int) or float(score).is_integer():
+        return [str(int(score)), f"{int(score)}.0"]
+    return [repr(float(score))]
+
+
+class AnswerKey:
+    """
+    单个量表的作答校验表：题号 -> {表单中的分值字符串: 分值}。
+    提交评估时按字典查找校验每道题的分值，不必对每个字段依次尝试 int/float 转换。
+    """
+    __slots__ = ("scale_code", "allowed")
+
+    def __init__(self, scale_code: str, questions: List[ScaleQuestion]):
+        self.scale_code = scale_code
+        self.allowed: Dict[int, Dict[str, Number]] = {}
+        for question in questions:
+            options: Dict[str, Number] = {}
+            for option in question.options:
+                for alias in _score_aliases(option.score):
+                    options.setdefault(alias, option.score)
+            self.allowed[question.number] = options
+
+    @property
+    def question_count(self) -> int:
+        return len(self.allowed)
+
+    def validate(self, raw_answers: Dict[int, str]) -> Tuple[Dict[str, Number], List[str]]:
+        """
+        校验 {题号: 表单原始值}：题号必须属于该量表、分值必须是该题某个选项的分值、每道题都必须作答。
+        返回 ({'q1': 分值, ...}, 错误列表)；错误列表为空时才可保存。
+        """
+        answers: Dict[str, Number] = {}
+        errors: List[str] = []
+        for number in sorted(raw_answers):
+            options = self.allowed.get(number)
+            if options is None:
+                errors.append(f"q{number}: 量表 {self.scale_code} 中没有该题")
+                continue
+            raw = raw_answers[number].strip()
+            score = options.get(raw)
+            if score is None:
+                # 罕见写法 (如 '3.00')，按数值再比较一次
+                try:
+                    value = float(raw)
+                except ValueError:
+                    value = None
+                score = next((s for s in options.values() if value is not None and s == value), None)
+            if score is None:
+                errors.append(f"q{number}: 分值 {raw!r} 不是该题的有效选项")
+                continue
+            answers[f"q{number}"] = score
+        missing = [number for number in self.allowed if number not in raw_answers]
+        if missing:
+            shown = ", ".join(f"q{n}" for n in missing[:10])
+            errors.append(f"缺少 {len(missing)} 道题的答案 ({shown}{' ...' if len(missing) > 10 else ''})")
+        return answers, errors
+
+
+class ScaleCatalog:
+    """全部量表的只读快照，加载后的读取不加锁、不访问数据库。"""
+
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self.session_factory = session_factory
+        self._scales: Optional[CatalogEntry] = None
+        self._questions: Dict[str, CatalogEntry] = {}
+        self._answer_keys: Dict[str, AnswerKey] = {}
+        self._load_lock = asyncio.Lock()
+        self.version: Optional[str] = None # 全部条目 ETag 的哈希，任一量表变化时改变
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._scales is not None
+
+    async def _read_rows(self) -> List[tuple]:
+        # 只读查询：目录服务不做任何 schema 检查或写入 (schema 由 Alembic 迁移负责)
+        async with self.session_factory() as session:
+            questions = await crud_questionnaire.get_all_questions(session)
+        return [(q.questionnaire_type, q.scale_name or q.questionnaire_type, q.question_number, q.question_text, q.options)
+                for q in questions]
+
+    async def load(self) -> "ScaleCatalog":
+        """从数据库读取全部题目，校验后序列化为响应字节，完成后原子替换当前快照。"""
+        started = time.perf_counter()
+        rows = await self._read_rows()
+        names: Dict[str, str] = {}
+        questions: Dict[str, List[ScaleQuestion]] = {}
+        for code, name, number, text, options_json in rows:
+            names.setdefault(code, name)
+            question = build_question(number, text, options_json)
+            if question is not None:
+                questions.setdefault(code, []).append(question)
+
+        scales = CatalogEntry(AvailableScalesResponse(
+            scales=[ScaleInfo(code=code, name=name) for code, name in names.items()]
+        ).model_dump_json().encode("utf-8"))
+        entries = {code: CatalogEntry(ScaleQuestionsResponse(questions=items).model_dump_json().encode("utf-8"))
+                   for code, items in questions.items()}
+        answer_keys = {code: AnswerKey(code, items) for code, items in questions.items()}
+        version = hashlib.sha256("".join([scales.etag] + [entries[c].etag for c in sorted(entries)]).encode()).hexdigest()[:16]
+        previous = self.version
+        # 单线程事件循环内整体替换，读取方看到的要么是旧快照、要么是新快照
+        self._scales, self._questions, self._answer_keys = scales, entries, answer_keys
+        self.version = version
+        self.loaded_at = time.time()
+        logger.info(f"量表目录已加载: {len(names)} 个量表，{len(rows)} 道题，版本 {version}"
+                    f"{' (未变化)' if previous == version else ''}，耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+        return self
+
+    async def ensure_loaded(self) -> "ScaleCatalog":
+        if not self.loaded:
+            async with self._load_lock:
+                if not self.loaded:
+                    await self.load()
+        return self
+
+    async def reload(self) -> "ScaleCatalog":
+        async with self._load_lock:
+            return await self.load()
+
+    def list_scales(self) -> CatalogEntry:
+        return self._scales if self._scales is not None else CatalogEntry(b'{"scales":[]}')
+
+    def get_questions(self, scale_code: str) -> Optional[CatalogEntry]:
+        return self._questions.get(scale_code)
+
+    def get_answer_key(self, scale_code: str) -> Optional[AnswerKey]:
+        return self._answer_keys.get(scale_code)
+
+
+_catalog: Optional[ScaleCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_scale_catalog() -> ScaleCatalog:
+    """进程级单例 (启动时由 lifespan 加载，见 app/main.py)。"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = ScaleCatalog(AsyncSessionLocal)
+    return _catalog
+
+
+# --- 失效通知 ---
+
+def publish_catalog_invalidation(reason: str = "import") -> int:
+    """
+    (同步) 通知所有 API 进程重新加载量表目录，供 src/import_questions.py 在导入完成后调用。
+    返回收到通知的订阅者数；Redis 不可用时记录日志并返回 0 (API 进程重启后同样会加载新题库)。
+    """
+    try:
+        client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=2)
+        try:
+            receivers = client.publish(settings.SCALE_CATALOG_CHANNEL, json.dumps({"reason": reason, "ts": time.time()}))
+        finally:
+            client.close()
+    except Exception as e:
+        logger.warning(f"量表目录: 发布失效通知失败 ({settings.REDIS_URL}): {e}")
+        return 0
+    logger.info(f"量表目录: 已发布失效通知 (原因: {reason})，{receivers} 个进程收到。")
+    return receivers
+
+
+async def listen_for_invalidation(catalog: Optional[ScaleCatalog] = None, retry_delay: float = 5.0):
+    """
+    订阅 SCALE_CATALOG_CHANNEL，收到通知后重新加载目录。由 API 的 lifespan 作为后台任务启动，
+    连接断开时按 retry_delay 重连，重连成功后主动重新加载一次以弥补断线期间错过的通知。
+    """
+    catalog = catalog or get_scale_catalog()
+    reconnecting = False
+    while True:
+        try:
+            async with aioredis.Redis.from_url(settings.REDIS_URL) as client:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(settings.SCALE_CATALOG_CHANNEL)
+                logger.info(f"量表目录: 已订阅失效通知频道 '{settings.SCALE_CATALOG_CHANNEL}'")
+                if reconnecting:
+                    await catalog.reload()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    logger.info(f"量表目录: 收到失效通知 {message.get('data')!r}，重新加载。")
+                    try:
+                        await catalog.reload()
+                    except Exception as e:
+                        # 加载失败时保留旧快照继续服务
+                        logger.error(f"量表目录: 重新加载失败，继续使用版本 {catalog.version}: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"量表目录: 失效通知订阅中断 ({e})，{retry_delay}s 后重连。")
+        reconnecting = True
+        await asyncio.sleep(retry_delay)
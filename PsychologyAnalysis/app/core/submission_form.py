@@ -0,0 +1,106 @@
+# app/core/submission_form.py
+"""
+评估提交表单的单次解析与校验。
+
+POST /assessments/submit 只调用一次 request.form()，一次遍历同时取出：
+  - 基础信息字段 (按 BasicInfoSubmit 校验，错误返回 422)；
+  - scale_type 与动态答案字段 q1..qN (按量表目录中的 AnswerKey 校验题号、分值和题数，错误返回 422)；
+  - image 上传文件。
+校验全部在写库和排队 AI 分析之前完成，无效提交不会产生评估记录，也不会触发大模型调用。
+"""
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request, UploadFile, status
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.scale_catalog import ScaleCatalog
+from app.schemas.assessment import BasicInfoSubmit
+
+logger = logging.getLogger(settings.APP_NAME)
+
+BASIC_INFO_FIELDS = frozenset(BasicInfoSubmit.model_fields)
+IMAGE_FIELD = "image" # 与前端 FormData 中文件输入的 name 一致
+
+
+class SubmissionForm:
+    """一次评估提交中解析出的全部内容。"""
+    __slots__ = ("basic_info", "scale_type", "answers", "image")
+
+    def __init__(self, basic_info: BasicInfoSubmit, scale_type: Optional[str],
+                 answers: Dict[str, Any], image: Optional[UploadFile]):
+        self.basic_info = basic_info
+        self.scale_type = scale_type
+        self.answers = answers
+        self.image = image
+
+    @property
+    def answers_json(self) -> Optional[str]:
+        """按题号排序的答案 JSON (存入 questionnaire_data)；没有答案时为 None。"""
+        if not self.answers:
+            return None
+        return json.dumps(self.answers, ensure_ascii=False, sort_keys=True)
+
+
+def _unprocessable(errors: List[Any]) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+
+
+def validate_submission(fields: Dict[str, Any], scale_type: Optional[str], raw_answers: Dict[int, str],
+                        catalog: ScaleCatalog) -> Tuple[Optional[BasicInfoSubmit], Dict[str, Any], List[Any]]:
+    """
+    校验一份提交 (表单提交与批量导入共用)：基础信息按 BasicInfoSubmit，答案按量表目录中的 AnswerKey。
+    返回 (基础信息, {'q1': 分值, ...}, 错误列表)；错误列表非空时不可保存。
+    """
+    try:
+        basic_info = BasicInfoSubmit.model_validate(fields)
+    except ValidationError as e:
+        logger.warning(f"评估提交的基础信息无效: {e.errors(include_url=False)}")
+        return None, {}, e.errors(include_url=False, include_context=False)
+
+    answers: Dict[str, Any] = {}
+    if scale_type:
+        answer_key = catalog.get_answer_key(scale_type)
+        if answer_key is None:
+            return basic_info, {}, [f"未知的量表代码: {scale_type}"]
+        answers, errors = answer_key.validate(raw_answers)
+        if errors:
+            logger.warning(f"量表 '{scale_type}' 的答案校验失败 ({len(errors)} 处): {errors[:5]}")
+            return basic_info, {}, errors
+    elif raw_answers:
+        return basic_info, {}, ["提交了量表答案但未指定 scale_type"]
+    return basic_info, answers, []
+
+
+async def parse_submission_form(request: Request, catalog: ScaleCatalog) -> SubmissionForm:
+    """解析并校验提交表单；任何字段无效时抛出 422 HTTPException (已接收的上传文件会被关闭)。"""
+    form = await request.form(max_files=1)
+    fields: Dict[str, str] = {}
+    raw_answers: Dict[int, str] = {}
+    scale_type: Optional[str] = None
+    image: Optional[UploadFile] = None
+
+    for key, value in form.multi_items():
+        if key == IMAGE_FIELD:
+            # 未选择文件时浏览器可能发送空字符串
+            if not isinstance(value, str) and value.filename:
+                image = value
+        elif key[:1] == "q" and key[1:].isdigit():
+            if isinstance(value, str):
+                raw_answers[int(key[1:])] = value
+        elif key == "scale_type":
+            scale_type = (value.strip() or None) if isinstance(value, str) else None
+        elif key in BASIC_INFO_FIELDS and isinstance(value, str):
+            # 空字符串视为未填写，沿用模型默认值
+            if value.strip():
+                fields[key] = value
+
+    basic_info, answers, errors = validate_submission(fields, scale_type, raw_answers, catalog)
+    if errors:
+        if image is not None:
+            await image.close()
+        raise _unprocessable(errors)
+
+    return SubmissionForm(basic_info, scale_type, answers, image)
@@ -0,0 +1,173 @@
+# app/core/uploads.py
+"""
+上传图片的流式、限长保存。
+
+提交评估时不再 `await image.read()` 把整张图片读入内存再用阻塞的 open().write() 写盘，而是：
+  1. 按 UPLOAD_CHUNK_SIZE 分块读取 UploadFile，用 anyio 的异步文件 I/O 写入同目录下的临时文件；
+  2. 边写边计算 SHA-256 和累计字节数，超过 UPLOAD_MAX_BYTES 时立即停止、删除临时文件并返回 413；
+  3. 写完后把临时文件原子地重命名 (os.replace) 为最终文件名，读方不会看到写了一半的图片。
+
+另外 UploadSizeLimitMiddleware 在读取请求体之前按 Content-Length 拒绝明显超限的提交，
+分块传输 (无 Content-Length) 时按已接收的字节数在接收过程中拒绝，避免先把整个请求体解析/落盘后才发现超限。
+"""
+import hashlib
+import logging
+import os
+import uuid
+from typing import Iterable, Optional
+
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from starlette.responses import JSONResponse
+
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+
+class SavedUpload:
+    """已保存的上传文件：最终路径、字节数和内容 SHA-256 (十六进制)。"""
+    __slots__ = ("path", "size", "sha256")
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"上传文件过大，最大允许 {max_bytes // (1024 * 1024)} MB。",
+    )
+
+
+async def _remove_quietly(path: str):
+    try:
+        await anyio.Path(path).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"无法移除临时上传文件 {path}: {e}")
+
+
+async def save_upload_stream(upload: UploadFile, dest_path: str,
+                             max_bytes: Optional[int] = None, chunk_size: Optional[int] = None) -> SavedUpload:
+    """
+    把 upload 分块写入 dest_path 所在目录的临时文件，完成后原子重命名为 dest_path。
+    超过 max_bytes 时抛出 413 HTTPException；任何失败都会删除临时文件，不留下残缺的图片。
+    """
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+
+    # 多部分解析时 Starlette 已知道文件大小，超限时不必再复制
+    declared_size = getattr(upload, "size", None)
+    if declared_size is not None and declared_size > max_bytes:
+        logger.warning(f"上传文件 '{upload.filename}' 大小 {declared_size} 字节超过上限 {max_bytes}，已拒绝。")
+        raise _too_large(max_bytes)
+
+    dest_dir = os.path.dirname(dest_path)
+    await anyio.Path(dest_dir).mkdir(parents=True, exist_ok=True)
+    # 临时文件与目标在同一目录 (同一文件系统)，保证 os.replace 是原子的
+    temp_path = os.path.join(dest_dir, f".{os.path.basename(dest_path)}.part-{uuid.uuid4().hex}")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(temp_path, "wb") as out:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    logger.warning(f"上传文件 '{upload.filename}' 超过上限 {max_bytes} 字节，已中止保存。")
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await out.write(chunk)
+        await anyio.to_thread.run_sync(os.replace, temp_path, dest_path)
+    except BaseException:
+        # 包括 413、磁盘错误和客户端断开导致的取消
+        with anyio.CancelScope(shield=True):
+            await _remove_quietly(temp_path)
+        raise
+
+    return SavedUpload(dest_path, size, digest.hexdigest())
+
+
+class RequestBodyTooLarge(HTTPException):
+    """请求体在接收过程中超过上限 (由 UploadSizeLimitMiddleware 的 receive 包装抛出)。"""
+
+    def __init__(self, max_body_bytes: int):
+        super().__init__(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"上传文件过大，最大允许 {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB。",
+        )
+        self.max_body_bytes = max_body_bytes
+
+
+class UploadSizeLimitMiddleware:
+    """
+    纯 ASGI 中间件，对 paths 中的 POST 请求限制请求体大小：
+      - Content-Length 超过 max_body_bytes 时，在读取请求体之前直接返回 413；
+      - 未带 Content-Length (分块传输) 时，包装 receive 累计已接收的字节数，超限时立即抛出 RequestBodyTooLarge，
+        多部分解析随之中止，不会先把整个请求体暂存下来。
+    应注册在 CORSMiddleware 之前 (即位于其内层)，使 413 响应也带有 CORS 头。
+    """
+
+    def __init__(self, app, max_body_bytes: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.paths = tuple(paths)
+
+    @staticmethod
+    def _reject():
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"上传文件过大，最大允许 {settings.UPLOAD_MAX_BYTES // (1024 * 1024)} MB。"},
+        )
+
+    async def __call__(self, scope, receive, send):
+        if not (scope["type"] == "http" and scope.get("method") == "POST" and scope.get("path") in self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = None
+        for key, value in scope.get("headers") or []:
+            if key == b"content-length":
+                content_length = value
+                break
+        if content_length is not None:
+            try:
+                length = int(content_length)
+            except ValueError:
+                length = None
+            if length is not None and length > self.max_body_bytes:
+                logger.warning(f"请求 {scope['path']} 的 Content-Length {length} 超过上限 {self.max_body_bytes}，已提前拒绝。")
+                await self._reject()(scope, receive, send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    logger.warning(f"请求 {scope['path']} 的请求体已超过上限 {self.max_body_bytes} 字节，中止接收。")
+                    raise RequestBodyTooLarge(self.max_body_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestBodyTooLarge:
+            # 通常由路由的异常处理器转换为 413；在路由之外抛出时在这里返回
+            if response_started:
+                raise
+            await self._reject()(scope, receive, send)
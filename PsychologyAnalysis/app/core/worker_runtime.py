@@ -0,0 +1,151 @@
+# app/core/worker_runtime.py
+"""
+Celery worker 进程级的异步运行时。
+
+每个 worker 子进程在 worker_process_init 时创建一次：
+  - 一个长期运行的事件循环 (在后台线程中 run_forever)
+  - 一个绑定到该循环的异步数据库引擎和连接池
+任务代码通过 run_coroutine() 把协程提交到这个循环上执行，
+不再为每个任务 asyncio.run() 新建事件循环、重建数据库连接。
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Awaitable, Optional
+
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.session import build_async_engine
+from src.llm_clients import close_llm_clients
+from src.scoring_engine import get_scoring_engine
+from src.interpretation_rules import get_interpreters
+
+logger = logging.getLogger(f"{settings.APP_NAME}_Worker")
+
+
+class WorkerRuntime:
+    """单个 worker 进程持有的事件循环 + 数据库引擎/会话工厂。"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop,
+            name=f"worker-runtime-loop-{self.pid}",
+            daemon=True,
+        )
+        self._thread.start()
+
+        # 引擎在本进程内创建，连接池里的连接只会在 self.loop 上使用
+        self.engine: AsyncEngine = build_async_engine(
+            pool_size=settings.WORKER_DB_POOL_SIZE,
+            max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+            pool_recycle=settings.WORKER_DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        self.session_factory = async_sessionmaker(
+            bind=self.engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autocommit=False,
+            autoflush=False,
+        )
+        self.tasks_run = 0
+        self.total_task_seconds = 0.0
+        logger.info(
+            f"Worker runtime 已启动 (PID {self.pid})，数据库连接池 "
+            f"size={settings.WORKER_DB_POOL_SIZE}, max_overflow={settings.WORKER_DB_MAX_OVERFLOW}"
+        )
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """在常驻事件循环上执行协程，阻塞直到得到结果 (供同步的 Celery 任务调用)。"""
+        started = time.perf_counter()
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        finally:
+            self.tasks_run += 1
+            self.total_task_seconds += time.perf_counter() - started
+
+    def close(self):
+        """释放连接池并停止事件循环。"""
+        if self.loop.is_closed():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.engine.dispose(), self.loop).result(10)
+        except Exception as e:
+            logger.warning(f"Worker runtime (PID {self.pid}) 释放数据库连接池时出错: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=10)
+        self.loop.close()
+        logger.info(
+            f"Worker runtime 已关闭 (PID {self.pid})，共执行 {self.tasks_run} 个协程，"
+            f"累计耗时 {self.total_task_seconds:.2f}s"
+        )
+
+
+_runtime: Optional[WorkerRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> WorkerRuntime:
+    """
+    返回当前进程的运行时，不存在时创建。
+    prefork 池由 worker_process_init 提前创建；solo / threads 池或 fork 后首次调用时在此惰性创建。
+    """
+    global _runtime
+    runtime = _runtime
+    if runtime is not None and runtime.pid == os.getpid():
+        return runtime
+    with _runtime_lock:
+        if _runtime is None or _runtime.pid != os.getpid():
+            # fork 继承来的运行时不可用 (后台线程不会跟随 fork)，直接丢弃
+            _runtime = WorkerRuntime()
+        return _runtime
+
+
+def run_coroutine(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """在当前 worker 进程的常驻事件循环上运行协程并返回结果。"""
+    return get_runtime().run(coro, timeout)
+
+
+def get_session() -> AsyncSession:
+    """创建绑定到 worker 进程连接池的新会话，需在 run_coroutine 执行的协程内使用。"""
+    return get_runtime().session_factory()
+
+
+def shutdown_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is not None and _runtime.pid == os.getpid():
+            _runtime.close()
+        _runtime = None
+
+
+# --- Celery 信号挂钩 ---
+@worker_process_init.connect
+def _init_worker_runtime(**kwargs):
+    get_runtime()
+    get_scoring_engine() # 启动时编译各量表的计分矩阵和解释分段表，避免首个任务承担编译开销
+    get_interpreters()
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process_runtime(**kwargs):
+    shutdown_runtime()
+    close_llm_clients()
+
+
+@worker_shutdown.connect
+def _shutdown_worker_runtime(**kwargs):
+    # solo / threads 池没有子进程，在主进程退出时清理
+    shutdown_runtime()
+    close_llm_clients()
@@ -4,6 +4,10 @@ from . import assessment    # 评估相关 CRUD
 from . import interrogation # 审讯记录相关 CRUD
 from . import stats         # 统计相关 CRUD
 from . import attribute     # +++ 属性相关 CRUD +++
+from . import artifact      # 分阶段分析产物 CRUD
+from . import questionnaire # 量表题目 CRUD
+from . import outbox        # 事务性发件箱 CRUD
+from . import image_blob    # 按内容寻址存储的图片 CRUD
 
 # (可选) 可以在这里定义 __all__
 __all__ = [
@@ -12,4 +16,8 @@ __all__ = [
     "interrogation",
     "stats",
     "attribute", # <--- 添加 attribute
+    "artifact",
+    "questionnaire",
+    "outbox",
+    "image_blob",
 ]
\ No newline at end of file
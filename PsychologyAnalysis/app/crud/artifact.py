@@ -0,0 +1,43 @@
+# FILE: app/crud/artifact.py
+import logging
+import sqlite3
+from typing import Any, Dict
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.analysis_artifact import AnalysisArtifact
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+async def get_artifacts(db: AsyncSession, assessment_id: int) -> Dict[str, Any]:
+    """异步获取评估记录已保存的所有阶段产物，返回 {stage: payload}。"""
+    result = await db.execute(
+        select(AnalysisArtifact.stage, AnalysisArtifact.payload).filter(AnalysisArtifact.assessment_id == assessment_id)
+    )
+    artifacts = {stage: payload for stage, payload in result.all()}
+    logger.debug(f"CRUD ARTIFACT: 评估 ID {assessment_id} 已有阶段产物: {list(artifacts.keys())}")
+    return artifacts
+
+async def save_artifact(db: AsyncSession, assessment_id: int, stage: str, payload: Any) -> AnalysisArtifact:
+    """保存 (或覆盖) 某个阶段的产物并提交。"""
+    logger.info(f"CRUD ARTIFACT: 保存评估 ID {assessment_id} 的阶段 '{stage}' 产物")
+    try:
+        result = await db.execute(
+            select(AnalysisArtifact)
+            .filter(AnalysisArtifact.assessment_id == assessment_id)
+            .filter(AnalysisArtifact.stage == stage)
+        )
+        db_obj = result.scalar_one_or_none()
+        if db_obj is None:
+            db_obj = AnalysisArtifact(assessment_id=assessment_id, stage=stage, payload=payload)
+            db.add(db_obj)
+        else:
+            db_obj.payload = payload
+        await db.commit()
+        return db_obj
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD ARTIFACT: 保存阶段 '{stage}' 产物时数据库错误 (ID: {assessment_id}): {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
@@ -5,7 +5,7 @@ import traceback
 from typing import Optional, Dict, Any, List
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import desc
+from sqlalchemy import and_, or_, desc, update, delete, insert, func
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import sqlite3
 
@@ -14,6 +14,10 @@ from app.models.assessment import Assessment, STATUS_COMPLETE, STATUS_PENDING, S
 # +++ 导入 Attribute 模型 +++
 from app.models.attribute import Attribute
 # ++++++++++++++++++++++++
+from app.models.assessment_score import AssessmentDimensionScore
+from app.models.task_outbox import TaskOutbox, ANALYSIS_TASK_NAME
+from app.crud import outbox as crud_outbox
+from app.crud import image_blob as crud_image_blob
 from app.core.config import settings
 
 logger = logging.getLogger(settings.APP_NAME)
@@ -39,12 +43,8 @@ async def get(db: AsyncSession, id: int) -> Optional[Assessment]:
         # 不在 CRUD 层抛出 HTTPException，让上层调用者处理
         raise e # 或者根据调用者期望返回 None
 
-async def create(db: AsyncSession, **kwargs: Any) -> Assessment:
-    """
-    异步创建一条新的评估记录。
-    kwargs 应包含 Assessment 模型所需的所有字段（除了自动生成的 id, created_at, updated_at）。
-    确保在成功时返回带有 ID 的对象，否则引发异常。
-    """
+def _build_assessment(kwargs: Dict[str, Any]) -> Assessment:
+    """由 create / create_with_outbox 的参数构造 Assessment 实例 (尚未加入会话)。"""
     logger.info(f"CRUD CREATE: 准备为 '{kwargs.get('subject_name', '未知主题')}' 创建评估记录")
     try:
         # 移除不允许由用户指定的字段，或由数据库自动处理的字段
@@ -63,14 +63,25 @@ async def create(db: AsyncSession, **kwargs: Any) -> Assessment:
 
         db_obj = Assessment(**kwargs)
         logger.debug("CRUD CREATE: 评估对象已在内存中创建。")
+        return db_obj
     except TypeError as te:
         logger.error(f"CRUD CREATE: 创建 Assessment 实例时发生 TypeError。提供的参数: {kwargs}", exc_info=True)
         raise TypeError(f"模型初始化字段不匹配或类型错误: {te}") from te
 
+async def create(db: AsyncSession, **kwargs: Any) -> Assessment:
+    """
+    异步创建一条新的评估记录。
+    kwargs 应包含 Assessment 模型所需的所有字段（除了自动生成的 id, created_at, updated_at）。
+    确保在成功时返回带有 ID 的对象，否则引发异常。
+    """
+    db_obj = _build_assessment(kwargs)
+
     db.add(db_obj)
     logger.debug("CRUD CREATE: 评估对象已添加到 SQLAlchemy 会话中。")
 
     try:
+        if db_obj.image_sha256:
+            await crud_image_blob.add_ref(db, db_obj.image_sha256) # 与评估记录一起提交
         logger.info("CRUD CREATE: 尝试提交数据库事务以保存新的评估记录...")
         await db.commit()
         logger.info("CRUD CREATE: 数据库提交成功。")
@@ -119,6 +130,74 @@ async def create(db: AsyncSession, **kwargs: Any) -> Assessment:
             logger.error(f"CRUD CREATE: 在错误处理中尝试回滚会话时再次发生错误: {rollback_err}", exc_info=True)
         raise e # 重新抛出原始错误
 
+async def create_with_outbox(db: AsyncSession, task_name: str = ANALYSIS_TASK_NAME, **kwargs: Any) -> Assessment:
+    """
+    异步创建评估记录，并在同一个事务中写入一条发件箱记录 (task_outbox)，
+    由发件箱中继进程投递 task_name(assessment_id) 到 Celery (见 app/tasks/outbox_relay.py)。
+    带有 image_sha256 时，图片的引用计数也在同一事务中增加。
+    请求路径上不再访问 broker；评估与待投递任务要么一起提交、要么一起回滚，不会丢失提交。
+    """
+    db_obj = _build_assessment(kwargs)
+    db.add(db_obj)
+
+    try:
+        # flush 以获得自增 ID，再写发件箱记录，最后一次提交
+        await db.flush()
+        if db_obj.id is None:
+            raise SQLAlchemyError("数据库在 flush 后未能分配评估记录 ID")
+        outbox_obj = crud_outbox.build(task_name, args=[db_obj.id], assessment_id=db_obj.id)
+        db.add(outbox_obj)
+        if db_obj.image_sha256:
+            await crud_image_blob.add_ref(db, db_obj.image_sha256)
+        await db.commit()
+        await db.refresh(db_obj)
+        logger.info(f"CRUD CREATE: 评估记录 ID {db_obj.id} 与发件箱任务 '{task_name}' (task_id {outbox_obj.task_id}) 已在同一事务中提交。")
+        return db_obj
+    except (IntegrityError, sqlite3.IntegrityError) as ie:
+        logger.error(f"CRUD CREATE: 数据库完整性错误: {ie}", exc_info=False)
+        await db.rollback()
+        raise IntegrityError(f"数据保存冲突或违反约束: {ie}", orig=ie, params=kwargs) from ie
+    except (SQLAlchemyError, sqlite3.OperationalError) as db_err:
+        logger.error(f"CRUD CREATE: 数据库操作错误: {type(db_err).__name__} - {db_err}", exc_info=True)
+        await db.rollback()
+        raise SQLAlchemyError(f"数据库操作失败: {db_err}") from db_err
+
+async def bulk_create_with_outbox(db: AsyncSession, rows: List[Dict[str, Any]],
+                                  task_name: Optional[str] = ANALYSIS_TASK_NAME) -> List[int]:
+    """
+    批量创建评估记录 (批量导入用)：一条多行 INSERT ... RETURNING 写入全部 rows (每行的列集合须相同)，
+    task_name 不为空时再批量写入对应的发件箱记录，整批一次提交。
+    返回与 rows 顺序一致的新记录 ID；出错时回滚并重新抛出 (IntegrityError 由调用方逐行重试)。
+    """
+    if not rows:
+        return []
+    table = Assessment.__table__
+    try:
+        result = await db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), rows)
+        new_ids = list(result.scalars().all())
+        if task_name:
+            await db.execute(insert(TaskOutbox.__table__), [
+                crud_outbox.row_values(task_name, args=[new_id], assessment_id=new_id) for new_id in new_ids
+            ])
+        await db.commit()
+    except (IntegrityError, sqlite3.IntegrityError):
+        await db.rollback()
+        raise
+    except (SQLAlchemyError, sqlite3.OperationalError) as db_err:
+        logger.error(f"CRUD BULK CREATE: 批量写入 {len(rows)} 条评估记录时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    logger.info(f"CRUD BULK CREATE: 已写入 {len(new_ids)} 条评估记录 (ID {new_ids[0]}..{new_ids[-1]})"
+                f"{'，并写入发件箱记录' if task_name else ''}。")
+    return new_ids
+
+async def get_existing_id_cards(db: AsyncSession, id_cards: List[str]) -> set:
+    """返回 id_cards 中已被评估记录占用的身份证号 (id_card 唯一)。"""
+    if not id_cards:
+        return set()
+    result = await db.execute(select(Assessment.id_card).where(Assessment.id_card.in_(id_cards)))
+    return set(result.scalars().all())
+
 async def update_status(db: AsyncSession, assessment_id: int, new_status: str) -> Optional[Assessment]:
     """仅更新指定评估记录的状态。"""
     logger.info(f"CRUD UPDATE STATUS: 尝试将评估记录 ID {assessment_id} 的状态更新为 '{new_status}'")
@@ -195,6 +274,113 @@ async def update_report_text(db: AsyncSession, assessment_id: int, report_text:
         await db.rollback()
         raise e
 
+# 只有处于这些状态的记录才允许被 finalize_assessment 写入最终结果 (乐观状态守卫)
+FINALIZABLE_STATUSES = (STATUS_PENDING, STATUS_PROCESSING)
+
+async def finalize_assessment(db: AsyncSession, assessment_id: int, report_text: Optional[str], status: str) -> Optional[str]:
+    """
+    在一个事务中用单条 UPDATE ... RETURNING 同时写入报告文本和最终状态。
+    不加载 ORM 对象 (不会触发 attributes 的 selectin 加载)，也不做 refresh。
+
+    仅当记录当前状态为 pending/processing 时才会更新；
+    返回写入后的状态，记录不存在或已被其他任务完成时返回 None。
+    """
+    logger.info(f"CRUD FINALIZE: 尝试将评估记录 ID {assessment_id} 写入最终状态 '{status}'")
+    stmt = (
+        update(Assessment)
+        .where(Assessment.id == assessment_id)
+        .where(Assessment.status.in_(FINALIZABLE_STATUSES))
+        .values(report_text=report_text, status=status)
+        .returning(Assessment.status)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        result = await db.execute(stmt)
+        new_status = result.scalar_one_or_none()
+        await db.commit()
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD FINALIZE: 写入最终状态时数据库错误 (ID: {assessment_id}): {type(db_err).__name__} - {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    except Exception as e:
+        logger.error(f"CRUD FINALIZE: 写入最终状态期间发生一般错误 (ID: {assessment_id}): {e}", exc_info=True)
+        await db.rollback()
+        raise e
+
+    if new_status is None:
+        logger.warning(f"CRUD FINALIZE: 评估记录 ID {assessment_id} 不存在或状态不在 {FINALIZABLE_STATUSES} 中，未更新。")
+    else:
+        logger.info(f"CRUD FINALIZE: 评估记录 ID {assessment_id} 已写入最终状态 '{new_status}'。")
+    return new_status
+
+async def mark_processing(db: AsyncSession, assessment_id: int, task_id: Optional[str] = None,
+                          redelivered: bool = False) -> Optional[str]:
+    """
+    入口任务认领评估：单条 UPDATE ... RETURNING (compare-and-set) 把评估标记为 processing，
+    并记录认领的任务 ID (claim_task_id)。可认领的状态:
+      - pending: 新提交或被清扫重置的评估；
+      - failed: 用新的任务 ID 重新派发 tasks.run_ai_analysis 时，从已保存的阶段产物继续；
+        claim_task_id 相同的消息 (发件箱至少一次投递产生的重复消息) 不会把失败的评估重新拉起；
+      - processing: 仅限 worker 在 ack 之前退出后 broker 重新投递的同一任务
+        (redelivered 且 task_id 与 claim_task_id 相同)。
+    其余情况 (已完成、已被其他任务认领) 跳过。返回更新后的状态；未认领时返回 None。
+    """
+    retry_failed = Assessment.status == STATUS_FAILED
+    if task_id:
+        retry_failed = and_(retry_failed, or_(Assessment.claim_task_id.is_(None), Assessment.claim_task_id != task_id))
+    claimable = or_(Assessment.status == STATUS_PENDING, retry_failed)
+    if redelivered and task_id:
+        claimable = or_(claimable, and_(Assessment.status == STATUS_PROCESSING, Assessment.claim_task_id == task_id))
+    stmt = (
+        update(Assessment)
+        .where(Assessment.id == assessment_id)
+        .where(claimable)
+        .values(status=STATUS_PROCESSING, claim_task_id=task_id)
+        .returning(Assessment.status)
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        result = await db.execute(stmt)
+        new_status = result.scalar_one_or_none()
+        await db.commit()
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD MARK PROCESSING: 数据库错误 (ID: {assessment_id}): {type(db_err).__name__} - {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    if new_status is None:
+        logger.warning(f"CRUD MARK PROCESSING: 评估记录 ID {assessment_id} 不存在、已完成或已被其他任务认领 (任务 {task_id})，未标记为 processing。")
+    return new_status
+
+async def save_scores(db: AsyncSession, assessment_id: int, scoring: Dict[str, Any]) -> None:
+    """
+    持久化计分阶段的结果 (ai_utils.score_questionnaire 的返回值)：
+    总分/标准分/分段写入 analysis_data，维度得分替换写入 assessment_dimension_scores，并记录 scored_at。
+    在一个事务中完成；出错时回滚并重新抛出。
+    """
+    dimensions = scoring.get("dimensions") or {}
+    stmt = (
+        update(Assessment)
+        .where(Assessment.id == assessment_id)
+        .values(raw_score=scoring.get("raw_score"), standard_score=scoring.get("standard_score"),
+                score_band=scoring.get("band"), scored_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    try:
+        await db.execute(stmt)
+        await db.execute(delete(AssessmentDimensionScore).where(AssessmentDimensionScore.assessment_id == assessment_id))
+        if dimensions:
+            await db.execute(insert(AssessmentDimensionScore), [
+                {"assessment_id": assessment_id, "dimension": dimension, "score": item.get("score"), "band": item.get("band")}
+                for dimension, item in dimensions.items()
+            ])
+        await db.commit()
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD SAVE SCORES: 写入得分时数据库错误 (ID: {assessment_id}): {type(db_err).__name__} - {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    logger.info(f"CRUD SAVE SCORES: 评估记录 ID {assessment_id} 得分已写入 (raw={scoring.get('raw_score')}, "
+                f"band={scoring.get('band')}, 维度数={len(dimensions)})。")
+
 # --- 后台管理查询函数 ---
 
 async def get_assessments_by_id_card(db: AsyncSession, id_card: str) -> List[Assessment]:
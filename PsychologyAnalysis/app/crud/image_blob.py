@@ -0,0 +1,127 @@
+# FILE: app/crud/image_blob.py
+import logging
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import delete, insert, update, func
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+
+from app.models.image_blob import ImageBlob
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+# --- 按内容寻址存储的图片 (ImageBlob) 的 CRUD 操作 ---
+# 写入顺序：register (单独提交，ref_count 不变) -> 写入存储后端 -> 在评估记录的事务中 add_ref。
+# 评估保存失败时图片保持 ref_count = 0，由清理任务在宽限期后删除 (见 app/tasks/blob_gc.py)。
+# 删除顺序：mark_deleting (墓碑，提交) -> 删除存储中的文件 -> purge_deleting 只删除仍带墓碑的记录。
+# register 会清除墓碑，清理任务据此得知删除期间图片被重新上传，需要恢复文件。
+
+
+async def register(db: AsyncSession, sha256: str, size: int, content_type: Optional[str] = None) -> None:
+    """
+    登记一张即将写入存储的图片：不存在时插入 (ref_count = 0)，已存在时刷新 last_seen_at 并清除删除标记，然后提交。
+    """
+    table = ImageBlob.__table__
+    try:
+        result = await db.execute(
+            update(table).where(table.c.sha256 == sha256).values(last_seen_at=func.now(), deleting=False)
+        )
+        if result.rowcount == 0:
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(table).values(sha256=sha256, size=size, content_type=content_type, ref_count=0))
+            except (IntegrityError, sqlite3.IntegrityError):
+                # 相同内容的图片被并发登记，对方的记录即可使用
+                logger.debug(f"CRUD IMAGE BLOB: {sha256[:12]} 已由并发请求登记。")
+        await db.commit()
+    except (sqlite3.OperationalError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD IMAGE BLOB: 登记图片 {sha256[:12]} 时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+
+
+async def add_ref(db: AsyncSession, sha256: str) -> None:
+    """引用计数加一 (不提交，由调用方与评估记录在同一事务中提交)。"""
+    table = ImageBlob.__table__
+    await db.execute(
+        update(table).where(table.c.sha256 == sha256)
+        .values(ref_count=table.c.ref_count + 1, last_seen_at=func.now())
+    )
+
+
+async def release(db: AsyncSession, sha256: str) -> None:
+    """引用计数减一 (不提交)；删除或更换评估图片时调用。"""
+    table = ImageBlob.__table__
+    await db.execute(
+        update(table).where(table.c.sha256 == sha256, table.c.ref_count > 0)
+        .values(ref_count=table.c.ref_count - 1, last_seen_at=func.now())
+    )
+
+
+async def get(db: AsyncSession, sha256: str) -> Optional[ImageBlob]:
+    result = await db.execute(select(ImageBlob).where(ImageBlob.sha256 == sha256))
+    return result.scalar_one_or_none()
+
+
+async def get_unreferenced(db: AsyncSession, seen_before: datetime, limit: int = 500) -> List[str]:
+    """ref_count 为 0 且 seen_before 之后未被登记/引用的图片。"""
+    table = ImageBlob.__table__
+    result = await db.execute(
+        select(table.c.sha256)
+        .where(table.c.ref_count == 0, table.c.last_seen_at < seen_before)
+        .order_by(table.c.last_seen_at)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def mark_deleting(db: AsyncSession, sha256s: List[str], seen_before: datetime) -> List[str]:
+    """
+    给仍无引用且未被重新登记的记录打上删除标记并提交，返回实际标记的 sha256 (调用方随后删除存储中的文件)。
+    条件在 UPDATE 中重新判断，期间被重新上传或引用的图片不会被标记；上次清理中断时留下的标记会被重新选中。
+    """
+    if not sha256s:
+        return []
+    table = ImageBlob.__table__
+    try:
+        result = await db.execute(
+            update(table)
+            .where(table.c.sha256.in_(sha256s), table.c.ref_count == 0, table.c.last_seen_at < seen_before)
+            .values(deleting=True)
+            .returning(table.c.sha256)
+        )
+        marked = list(result.scalars().all())
+        await db.commit()
+    except (sqlite3.OperationalError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD IMAGE BLOB: 标记 {len(sha256s)} 条无引用图片记录时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    return marked
+
+
+async def purge_deleting(db: AsyncSession, sha256s: List[str]) -> List[str]:
+    """
+    存储中的文件删除后调用：删除仍带删除标记的记录并提交，返回实际删除的 sha256。
+    未返回的图片在删除期间被 register 重新登记 (标记已清除)，调用方需要恢复其文件。
+    """
+    if not sha256s:
+        return []
+    table = ImageBlob.__table__
+    try:
+        result = await db.execute(
+            delete(table)
+            .where(table.c.sha256.in_(sha256s), table.c.deleting.is_(True))
+            .returning(table.c.sha256)
+        )
+        deleted = list(result.scalars().all())
+        await db.commit()
+    except (sqlite3.OperationalError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD IMAGE BLOB: 删除 {len(sha256s)} 条已标记的图片记录时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+    if deleted:
+        logger.info(f"CRUD IMAGE BLOB: 已删除 {len(deleted)} 条无引用的图片记录。")
+    return deleted
@@ -0,0 +1,175 @@
+# FILE: app/crud/outbox.py
+import logging
+import sqlite3
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, bindparam, insert, or_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.task_outbox import TaskOutbox, OUTBOX_PENDING, OUTBOX_DISPATCHED, ANALYSIS_TASK_NAME
+from app.models.assessment import Assessment, STATUS_PENDING, STATUS_PROCESSING
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+# --- 事务性发件箱 (TaskOutbox) 的 CRUD 操作 ---
+
+
+def utcnow() -> datetime:
+    """与数据库 CURRENT_TIMESTAMP 一致的 UTC 时间 (不带时区，TIMESTAMP 列按此比较)。"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def row_values(task_name: str, args: Optional[Sequence[Any]] = None, kwargs: Optional[Dict[str, Any]] = None,
+               assessment_id: Optional[int] = None) -> Dict[str, Any]:
+    """一条待投递记录的列值 (供批量 INSERT)；任务 ID 预先生成，重复投递时 Celery 任务 ID 不变。"""
+    return {
+        "task_name": task_name,
+        "payload": {"args": list(args or []), "kwargs": dict(kwargs or {})},
+        "assessment_id": assessment_id,
+        "task_id": str(uuid.uuid4()),
+        "status": OUTBOX_PENDING,
+        "attempts": 0,
+    }
+
+
+def build(task_name: str, args: Optional[Sequence[Any]] = None, kwargs: Optional[Dict[str, Any]] = None,
+          assessment_id: Optional[int] = None) -> TaskOutbox:
+    """构造一条待投递记录 (尚未加入会话)。"""
+    return TaskOutbox(**row_values(task_name, args, kwargs, assessment_id))
+
+
+async def claim_batch(db: AsyncSession, limit: int) -> List[Any]:
+    """
+    取出一批到期的待投递记录 (按 id 顺序)。
+    Postgres 下使用 FOR UPDATE SKIP LOCKED，多个中继进程并行时各自取到不同的记录，
+    行锁保持到调用方提交 (mark_results) 为止；SQLite 不支持行锁，SQLAlchemy 会忽略该子句。
+    """
+    table = TaskOutbox.__table__
+    result = await db.execute(
+        select(table.c.id, table.c.task_name, table.c.payload, table.c.task_id, table.c.attempts)
+        .where(table.c.status == OUTBOX_PENDING, table.c.available_at <= utcnow())
+        .order_by(table.c.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(result.all())
+
+
+async def mark_results(db: AsyncSession, dispatched_ids: List[int], failures: List[Dict[str, Any]]) -> None:
+    """
+    一次提交记录一批投递结果：成功的标记为 dispatched，失败的增加 attempts 并推迟 available_at。
+    failures 每项含 _id、attempts (新值)、last_error、available_at。
+    """
+    table = TaskOutbox.__table__
+    try:
+        if dispatched_ids:
+            await db.execute(
+                update(table).where(table.c.id.in_(dispatched_ids)).values(
+                    status=OUTBOX_DISPATCHED, dispatched_at=utcnow(),
+                    attempts=table.c.attempts + 1, last_error=None,
+                )
+            )
+        if failures:
+            await db.execute(
+                update(table).where(table.c.id == bindparam("_id")).values(
+                    attempts=bindparam("attempts"), last_error=bindparam("last_error"),
+                    available_at=bindparam("available_at"),
+                ),
+                failures,
+            )
+        await db.commit()
+    except (sqlite3.OperationalError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD OUTBOX: 记录投递结果时数据库错误 (成功 {len(dispatched_ids)} 条, 失败 {len(failures)} 条): {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+
+
+async def requeue_stale(db: AsyncSession, stale_before: datetime, max_attempts: int, limit: int = 500,
+                        processing_before: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    清扫：
+      - 评估停留在 processing 且 updated_at 早于 processing_before (认领后 worker 被杀、消息未被重新投递)：
+        评估重置为 pending 并清空 claim_task_id，随后由下面两条规则重新投递；
+        processing_before 应不晚于 stale_before，重置的评估才会在同一轮中重新排队；
+    评估为 pending，但
+      - 其发件箱记录在 stale_before 之前已投递 (消息丢失，如 broker 重启)：记录重置为 pending 重新投递；
+      - 创建于 stale_before 之前且没有任何发件箱记录 (发件箱上线前的旧提交)：补写一条发件箱记录。
+    重新排队次数达到 max_attempts 的记录保持不变 (需要人工处理)。返回 {"reset", "requeued", "backfilled"}。
+    消息只是排队较久 (未丢失) 时会产生重复投递：先到的消息认领评估后，其余消息在 mark_processing 中被跳过。
+    """
+    table = TaskOutbox.__table__
+    stuck_ids = []
+    try:
+        if processing_before is not None:
+            stuck_ids = (await db.execute(
+                select(Assessment.id)
+                .outerjoin(TaskOutbox, and_(TaskOutbox.assessment_id == Assessment.id,
+                                            TaskOutbox.task_name == ANALYSIS_TASK_NAME))
+                .where(
+                    Assessment.status == STATUS_PROCESSING,
+                    Assessment.updated_at < processing_before,
+                    or_(TaskOutbox.id.is_(None), TaskOutbox.attempts < max_attempts),
+                )
+                .order_by(Assessment.id)
+                .limit(limit)
+            )).scalars().all()
+            if stuck_ids:
+                # 条件中再次检查状态和 updated_at：期间有进展的评估不会被重置
+                await db.execute(
+                    update(Assessment)
+                    .where(Assessment.id.in_(stuck_ids), Assessment.status == STATUS_PROCESSING,
+                           Assessment.updated_at < processing_before)
+                    .values(status=STATUS_PENDING, claim_task_id=None)
+                    .execution_options(synchronize_session=False)
+                )
+
+        stale_ids = (await db.execute(
+            select(table.c.id)
+            .join(Assessment, Assessment.id == table.c.assessment_id)
+            .where(
+                table.c.status == OUTBOX_DISPATCHED,
+                table.c.dispatched_at < stale_before,
+                table.c.attempts < max_attempts,
+                Assessment.status == STATUS_PENDING,
+            )
+            .order_by(table.c.id)
+            .limit(limit)
+        )).scalars().all()
+        if stale_ids:
+            await db.execute(
+                update(table).where(table.c.id.in_(stale_ids)).values(
+                    status=OUTBOX_PENDING, available_at=utcnow(), last_error="requeued by sweeper",
+                )
+            )
+
+        orphan_ids = (await db.execute(
+            select(Assessment.id)
+            .outerjoin(TaskOutbox, and_(TaskOutbox.assessment_id == Assessment.id,
+                                        TaskOutbox.task_name == ANALYSIS_TASK_NAME))
+            .where(Assessment.status == STATUS_PENDING, Assessment.created_at < stale_before, TaskOutbox.id.is_(None))
+            .order_by(Assessment.id)
+            .limit(limit)
+        )).scalars().all()
+        if orphan_ids:
+            await db.execute(insert(table), [
+                row_values(ANALYSIS_TASK_NAME, args=[assessment_id], assessment_id=assessment_id)
+                for assessment_id in orphan_ids
+            ])
+        await db.commit()
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD OUTBOX: 清扫 pending/processing 评估时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+
+    counts = {"reset": len(stuck_ids), "requeued": len(stale_ids), "backfilled": len(orphan_ids)}
+    if stuck_ids:
+        logger.warning(f"CRUD OUTBOX: {counts['reset']} 条评估停留在 processing 超时 (worker 可能已退出)，"
+                       f"已重置为 pending: {list(stuck_ids)[:20]}")
+    if stale_ids or orphan_ids:
+        logger.info(f"CRUD OUTBOX: 重新排队 {counts['requeued']} 条已投递但评估仍为 pending 的记录，"
+                    f"为 {counts['backfilled']} 条缺少发件箱记录的评估补写记录。")
+    return counts
@@ -0,0 +1,74 @@
+# FILE: app/crud/questionnaire.py
+import logging
+import sqlite3
+from typing import Any, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.questionnaire import QuestionnaireQuestion
+from app.core.config import settings
+
+logger = logging.getLogger(settings.APP_NAME)
+
+# --- 量表题目 (QuestionnaireQuestion) 的 CRUD 操作 ---
+
+async def get_all_questions(db: AsyncSession) -> List[QuestionnaireQuestion]:
+    """异步获取全部量表的题目，按量表代码、题号排序 (供量表目录一次性加载)。"""
+    result = await db.execute(
+        select(QuestionnaireQuestion)
+        .order_by(QuestionnaireQuestion.questionnaire_type, QuestionnaireQuestion.question_number)
+    )
+    return list(result.scalars().all())
+
+async def sync_scale_questions(db: AsyncSession, questionnaire_type: str, scale_name: Optional[str],
+                               questions: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    把某个量表的题目同步为 questions (每项含 question_number、question_text、options JSON 字符串)。
+    先读出现有题目做差异比较，只对新增/变化/删除的题目各执行一条批量语句 (executemany)，
+    全部在一个事务中完成；出错时回滚并重新抛出，读方不会看到只导入了一半的量表。
+    返回 {"inserted", "updated", "deleted", "unchanged"} 计数。
+    """
+    scale_name = scale_name or questionnaire_type
+    table = QuestionnaireQuestion.__table__
+    try:
+        result = await db.execute(
+            select(table.c.id, table.c.question_number, table.c.question_text, table.c.options, table.c.scale_name)
+            .where(table.c.questionnaire_type == questionnaire_type)
+        )
+        existing = {row.question_number: row for row in result.all()}
+
+        inserts, updates = [], []
+        for q in questions:
+            row = existing.pop(q["question_number"], None)
+            if row is None:
+                inserts.append({"questionnaire_type": questionnaire_type, "question_number": q["question_number"],
+                                "question_text": q["question_text"], "options": q["options"], "scale_name": scale_name})
+            elif (row.question_text, row.options, row.scale_name) != (q["question_text"], q["options"], scale_name):
+                updates.append({"_id": row.id, "question_text": q["question_text"], "options": q["options"],
+                                "scale_name": scale_name})
+        delete_ids = [row.id for row in existing.values()]
+
+        if delete_ids:
+            await db.execute(delete(table).where(table.c.id.in_(delete_ids)))
+        if updates:
+            await db.execute(
+                update(table).where(table.c.id == bindparam("_id")).values(
+                    question_text=bindparam("question_text"), options=bindparam("options"),
+                    scale_name=bindparam("scale_name"),
+                ),
+                updates,
+            )
+        if inserts:
+            await db.execute(insert(table), inserts)
+        await db.commit()
+    except (sqlite3.OperationalError, sqlite3.IntegrityError, SQLAlchemyError) as db_err:
+        logger.error(f"CRUD QUESTIONNAIRE: 同步量表 '{questionnaire_type}' 题目时数据库错误: {db_err}", exc_info=True)
+        await db.rollback()
+        raise db_err
+
+    counts = {"inserted": len(inserts), "updated": len(updates), "deleted": len(delete_ids),
+              "unchanged": len(questions) - len(inserts) - len(updates)}
+    logger.info(f"CRUD QUESTIONNAIRE: 量表 '{questionnaire_type}' 题目已同步: {counts}")
+    return counts
@@ -1,12 +1,13 @@
 # FILE: app/crud/stats.py (新建)
 import logging
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import func # 导入 SQL 函数
 
 from app.models.user import User # 导入 User 模型 (如果按性别统计需要 User 表)
 from app.models.assessment import Assessment # 导入 Assessment 模型 (如果按年龄统计需要 Assessment 表)
+from app.models.assessment_score import AssessmentDimensionScore
 from app.core.config import settings
 
 logger = logging.getLogger(settings.APP_NAME)
@@ -108,6 +109,49 @@ async def get_gender_distribution(db: AsyncSession) -> Dict[str, List[Any]]:
         logger.error(f"CRUD Stats: 计算性别分布时出错: {e}", exc_info=True)
         return {"labels": ["错误"], "values": [0]}
 
+async def get_score_band_distribution(db: AsyncSession, questionnaire_type: str) -> Dict[str, List[Any]]:
+    """
+    按解释分段统计某个量表的人数 (使用计分时写入的 score_band 列，
+    走 (questionnaire_type, raw_score) / score_band 索引，不再逐行解析 questionnaire_data)。
+    """
+    logger.info(f"CRUD Stats: 计算量表 '{questionnaire_type}' 的得分分段分布")
+    try:
+        stmt = (
+            select(Assessment.score_band, func.count(Assessment.id).label('count'))
+            .where(Assessment.questionnaire_type == questionnaire_type)
+            .where(Assessment.raw_score.is_not(None))
+            .group_by(Assessment.score_band)
+            .order_by(func.min(Assessment.raw_score))
+        )
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return {"labels": ["无数据"], "values": [0]}
+        return {"labels": [row.score_band or "未分段" for row in rows], "values": [row.count for row in rows]}
+    except Exception as e:
+        logger.error(f"CRUD Stats: 计算得分分段分布时出错: {e}", exc_info=True)
+        return {"labels": ["错误"], "values": [0]}
+
+
+async def get_dimension_score_averages(db: AsyncSession, questionnaire_type: Optional[str] = None) -> Dict[str, List[Any]]:
+    """多维度量表 (如 EPQ85) 各维度的平均得分，数据来自 assessment_dimension_scores。"""
+    logger.info(f"CRUD Stats: 计算维度平均得分 (量表: {questionnaire_type or '全部'})")
+    try:
+        stmt = (
+            select(AssessmentDimensionScore.dimension, func.avg(AssessmentDimensionScore.score).label('average'))
+            .group_by(AssessmentDimensionScore.dimension)
+            .order_by(AssessmentDimensionScore.dimension)
+        )
+        if questionnaire_type:
+            stmt = (stmt.join(Assessment, Assessment.id == AssessmentDimensionScore.assessment_id)
+                    .where(Assessment.questionnaire_type == questionnaire_type))
+        rows = (await db.execute(stmt)).all()
+        if not rows:
+            return {"labels": ["无数据"], "values": [0]}
+        return {"labels": [row.dimension for row in rows], "values": [round(row.average, 2) for row in rows]}
+    except Exception as e:
+        logger.error(f"CRUD Stats: 计算维度平均得分时出错: {e}", exc_info=True)
+        return {"labels": ["错误"], "values": [0]}
+
 # --- (可选) 其他统计函数 ---
 # async def get_scale_usage(db: AsyncSession) -> Dict[str, List[Any]]: ...
 # async def get_assessment_status_distribution(db: AsyncSession) -> Dict[str, List[Any]]: ...
\ No newline at end of file
@@ -1,21 +1,31 @@
 # app/db/session.py
 import logging
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from app.core.config import settings # 导入你的设置
 
 logger = logging.getLogger(settings.APP_NAME) # Or use a specific logger
 
+
+def build_async_engine(**engine_kwargs) -> AsyncEngine:
+    """
+    Create an async engine for settings.DATABASE_URL.
+    Extra keyword arguments (pool_size, max_overflow, ...) are passed to create_async_engine,
+    so the Celery worker runtime can build its own per-process engine and pool.
+    """
+    return create_async_engine(
+        settings.DATABASE_URL,
+        # echo=True,  # Uncomment for debugging SQL statements
+        future=True,  # Enables SQLAlchemy 2.0 style features
+        **engine_kwargs
+    )
+
+
 # --- Asynchronous Database Engine ---
 # Create an asynchronous engine using the DATABASE_URL from settings.
 # Ensure settings.DATABASE_URL is like "sqlite+aiosqlite:///path/to/your.db"
 logger.info(f"Creating async engine for database: {settings.DATABASE_URL}")
 try:
-    async_engine = create_async_engine(
-        settings.DATABASE_URL,
-        # echo=True,  # Uncomment for debugging SQL statements
-        future=True  # Enables SQLAlchemy 2.0 style features
-        # connect_args can be added here if needed, but typically not for aiosqlite
-    )
+    async_engine = build_async_engine()
     logger.info("Async engine created successfully.")
 except Exception as e:
     logger.critical(f"Failed to create async engine: {e}", exc_info=True)
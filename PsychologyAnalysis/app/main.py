@@ -4,8 +4,10 @@
 
 import sys
 import os
+import asyncio
 import logging
 import traceback
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -49,12 +51,33 @@ except Exception as e:
 # --- 4. 路由导入 ---
 try:
     from app.routers import scales, assessments, reports, auth, encyclopedia, sse, admin
+    from app.core.uploads import UploadSizeLimitMiddleware
+    from app.core.scale_catalog import get_scale_catalog, listen_for_invalidation
     logger.info("所有API路由模块导入成功。")
 except ImportError as e:
     logger.critical(f"[启动错误] 无法导入路由模块: {e}", exc_info=True)
     sys.exit(1)
 
-# --- 5. FastAPI 应用实例 ---
+# --- 5. 启动时的一次性初始化 ---
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    """
+    启动时执行一次：预加载量表目录 (schema 由 Alembic 迁移负责)，
+    并启动量表目录失效通知的订阅任务 (关闭时取消)。
+    """
+    try:
+        await get_scale_catalog().load()
+    except Exception as e:
+        logger.error(f"启动时加载量表目录失败 (将在首次请求时重试): {e}", exc_info=True)
+    # 题库重新导入后自动刷新量表目录 (见 app/core/scale_catalog.py)
+    listener = asyncio.create_task(listen_for_invalidation()) if settings.SCALE_CATALOG_LISTENER_ENABLED else None
+    yield
+    if listener is not None:
+        listener.cancel()
+        with suppress(asyncio.CancelledError):
+            await listener
+
+# --- 6. FastAPI 应用实例 ---
 app = FastAPI(
     title=settings.APP_NAME,
     description="倾听者AI智能警务分析评估应用系统 API",
@@ -62,10 +85,19 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 logger.info(f"FastAPI应用 '{settings.APP_NAME}' 实例已创建。")
 
-# --- 6. CORS 中间件 ---
+# --- 7. CORS 与上传大小限制中间件 ---
+# 评估提交请求按 Content-Length / 已接收字节数提前拒绝超限上传 (见 app/core/uploads.py)。
+# 先注册 = 位于内层：CORSMiddleware 包在它外面，413 响应也带有 CORS 头，前端能读到错误信息
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_bytes=settings.UPLOAD_MAX_BYTES + settings.UPLOAD_FORM_OVERHEAD_BYTES,
+    paths=[f"{settings.API_V1_STR}/assessments/submit"],
+)
+
 if parsed_cors_origins:
     app.add_middleware(
         CORSMiddleware,
@@ -76,7 +108,7 @@ if parsed_cors_origins:
     )
     logger.info(f"CORS中间件已启用，允许的来源: {parsed_cors_origins}")
 
-# --- 7. API 路由注册 ---
+# --- 8. API 路由注册 ---
 logger.info("开始注册API路由...")
 app.include_router(auth.router, prefix=settings.API_V1_STR, tags=["认证 (Auth)"])
 app.include_router(scales.router, prefix=settings.API_V1_STR, tags=["量表 (Scales)"])
@@ -90,7 +122,7 @@ app.include_router(sse.router, tags=["SSE 事件流"])
 logger.info("所有API路由注册完成。")
 
 
-# --- 8. 静态文件服务和 SPA 回退路由 ---
+# --- 9. 静态文件服务和 SPA 回退路由 ---
 ADMIN_FRONTEND_DIR = os.path.join(PROJECT_ROOT, "psychology-admin-frontend", "dist-admin")
 
 if os.path.isdir(ADMIN_FRONTEND_DIR):
@@ -116,14 +148,14 @@ if os.path.isdir(ADMIN_FRONTEND_DIR):
 
 else:
     logger.warning(f"后台管理前端目录未找到: {ADMIN_FRONTEND_DIR}。请运行 'npm run build'。")
-# --- 9. 欢迎根路径 ---
+# --- 10. 欢迎根路径 ---
 @app.get("/", tags=["Root"])
 async def read_root():
     """根路径，返回欢迎信息。"""
     return {"message": f"欢迎使用 {settings.APP_NAME}", "version": app.version}
 
 
-# --- 10. 最终启动信息 ---
+# --- 11. 最终启动信息 ---
 logger.info("=" * 50)
 logger.info(f"FastAPI 应用 '{settings.APP_NAME}' 已完成配置并准备就绪。")
 logger.info(f"当前环境: {settings.ENVIRONMENT}")
@@ -131,7 +163,7 @@ logger.info("服务已启动，等待接收请求...")
 logger.info("=" * 50)
 
 
-# --- 11. Uvicorn 开发服务器运行器 ---
+# --- 12. Uvicorn 开发服务器运行器 ---
 # 此部分仅在直接运行 `python app/main.py` 时执行
 if __name__ == "__main__":
     import uvicorn
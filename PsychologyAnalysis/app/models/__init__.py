@@ -2,6 +2,11 @@ from .user import User
 from .assessment import Assessment
 from .interrogation import InterrogationRecord
 from .attribute import Attribute # <--- 新增导入
+from .analysis_artifact import AnalysisArtifact
+from .assessment_score import AssessmentDimensionScore
+from .questionnaire import QuestionnaireQuestion
+from .task_outbox import TaskOutbox
+from .image_blob import ImageBlob
 # 关联表通常不需要在这里导出，除非你直接使用它
 
 __all__ = [
@@ -9,4 +14,9 @@ __all__ = [
     "Assessment",
     "InterrogationRecord",
     "Attribute", # <--- 添加到列表
+    "AnalysisArtifact",
+    "AssessmentDimensionScore",
+    "QuestionnaireQuestion",
+    "TaskOutbox",
+    "ImageBlob",
 ]
\ No newline at end of file
@@ -0,0 +1,30 @@
+# FILE: app/models/analysis_artifact.py
+from sqlalchemy import Column, Integer, String, JSON, TIMESTAMP, ForeignKey, UniqueConstraint
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+# 分阶段分析产生的中间结果 (报告正文本身仍保存在 analysis_data.report_text)
+STAGE_VISION = "vision"   # 图片描述文本
+STAGE_SCORING = "scoring" # 量表计分结果 {"answers": ..., "score": ..., "interpretation": ...}
+
+class AnalysisArtifact(Base):
+    __tablename__ = "analysis_artifacts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 所属评估记录，评估删除时一并删除
+    assessment_id = Column(Integer, ForeignKey("analysis_data.id", ondelete="CASCADE"), nullable=False, index=True)
+    # 阶段名称: vision / scoring
+    stage = Column(String(50), nullable=False)
+    # 阶段产物 (JSON)
+    payload = Column(JSON, nullable=True)
+
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    # 每个评估每个阶段只保留一份产物
+    __table_args__ = (
+        UniqueConstraint("assessment_id", "stage", name="uq_analysis_artifacts_assessment_stage"),
+    )
+
+    def __repr__(self):
+        return f"<AnalysisArtifact(assessment_id={self.assessment_id}, stage='{self.stage}')>"
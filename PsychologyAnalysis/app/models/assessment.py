@@ -8,7 +8,8 @@ from sqlalchemy import ( # 按字母顺序或分组导入，更清晰
     Text,
     TIMESTAMP,
     ForeignKey,
-    Index
+    Index,
+    Float
 )
 from sqlalchemy.orm import relationship # <--- 新增: 用于定义 ORM 关系
 from sqlalchemy.sql import func
@@ -38,6 +39,8 @@ class Assessment(Base):
 
     id = Column(Integer, primary_key=True, index=True) # 主键，自动索引
     image_path = Column(Text, nullable=True) # 图片文件相对路径或标识符
+    # 内容寻址存储中的图片 (见 app/core/blob_storage.py)；为空时按 image_path 在 UPLOADS_DIR 中查找旧图片
+    image_sha256 = Column(String(64), ForeignKey("image_blobs.sha256"), nullable=True, index=True)
     subject_name = Column(String(200), index=True) # 被测者姓名，添加索引便于查询
     age = Column(Integer) # 年龄
     gender = Column(String(10)) # 性别
@@ -45,6 +48,12 @@ class Assessment(Base):
     questionnaire_data = Column(Text, nullable=True) # 存储量表答案的 JSON 字符串
     report_text = Column(Text, nullable=True) # 存储生成的报告文本
 
+    # 计分结果 (计分阶段写入，多维度量表的各维度得分见 AssessmentDimensionScore)
+    raw_score = Column(Float, nullable=True, index=True) # 原始总分 (多维度量表如 EPQ85 为空)
+    standard_score = Column(Float, nullable=True) # 标准分 (如 SAS/SDS 原始分 × 1.25 取整)
+    score_band = Column(String(255), nullable=True, index=True) # 总分所在的解释分段
+    scored_at = Column(TIMESTAMP, nullable=True, index=True) # 计分时间，为空表示尚未计分 (回填任务据此筛选)
+
     # 时间戳
     created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False) # 创建时间，数据库自动设置
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now(), nullable=False) # 更新时间
@@ -74,6 +83,8 @@ class Assessment(Base):
         server_default=STATUS_PENDING,
         index=True
     )
+    # 认领本评估的入口任务 ID (即发件箱记录的 task_id)；只有同一任务的重新投递 (redelivered) 才能再次认领 processing 的评估
+    claim_task_id = Column(String(64), nullable=True)
 
     # --- 新增的多对多关系 ---
     # 定义与 Attribute 模型的关系
@@ -94,10 +105,10 @@ class Assessment(Base):
     # submitter = relationship("User", back_populates="assessments", lazy="selectin")
     # --- 关系定义结束 ---
 
-    # (可选) 定义表级索引，如果需要复合索引
-    # __table_args__ = (
-    #     Index('ix_assessment_id_card_status', 'id_card', 'status'), # 示例复合索引
-    # )
+    # 按量表类型筛选/聚合得分
+    __table_args__ = (
+        Index('ix_analysis_data_type_raw_score', 'questionnaire_type', 'raw_score'),
+    )
 
     def __repr__(self):
         """提供一个方便调试的对象表示"""
@@ -0,0 +1,26 @@
+# FILE: app/models/assessment_score.py
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, UniqueConstraint, Index
+from app.db.base_class import Base
+
+class AssessmentDimensionScore(Base):
+    """多维度量表 (如 EPQ85 的 E/N/P/L) 每个维度的得分，每个评估每个维度一行。"""
+    __tablename__ = "assessment_dimension_scores"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 所属评估记录，评估删除时一并删除
+    assessment_id = Column(Integer, ForeignKey("analysis_data.id", ondelete="CASCADE"), nullable=False, index=True)
+    # 维度代码，如 E / N / P / L
+    dimension = Column(String(50), nullable=False)
+    # 维度原始得分
+    score = Column(Float, nullable=False)
+    # 维度得分所在的解释分段 (落在分段空隙中时为空)
+    band = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("assessment_id", "dimension", name="uq_assessment_dimension_scores_assessment_dimension"),
+        # 按维度筛选/聚合得分，如 "N >= 14 的人数"
+        Index("ix_assessment_dimension_scores_dimension_score", "dimension", "score"),
+    )
+
+    def __repr__(self):
+        return f"<AssessmentDimensionScore(assessment_id={self.assessment_id}, dimension='{self.dimension}', score={self.score})>"
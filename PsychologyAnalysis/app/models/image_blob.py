@@ -0,0 +1,30 @@
+# FILE: app/models/image_blob.py
+from sqlalchemy import Boolean, Column, Integer, String, TIMESTAMP, Index, false
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+class ImageBlob(Base):
+    """
+    按内容寻址存储的上传图片 (见 app/core/blob_storage.py)：以 SHA-256 为键，内容相同的图片只保存一份。
+    ref_count 为引用该图片的评估记录数 (Assessment.image_sha256)；降为 0 且超过宽限期后由清理任务删除。
+    删除分两步：先标记 deleting，删除存储中的文件后再删除仍带标记的记录；期间重新登记会清除标记。
+    """
+    __tablename__ = "image_blobs"
+
+    sha256 = Column(String(64), primary_key=True) # 内容 SHA-256 (十六进制)，同时决定存储路径
+    size = Column(Integer, nullable=False) # 字节数
+    content_type = Column(String(100), nullable=True) # 上传时的 MIME 类型 (按扩展名推断)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # 最近一次写入/引用的时间；清理任务只删除 ref_count 为 0 且在宽限期内未被触碰的记录
+    last_seen_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # 清理任务已开始删除该图片 (墓碑)；register 会清除标记，清理任务据此发现被重新上传的图片
+    deleting = Column(Boolean(), default=False, server_default=false(), nullable=False)
+
+    __table_args__ = (
+        # 清理任务按 (ref_count, last_seen_at) 查找无引用的图片
+        Index("ix_image_blobs_ref_count_last_seen_at", "ref_count", "last_seen_at"),
+    )
+
+    def __repr__(self):
+        return f"<ImageBlob(sha256='{self.sha256[:12]}...', size={self.size}, refs={self.ref_count})>"
@@ -0,0 +1,26 @@
+# FILE: app/models/questionnaire.py
+from sqlalchemy import Column, Integer, String, Text, UniqueConstraint
+from app.db.base_class import Base
+
+class QuestionnaireQuestion(Base):
+    """量表题目 (由 src/import_questions.py 从 input/questionnaires/*.json 导入)。"""
+    __tablename__ = "questionnaire_questions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # 量表代码，如 SAS / EPQ85 (即 analysis_data.questionnaire_type)
+    questionnaire_type = Column(String(100), nullable=False, index=True)
+    # 题号 (量表内从 1 开始)
+    question_number = Column(Integer, nullable=False)
+    # 题干
+    question_text = Column(Text, nullable=False)
+    # 选项 JSON 字符串: [{"text": ..., "score": ..., "value"?: ...}, ...] (与旧版 sqlite 表的存储格式一致)
+    options = Column(Text, nullable=False)
+    # 量表显示名称
+    scale_name = Column(String(200), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint("questionnaire_type", "question_number", name="uq_questionnaire_questions_type_number"),
+    )
+
+    def __repr__(self):
+        return f"<QuestionnaireQuestion(type='{self.questionnaire_type}', number={self.question_number})>"
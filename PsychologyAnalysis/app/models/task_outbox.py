@@ -0,0 +1,43 @@
+# FILE: app/models/task_outbox.py
+from sqlalchemy import Column, Integer, String, Text, JSON, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+# 发件箱记录状态
+OUTBOX_PENDING = "pending"       # 待投递 (或投递失败待重试)
+OUTBOX_DISPATCHED = "dispatched" # 已投递到 Celery broker
+
+# 评估提交后排队的入口分析任务 (prefork worker 与 asyncio worker 都消费该任务)
+ANALYSIS_TASK_NAME = "tasks.run_ai_analysis"
+
+class TaskOutbox(Base):
+    """
+    事务性发件箱：与评估记录在同一个事务中写入的待投递 Celery 任务。
+    由 app/tasks/outbox_relay.py 的中继进程批量投递并标记为 dispatched。
+    """
+    __tablename__ = "task_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Celery 任务名，如 tasks.run_ai_analysis
+    task_name = Column(String(200), nullable=False)
+    # 任务参数 {"args": [...], "kwargs": {...}}
+    payload = Column(JSON, nullable=False)
+    # 关联的评估记录 (用于清扫长期停留在 pending 的评估)，评估删除时一并删除
+    assessment_id = Column(Integer, ForeignKey("analysis_data.id", ondelete="CASCADE"), nullable=True, index=True)
+    # 投递时使用的 Celery 任务 ID (写入时预先生成，重复投递时保持不变)
+    task_id = Column(String(64), nullable=False)
+    status = Column(String(20), nullable=False, default=OUTBOX_PENDING, server_default=OUTBOX_PENDING)
+    attempts = Column(Integer, nullable=False, default=0, server_default="0") # 已投递次数 (含失败)
+    last_error = Column(Text, nullable=True)
+    # 下次可投递的时间 (投递失败后按退避推迟)
+    available_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    dispatched_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # 中继按 (status, available_at) 取待投递记录
+        Index("ix_task_outbox_status_available_at", "status", "available_at"),
+    )
+
+    def __repr__(self):
+        return f"<TaskOutbox(id={self.id}, task='{self.task_name}', status='{self.status}', attempts={self.attempts})>"
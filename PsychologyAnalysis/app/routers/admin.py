@@ -4,31 +4,36 @@ import logging
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Response, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import class_mapper
 from pydantic import BaseModel, Field
-from openai import OpenAI
+from openai import AsyncOpenAI
 
 # --- 核心应用导入 ---
 from app.core.config import settings
-from app.core.deps import get_db, get_current_active_superuser
+from app.core.deps import get_db, get_current_active_superuser, get_catalog
+from app.core.bulk_ingest import detect_format, ingest
+from app.core.scale_catalog import ScaleCatalog
+from app.core.llm_gateway import llm_slot
 from app import crud, models, schemas
 # --- 导入专项指导方案的响应模型 ---
 from app.schemas.guidance import GuidanceWithReportResponse, ReportDataForGuidance
 
 # --- AI & 工具函数导入 ---
 try:
-    from src.guidance_generator import generate_guidance
+    from src.guidance_generator import agenerate_guidance
 except ImportError:
-    generate_guidance = None
-    logging.getLogger(settings.APP_NAME).warning("未能导入 src.guidance_generator.generate_guidance，相关功能将不可用。")
+    agenerate_guidance = None
+    logging.getLogger(settings.APP_NAME).warning("未能导入 src.guidance_generator.agenerate_guidance，相关功能将不可用。")
 
 try:
-    from src.interrogation_ai import suggest_next_question
+    from src.interrogation_ai import asuggest_next_question
 except ImportError:
-    suggest_next_question = None
-    logging.getLogger(settings.APP_NAME).warning("未能导入 src.interrogation_ai.suggest_next_question，相关功能将不可用。")
+    asuggest_next_question = None
+    logging.getLogger(settings.APP_NAME).warning("未能导入 src.interrogation_ai.asuggest_next_question，相关功能将不可用。")
+
+from src.llm_clients import get_async_llm_client, ROLE_ADMIN
 
 # --- 日志和路由设置 ---
 logger = logging.getLogger(settings.APP_NAME)
@@ -47,12 +52,13 @@ def alchemy_to_dict(obj: Any) -> Dict[str, Any]:
     column_names = [c.key for c in class_mapper(obj.__class__).columns]
     return {c: getattr(obj, c) for c in column_names}
 
-def get_ai_client():
-    """依赖注入函数：获取一个配置好的AI客户端实例。"""
+async def get_ai_client():
+    """依赖注入函数：获取配置好的异步AI客户端 (async 依赖，保证在事件循环中创建/取得客户端)。"""
     if not settings.DASHSCOPE_API_KEY:
         logger.error("AI服务未配置：环境变量 DASHSCOPE_API_KEY 未设置。")
         raise HTTPException(status_code=503, detail="AI服务未配置 (缺少API Key)")
-    return OpenAI(api_key=settings.DASHSCOPE_API_KEY, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+    # 进程级共享客户端，连接池在请求之间复用
+    return get_async_llm_client(ROLE_ADMIN)
 
 
 # ====================================================================
@@ -89,6 +95,27 @@ async def search_assessments(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="查询评估记录时发生错误")
 
 
+@router.post(
+    "/assessments/bulk",
+    response_model=schemas.BulkIngestResponse,
+    summary="批量导入评估记录 (JSONL / CSV)"
+)
+async def bulk_ingest_assessments(
+    request: Request,
+    format: Optional[str] = Query(None, description="请求体格式: jsonl 或 csv (不填则按 Content-Type 判断)"),
+    db: AsyncSession = Depends(get_db),
+    catalog: ScaleCatalog = Depends(get_catalog),
+    current_admin: models.User = Depends(get_current_active_superuser)
+):
+    """
+    批量导入纸质评估。请求体为 JSONL 或 CSV，边接收边解析，按块写入评估记录及其分析任务。
+    单条记录的错误不影响其他记录，返回每条记录的结果 (行号 + 新评估 ID 或错误原因)。
+    """
+    fmt = detect_format(request, format)
+    logger.info(f"管理员 {current_admin.username} 开始批量导入评估记录 (格式: {fmt})")
+    return await ingest(request, db, catalog, current_admin.id, fmt)
+
+
 # ====================================================================
 # --- 数据统计与AI分析 ---
 # ====================================================================
@@ -111,10 +138,31 @@ async def get_demographics_stats(db: AsyncSession = Depends(get_db)):
         logger.error(f"获取人口统计数据时出错: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="获取统计数据时发生错误")
 
+@router.get(
+    "/stats/scores",
+    response_model=schemas.ScoreStats,
+    summary="获取量表得分分布"
+)
+async def get_score_stats(
+    questionnaire_type: str = Query(..., description="量表代码，如 SAS、EPQ85"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    统计指定量表的得分分段人数和各维度平均分 (基于计分时写入的得分列，历史数据需先运行 run_score_backfill.py)。
+    """
+    logger.info(f"管理员请求量表 '{questionnaire_type}' 的得分统计")
+    try:
+        band_data = await crud.stats.get_score_band_distribution(db, questionnaire_type)
+        dimension_data = await crud.stats.get_dimension_score_averages(db, questionnaire_type)
+        return schemas.ScoreStats(questionnaire_type=questionnaire_type, bandData=band_data, dimensionData=dimension_data)
+    except Exception as e:
+        logger.error(f"获取得分统计数据时出错: {e}", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="获取得分统计数据时发生错误")
+
 @router.post("/stats/ai-analysis", response_model=schemas.AIAnalysisResponse, summary="对统计数据进行AI智能分析")
 async def perform_ai_analysis(
     request_data: schemas.AIAnalysisRequest,
-    ai_client: OpenAI = Depends(get_ai_client),
+    ai_client: AsyncOpenAI = Depends(get_ai_client),
     current_user: models.User = Depends(get_current_active_superuser)
 ):
     """
@@ -142,10 +190,13 @@ async def perform_ai_analysis(
     messages = [{"role": "system", "content": "你是一位数据分析专家，擅长从数据中挖掘警务相关的洞察。"}, {"role": "user", "content": prompt}]
     
     try:
-        completion = ai_client.chat.completions.create(model=settings.TEXT_MODEL, messages=messages, temperature=0.5, max_tokens=1000)
+        async with llm_slot("admin.ai_analysis"):
+            completion = await ai_client.chat.completions.create(model=settings.TEXT_MODEL, messages=messages, temperature=0.5, max_tokens=1000)
         analysis_text = completion.choices[0].message.content
         logger.info("AI 数据分析成功完成")
         return schemas.AIAnalysisResponse(analysis_text=analysis_text)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"调用AI进行数据分析时出错: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"AI分析服务出错: {e}")
@@ -176,7 +227,7 @@ async def suggest_interrogation_question(record_id: int, current_qas: List[schem
     根据当前的审讯历史，调用AI生成下一步的建议问题。
     """
     logger.info(f"管理员请求审讯记录 ID: {record_id} 的下一个问题建议")
-    if not suggest_next_question:
+    if not asuggest_next_question:
         raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="AI 建议功能未配置")
     record = await crud.interrogation.get_interrogation(db, record_id=record_id)
     if not record:
@@ -185,8 +236,11 @@ async def suggest_interrogation_question(record_id: int, current_qas: List[schem
     basic_info = record.basic_info or {}
     try:
         history_dicts = [qa.model_dump() for qa in current_qas]
-        suggestions = suggest_next_question(basic_info=basic_info, history=history_dicts)
+        async with llm_slot("admin.interrogation_suggest"):
+            suggestions = await asuggest_next_question(basic_info=basic_info, history=history_dicts)
         return suggestions
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"生成审讯建议时出错 (ID: {record_id}): {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="获取 AI 建议时出错")
@@ -248,7 +302,7 @@ async def get_guidance_for_person(
     它会查找最新的评估报告，并调用AI生成指导方案，最终返回一个结构化的响应。
     """
     logger.info(f"为身份证号 '{id_card}' 生成 '{guidance_type}' 指导方案")
-    if not generate_guidance:
+    if not agenerate_guidance:
         raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="指导方案生成功能未配置")
 
     assessment = await crud.assessment.get_latest_completed_by_id_card(db, id_card=id_card)
@@ -258,7 +312,8 @@ async def get_guidance_for_person(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="找到评估记录，但报告内容为空")
 
     try:
-        guidance_text = generate_guidance(report_text=assessment.report_text, scenario=guidance_type)
+        async with llm_slot("admin.guidance"):
+            guidance_text = await agenerate_guidance(report_text=assessment.report_text, scenario=guidance_type)
         if not guidance_text:
             raise ValueError("AI未能生成指导方案文本")
         
@@ -273,6 +328,8 @@ async def get_guidance_for_person(
             guidance=guidance_text
         )
 
+    except HTTPException:
+        raise
     except ValueError as ve:
         logger.error(f"生成指导方案时值错误: {ve}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"生成指导方案失败: {ve}")
@@ -1,9 +1,8 @@
 # FILE: app/routers/assessments.py (修改后)
 import logging
 import os
-import json
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, Request, status
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from typing import Dict, Any, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 # --- 修改: 导入更具体的数据库异常 ---
@@ -12,15 +11,15 @@ from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 # --- 核心应用导入 ---
 from app.core.config import settings
 from app.schemas.assessment import AssessmentSubmitResponse
-# 确保 Celery 任务可导入
-try:
-    from app.tasks.analysis import run_ai_analysis
-except ImportError:
-    run_ai_analysis = None # 如果导入失败，定义为 None
-    logging.getLogger(settings.APP_NAME or "FallbackLogger").error("未能导入 Celery 任务 'run_ai_analysis'。后台处理已禁用。")
+from app.core.uploads import save_upload_stream
+from app.core.blob_storage import store_upload, content_type_for
+from app.core.scale_catalog import ScaleCatalog
+from app.core.submission_form import parse_submission_form
+# 分析任务通过事务性发件箱投递 (见 app/tasks/outbox_relay.py)，请求路径上不访问 Celery broker
+from app.models.task_outbox import ANALYSIS_TASK_NAME
 
 # --- 认证与数据库导入 ---
-from app.core.deps import get_current_active_user, get_db # 使用异步 get_db
+from app.core.deps import get_current_active_user, get_db, get_catalog # 使用异步 get_db
 from app import models, schemas # 导入 schemas 供潜在使用
 # 导入主 crud 包 (确保 app/crud/__init__.py 导入了 assessment)
 from app import crud
@@ -58,65 +57,38 @@ router = APIRouter()
     status_code=status.HTTP_202_ACCEPTED # 成功时返回 202 Accepted
 )
 async def submit_assessment(
+    request: Request,
     # --- 依赖 ---
     db: AsyncSession = Depends(get_db),
-    request: Request = None, # 保留用于解析表单数据
     current_user: models.User = Depends(get_current_active_user), # 认证依赖
-
-    # --- 表单字段 (名称需与 JS 中的 FormData 匹配) ---
-    name: str = Form(..., description="姓名"),
-    gender: str = Form(..., description="性别"),
-    age: int = Form(..., gt=0, description="年龄"),
-    id_card: Optional[str] = Form(None, description="身份证号"),
-    occupation: Optional[str] = Form(None, description="职业"),
-    case_name: Optional[str] = Form(None, description="案件名称"),
-    case_type: Optional[str] = Form(None, description="案件类型"),
-    identity_type: Optional[str] = Form(None, description="人员身份"),
-    person_type: Optional[str] = Form(None, description="人员类型"),
-    marital_status: Optional[str] = Form(None, description="婚姻状况"),
-    children_info: Optional[str] = Form(None, description="子女情况"),
-    criminal_record: Optional[int] = Form(0, ge=0, le=1, description="有无犯罪前科 (0:无, 1:有)"),
-    health_status: Optional[str] = Form(None, description="健康情况"),
-    phone_number: Optional[str] = Form(None, description="手机号"),
-    domicile: Optional[str] = Form(None, description="归属地"),
-    scale_type: Optional[str] = Form(None, description="选择的量表代码"),
-    # 确保 'image' 匹配 HTML/JS 中文件输入的 name 属性
-    image: Optional[UploadFile] = File(None, description="上传的绘画图片")
+    catalog: ScaleCatalog = Depends(get_catalog), # 量表目录，用于校验答案
 ):
     """
     接收来自已认证用户的评估数据。
-    保存数据并排队等待后台 AI 分析任务。
+    表单 (基础信息字段、scale_type、q1..qN 答案和 image 文件，名称需与 JS 中的 FormData 匹配)
+    只解析一次并在写库前完成校验，然后保存数据并排队等待后台 AI 分析任务。
     """
     # +++ 在潜在的数据库错误发生前获取用户名和 ID +++
     submitter_username = current_user.username
     submitter_id = current_user.id
-    logger.info(f"用户 '{submitter_username}' (ID: {submitter_id}) 正在提交新的评估，主体姓名: {name}")
 
-    # --- 1. 收集基础信息 (将表单字段映射到数据库模型字段) ---
-    basic_info: Dict[str, Any] = {
-        "subject_name": name, # 将表单的 'name' 映射到数据库模型的 'subject_name'
-        "gender": gender,
-        "age": age,
-        "id_card": id_card,
-        "occupation": occupation,
-        "case_name": case_name,
-        "case_type": case_type,
-        "identity_type": identity_type,
-        "person_type": person_type,
-        "marital_status": marital_status,
-        "children_info": children_info,
-        "criminal_record": criminal_record, # 已经是 int 0 或 1
-        "health_status": health_status,
-        "phone_number": phone_number,
-        "domicile": domicile,
-        "submitter_id": submitter_id # 添加认证用户的 ID
-    }
+    # --- 1. 单次解析表单并校验基础信息与量表答案 (无效时返回 422，不写库、不触发分析) ---
+    submission = await parse_submission_form(request, catalog)
+    info = submission.basic_info
+    scale_type = submission.scale_type
+    image = submission.image
+    logger.info(f"用户 '{submitter_username}' (ID: {submitter_id}) 正在提交新的评估，主体姓名: {info.name}")
+
+    # 将表单字段映射到数据库模型字段 (表单的 'name' 对应模型的 'subject_name')
+    basic_info: Dict[str, Any] = info.model_dump(exclude={"name"})
+    basic_info["subject_name"] = info.name
+    basic_info["submitter_id"] = submitter_id # 添加认证用户的 ID
     logger.debug(f"收集的基础信息 (待存入数据库): {basic_info}")
 
     # --- 2. 处理图片上传 ---
+    # 图片按内容寻址存储 (见 app/core/blob_storage.py)；image_path 只保留上传时的文件名作为标识
     image_relative_path: Optional[str] = None
-    image_full_path: Optional[str] = None # 跟踪完整路径以备保存
-    image_was_saved_to_disk: bool = False # 标记，以便在出错时清理
+    image_sha256: Optional[str] = None
 
     if image and image.filename:
         # 清理文件名
@@ -129,8 +101,8 @@ async def submit_assessment(
 
         if image: # 再次检查文件名检查后 image 是否仍然有效
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            # 使用身份证号（如果提供）或姓名（如果提供）或 'UnknownID' 作为文件名的一部分
-            id_part = secure_filename(id_card if id_card else (name if name else 'UnknownID'))
+            # 使用身份证号（如果提供）或姓名作为文件名的一部分
+            id_part = secure_filename(info.id_card if info.id_card else (info.name if info.name else 'UnknownID'))
             base, ext = os.path.splitext(original_filename)
             safe_base = base[:50] # 限制基本文件名长度
             # 标准化扩展名为小写
@@ -144,27 +116,24 @@ async def submit_assessment(
                     detail=f"不允许的文件类型: {ext}. 请上传 {', '.join(allowed_extensions)} 格式的文件。"
                 )
 
-            # 构建用于保存的安全文件名
+            # 构建安全文件名 (暂存文件名，同时作为 image_path 标识保存)
             image_filename_to_save = f"{id_part}_{timestamp}_{safe_base}{ext_lower}"
-            image_full_path = os.path.join(settings.UPLOADS_DIR, image_filename_to_save)
-            # 在数据库中存储相对路径（或仅文件名）
-            image_relative_path = image_filename_to_save # 或根据你提供文件的方式进行调整
+            staging_path = os.path.join(settings.BLOB_STAGING_DIR, image_filename_to_save)
+            image_relative_path = image_filename_to_save
 
             try:
-                # 确保上传目录存在
-                os.makedirs(settings.UPLOADS_DIR, exist_ok=True)
-                # 异步读取文件内容并保存
-                file_content = await image.read()
-                with open(image_full_path, "wb") as buffer:
-                    buffer.write(file_content)
-                image_was_saved_to_disk = True # 标记为已保存，以备潜在清理
-                logger.info(f"图片由用户 {submitter_username} 保存至: {image_full_path}")
+                # 分块流式写入暂存目录 (异步文件 I/O，限制大小，边写边算 SHA-256)，再按 SHA-256 存入图片存储 (相同内容只存一份)
+                saved = await save_upload_stream(image, staging_path)
+                image_sha256 = await store_upload(db, saved, content_type_for(image_filename_to_save))
+                logger.info(f"图片由用户 {submitter_username} 上传: {image_filename_to_save} ({saved.size} 字节, sha256={saved.sha256})")
+            except HTTPException:
+                raise # 例如超过大小上限的 413
             except OSError as e: # 捕获文件系统相关的错误
-                logger.error(f"用户 {submitter_username} 保存上传图片至 {image_full_path} 时发生文件系统错误: {e}", exc_info=True)
+                logger.error(f"用户 {submitter_username} 保存上传图片 {image_filename_to_save} 时发生文件系统错误: {e}", exc_info=True)
                 # 如果保存失败则不继续，通知用户
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"保存上传文件时发生服务器错误。")
             except Exception as e:
-                logger.error(f"用户 {submitter_username} 保存上传图片至 {image_full_path} 时发生未知错误: {e}", exc_info=True)
+                logger.error(f"用户 {submitter_username} 保存上传图片 {image_filename_to_save} 时发生未知错误: {e}", exc_info=True)
                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"处理上传文件时发生意外错误。")
             finally:
                  # 确保文件被关闭 (UploadFile 应该会处理这个，但这是好习惯)
@@ -172,55 +141,25 @@ async def submit_assessment(
     else:
         logger.info(f"用户 {submitter_username} 未上传图片。")
 
-    # --- 3. 收集量表答案 (从动态表单字段 q1, q2...) ---
-    scale_answers_dict: Dict[str, Any] = {}
-    scale_answers_json: Optional[str] = None
-    if scale_type:
-        if request is None:
-             logger.error("未注入 Request 对象，无法解析量表答案。这是一个服务器配置问题。")
-             # 这表示服务器端设置问题
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="内部服务器错误: 无法访问请求对象。")
-        try:
-            # 异步获取所有表单数据
-            form_data = await request.form()
-            for key, value in form_data.items():
-                # 检查 key 是否以 'q' 开头后跟数字
-                if key.startswith('q') and key[1:].isdigit():
-                    # 尝试将值转换为数字（如果可能），否则保持字符串
-                    try:
-                        scale_answers_dict[key] = int(value)
-                    except ValueError:
-                        try:
-                            scale_answers_dict[key] = float(value)
-                        except ValueError:
-                            scale_answers_dict[key] = value # 保留为字符串
+    # --- 3. 量表答案 (已在第 1 步按量表定义校验) ---
+    scale_answers_json: Optional[str] = submission.answers_json
+    if scale_answers_json:
+        logger.info(f"用户 {submitter_username} 为量表 '{scale_type}' 提交的答案: {len(submission.answers)} 条")
+        logger.debug(f"量表答案 (JSON): {scale_answers_json}")
 
-            if scale_answers_dict:
-                # 将收集到的答案转换为 JSON 字符串以便数据库存储
-                scale_answers_json = json.dumps(scale_answers_dict, ensure_ascii=False, sort_keys=True) # 排序以保证一致性
-                logger.info(f"用户 {submitter_username} 为量表 '{scale_type}' 收集到的答案: {len(scale_answers_dict)} 条")
-                logger.debug(f"量表答案 (JSON): {scale_answers_json}")
-            else:
-                logger.warning(f"用户 {submitter_username} 提供了量表类型 '{scale_type}', 但未在表单中找到以 'q' 开头的答案。")
-                # 根据需求，你可能需要抛出错误或允许提交时没有答案
-                # raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"选择了量表 '{scale_type}' 但未提供答案。")
-        except Exception as e:
-             logger.error(f"用户 {submitter_username} 解析量表答案时出错: {e}", exc_info=True)
-             # 在没有量表数据的情况下继续或抛出错误
-             scale_answers_json = None # 确保如果解析失败则为 None
-             # raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"解析量表答案时出错: {e}")
-
-    # --- 4. 使用异步 CRUD 保存初始数据 ---
+    # --- 4. 使用异步 CRUD 保存初始数据，并在同一事务中写入分析任务的发件箱记录 ---
     assessment_id: Optional[int] = None
     new_assessment: Optional[models.Assessment] = None # 初始化为 None
     try:
         # --- *** 通过导入的 crud 包访问 assessment CRUD *** ---
         # 现在需要 app/crud/__init__.py 包含 `from . import assessment`
-        new_assessment = await crud.assessment.create(
+        new_assessment = await crud.assessment.create_with_outbox(
             db=db,
+            task_name=ANALYSIS_TASK_NAME, # 由发件箱中继投递到 Celery
             # 使用与 Assessment 模型字段匹配的关键字参数传递收集的数据
             **basic_info, # 解包基础信息字典
-            image_path=image_relative_path, # 存储相对路径/文件名
+            image_path=image_relative_path, # 上传时的文件名 (标识)
+            image_sha256=image_sha256, # 图片存储中的键，引用计数在同一事务中增加
             questionnaire_type=scale_type,
             questionnaire_data=scale_answers_json, # 存储 JSON 字符串
             report_text=None # 初始报告文本为空
@@ -243,13 +182,7 @@ async def submit_assessment(
     except IntegrityError as ie: # --- 捕获 IntegrityError (例如，唯一约束冲突) ---
         logger.warning(f"用户 {submitter_username} 保存评估数据时发生数据库完整性错误: {ie}", exc_info=True)
         await db.rollback() # 回滚数据库事务
-        # 清理可能已保存的图片
-        if image_was_saved_to_disk and image_full_path and os.path.exists(image_full_path):
-            try:
-                os.remove(image_full_path)
-                logger.info(f"因数据库完整性错误清理了文件 {image_full_path}")
-            except Exception as rm_err:
-                logger.warning(f"数据库完整性错误后无法移除文件 {image_full_path}: {rm_err}")
+        # 已存入的图片不删除 (可能被其他评估共用)：其引用计数未增加，由清理任务在宽限期后回收
         # 返回 409 Conflict 状态码
         # 可以根据具体错误 (ie.args) 提供更具体的 detail，但要小心暴露内部信息
         error_detail = "数据保存冲突。可能某个唯一字段（如身份证号）已存在。"
@@ -261,78 +194,32 @@ async def submit_assessment(
     except TypeError as te: # --- 捕获 TypeError (通常来自模型初始化时字段类型不匹配) ---
         logger.warning(f"用户 {submitter_username} 提交的数据字段与预期模型类型不匹配: {te}", exc_info=True)
         await db.rollback() # 尽管可能还没到数据库操作，回滚以防万一
-        # 清理可能已保存的图片
-        if image_was_saved_to_disk and image_full_path and os.path.exists(image_full_path):
-             try:
-                 os.remove(image_full_path)
-                 logger.info(f"因类型错误清理了文件 {image_full_path}")
-             except Exception as rm_err:
-                 logger.warning(f"类型错误后无法移除文件 {image_full_path}: {rm_err}")
         # 返回 422 Unprocessable Entity 状态码，表示数据无法处理
         raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"提交的数据字段无效或类型错误: {te}")
 
     except SQLAlchemyError as dbe: # --- 捕获其他 SQLAlchemy 相关错误 (连接、其他约束等) ---
          logger.error(f"用户 {submitter_username} 保存评估数据时发生数据库操作错误: {dbe}", exc_info=True)
          await db.rollback() # 回滚数据库事务
-         # 清理可能已保存的图片
-         if image_was_saved_to_disk and image_full_path and os.path.exists(image_full_path):
-             try:
-                 os.remove(image_full_path)
-                 logger.info(f"因数据库操作错误清理了文件 {image_full_path}")
-             except Exception as rm_err:
-                 logger.warning(f"数据库操作错误后无法移除文件 {image_full_path}: {rm_err}")
          # 返回 500 Internal Server Error
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"数据库操作失败。请稍后重试或联系管理员。")
 
     except Exception as e: # --- 捕获所有其他意外错误 ---
         logger.error(f"用户 {submitter_username} 处理评估提交时发生意外错误: {e}", exc_info=True)
         await db.rollback() # 尝试回滚以防万一
-        # 清理可能已保存的图片
-        if image_was_saved_to_disk and image_full_path and os.path.exists(image_full_path):
-            try:
-                os.remove(image_full_path)
-                logger.info(f"因意外错误清理了文件 {image_full_path}")
-            except Exception as rm_err:
-                logger.warning(f"意外错误后无法移除文件 {image_full_path}: {rm_err}")
         # 返回 500 Internal Server Error
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"处理请求时发生内部服务器错误。")
 
-    # --- 5. 触发 Celery 任务 (仅当 assessment_id 成功获取后执行) ---
-    task_id: Optional[str] = None
-    if assessment_id: # 只有在数据成功保存并获取 ID 后才排队
-        if run_ai_analysis:
-            try:
-                # 仅传递任务所需的 ID
-                task = run_ai_analysis.delay(assessment_id)
-                task_id = task.id
-                logger.info(f"已为评估 ID: {assessment_id} (提交者: {submitter_username}) 排队 AI 分析任务。任务 ID: {task_id}")
-            except Exception as celery_err:
-                 # 记录错误，但请求本身是成功的（数据已保存）
-                 logger.error(f"为评估 ID {assessment_id} (提交者: {submitter_username}) 排队 Celery 任务失败: {celery_err}", exc_info=True)
-                 # 不要在此处引发 HTTPException，因为主要操作（保存数据）已成功。
-                 # 响应消息将指示排队失败。
-        else:
-             logger.warning(f"Celery 任务 'run_ai_analysis' 未加载或不可用。评估 ID: {assessment_id} 的后台处理将不会运行。")
-
-    # --- 6. 构建 API 响应 (基于成功保存和任务排队状态) ---
+    # --- 5. 构建 API 响应 ---
+    # 分析任务已与评估记录一起提交到发件箱，由中继进程投递；broker 暂时不可用时中继会重试
     if assessment_id:
-        status_code_resp: str
-        message: str
-        if task_id:
-            message = "评估数据已接收，正在后台进行 AI 分析。"
-            status_code_resp = "processing_queued" # 状态码：处理已排队
-        elif run_ai_analysis is None: # 检查任务函数本身是否为 None
-            message = f"评估数据已接收 (ID: {assessment_id})，但后台分析任务未配置或导入失败。"
-            status_code_resp = "warning_task_unavailable" # 状态码：警告，任务不可用
-        else: # 任务函数存在但 .delay() 失败
-            message = f"评估数据已接收 (ID: {assessment_id})，但启动后台处理任务时出错。"
-            status_code_resp = "warning_queueing_failed" # 状态码：警告，排队失败
+        logger.info(f"已为评估 ID: {assessment_id} (提交者: {submitter_username}) 写入 AI 分析任务发件箱记录。")
+        message = "评估数据已接收，正在后台进行 AI 分析。"
+        status_code_resp = "processing_queued" # 状态码：处理已排队
 
         return AssessmentSubmitResponse(
             status=status_code_resp,
             message=message,
             submission_id=assessment_id
-            # task_id=task_id # 可选地在响应中包含 task_id
         )
     else:
         # 理论上，如果上面的异常处理正确，这个情况不应该发生
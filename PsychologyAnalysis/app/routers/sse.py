@@ -8,6 +8,7 @@ import redis.asyncio as redis # 导入异步 redis 客户端
 
 from app.core.config import settings
 from app.core.deps import get_current_active_user # 保护 SSE 端点
+from app.core.redis_client import report_channel, STATUS_STREAMING
 from app import models
 
 logger = logging.getLogger(settings.APP_NAME)
@@ -51,7 +52,7 @@ async def report_status_stream(
     """
     logger.info(f"用户 '{current_user.username}' (ID: {current_user.id}) 订阅评估 ID: {submission_id} 的状态更新。")
 
-    channel_name = f"report-ready:{submission_id}"
+    channel_name = report_channel(submission_id)
 
     async def event_generator():
         # 从连接池获取单个连接
@@ -75,7 +76,7 @@ async def report_status_stream(
                         async with asyncio.timeout(60): # 例如，每 60 秒检查一次连接
                             message = await pubsub.get_message() # timeout=None 已移除，由 asyncio.timeout 控制
                         if message:
-                            logger.info(f"SSE: 从频道 '{channel_name}' 收到消息: {message}")
+                            logger.debug(f"SSE: 从频道 '{channel_name}' 收到消息: {message}")
                             data = message.get("data")
                             if data:
                                 try:
@@ -89,6 +90,12 @@ async def report_status_stream(
                                          logger.warning(f"SSE: 报告 ID {submission_id} 生成失败，发送 'report_failed' 事件。 Error: {payload.get('error')}")
                                          yield json.dumps({"event": "report_failed", "data": json.dumps({"submission_id": submission_id, "error": payload.get('error', '未知错误')})})
                                          break # 任务失败，也结束流
+                                    elif payload.get("status") == STATUS_STREAMING:
+                                         # 报告正文片段: offset 为 delta 在完整报告中的起始位置，offset 为 0 时前端应清空已收到的内容 (重试)
+                                         yield json.dumps({"event": "report_chunk", "data": json.dumps({"submission_id": submission_id, "delta": payload.get('delta', ''), "offset": payload.get('offset', 0)}, ensure_ascii=False)})
+                                    elif payload.get("status") == "processing":
+                                         # 中间阶段事件，转发给前端但不结束流
+                                         yield json.dumps({"event": "report_progress", "data": json.dumps({"submission_id": submission_id, "stage": payload.get('stage')})})
                                     else:
                                          logger.warning(f"SSE: 从频道 '{channel_name}' 收到未知状态的消息: {payload}")
                                 except json.JSONDecodeError:
@@ -11,13 +11,13 @@ from .scale import (
     ScaleOption, ScaleQuestion, ScaleInfo, ScaleQuestionsResponse, AvailableScalesResponse
 )
 # --- 评估相关 ---
-from .assessment import AssessmentSubmitResponse, AssessmentSummary
+from .assessment import AssessmentSubmitResponse, AssessmentSummary, BulkIngestRowResult, BulkIngestResponse
 # --- 报告相关 ---
 from .report import ReportData, ReportResponse, ReportStatusResponse
 # --- 百科相关 ---
 from .encyclopedia import EncyclopediaEntry, CategoriesResponse, EntriesResponse
 # --- 统计相关 ---
-from .stats import DemographicsStats, ChartData, AIAnalysisRequest, AIAnalysisResponse
+from .stats import DemographicsStats, ChartData, ScoreStats, AIAnalysisRequest, AIAnalysisResponse
 # --- 审讯相关 ---
 from .interrogation import (
     InterrogationBasicInfo, InterrogationQAInput, InterrogationRecordCreate,
@@ -40,13 +40,13 @@ __all__ = [
     # Scale
     "ScaleOption", "ScaleQuestion", "ScaleInfo", "ScaleQuestionsResponse", "AvailableScalesResponse",
     # Assessment
-    "AssessmentSubmitResponse", "AssessmentSummary",
+    "AssessmentSubmitResponse", "AssessmentSummary", "BulkIngestRowResult", "BulkIngestResponse",
     # Report
     "ReportData", "ReportResponse", "ReportStatusResponse",
     # Encyclopedia
     "EncyclopediaEntry", "CategoriesResponse", "EntriesResponse",
     # Stats
-    "DemographicsStats", "ChartData", "AIAnalysisRequest", "AIAnalysisResponse",
+    "DemographicsStats", "ChartData", "ScoreStats", "AIAnalysisRequest", "AIAnalysisResponse",
     # Interrogation
     "InterrogationBasicInfo", "InterrogationQAInput", "InterrogationRecordCreate",
     "InterrogationRecordUpdate", "InterrogationRecordRead",
@@ -1,12 +1,11 @@
 #评估提交相关
 # app/schemas/assessment.py
 from pydantic import BaseModel, Field
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 # --- 用于 POST /api/assessments/submit 的请求体 (部分数据将来自 Form) ---
-# Pydantic 模型通常用于 JSON body，但 FastAPI 也能从 Form 字段映射
-# 这里定义基础信息字段，方便验证和文档化，实际接收用 Form(...)
+# 提交是 multipart 表单；app/core/submission_form.py 单次解析表单后用本模型校验基础信息字段
 class BasicInfoSubmit(BaseModel):
     name: str = Field(..., description="姓名")
     gender: str = Field(..., description="性别")
@@ -23,7 +22,7 @@ class BasicInfoSubmit(BaseModel):
     health_status: Optional[str] = Field(None, description="健康情况")
     phone_number: Optional[str] = Field(None, description="手机号")
     domicile: Optional[str] = Field(None, description="归属地")
-    # 注意：scale_type 和 scale_answers 会作为独立的 Form 字段传入
+    # 注意：scale_type 和 q1..qN 答案作为独立的表单字段传入，按量表目录单独校验
 
 # --- 用于 POST /api/assessments/submit 的响应 ---
 class AssessmentSubmitResponse(BaseModel):
@@ -31,6 +30,20 @@ class AssessmentSubmitResponse(BaseModel):
     message: str
     submission_id: Optional[int] = None # 成功时返回 ID
     
+# --- 用于 POST /api/v1/admin/assessments/bulk 的响应 ---
+class BulkIngestRowResult(BaseModel):
+    line: int # 该记录在请求体中的起始行号 (CSV 表头为第 1 行)
+    status: str # "created" 或 "error"
+    assessment_id: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+class BulkIngestResponse(BaseModel):
+    total: int
+    created: int
+    failed: int
+    elapsed_ms: float
+    results: List[BulkIngestRowResult]
+
 class AssessmentSummary(BaseModel):
     """用于在列表中显示的评估摘要信息"""
     id: int
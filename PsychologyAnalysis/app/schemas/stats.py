@@ -13,6 +13,12 @@ class DemographicsStats(BaseModel):
     ageData: ChartData
     genderData: ChartData
 
+class ScoreStats(BaseModel):
+    """单个量表的得分统计 (来自计分时持久化的得分列)"""
+    questionnaire_type: str
+    bandData: ChartData
+    dimensionData: ChartData
+
 # [+] 新增: AI 分析请求体模型
 class AIAnalysisRequest(BaseModel):
     demographics: DemographicsStats = Field(..., description="要分析的人口统计数据")
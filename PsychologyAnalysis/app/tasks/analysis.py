@@ -2,11 +2,11 @@
 import logging
 import os
 import sys
-import asyncio
-import json
-# --- 使用异步和同步 Redis 客户端 ---
-import redis.asyncio as aredis # 异步别名
-import redis # 标准同步客户端
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from celery import chain
+from celery.exceptions import Ignore
 
 # --- 路径设置 (保持不变) ---
 TASK_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -20,13 +20,21 @@ if PROJECT_ROOT_FROM_TASK not in sys.path:
 try:
     from app.core.celery_app import celery_app
     from app.core.config import settings
-    from app.db.session import AsyncSessionLocal
+    # 每个 worker 进程常驻的事件循环和数据库连接池 (worker_process_init 时创建)
+    from app.core.worker_runtime import run_coroutine, get_session
+    from app.core.redis_client import get_status_publisher, get_publisher_stats, ReportChunkStreamer
     from app.crud import assessment as crud_assessment
+    from app.crud import artifact as crud_artifact
+    from app.models.analysis_artifact import STAGE_VISION, STAGE_SCORING
     # +++ 导入所有需要的状态常量 +++
     from app.models.assessment import STATUS_COMPLETE, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING
     # +++++++++++++++++++++++++++++++
-    from src.ai_utils import generate_report_content
+    from src.ai_utils import (
+        generate_report_content, run_report_pipeline, prepare_ai_config, resolve_image_path,
+        describe_image, is_vision_failure, score_questionnaire, build_subject_info, write_report,
+    )
     from src.utils import setup_logging
+    from src.vision_cache import cache_stats as vision_cache_stats
     WORKER_LOGGER_NAME = f"{settings.APP_NAME}_Worker"
     setup_logging(log_level_str=settings.LOG_LEVEL,
                     log_dir_name=os.path.basename(settings.LOGS_DIR),
@@ -58,235 +66,330 @@ except Exception as setup_err:
         if not logger.hasHandlers(): logging.basicConfig(level=logging.INFO)
         logger.critical(f"CRITICAL: 初始化失败: {setup_err}")
 
-# --- Redis Publish Function (保持不变) ---
-def publish_report_status_sync(assessment_id: int, status: str, error_msg: str = None):
-    """同步地将报告状态发布到 Redis。"""
-    global logger
-    if not hasattr(settings, 'REDIS_URL'):
-         logger.error(f"Worker (Sync): settings 对象缺少 REDIS_URL，无法发布 ID {assessment_id} 的状态 '{status}'。")
-         return
-    channel_name = f"report-ready:{assessment_id}"
-    message_payload = {"status": status}
-    if error_msg:
-        message_payload["error"] = error_msg
-    message_json = json.dumps(message_payload)
-    redis_client = None
+# --- Redis Publish Function ---
+def publish_report_status_sync(assessment_id: int, status: str, error_msg: str = None, extra: dict = None):
+    """同步地将报告状态发布到 Redis (复用进程级连接池，见 app/core/redis_client.py)。"""
     try:
-        redis_client = redis.Redis.from_url(
-            settings.REDIS_URL,
-            decode_responses=True
+        get_status_publisher().publish(assessment_id, status, error_msg, extra)
+    except Exception as e:
+        # 连接池创建失败等情况，不影响任务本身
+        logger.error(f"Worker (Sync): 发布 ID {assessment_id} 的状态 '{status}' 时出错: {e}", exc_info=True)
+
+
+# --- 数据库辅助协程 (都在 worker 常驻事件循环上通过 run_coroutine 执行) ---
+async def _load_submission(assessment_id: int) -> Tuple[Optional[dict], Dict[str, Any]]:
+    """加载评估记录 (转为列字典) 和已保存的阶段产物。记录不存在时返回 (None, {})。"""
+    async with get_session() as session:
+        assessment_record = await crud_assessment.get(db=session, id=assessment_id)
+        if not assessment_record:
+            return None, {}
+        submission_data = {column.name: getattr(assessment_record, column.name)
+                           for column in assessment_record.__table__.columns}
+        artifacts = await crud_artifact.get_artifacts(db=session, assessment_id=assessment_id)
+        return submission_data, artifacts
+
+async def _save_artifact(assessment_id: int, stage: str, payload: Any):
+    async with get_session() as session:
+        await crud_artifact.save_artifact(db=session, assessment_id=assessment_id, stage=stage, payload=payload)
+        if stage == STAGE_SCORING and isinstance(payload, dict):
+            # 得分同时写入 analysis_data / assessment_dimension_scores，供按分数筛选和统计；失败不影响报告生成
+            try:
+                await crud_assessment.save_scores(db=session, assessment_id=assessment_id, scoring=payload)
+            except Exception as e:
+                logger.warning(f"保存得分失败，ID {assessment_id}: {e} (可稍后用 run_score_backfill.py 补算)")
+
+async def _mark_processing(assessment_id: int, task_id: Optional[str], redelivered: bool) -> Optional[str]:
+    async with get_session() as session:
+        return await crud_assessment.mark_processing(db=session, assessment_id=assessment_id,
+                                                     task_id=task_id, redelivered=redelivered)
+
+async def _finalize(assessment_id: int, report_text: str, status: str) -> Optional[str]:
+    async with get_session() as session:
+        return await crud_assessment.finalize_assessment(
+            db=session, assessment_id=assessment_id, report_text=report_text, status=status
         )
-        redis_client.publish(channel_name, message_json)
-        logger.info(f"Worker (Sync): 已向频道 '{channel_name}' 发布消息: {message_json}")
+
+
+def vision_artifact_payload(description: str, elapsed_ms: float) -> dict:
+    return {"description": description, "ok": not is_vision_failure(description), "elapsed_ms": elapsed_ms}
+
+def reusable_artifacts(artifacts: Dict[str, Any]) -> Dict[str, Any]:
+    """把已保存的阶段产物转换为流水线阶段结果；失败的图片描述不复用，重试时会重新识别。"""
+    precomputed = {}
+    vision = artifacts.get(STAGE_VISION)
+    if isinstance(vision, dict) and vision.get("ok"):
+        precomputed["vision"] = vision.get("description")
+    scoring = artifacts.get(STAGE_SCORING)
+    if isinstance(scoring, dict):
+        precomputed["scoring"] = scoring
+    return precomputed
+
+def _chunk_streamer(assessment_id: int) -> Optional[ReportChunkStreamer]:
+    """报告流式输出开启时返回片段发布器，否则返回 None (write_report 走非流式调用)。"""
+    if not settings.REPORT_STREAMING_ENABLED:
+        return None
+    try:
+        return ReportChunkStreamer(assessment_id)
     except Exception as e:
-        logger.error(f"Worker (Sync): 向频道 '{channel_name}' 发布消息时出错: {e}", exc_info=True)
-    finally:
-         if redis_client:
-              try:
-                   redis_client.close()
-                   logger.debug(f"Worker (Sync): Redis client for publish ID {assessment_id} closed.")
-              except Exception as close_err:
-                   logger.warning(f"Worker (Sync): 关闭 Redis publish client 时出错: {close_err}")
-
-# --- Celery 任务定义 (更新 global 声明) ---
-@celery_app.task(bind=True, name='tasks.run_ai_analysis')
+        logger.warning(f"Worker: 创建报告片段发布器失败，ID {assessment_id} 改为非流式生成: {e}")
+        return None
+
+def _retry_countdown(retries: int) -> int:
+    return settings.ANALYSIS_STAGE_RETRY_BACKOFF * (2 ** retries)
+
+
+def classify_report_text(generated_text: Optional[str]) -> Tuple[str, str, Optional[str]]:
+    """根据生成结果判断最终状态，返回 (要保存的报告文本, 最终状态, 错误摘要)。"""
+    if generated_text is None:
+        return "错误：报告生成意外返回空", STATUS_FAILED, "报告生成返回空"
+    if "错误" in generated_text or "Error" in generated_text or "失败" in generated_text:
+        return generated_text, STATUS_FAILED, f"AI 处理失败: {generated_text[:150]}"
+    return generated_text, STATUS_COMPLETE, None
+
+
+def _complete_report(assessment_id: int, generated_text: Optional[str], stage_timings: Dict[str, float],
+                     task_id_str: str) -> dict:
+    """检查生成结果，用单条 UPDATE 写入报告和最终状态，发布 Redis 消息并构造任务返回值。"""
+    report_text_to_save, final_status, error_detail = classify_report_text(generated_text)
+    if final_status == STATUS_COMPLETE:
+        logger.info(f"{task_id_str} 报告内容生成成功，ID: {assessment_id}")
+    else:
+        logger.error(f"{task_id_str} 核心处理函数返回错误信息，ID {assessment_id}: {str(generated_text)[:200]}...")
+
+    updated_to_complete = False
+    try:
+        # 单条 UPDATE ... RETURNING 同时写入报告文本和最终状态 (只允许从 pending/processing 迁移)
+        logger.info(f"{task_id_str} 尝试写入报告文本和最终状态 '{final_status}'，ID: {assessment_id}")
+        written_status = run_coroutine(_finalize(assessment_id, str(report_text_to_save), final_status))
+        if written_status is None:
+            logger.error(f"{task_id_str} 写入最终状态时记录 ID {assessment_id} 未找到或已不处于待处理状态！")
+            if final_status == STATUS_COMPLETE: final_status = STATUS_FAILED # 使用常量
+            error_detail = f"数据库更新失败 (ID: {assessment_id} 未找到或状态已变更)"
+        elif written_status == STATUS_COMPLETE:
+            logger.info(f"{task_id_str} 数据库报告文本和状态 '{STATUS_COMPLETE}' 写入成功，ID: {assessment_id}")
+            updated_to_complete = True
+    except Exception as db_err:
+        logger.error(f"{task_id_str} 写入最终结果时数据库出错，ID {assessment_id}: {db_err}", exc_info=True)
+        final_status = STATUS_FAILED
+        error_detail = f"数据库更新时出错: {db_err}"[:150]
+
+    # *** 同步发布最终状态到 Redis (使用 "success" 或 "failed" 字符串) ***
+    if final_status == STATUS_COMPLETE:
+        publish_report_status_sync(assessment_id, "success")
+    else:
+        logger.error(f"{task_id_str} 任务处理失败，ID {assessment_id}。错误: {error_detail}")
+        publish_report_status_sync(assessment_id, "failed", error_detail)
+
+    logger.info(f"{task_id_str} 任务处理完成，ID {assessment_id}, 结果: {final_status}, 各阶段耗时: {stage_timings}")
+    logger.debug(f"{task_id_str} Redis 发布器计数: {get_publisher_stats()}，图片描述缓存: {vision_cache_stats()}")
+    if final_status == STATUS_COMPLETE:
+        return {"status": "success", "assessment_id": assessment_id, "report_length": len(report_text_to_save),
+                "db_status_updated": updated_to_complete, "stage_timings": stage_timings}
+    return {"status": "failure", "assessment_id": assessment_id, "error": error_detail, "stage_timings": stage_timings}
+
+
+def _fail_assessment(assessment_id: int, error_msg: str, task_id_str: str) -> dict:
+    """记录失败信息和失败状态，发布 failed 事件。"""
+    try:
+        run_coroutine(_finalize(assessment_id, error_msg[:2000], STATUS_FAILED))
+        logger.info(f"{task_id_str} 已将错误信息和失败状态写入数据库，ID {assessment_id}")
+    except Exception as db_err:
+        logger.error(f"{task_id_str} 写入失败状态时数据库也出错了，ID {assessment_id}: {db_err}")
+    publish_report_status_sync(assessment_id, "failed", error_msg[:150])
+    return {"status": "failure", "assessment_id": assessment_id, "error": error_msg[:150]}
+
+
+# --- Celery 任务定义 ---
+# acks_late + reject_on_worker_lost: 任务执行完才 ack；worker 被杀 (OOM、发布) 时消息回到队列重新投递，
+# 入口任务以 redelivered 重新认领自己的评估，分阶段任务按已保存的产物跳过已完成的工作
+@celery_app.task(bind=True, name='tasks.run_ai_analysis', acks_late=True, reject_on_worker_lost=True)
 def run_ai_analysis(self, assessment_id: int):
     """
-    Celery 任务：异步运行 AI 分析、更新报告文本和状态，完成后 *同步* 发布 Redis 消息。
+    Celery 入口任务：把评估标记为 processing，然后
+      - chain 模式 (默认): 派发 vision -> scoring -> report 三个分阶段任务，每个阶段的产物都会持久化，
+        重试或重新入队时从最后完成的阶段继续；
+      - inline 模式: 在本任务内并发执行阶段流水线 (同样复用/保存阶段产物)。
     """
-    # +++ 确保所有使用的状态常量都在 global 声明中 +++
-    global logger, STATUS_COMPLETE, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING
-    # +++++++++++++++++++++++++++++++++++++++++++++++
-    if logger is None:
-        print("CRITICAL ERROR: Logger 在 run_ai_analysis 任务中不可用!")
-        logging.basicConfig(level=logging.INFO)
-        logger = logging.getLogger(__name__)
-
     task_id_str = f"[Celery Task {self.request.id}]"
     logger.info(f"{task_id_str} 收到任务，评估 ID: {assessment_id}")
 
     if generate_report_content is None:
         error_msg = "核心处理函数导入失败"
         logger.error(f"{task_id_str} {error_msg}，中止任务 ID {assessment_id}。")
-        try:
-            async def update_fail_status():
-                async with AsyncSessionLocal() as session:
-                    # 使用 STATUS_FAILED 常量
-                    await crud_assessment.update_status(db=session, assessment_id=assessment_id, new_status=STATUS_FAILED)
-                    logger.info(f"{task_id_str} 已尝试将 ID {assessment_id} 状态更新为失败 (导入错误)。")
-            asyncio.run(update_fail_status())
-        except Exception as db_err:
-             logger.error(f"{task_id_str} 在更新失败状态时出错 (导入错误)，ID {assessment_id}: {db_err}")
-        publish_report_status_sync(assessment_id, "failed", error_msg) # 这里仍然用字符串 "failed" 发布
-        return {"status": "failure", "assessment_id": assessment_id, "error": error_msg}
-
-    async def _run_analysis_async():
-        nonlocal assessment_id
-        report_text_to_save = "处理失败：发生未知错误"
-        # 使用状态常量初始化
-        final_status = STATUS_FAILED
-        error_detail = None
-        updated_to_complete = False
+        return _fail_assessment(assessment_id, error_msg, task_id_str)
 
-        async with AsyncSessionLocal() as session:
-            try:
-                logger.info(f"{task_id_str} 正在异步加载评估数据 ID: {assessment_id}")
-                assessment_record = await crud_assessment.get(db=session, id=assessment_id)
-
-                if not assessment_record:
-                    logger.error(f"{task_id_str} 无法找到评估记录 ID: {assessment_id}")
-                    error_detail = f"评估记录 ID {assessment_id} 未找到"
-                    # 使用状态常量返回
-                    return {"status": STATUS_FAILED, "assessment_id": assessment_id, "error": error_detail}
-
-                # +++ 更新状态为 processing (使用常量) +++
-                if assessment_record.status == STATUS_PENDING:
-                    # 使用常量进行比较和更新
-                    logger.info(f"{task_id_str} 将评估 ID {assessment_id} 状态更新为 '{STATUS_PROCESSING}'")
-                    try:
-                        await crud_assessment.update_status(db=session, assessment_id=assessment_id, new_status=STATUS_PROCESSING)
-                    except Exception as status_update_err:
-                         logger.error(f"{task_id_str} 更新状态为 processing 时出错 (ID: {assessment_id}): {status_update_err}", exc_info=True)
-                # +++++++++++++++++++++++++++++++++++++++
-
-                submission_data = {}
-                for column in assessment_record.__table__.columns:
-                    submission_data[column.name] = getattr(assessment_record, column.name)
-
-                logger.debug(f"{task_id_str} 已加载数据，准备调用核心处理函数，ID: {assessment_id}")
-                generated_text = generate_report_content(
-                    submission_data=submission_data,
-                    config=settings.model_dump(),
-                    task_logger=logger
-                )
-
-                if generated_text is None:
-                    logger.error(f"{task_id_str} 核心处理函数返回 None，ID: {assessment_id}")
-                    report_text_to_save = "错误：报告生成意外返回空"
-                    error_detail = "报告生成返回空"
-                    final_status = STATUS_FAILED
-                elif "错误" in generated_text or "Error" in generated_text or "失败" in generated_text:
-                    logger.error(f"{task_id_str} 核心处理函数返回错误信息，ID {assessment_id}: {generated_text[:200]}...")
-                    report_text_to_save = generated_text
-                    error_detail = f"AI 处理失败: {generated_text[:150]}"
-                    final_status = STATUS_FAILED
-                else:
-                    logger.info(f"{task_id_str} 报告内容生成成功，ID: {assessment_id}")
-                    report_text_to_save = generated_text
-                    # 使用状态常量
-                    final_status = STATUS_COMPLETE
-                    error_detail = None
-
-                logger.info(f"{task_id_str} 尝试异步更新报告文本到数据库，ID: {assessment_id}")
-                report_to_save_str = str(report_text_to_save)
-                updated_record = await crud_assessment.update_report_text(
-                    db=session,
-                    assessment_id=assessment_id,
-                    report_text=report_to_save_str
-                )
-
-                if not updated_record:
-                    logger.error(f"{task_id_str} 尝试更新数据库时记录 ID {assessment_id} 未找到！")
-                    if final_status == STATUS_COMPLETE: final_status = STATUS_FAILED # 使用常量
-                    error_detail = f"数据库更新失败 (更新时 ID: {assessment_id} 未找到)"
-                else:
-                    logger.info(f"{task_id_str} 数据库报告文本更新成功，ID: {assessment_id}")
-                    # +++++++ 如果报告文本更新成功，并且预期状态是 complete，则更新状态 (使用常量) +++++++
-                    if final_status == STATUS_COMPLETE:
-                        logger.info(f"{task_id_str} 尝试异步更新评估状态为 '{STATUS_COMPLETE}'，ID: {assessment_id}")
-                        try:
-                            status_updated_record = await crud_assessment.update_status(
-                                db=session,
-                                assessment_id=assessment_id,
-                                new_status=STATUS_COMPLETE # 使用常量
-                            )
-                            if status_updated_record:
-                                logger.info(f"{task_id_str} 数据库状态更新为 '{STATUS_COMPLETE}' 成功，ID: {assessment_id}")
-                                updated_to_complete = True
-                            else:
-                                logger.error(f"{task_id_str} 更新状态为 '{STATUS_COMPLETE}' 时记录 ID {assessment_id} 未找到！")
-                                final_status = STATUS_FAILED # 使用常量
-                                error_detail = f"数据库状态更新失败 (更新时 ID: {assessment_id} 未找到)"
-                        except Exception as status_update_err:
-                            logger.error(f"{task_id_str} 更新状态为 '{STATUS_COMPLETE}' 时出错，ID {assessment_id}: {status_update_err}", exc_info=True)
-                            error_detail = f"数据库状态更新时出错: {status_update_err}"
-                    # +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+    try:
+        redelivered = bool((self.request.delivery_info or {}).get("redelivered"))
+        claimed_status = run_coroutine(_mark_processing(assessment_id, self.request.id, redelivered))
+    except Exception as db_err:
+        logger.critical(f"{task_id_str} 标记 processing 时出错，ID {assessment_id}: {db_err}", exc_info=True)
+        return _fail_assessment(assessment_id, f"任务执行错误: {type(db_err).__name__} - {db_err}", task_id_str)
+    if claimed_status is None:
+        logger.warning(f"{task_id_str} 评估 ID {assessment_id} 不存在、已完成或已被认领 (重复投递)，跳过。")
+        return {"status": "skipped", "assessment_id": assessment_id}
+    publish_report_status_sync(assessment_id, STATUS_PROCESSING, extra={"stage": "started"})
 
-            except Exception as e:
-                logger.error(f"{task_id_str} 在 _run_analysis_async 中发生意外错误，ID {assessment_id}: {e}", exc_info=True)
-                error_message = f"任务执行失败: {type(e).__name__} - {str(e)}"
-                report_text_to_save = error_message[:2000]
-                final_status = STATUS_FAILED # 使用常量
-                error_detail = error_message[:150]
-                try:
-                    logger.info(f"{task_id_str} 尝试将错误信息和失败状态写入数据库，ID {assessment_id}")
-                    await crud_assessment.update_report_text(
-                         db=session,
-                         assessment_id=assessment_id,
-                         report_text=report_text_to_save
-                     )
-                    # 使用常量更新状态
-                    await crud_assessment.update_status(
-                         db=session,
-                         assessment_id=assessment_id,
-                         new_status=STATUS_FAILED
-                     )
-                    logger.info(f"{task_id_str} 已将最终错误信息和失败状态写入数据库，ID {assessment_id}")
-                except Exception as db_err_on_fail:
-                    logger.error(f"{task_id_str} 在失败处理中写入数据库也失败了，ID {assessment_id}: {db_err_on_fail}")
-
-        # 返回最终状态 (常量)，以及其他信息
-        return {"status": final_status, "report_text": report_text_to_save, "error": error_detail, "updated_to_complete": updated_to_complete}
-
-    # --- 运行异步块并发布状态 (使用常量) ---
-    result = None
-    final_task_status = STATUS_FAILED # 使用常量
-    report_length = 0
-    error_for_publish = "任务执行期间发生未知错误"
-    publish_status_str = "failed" # 用于发布到 Redis 的状态字符串，保持 success/failed
+    if settings.ANALYSIS_PIPELINE_MODE == "chain":
+        workflow = chain(
+            analysis_vision_stage.si(assessment_id),
+            analysis_scoring_stage.si(assessment_id),
+            analysis_report_stage.si(assessment_id),
+        )
+        async_result = workflow.apply_async()
+        logger.info(f"{task_id_str} 已派发分阶段任务链，评估 ID {assessment_id}，链 ID: {async_result.id}")
+        return {"status": "dispatched", "assessment_id": assessment_id, "chain_id": async_result.id}
 
     try:
-        result = asyncio.run(_run_analysis_async())
-        final_task_status = result.get("status", STATUS_FAILED)
-        error_for_publish = result.get("error")
-
-        if final_task_status == STATUS_COMPLETE and result.get("updated_to_complete"):
-            report_length = len(result.get("report_text", ""))
-            error_for_publish = None
-            publish_status_str = "success" # Redis 发布 success
-        elif final_task_status == STATUS_COMPLETE and not result.get("updated_to_complete"):
-             logger.warning(f"{task_id_str} 任务成功完成但状态更新至DB失败，ID {assessment_id}。错误: {error_for_publish}")
-             error_for_publish = "报告已生成，但最终状态更新至数据库时出错。"
-             publish_status_str = "success" # 核心完成，仍发布 success
-        else: # 任务失败
-             logger.error(f"{task_id_str} 任务处理失败，ID {assessment_id}。错误: {error_for_publish}")
-             publish_status_str = "failed" # Redis 发布 failed
-
-        # *** 同步发布最终状态到 Redis (使用 "success" 或 "failed" 字符串) ***
-        publish_report_status_sync(assessment_id, publish_status_str, error_for_publish)
+        submission_data, artifacts = run_coroutine(_load_submission(assessment_id))
+        if submission_data is None:
+            logger.error(f"{task_id_str} 无法找到评估记录 ID: {assessment_id}")
+            return {"status": "failure", "assessment_id": assessment_id, "error": f"评估记录 ID {assessment_id} 未找到"}
 
-    except Exception as task_exec_err:
-        logger.critical(f"{task_id_str} Celery 任务执行期间发生顶层错误，ID {assessment_id}: {task_exec_err}", exc_info=True)
-        error_msg = f"任务执行错误: {type(task_exec_err).__name__} - {str(task_exec_err)}"
-        error_for_publish = error_msg[:150]
-        final_task_status = STATUS_FAILED # 使用常量
-        publish_status_str = "failed"     # Redis 发布 failed
+        precomputed = reusable_artifacts(artifacts)
+        if precomputed:
+            logger.info(f"{task_id_str} 复用已保存的阶段产物 {list(precomputed.keys())}，ID {assessment_id}")
+
+        def checkpoint(stage_name: str, value: Any):
+            # 图片描述和量表结果在各自阶段完成时立即保存，报告阶段失败后重试无需重做
+            if stage_name == "vision":
+                run_coroutine(_save_artifact(assessment_id, STAGE_VISION, vision_artifact_payload(value, None)))
+            elif stage_name == "scoring":
+                run_coroutine(_save_artifact(assessment_id, STAGE_SCORING, value))
 
+        streamer = _chunk_streamer(assessment_id)
         try:
-            from src.data_handler import DataHandler
-            sync_db_path = settings.DB_PATH_SQLITE
-            sync_handler = DataHandler(db_path=sync_db_path)
-            sync_handler.update_report_text(assessment_id, error_msg[:2000])
-            # sync_handler.update_status(assessment_id, STATUS_FAILED) # 假设有同步更新状态方法
-            logger.info(f"{task_id_str} 已尝试同步记录顶层错误到数据库，ID {assessment_id}")
-        except Exception as sync_db_err:
-            logger.error(f"{task_id_str} 同步记录顶层错误到数据库失败，ID {assessment_id}: {sync_db_err}")
+            generated_text, stage_timings = run_report_pipeline(
+                submission_data, settings.model_dump(), logger,
+                precomputed=precomputed, on_stage_complete=checkpoint,
+                on_report_chunk=streamer.feed if streamer else None
+            )
         finally:
-             publish_report_status_sync(assessment_id, publish_status_str, error_for_publish)
+            if streamer: streamer.flush() # 最终状态消息之前发出剩余片段
+        return _complete_report(assessment_id, generated_text, stage_timings, task_id_str)
+    except Exception as task_exec_err:
+        logger.critical(f"{task_id_str} Celery 任务执行期间发生顶层错误，ID {assessment_id}: {task_exec_err}", exc_info=True)
+        return _fail_assessment(assessment_id, f"任务执行错误: {type(task_exec_err).__name__} - {str(task_exec_err)}", task_id_str)
+
+
+class AnalysisStageTask(celery_app.Task):
+    """
+    分阶段任务的基类：阶段任务最终失败 (非重试、非 Ignore) 时把评估标记为失败，避免停留在 processing。
+    与入口任务一样在执行完成后才 ack，worker 被杀时消息重新投递。
+    """
+    acks_late = True
+    reject_on_worker_lost = True
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        assessment_id = args[0] if args else kwargs.get("assessment_id")
+        if assessment_id is None:
+            return
+        task_id_str = f"[Celery Task {task_id} {self.name}]"
+        logger.critical(f"{task_id_str} 分阶段任务执行失败，ID {assessment_id}: {exc}")
+        _fail_assessment(assessment_id, f"任务执行错误: {type(exc).__name__} - {str(exc)}", task_id_str)
+
 
-    # --- 返回任务结果 (使用 "success" 或 "failure" 字符串，与 Redis 发布一致) ---
-    logger.info(f"{task_id_str} 任务处理完成，ID {assessment_id}, 结果: {final_task_status}")
-    if final_task_status == STATUS_COMPLETE:
-        return {"status": "success", "assessment_id": assessment_id, "report_length": report_length, "db_status_updated": result.get("updated_to_complete", False)}
+def _load_for_stage(task, assessment_id: int, stage: str) -> Tuple[dict, Dict[str, Any], str]:
+    """分阶段任务的公共开头：加载评估数据；记录不存在时终止整个任务链。"""
+    task_id_str = f"[Celery Task {task.request.id} {stage}]"
+    submission_data, artifacts = run_coroutine(_load_submission(assessment_id))
+    if submission_data is None:
+        logger.error(f"{task_id_str} 无法找到评估记录 ID: {assessment_id}，终止任务链。")
+        raise Ignore()
+    return submission_data, artifacts, task_id_str
+
+
+@celery_app.task(bind=True, base=AnalysisStageTask, name='tasks.analysis_vision_stage', max_retries=None)
+def analysis_vision_stage(self, assessment_id: int):
+    """阶段 1：图片识别，结果保存为 vision 产物。视觉模型出错时按退避重试。"""
+    submission_data, artifacts, task_id_str = _load_for_stage(self, assessment_id, STAGE_VISION)
+    existing = artifacts.get(STAGE_VISION)
+    if isinstance(existing, dict) and existing.get("ok"):
+        logger.info(f"{task_id_str} 已有图片描述产物，跳过图片识别，ID {assessment_id}")
+        return {"stage": STAGE_VISION, "assessment_id": assessment_id, "skipped": True}
+
+    config = settings.model_dump()
+    ai_config = prepare_ai_config(config, logger)
+    if ai_config is None:
+        _fail_assessment(assessment_id, "错误：AI 服务配置不完整 (缺少 API Key)", task_id_str)
+        raise Ignore()
+
+    started = time.perf_counter()
+    image_full_path = resolve_image_path(submission_data, config, logger)
+    try:
+        description = describe_image(image_full_path, ai_config, logger, assessment_id, raise_on_error=True,
+                                     image_sha256=submission_data.get('image_sha256'))
+    except Exception as img_err:
+        if self.request.retries < settings.ANALYSIS_STAGE_MAX_RETRIES:
+            logger.warning(f"{task_id_str} 图片识别失败，第 {self.request.retries + 1} 次重试，ID {assessment_id}: {img_err}")
+            raise self.retry(exc=img_err, countdown=_retry_countdown(self.request.retries))
+        # 重试用尽：与旧流程一致，带着错误描述继续生成报告 (该产物标记为失败，下次重新入队时会重新识别)
+        description = f"图片处理错误: {img_err}"
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+    run_coroutine(_save_artifact(assessment_id, STAGE_VISION, vision_artifact_payload(description, elapsed_ms)))
+    return {"stage": STAGE_VISION, "assessment_id": assessment_id, "elapsed_ms": elapsed_ms}
+
+
+@celery_app.task(bind=True, base=AnalysisStageTask, name='tasks.analysis_scoring_stage', max_retries=None)
+def analysis_scoring_stage(self, assessment_id: int):
+    """阶段 2：量表解析与计分，结果保存为 scoring 产物。"""
+    submission_data, artifacts, task_id_str = _load_for_stage(self, assessment_id, STAGE_SCORING)
+    if isinstance(artifacts.get(STAGE_SCORING), dict):
+        logger.info(f"{task_id_str} 已有量表计分产物，跳过，ID {assessment_id}")
+        return {"stage": STAGE_SCORING, "assessment_id": assessment_id, "skipped": True}
+
+    started = time.perf_counter()
+    scoring = score_questionnaire(
+        submission_data.get('questionnaire_type'), submission_data.get('questionnaire_data'), logger, assessment_id
+    )
+    scoring["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    run_coroutine(_save_artifact(assessment_id, STAGE_SCORING, scoring))
+    return {"stage": STAGE_SCORING, "assessment_id": assessment_id, "elapsed_ms": scoring["elapsed_ms"]}
+
+
+@celery_app.task(bind=True, base=AnalysisStageTask, name='tasks.analysis_report_stage', max_retries=None)
+def analysis_report_stage(self, assessment_id: int):
+    """阶段 3：用已保存的图片描述和量表结果调用 LLM 生成报告，写入最终状态。失败重试只重做本阶段。"""
+    submission_data, artifacts, task_id_str = _load_for_stage(self, assessment_id, "report")
+    config = settings.model_dump()
+    ai_config = prepare_ai_config(config, logger)
+    if ai_config is None:
+        return _fail_assessment(assessment_id, "错误：AI 服务配置不完整 (缺少 API Key)", task_id_str)
+
+    precomputed = reusable_artifacts(artifacts)
+    vision_artifact = artifacts.get(STAGE_VISION)
+    if "vision" in precomputed:
+        description = precomputed["vision"]
+    elif isinstance(vision_artifact, dict):
+        description = vision_artifact.get("description") # 重试用尽后保存的失败描述
     else:
-        return {"status": "failure", "assessment_id": assessment_id, "error": error_for_publish}
\ No newline at end of file
+        # 单独派发了报告阶段：就地补做图片识别 (不抛出，失败时用错误描述)
+        description = describe_image(resolve_image_path(submission_data, config, logger), ai_config, logger, assessment_id,
+                                     image_sha256=submission_data.get('image_sha256'))
+    scoring = precomputed.get("scoring") or score_questionnaire(
+        submission_data.get('questionnaire_type'), submission_data.get('questionnaire_data'), logger, assessment_id
+    )
+
+    stage_timings = {
+        STAGE_VISION: vision_artifact.get("elapsed_ms") if isinstance(vision_artifact, dict) else None,
+        STAGE_SCORING: scoring.get("elapsed_ms"),
+    }
+    started = time.perf_counter()
+    streamer = _chunk_streamer(assessment_id)
+    try:
+        generated_text = write_report(
+            description, scoring, build_subject_info(submission_data),
+            submission_data.get('questionnaire_type'), ai_config, logger, assessment_id,
+            on_chunk=streamer.feed if streamer else None
+        )
+    except Exception as report_err:
+        if streamer: streamer.flush()
+        if self.request.retries < settings.ANALYSIS_STAGE_MAX_RETRIES:
+            logger.warning(f"{task_id_str} 报告生成失败，第 {self.request.retries + 1} 次重试 (复用已保存的阶段产物)，ID {assessment_id}: {report_err}")
+            raise self.retry(exc=report_err, countdown=_retry_countdown(self.request.retries))
+        logger.error(f"{task_id_str} LLM 报告生成失败 (ID {assessment_id}): {report_err}", exc_info=True)
+        generated_text = f"报告生成错误: {type(report_err).__name__} - {str(report_err)}"
+    if streamer: streamer.flush()
+    stage_timings["report"] = round((time.perf_counter() - started) * 1000, 2)
+
+    return _complete_report(assessment_id, generated_text, stage_timings, task_id_str)
@@ -0,0 +1,347 @@
+# app/tasks/async_worker.py
+"""
+asyncio 原生分析 worker。
+
+报告生成几乎完全是在等待网络 (视觉模型 + LLM)，prefork worker 每个子进程同一时间只能阻塞在一个
+OpenAI 调用上。本模块提供另一种 worker：直接消费 Celery 的 tasks.run_ai_analysis 队列
+(与 prefork worker 使用同一个 broker 和队列)，在单个进程的事件循环里用 AsyncOpenAI 并发处理
+最多 settings.ASYNC_WORKER_CONCURRENCY 个评估。
+
+- 同一进程内的所有任务共享 src/llm_clients.py 中的 AsyncOpenAI 客户端 (一个连接池)；
+- kombu 消费者运行在独立线程中，prefetch_count = 并发数，未确认的消息数即在途任务数 (天然背压)；
+- 任务完成后才 ack (与 acks_late 相同的语义)，进程异常退出时消息会被重新投递；
+- 流水线在本进程内完整执行 (不再派发分阶段任务链)，但同样读写 analysis_artifacts 阶段产物；
+- 不写 Celery result backend，结果通过数据库状态和 Redis 状态消息对外可见。
+
+启动方式见 run_async_worker.py。
+"""
+import asyncio
+import logging
+import queue
+import signal
+import socket
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from kombu import Connection, Exchange, Queue
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.redis_client import get_status_publisher, get_publisher_stats, AsyncReportChunkStreamer
+from app.crud import assessment as crud_assessment
+from app.crud import artifact as crud_artifact
+from app.db.session import build_async_engine
+from app.models.analysis_artifact import STAGE_VISION, STAGE_SCORING
+from app.models.assessment import STATUS_COMPLETE, STATUS_FAILED, STATUS_PROCESSING
+from app.models.task_outbox import ANALYSIS_TASK_NAME
+from app.tasks.analysis import classify_report_text, reusable_artifacts, vision_artifact_payload
+from src.llm_clients import aclose_llm_clients, registry_stats
+from src.ai_utils import (
+    prepare_ai_config, resolve_image_path, adescribe_image, score_questionnaire, build_subject_info, awrite_report,
+)
+
+logger = logging.getLogger(f"{settings.APP_NAME}_Worker")
+
+
+def parse_task_message(body: Any, message) -> Tuple[Optional[str], Optional[str], tuple, dict]:
+    """
+    解析 Celery 任务消息，返回 (task_name, task_id, args, kwargs)。
+    支持协议 v2 (headers 中带 task/id，body 为 [args, kwargs, embed]) 和旧的协议 v1 (body 为 dict)。
+    """
+    headers = getattr(message, "headers", None) or {}
+    if "task" in headers:
+        args, kwargs = (), {}
+        if isinstance(body, (list, tuple)) and len(body) >= 2:
+            args, kwargs = body[0] or (), body[1] or {}
+        return headers.get("task"), headers.get("id"), tuple(args), dict(kwargs)
+    if isinstance(body, dict):
+        return body.get("task"), body.get("id"), tuple(body.get("args") or ()), dict(body.get("kwargs") or {})
+    return None, None, (), {}
+
+
+class AsyncAnalysisWorker:
+    """单进程、高并发的分析 worker。run() 阻塞直到收到 SIGTERM/SIGINT 且在途任务全部完成。"""
+
+    def __init__(self, concurrency: Optional[int] = None, queue_name: Optional[str] = None):
+        self.concurrency = concurrency or settings.ASYNC_WORKER_CONCURRENCY
+        self.queue_name = queue_name or settings.CELERY_ANALYSIS_QUEUE
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.session_factory: Optional[async_sessionmaker] = None
+        # 事件循环线程完成任务后把消息放进来，由消费者线程 ack (kombu 连接不是线程安全的)
+        self._ack_queue: "queue.Queue" = queue.Queue()
+        self._stop = threading.Event()
+        self._inflight = 0
+        self._inflight_lock = threading.Lock()
+        self._producer = None # 消费者线程中创建，用于转交无法处理的消息
+        self.processed = 0
+        self.failed = 0
+
+    # --- 生命周期 ---
+    def run(self):
+        asyncio.run(self._main())
+
+    def request_stop(self, *_):
+        if not self._stop.is_set():
+            logger.info("AsyncWorker: 收到停止信号，不再接收新任务，等待在途任务完成...")
+        self._stop.set()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        engine = build_async_engine(
+            pool_size=settings.WORKER_DB_POOL_SIZE,
+            max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+            pool_recycle=settings.WORKER_DB_POOL_RECYCLE,
+            pool_pre_ping=True,
+        )
+        self.session_factory = async_sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False, autocommit=False, autoflush=False
+        )
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                self.loop.add_signal_handler(sig, self.request_stop)
+            except (NotImplementedError, RuntimeError):
+                signal.signal(sig, self.request_stop) # Windows
+
+        consumer = threading.Thread(target=self._consume, name="async-worker-consumer", daemon=True)
+        consumer.start()
+        logger.info(f"AsyncWorker: 已启动，队列 '{self.queue_name}'，并发上限 {self.concurrency}")
+        try:
+            while consumer.is_alive():
+                await asyncio.sleep(0.5)
+        finally:
+            self._stop.set()
+            await aclose_llm_clients()
+            await engine.dispose()
+            logger.info(f"AsyncWorker: 已退出。完成 {self.processed}，失败 {self.failed}，"
+                        f"Redis 发布器计数: {get_publisher_stats()}，LLM 客户端: {registry_stats()}")
+
+    # --- 消费者线程 ---
+    def _consume(self):
+        task_queue = Queue(self.queue_name, Exchange(self.queue_name), routing_key=self.queue_name)
+        with Connection(celery_app.conf.broker_url) as conn:
+            self._producer = conn.Producer()
+            consumer = conn.Consumer(task_queue, callbacks=[self._on_message], accept=["json"],
+                                     prefetch_count=self.concurrency)
+            consumer.consume()
+            try:
+                while not self._stop.is_set():
+                    self._flush_acks()
+                    try:
+                        conn.drain_events(timeout=0.5)
+                    except socket.timeout:
+                        pass
+                consumer.cancel()
+                # 停止接收新消息后继续 ack 在途任务，直到全部完成
+                while self._inflight_count() > 0 or not self._ack_queue.empty():
+                    self._flush_acks()
+                    time.sleep(0.1)
+            except Exception as e:
+                logger.critical(f"AsyncWorker: 消费者线程出错: {e}", exc_info=True)
+                self._stop.set()
+
+    def _flush_acks(self):
+        while True:
+            try:
+                message = self._ack_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                message.ack()
+            except Exception as e:
+                logger.error(f"AsyncWorker: ack 消息失败: {e}")
+
+    def _inflight_count(self) -> int:
+        with self._inflight_lock:
+            return self._inflight
+
+    def _on_message(self, body, message):
+        task_name, task_id, args, kwargs = parse_task_message(body, message)
+        if task_name != ANALYSIS_TASK_NAME:
+            # 不是本 worker 能处理的任务 (例如未配置路由的新任务)：放回本队列只会被自己再次取到 (忙循环)，
+            # 因此原样转发到只由 prefork worker 消费的维护队列
+            self._forward(message, task_name, task_id)
+            return
+        assessment_id = args[0] if args else kwargs.get("assessment_id")
+        if assessment_id is None:
+            logger.error(f"AsyncWorker: 任务 {task_id} 缺少 assessment_id 参数，丢弃。")
+            message.ack()
+            return
+
+        with self._inflight_lock:
+            self._inflight += 1
+        redelivered = bool((getattr(message, "delivery_info", None) or {}).get("redelivered"))
+        future = asyncio.run_coroutine_threadsafe(self._handle(int(assessment_id), task_id, redelivered), self.loop)
+        future.add_done_callback(lambda _f, m=message: self._job_done(m))
+
+    def _forward(self, message, task_name: Optional[str], task_id: Optional[str]):
+        target = Queue(settings.CELERY_MAINTENANCE_QUEUE, Exchange(settings.CELERY_MAINTENANCE_QUEUE),
+                       routing_key=settings.CELERY_MAINTENANCE_QUEUE)
+        try:
+            self._producer.publish(
+                message.body, exchange=target.exchange, routing_key=target.routing_key, declare=[target],
+                headers=message.headers, content_type=message.content_type, content_encoding=message.content_encoding,
+                correlation_id=message.properties.get("correlation_id"), reply_to=message.properties.get("reply_to"),
+            )
+        except Exception as e:
+            logger.error(f"AsyncWorker: 转发任务 '{task_name}' (ID {task_id}) 失败，消息保持未确认: {e}", exc_info=True)
+            return
+        logger.warning(f"AsyncWorker: 任务 '{task_name}' (ID {task_id}) 不由本 worker 处理，已转发到队列 "
+                       f"'{settings.CELERY_MAINTENANCE_QUEUE}'。")
+        message.ack()
+
+    def _job_done(self, message):
+        # 先入 ack 队列再减计数，消费者线程看到计数归零时队列里一定已有这条消息
+        self._ack_queue.put(message)
+        with self._inflight_lock:
+            self._inflight -= 1
+
+    # --- 事件循环中的任务处理 ---
+    async def _publish(self, assessment_id: int, status: str, error_msg: Optional[str] = None,
+                       extra: Optional[Dict[str, Any]] = None):
+        try:
+            await asyncio.to_thread(get_status_publisher().publish, assessment_id, status, error_msg, extra)
+        except Exception as e:
+            logger.error(f"AsyncWorker: 发布 ID {assessment_id} 的状态 '{status}' 时出错: {e}", exc_info=True)
+
+    async def _finalize(self, assessment_id: int, report_text: str, status: str) -> Optional[str]:
+        async with self.session_factory() as session:
+            return await crud_assessment.finalize_assessment(
+                db=session, assessment_id=assessment_id, report_text=report_text, status=status
+            )
+
+    async def _save_artifact(self, assessment_id: int, stage: str, payload: Any):
+        try:
+            async with self.session_factory() as session:
+                await crud_artifact.save_artifact(db=session, assessment_id=assessment_id, stage=stage, payload=payload)
+                if stage == STAGE_SCORING and isinstance(payload, dict):
+                    await crud_assessment.save_scores(db=session, assessment_id=assessment_id, scoring=payload)
+        except Exception as e:
+            logger.warning(f"AsyncWorker: 保存阶段产物 '{stage}' 失败，ID {assessment_id}: {e}")
+
+    async def _fail(self, assessment_id: int, error_msg: str, task_id_str: str):
+        self.failed += 1
+        try:
+            await self._finalize(assessment_id, error_msg[:2000], STATUS_FAILED)
+        except Exception as db_err:
+            logger.error(f"{task_id_str} 写入失败状态时数据库也出错了，ID {assessment_id}: {db_err}")
+        await self._publish(assessment_id, "failed", error_msg[:150])
+
+    async def _with_retries(self, coro_factory, what: str, task_id_str: str, assessment_id: int):
+        """按 ANALYSIS_STAGE_MAX_RETRIES / ANALYSIS_STAGE_RETRY_BACKOFF 重试一个协程 (退避期间不占用线程)。"""
+        attempt = 0
+        while True:
+            try:
+                return await coro_factory()
+            except Exception as e:
+                if attempt >= settings.ANALYSIS_STAGE_MAX_RETRIES or self._stop.is_set():
+                    raise
+                countdown = settings.ANALYSIS_STAGE_RETRY_BACKOFF * (2 ** attempt)
+                attempt += 1
+                logger.warning(f"{task_id_str} {what}失败，{countdown}s 后第 {attempt} 次重试，ID {assessment_id}: {e}")
+                await asyncio.sleep(countdown)
+
+    async def _handle(self, assessment_id: int, task_id: Optional[str], redelivered: bool = False):
+        async with self.semaphore:
+            task_id_str = f"[AsyncWorker Task {task_id}]"
+            try:
+                await self._process(assessment_id, task_id_str, task_id, redelivered)
+            except Exception as e:
+                logger.critical(f"{task_id_str} 任务执行期间发生顶层错误，ID {assessment_id}: {e}", exc_info=True)
+                await self._fail(assessment_id, f"任务执行错误: {type(e).__name__} - {str(e)}", task_id_str)
+
+    async def _process(self, assessment_id: int, task_id_str: str, task_id: Optional[str] = None,
+                       redelivered: bool = False):
+        started = time.perf_counter()
+        async with self.session_factory() as session:
+            claimed_status = await crud_assessment.mark_processing(db=session, assessment_id=assessment_id,
+                                                                   task_id=task_id, redelivered=redelivered)
+            if claimed_status is None:
+                logger.warning(f"{task_id_str} 评估 ID {assessment_id} 不存在、已完成或已被认领 (重复投递)，跳过。")
+                return
+            record = await crud_assessment.get(db=session, id=assessment_id)
+            submission_data = {column.name: getattr(record, column.name) for column in record.__table__.columns}
+            artifacts = await crud_artifact.get_artifacts(db=session, assessment_id=assessment_id)
+        await self._publish(assessment_id, STATUS_PROCESSING, extra={"stage": "started"})
+
+        config = settings.model_dump()
+        ai_config = prepare_ai_config(config, logger)
+        if ai_config is None:
+            await self._fail(assessment_id, "错误：AI 服务配置不完整 (缺少 API Key)", task_id_str)
+            return
+
+        precomputed = reusable_artifacts(artifacts)
+        stage_timings: Dict[str, Optional[float]] = {}
+
+        async def vision() -> str:
+            if "vision" in precomputed:
+                return precomputed["vision"]
+            t0 = time.perf_counter()
+            # S3 存储后端可能需要下载图片，放到线程中执行
+            image_full_path = await asyncio.to_thread(resolve_image_path, submission_data, config, logger)
+            try:
+                description = await self._with_retries(
+                    lambda: adescribe_image(image_full_path, ai_config, logger, assessment_id, raise_on_error=True,
+                                            image_sha256=submission_data.get('image_sha256')),
+                    "图片识别", task_id_str, assessment_id,
+                )
+            except Exception as img_err:
+                description = f"图片处理错误: {img_err}"
+            stage_timings[STAGE_VISION] = round((time.perf_counter() - t0) * 1000, 2)
+            await self._save_artifact(assessment_id, STAGE_VISION,
+                                      vision_artifact_payload(description, stage_timings[STAGE_VISION]))
+            return description
+
+        vision_task = asyncio.create_task(vision())
+        # 量表计分是纯 CPU 的轻量计算，在等待视觉模型时就地完成
+        scoring = precomputed.get("scoring")
+        if scoring is None:
+            t0 = time.perf_counter()
+            scoring = score_questionnaire(
+                submission_data.get('questionnaire_type'), submission_data.get('questionnaire_data'), logger, assessment_id
+            )
+            scoring["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            await self._save_artifact(assessment_id, STAGE_SCORING, scoring)
+        stage_timings[STAGE_SCORING] = scoring.get("elapsed_ms")
+        description = await vision_task
+
+        t0 = time.perf_counter()
+        streamer = AsyncReportChunkStreamer(assessment_id) if settings.REPORT_STREAMING_ENABLED else None
+
+        async def write():
+            if streamer is not None:
+                streamer.offset = 0 # 重试时新一轮生成从头开始
+            try:
+                return await awrite_report(description, scoring, build_subject_info(submission_data),
+                                           submission_data.get('questionnaire_type'), ai_config, logger, assessment_id,
+                                           on_chunk=streamer.feed if streamer else None)
+            finally:
+                if streamer is not None:
+                    await streamer.flush()
+
+        try:
+            generated_text = await self._with_retries(write, "报告生成", task_id_str, assessment_id)
+        except Exception as report_err:
+            logger.error(f"{task_id_str} LLM 报告生成失败 (ID {assessment_id}): {report_err}", exc_info=True)
+            generated_text = f"报告生成错误: {type(report_err).__name__} - {str(report_err)}"
+        stage_timings["report"] = round((time.perf_counter() - t0) * 1000, 2)
+        stage_timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+
+        report_text_to_save, final_status, error_detail = classify_report_text(generated_text)
+        written_status = await self._finalize(assessment_id, str(report_text_to_save), final_status)
+        if written_status is None:
+            logger.error(f"{task_id_str} 写入最终状态时记录 ID {assessment_id} 未找到或已不处于待处理状态！")
+            final_status = STATUS_FAILED
+            error_detail = f"数据库更新失败 (ID: {assessment_id} 未找到或状态已变更)"
+
+        if final_status == STATUS_COMPLETE:
+            self.processed += 1
+            await self._publish(assessment_id, "success")
+        else:
+            self.failed += 1
+            await self._publish(assessment_id, "failed", error_detail)
+        logger.info(f"{task_id_str} 任务处理完成，ID {assessment_id}, 结果: {final_status}, 各阶段耗时: {stage_timings}")
@@ -0,0 +1,191 @@
+# app/tasks/blob_gc.py
+"""
+图片存储 (app/core/blob_storage.py) 的维护任务：
+  - collect_unreferenced: 删除 ref_count 为 0 且超过宽限期 (BLOB_GC_GRACE_SECONDS) 未被登记/引用的图片；
+    先给 image_blobs 记录打上删除标记 (墓碑)，备份并删除存储中的文件，最后只删除仍带标记的记录；
+    删除期间被重新上传的图片 (register 清除了标记) 用备份恢复文件，新评估引用的图片不会丢失；
+  - migrate_legacy_uploads: 把平铺在 UPLOADS_DIR 中的旧图片 (只有 image_path、没有 image_sha256 的评估)
+    存入图片存储并补写 image_sha256，可选删除已迁移的旧文件。
+入口: 命令行 python run_blob_gc.py
+"""
+import contextlib
+import hashlib
+import shutil
+import logging
+import os
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import anyio
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.blob_storage import BlobBackend, content_type_for, get_blob_store, store_upload
+from app.core.config import settings
+from app.core.uploads import SavedUpload
+from app.crud import image_blob as crud_image_blob
+from app.crud.outbox import utcnow
+from app.models.assessment import Assessment
+
+logger = logging.getLogger(settings.APP_NAME)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _backup_blob(store: BlobBackend, sha256: str) -> Optional[str]:
+    """删除前把图片复制到暂存目录 (同步，在线程中执行)，返回备份路径；存储中已没有该图片时返回 None。"""
+    os.makedirs(settings.BLOB_STAGING_DIR, exist_ok=True)
+    backup_path = os.path.join(settings.BLOB_STAGING_DIR, f"gc-{sha256}-{uuid.uuid4().hex}")
+    try:
+        with contextlib.closing(store.open(sha256)) as src, open(backup_path, "wb") as out:
+            shutil.copyfileobj(src, out, settings.UPLOAD_CHUNK_SIZE)
+    except FileNotFoundError:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+        return None
+    except BaseException:
+        if os.path.exists(backup_path):
+            os.remove(backup_path)
+        raise
+    return backup_path
+
+
+async def _restore_reregistered(db: AsyncSession, store: BlobBackend, sha256s: List[str],
+                                backups: Dict[str, Optional[str]]) -> int:
+    """恢复删除期间被重新登记的图片 (用删除前的备份写回存储)，返回恢复的张数。"""
+    restored = 0
+    for sha256 in sha256s:
+        backup_path = backups.pop(sha256, None)
+        if backup_path is None:
+            if not await anyio.to_thread.run_sync(store.exists, sha256):
+                logger.error(f"图片清理: 图片 {sha256[:12]} 在删除期间被重新登记，但没有可恢复的备份，文件需人工检查。")
+            continue
+        blob = await crud_image_blob.get(db, sha256)
+        await anyio.to_thread.run_sync(store.put_file, backup_path, sha256, blob.content_type if blob else None)
+        restored += 1
+        logger.warning(f"图片清理: 图片 {sha256[:12]} 在删除期间被重新上传，已从备份恢复。")
+    return restored
+
+
+async def collect_unreferenced(session_factory: Callable[[], AsyncSession], store: Optional[BlobBackend] = None,
+                               grace_seconds: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """删除无引用的图片，返回 {"deleted", "restored", "errors", "elapsed_ms"}。"""
+    started = time.perf_counter()
+    store = store or get_blob_store()
+    grace_seconds = settings.BLOB_GC_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    seen_before = utcnow() - timedelta(seconds=grace_seconds)
+    deleted, restored, errors = 0, 0, 0
+    while True:
+        async with session_factory() as db:
+            candidates = await crud_image_blob.get_unreferenced(db, seen_before, limit=batch_size)
+            marked = await crud_image_blob.mark_deleting(db, candidates, seen_before)
+        backups: Dict[str, Optional[str]] = {}
+        removed, failed = [], 0
+        try:
+            for sha256 in marked:
+                try:
+                    backups[sha256] = await anyio.to_thread.run_sync(_backup_blob, store, sha256)
+                    await anyio.to_thread.run_sync(store.delete, sha256)
+                    removed.append(sha256)
+                except Exception as e:
+                    failed += 1
+                    logger.warning(f"图片清理: 删除存储中的图片 {sha256[:12]} 失败 (记录保留删除标记，下次清理时重试): {e}")
+            async with session_factory() as db:
+                purged = await crud_image_blob.purge_deleting(db, removed)
+                purged_set = set(purged)
+                restored += await _restore_reregistered(
+                    db, store, [sha256 for sha256 in removed if sha256 not in purged_set], backups)
+            deleted += len(purged)
+        finally:
+            for backup_path in backups.values():
+                if backup_path:
+                    with contextlib.suppress(FileNotFoundError):
+                        await anyio.to_thread.run_sync(os.remove, backup_path)
+        errors += failed
+        # 删除失败的记录仍满足无引用条件，本轮不再重复选取，留给下次清理
+        if len(candidates) < batch_size or failed:
+            break
+    stats = {"deleted": deleted, "restored": restored, "errors": errors,
+             "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)}
+    logger.info(f"图片清理完成: 删除 {deleted} 张无引用图片，恢复 {restored} 张被重新上传的图片，失败 {errors} 张，"
+                f"耗时 {stats['elapsed_ms']} ms")
+    return stats
+
+
+def _stage_copy(src_path: str) -> SavedUpload:
+    """把旧图片复制到暂存目录并计算 SHA-256 (同步，在线程中执行)。"""
+    os.makedirs(settings.BLOB_STAGING_DIR, exist_ok=True)
+    staging_path = os.path.join(settings.BLOB_STAGING_DIR, f"migrate-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(src_path, "rb") as src, open(staging_path, "wb") as out:
+            while True:
+                chunk = src.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(staging_path):
+            os.remove(staging_path)
+        raise
+    return SavedUpload(staging_path, size, digest.hexdigest())
+
+
+def _legacy_path(image_path: str) -> str:
+    return image_path if os.path.isabs(image_path) else os.path.join(settings.UPLOADS_DIR, image_path)
+
+
+async def migrate_legacy_uploads(session_factory: Callable[[], AsyncSession], store: Optional[BlobBackend] = None,
+                                 batch_size: int = DEFAULT_BATCH_SIZE, remove_legacy: bool = False) -> Dict[str, Any]:
+    """
+    迁移旧图片 (按 id 分批)，每条评估单独提交。返回 {"migrated", "missing", "removed", "elapsed_ms"}。
+    remove_legacy=True 时，旧文件不再被任何未迁移的评估引用后才删除。
+    """
+    started = time.perf_counter()
+    store = store or get_blob_store()
+    stats = {"migrated": 0, "missing": 0, "removed": 0}
+    last_id = 0
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(Assessment.id, Assessment.image_path)
+                .where(Assessment.id > last_id, Assessment.image_sha256.is_(None), Assessment.image_path.isnot(None))
+                .order_by(Assessment.id)
+                .limit(batch_size)
+            )).all()
+            for row in rows:
+                src_path = _legacy_path(row.image_path)
+                if not await anyio.to_thread.run_sync(os.path.isfile, src_path):
+                    stats["missing"] += 1
+                    continue
+                saved = await anyio.to_thread.run_sync(_stage_copy, src_path)
+                sha256 = await store_upload(db, saved, content_type_for(row.image_path), store=store)
+                result = await db.execute(
+                    update(Assessment).where(Assessment.id == row.id, Assessment.image_sha256.is_(None))
+                    .values(image_sha256=sha256)
+                )
+                if result.rowcount:
+                    await crud_image_blob.add_ref(db, sha256)
+                await db.commit()
+                stats["migrated"] += 1
+
+                if remove_legacy:
+                    still_used = (await db.execute(
+                        select(func.count(Assessment.id))
+                        .where(Assessment.image_path == row.image_path, Assessment.image_sha256.is_(None))
+                    )).scalar_one()
+                    if not still_used:
+                        await anyio.to_thread.run_sync(os.remove, src_path)
+                        stats["removed"] += 1
+        if len(rows) < batch_size:
+            break
+        last_id = rows[-1].id
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"旧图片迁移完成: 迁移 {stats['migrated']} 条，文件缺失 {stats['missing']} 条，"
+                f"删除旧文件 {stats['removed']} 个，耗时 {stats['elapsed_ms']} ms")
+    return stats
@@ -0,0 +1,122 @@
+# app/tasks/outbox_relay.py
+"""
+事务性发件箱 (task_outbox) 中继。
+
+提交评估时评估记录与一条发件箱记录在同一个事务中写入 (crud.assessment.create_with_outbox)，
+请求路径上不访问 broker。本模块把发件箱记录投递到 Celery：
+  - relay_batch: 取一批到期的待投递记录，复用一个 producer 连接批量 send_task，
+    然后在一次提交中把成功的标记为 dispatched、失败的按指数退避推迟重试；
+  - sweep_stale: 评估已投递超过 OUTBOX_STALE_AFTER 秒仍为 pending (消息丢失) 时重新排队，
+    并为发件箱上线前遗留的 pending 评估补写发件箱记录；停留在 processing 超过 OUTBOX_PROCESSING_TIMEOUT 秒
+    (worker 在认领后被杀且消息未被重新投递) 的评估先重置为 pending 再重新排队；
+  - run_relay: 常驻循环，启动方式见 run_outbox_relay.py。
+
+投递是"至少一次"：中继在 send_task 之后、提交之前退出，或清扫重新排队，都可能重复投递同一任务
+(任务 ID 不变)。run_ai_analysis 以 compare-and-set 把 pending 的评估认领为 processing 并记录任务 ID
+(crud.assessment.mark_processing)，重复消息会被跳过；只有 worker 未 ack 就退出后 broker 重新投递的同一任务
+(redelivered) 才能再次认领 processing 的评估。失败的评估可以用新的任务 ID 重新派发，从已保存的阶段产物继续。
+"""
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.crud import outbox as crud_outbox
+
+logger = logging.getLogger(settings.APP_NAME)
+
+
+def _retry_at(attempts: int):
+    delay = min(settings.OUTBOX_RETRY_BACKOFF * (2 ** max(attempts - 1, 0)), settings.OUTBOX_RETRY_MAX_DELAY)
+    return crud_outbox.utcnow() + timedelta(seconds=delay)
+
+
+def publish_rows(rows: List[Any]) -> Tuple[List[int], List[Dict[str, Any]]]:
+    """
+    (同步，在线程中执行) 用同一个 producer 连接投递一批记录。
+    返回 (成功的 id 列表, 失败记录的更新参数列表)；broker 不可用时整批记为失败。
+    """
+    dispatched: List[int] = []
+    failures: List[Dict[str, Any]] = []
+    try:
+        with celery_app.producer_or_acquire() as producer:
+            for row in rows:
+                payload = row.payload or {}
+                try:
+                    celery_app.send_task(row.task_name, args=payload.get("args") or [], kwargs=payload.get("kwargs") or {},
+                                         task_id=row.task_id, producer=producer)
+                    dispatched.append(row.id)
+                except Exception as e:
+                    failures.append({"_id": row.id, "attempts": row.attempts + 1, "last_error": str(e)[:500],
+                                     "available_at": _retry_at(row.attempts + 1)})
+    except Exception as e:
+        # 获取 broker 连接失败
+        logger.warning(f"发件箱中继: 无法连接 broker: {e}")
+        done = set(dispatched) | {f["_id"] for f in failures}
+        failures.extend({"_id": row.id, "attempts": row.attempts + 1, "last_error": str(e)[:500],
+                         "available_at": _retry_at(row.attempts + 1)} for row in rows if row.id not in done)
+    return dispatched, failures
+
+
+async def relay_batch(session_factory: Callable[[], AsyncSession], batch_size: Optional[int] = None) -> Dict[str, int]:
+    """投递一批到期的发件箱记录，返回 {"claimed", "dispatched", "failed"}。"""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    async with session_factory() as session:
+        rows = await crud_outbox.claim_batch(session, batch_size)
+        if not rows:
+            await session.rollback() # 释放只读事务
+            return {"claimed": 0, "dispatched": 0, "failed": 0}
+        started = time.perf_counter()
+        # send_task 是阻塞调用，放到线程中执行；Postgres 下行锁保持到 mark_results 提交
+        dispatched, failures = await asyncio.to_thread(publish_rows, rows)
+        await crud_outbox.mark_results(session, dispatched, failures)
+    logger.info(f"发件箱中继: 投递 {len(dispatched)}/{len(rows)} 条，失败 {len(failures)} 条，"
+                f"耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    return {"claimed": len(rows), "dispatched": len(dispatched), "failed": len(failures)}
+
+
+async def sweep_stale(session_factory: Callable[[], AsyncSession]) -> Dict[str, int]:
+    """把长期停留在 pending / processing 的评估重新排队 (见 crud.outbox.requeue_stale)。"""
+    now = crud_outbox.utcnow()
+    stale_before = now - timedelta(seconds=settings.OUTBOX_STALE_AFTER)
+    processing_before = now - timedelta(seconds=max(settings.OUTBOX_PROCESSING_TIMEOUT, settings.OUTBOX_STALE_AFTER))
+    async with session_factory() as session:
+        return await crud_outbox.requeue_stale(session, stale_before, settings.OUTBOX_MAX_ATTEMPTS,
+                                               processing_before=processing_before)
+
+
+async def run_relay(session_factory: Callable[[], AsyncSession], stop_event: Optional[asyncio.Event] = None,
+                    batch_size: Optional[int] = None, poll_interval: Optional[float] = None,
+                    sweep_interval: Optional[float] = None):
+    """
+    常驻循环：批满时立即投递下一批，否则按 poll_interval 轮询；每 sweep_interval 秒清扫一次。
+    stop_event 被设置后在当前批次完成后退出。
+    """
+    stop_event = stop_event or asyncio.Event()
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    poll_interval = poll_interval if poll_interval is not None else settings.OUTBOX_POLL_INTERVAL
+    sweep_interval = sweep_interval if sweep_interval is not None else settings.OUTBOX_SWEEP_INTERVAL
+    next_sweep = time.monotonic()
+    logger.info(f"发件箱中继已启动: batch_size={batch_size}, poll_interval={poll_interval}s, sweep_interval={sweep_interval}s")
+
+    while not stop_event.is_set():
+        claimed = 0
+        try:
+            if time.monotonic() >= next_sweep:
+                await sweep_stale(session_factory)
+                next_sweep = time.monotonic() + sweep_interval
+            claimed = (await relay_batch(session_factory, batch_size))["claimed"]
+        except Exception as e:
+            # 数据库暂时不可用等，稍后重试
+            logger.error(f"发件箱中继: 本轮处理失败: {e}", exc_info=True)
+        if claimed < batch_size:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=poll_interval)
+            except asyncio.TimeoutError:
+                pass
+    logger.info("发件箱中继已停止。")
@@ -0,0 +1,162 @@
+# app/tasks/score_backfill.py
+"""
+为已有评估记录批量回填计分结果 (analysis_data.raw_score / standard_score / score_band
+以及 assessment_dimension_scores)。
+
+按主键分批 (keyset 分页) 读取尚未计分 (scored_at 为空) 的记录，同一批内按量表分组，
+用计分引擎的矩阵计分一次算出整组得分、用 numpy 批量查解释分段，
+再以 executemany 方式批量 UPDATE / INSERT，每批提交一次。
+入口:
+  - Celery 任务 tasks.backfill_assessment_scores
+  - 命令行 python run_score_backfill.py
+"""
+import json
+import logging
+import time
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.worker_runtime import run_coroutine, get_session
+from app.models.assessment import Assessment
+from app.models.assessment_score import AssessmentDimensionScore
+from src.interpretation_rules import get_interpreter
+from src.scoring_engine import TOTAL_DIMENSION, get_scoring_engine, as_number
+
+logger = logging.getLogger(settings.APP_NAME)
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def _parse_answers(raw: Any):
+    try:
+        answers = json.loads(raw) if isinstance(raw, str) else raw
+    except (TypeError, ValueError):
+        return None
+    return answers if isinstance(answers, dict) else None
+
+
+def score_rows(scale_code: str, rows: List[Any]):
+    """
+    对同一量表的一组 (id, questionnaire_data) 计分，返回 (assessment 更新列表, 维度得分行列表)。
+    量表未登记、答案无法解析或没有任何有效作答的记录只标记 scored_at (得分和分段为空，不写维度得分)，
+    不会被当作 0 分计入统计。
+    """
+    compiled = get_scoring_engine().get(scale_code)
+    if compiled is None:
+        return [{"_id": row.id, "raw_score": None, "standard_score": None, "score_band": None} for row in rows], []
+
+    interpreter = get_interpreter(scale_code)
+    answer_sets = [_parse_answers(row.questionnaire_data) or {} for row in rows]
+    a, m = compiled.encode_batch(answer_sets)
+    scores = compiled.score_matrix(a, m)
+    answered = m.sum(axis=1).tolist() # 每份答卷的有效作答数
+    updates: List[Dict[str, Any]] = []
+    dimension_rows: List[Dict[str, Any]] = []
+
+    if compiled.dimensions == (TOTAL_DIMENSION,):
+        totals = scores[:, 0]
+        bands = interpreter.total_bands_many(totals) if interpreter is not None else [None] * len(rows)
+        for row, total, band, count in zip(rows, totals.tolist(), bands, answered):
+            if not count:
+                updates.append({"_id": row.id, "raw_score": None, "standard_score": None, "score_band": None})
+                continue
+            updates.append({
+                "_id": row.id,
+                "raw_score": as_number(total),
+                "standard_score": interpreter.standard_score(total) if interpreter is not None else None,
+                "score_band": band,
+            })
+        return updates, dimension_rows
+
+    # 多维度量表：总分列为空，各维度写入子表
+    dimension_bands = {}
+    for d, dimension in enumerate(compiled.dimensions):
+        table = interpreter.tables.get(dimension) if interpreter is not None else None
+        dimension_bands[dimension] = table.lookup_many(scores[:, d]) if table is not None else [None] * len(rows)
+    for i, row in enumerate(rows):
+        updates.append({"_id": row.id, "raw_score": None, "standard_score": None, "score_band": None})
+        if not answered[i]:
+            continue
+        for d, dimension in enumerate(compiled.dimensions):
+            dimension_rows.append({
+                "assessment_id": row.id,
+                "dimension": dimension,
+                "score": as_number(scores[i, d]),
+                "band": dimension_bands[dimension][i] or (interpreter.fallback if interpreter is not None else None),
+            })
+    return updates, dimension_rows
+
+
+async def backfill_scores(session_factory: Callable[[], AsyncSession], batch_size: int = DEFAULT_BATCH_SIZE,
+                          rescore: bool = False) -> Dict[str, Any]:
+    """
+    回填计分结果。rescore=True 时重新计算所有有量表数据的记录 (量表定义或解释规则调整后使用)，
+    否则只处理 scored_at 为空的记录。返回统计信息。
+    """
+    started = time.perf_counter()
+    stats = {"rows": 0, "batches": 0, "dimension_rows": 0, "by_scale": {}}
+    last_id = 0
+    while True:
+        async with session_factory() as session:
+            stmt = (
+                select(Assessment.id, Assessment.questionnaire_type, Assessment.questionnaire_data)
+                .where(Assessment.id > last_id)
+                .where(Assessment.questionnaire_type.is_not(None))
+                .where(Assessment.questionnaire_data.is_not(None))
+                .order_by(Assessment.id)
+                .limit(batch_size)
+            )
+            if not rescore:
+                stmt = stmt.where(Assessment.scored_at.is_(None))
+            rows = (await session.execute(stmt)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            groups: Dict[str, List[Any]] = {}
+            for row in rows:
+                groups.setdefault(row.questionnaire_type, []).append(row)
+            updates: List[Dict[str, Any]] = []
+            dimension_rows: List[Dict[str, Any]] = []
+            for scale_code, group in groups.items():
+                group_updates, group_dimensions = score_rows(scale_code, group)
+                updates.extend(group_updates)
+                dimension_rows.extend(group_dimensions)
+                stats["by_scale"][scale_code] = stats["by_scale"].get(scale_code, 0) + len(group)
+
+            try:
+                # executemany: 一条语句、每行一组参数
+                await session.execute(
+                    update(Assessment.__table__)
+                    .where(Assessment.__table__.c.id == bindparam("_id"))
+                    .values(raw_score=bindparam("raw_score"), standard_score=bindparam("standard_score"),
+                            score_band=bindparam("score_band"), scored_at=func.now()),
+                    updates,
+                )
+                await session.execute(delete(AssessmentDimensionScore)
+                                      .where(AssessmentDimensionScore.assessment_id.in_([r.id for r in rows])))
+                if dimension_rows:
+                    await session.execute(insert(AssessmentDimensionScore), dimension_rows)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+        stats["rows"] += len(rows)
+        stats["batches"] += 1
+        stats["dimension_rows"] += len(dimension_rows)
+        logger.info(f"得分回填: 第 {stats['batches']} 批完成，{len(rows)} 条 (截至 ID {last_id})，累计 {stats['rows']} 条。")
+
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    logger.info(f"得分回填结束: {stats}")
+    return stats
+
+
+@celery_app.task(name='tasks.backfill_assessment_scores')
+def backfill_assessment_scores(batch_size: int = DEFAULT_BATCH_SIZE, rescore: bool = False) -> Dict[str, Any]:
+    """Celery 任务：在 worker 常驻事件循环上运行 backfill_scores。"""
+    return run_coroutine(backfill_scores(get_session, batch_size=batch_size, rescore=rescore))
@@ -0,0 +1,40 @@
+# run_async_worker.py
+"""
+启动 asyncio 原生分析 worker (见 app/tasks/async_worker.py)。
+
+与 run_celery_worker.py 消费同一个 tasks.run_ai_analysis 队列，但在单个进程内用 AsyncOpenAI
+并发处理多个评估。用法:
+    python run_async_worker.py            # 并发数取 settings.ASYNC_WORKER_CONCURRENCY
+    python run_async_worker.py -c 64
+"""
+import argparse
+import os
+import sys
+
+# --- 1. 定位项目根目录并加入 sys.path ---
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+print(f"[Async Worker Start Script] Project Root detected: {PROJECT_ROOT}")
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+    print(f"[Async Worker Start Script] Added {PROJECT_ROOT} to sys.path")
+
+# --- 2. 导入 worker ---
+try:
+    from app.core.config import settings
+    from app.tasks.async_worker import AsyncAnalysisWorker
+    print("[Async Worker Start Script] Successfully imported AsyncAnalysisWorker")
+except ImportError as e:
+    print(f"[Async Worker Start Script] CRITICAL ERROR: Could not import async worker: {e}")
+    print("Please ensure dependencies are installed.")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio analysis worker")
+    parser.add_argument("-c", "--concurrency", type=int, default=settings.ASYNC_WORKER_CONCURRENCY,
+                        help="单进程内同时处理的评估数上限")
+    parser.add_argument("-Q", "--queue", default=settings.CELERY_ANALYSIS_QUEUE, help="消费的队列名")
+    args = parser.parse_args()
+
+    print(f"[Async Worker Start Script] Starting async worker: queue={args.queue}, concurrency={args.concurrency}")
+    AsyncAnalysisWorker(concurrency=args.concurrency, queue_name=args.queue).run()
@@ -0,0 +1,50 @@
+# run_blob_gc.py
+"""
+图片存储维护 (见 app/tasks/blob_gc.py)。
+用法:
+    python run_blob_gc.py                           # 删除超过宽限期的无引用图片
+    python run_blob_gc.py --grace-seconds 0         # 立即删除所有无引用图片
+    python run_blob_gc.py --migrate-legacy          # 先把 UPLOADS_DIR 中平铺的旧图片迁入图片存储
+    python run_blob_gc.py --migrate-legacy --remove-legacy
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# --- 1. 定位项目根目录并加入 sys.path ---
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# --- 2. 导入维护函数 ---
+try:
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.tasks.blob_gc import collect_unreferenced, migrate_legacy_uploads, DEFAULT_BATCH_SIZE
+except ImportError as e:
+    print(f"[Blob GC] CRITICAL ERROR: Could not import blob maintenance module: {e}")
+    print("Please ensure dependencies are installed.")
+    sys.exit(1)
+
+
+async def main(args):
+    try:
+        if args.migrate_legacy:
+            stats = await migrate_legacy_uploads(AsyncSessionLocal, batch_size=args.batch_size,
+                                                 remove_legacy=args.remove_legacy)
+            print(f"[Blob GC] 旧图片迁移: 迁移 {stats['migrated']} 条，文件缺失 {stats['missing']} 条，"
+                  f"删除旧文件 {stats['removed']} 个，耗时 {stats['elapsed_ms']} ms")
+        stats = await collect_unreferenced(AsyncSessionLocal, grace_seconds=args.grace_seconds, batch_size=args.batch_size)
+        print(f"[Blob GC] 清理: 删除 {stats['deleted']} 张无引用图片，恢复 {stats['restored']} 张，"
+              f"失败 {stats['errors']} 张，耗时 {stats['elapsed_ms']} ms")
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="图片存储维护：清理无引用图片 / 迁移旧图片")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批处理的记录数")
+    parser.add_argument("--grace-seconds", type=int, default=None, help="无引用图片的保留时间 (默认 BLOB_GC_GRACE_SECONDS)")
+    parser.add_argument("--migrate-legacy", action="store_true", help="把 UPLOADS_DIR 中的旧图片迁入图片存储")
+    parser.add_argument("--remove-legacy", action="store_true", help="迁移后删除不再被引用的旧文件")
+    asyncio.run(main(parser.parse_args()))
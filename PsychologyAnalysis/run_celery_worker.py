@@ -20,6 +20,7 @@ else:
 # 现在可以安全地导入了
 try:
     from app.core.celery_app import celery_app
+    from app.core.config import settings
     print("[Worker Start Script] Successfully imported celery_app")
 except ImportError as e:
     print(f"[Worker Start Script] CRITICAL ERROR: Could not import celery_app: {e}")
@@ -48,6 +49,8 @@ except Exception as e:
 worker_args = [
     'worker',             # 命令
     '--loglevel=info',    # 日志级别
+    # 同时消费入口任务队列、分阶段任务队列和维护任务队列 (见 app/core/celery_app.py 的 task_routes)
+    '-Q', f"{settings.CELERY_ANALYSIS_QUEUE},{settings.CELERY_STAGE_QUEUE},{settings.CELERY_MAINTENANCE_QUEUE}",
     # '-P', 'solo',       # 在 Windows 上需要添加这个参数
     # '-c', '4',          # (可选) 并发数 (Linux/macOS)
     # '--pool=prefork',   # (可选) 进程池类型 (Linux/macOS 默认)
@@ -0,0 +1,55 @@
+# run_outbox_relay.py
+"""
+启动事务性发件箱中继 (见 app/tasks/outbox_relay.py)，把提交评估时写入 task_outbox 的任务投递到 Celery。
+用法:
+    python run_outbox_relay.py                # 常驻运行 (Ctrl+C / SIGTERM 在当前批次完成后退出)
+    python run_outbox_relay.py --once         # 清扫一次并投递一批后退出
+    python run_outbox_relay.py --batch-size 500
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+
+# --- 1. 定位项目根目录并加入 sys.path ---
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# --- 2. 导入中继 ---
+try:
+    from app.core.config import settings
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.tasks.outbox_relay import relay_batch, run_relay, sweep_stale
+except ImportError as e:
+    print(f"[Outbox Relay] CRITICAL ERROR: Could not import outbox relay: {e}")
+    print("Please ensure dependencies are installed.")
+    sys.exit(1)
+
+
+async def main(batch_size: int, once: bool):
+    try:
+        if once:
+            swept = await sweep_stale(AsyncSessionLocal)
+            stats = await relay_batch(AsyncSessionLocal, batch_size)
+            print(f"[Outbox Relay] 清扫: {swept}，投递: {stats}")
+            return
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except NotImplementedError: # Windows
+                pass
+        await run_relay(AsyncSessionLocal, stop_event, batch_size=batch_size)
+    finally:
+        await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="事务性发件箱中继")
+    parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE, help="每批投递的记录数")
+    parser.add_argument("--once", action="store_true", help="只处理一批后退出")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.once))
@@ -0,0 +1,45 @@
+# run_score_backfill.py
+"""
+为已有评估记录回填计分结果 (见 app/tasks/score_backfill.py)。
+用法:
+    python run_score_backfill.py                 # 只处理尚未计分的记录
+    python run_score_backfill.py --rescore       # 量表定义/解释规则调整后，重新计算全部记录
+    python run_score_backfill.py --batch-size 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+# --- 1. 定位项目根目录并加入 sys.path ---
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+# --- 2. 导入回填函数 ---
+try:
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.tasks.score_backfill import backfill_scores, DEFAULT_BATCH_SIZE
+except ImportError as e:
+    print(f"[Score Backfill] CRITICAL ERROR: Could not import backfill module: {e}")
+    print("Please ensure dependencies are installed.")
+    sys.exit(1)
+
+
+async def main(batch_size: int, rescore: bool):
+    try:
+        stats = await backfill_scores(AsyncSessionLocal, batch_size=batch_size, rescore=rescore)
+    finally:
+        await async_engine.dispose()
+    print(f"[Score Backfill] 完成: {stats['rows']} 条记录，{stats['batches']} 批，"
+          f"维度得分 {stats['dimension_rows']} 行，耗时 {stats['elapsed_ms']} ms")
+    for scale_code, count in sorted(stats["by_scale"].items()):
+        print(f"  {scale_code}: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="回填评估记录的计分结果")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="每批处理 (并提交) 的记录数")
+    parser.add_argument("--rescore", action="store_true", help="重新计算已计分的记录")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.rescore))
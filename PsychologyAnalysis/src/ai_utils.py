@@ -5,6 +5,7 @@ import json
 from datetime import datetime
 import sys
 import logging
+from typing import Any, Callable, Dict, Optional, Tuple
 
 # --- 路径设置和模块导入 (保持不变) ---
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -17,18 +18,30 @@ try:
     # 修正：确认导入路径
     from src.image_processor import ImageProcessor
     from src.report_generator import ReportGenerator
+    from src.pipeline import Stage, run_stages, PipelineError
+    from src.scoring_engine import get_scoring_engine, TOTAL_DIMENSION
+    from src.interpretation_rules import get_interpreter
     print("[ai_utils] 成功相对导入 ImageProcessor 和 ReportGenerator。")
 except ImportError:
     try:
         # 移除了 from data_handler import DataHandler 的导入
         from image_processor import ImageProcessor
         from report_generator import ReportGenerator
+        from pipeline import Stage, run_stages, PipelineError
+        from scoring_engine import get_scoring_engine, TOTAL_DIMENSION
+        from interpretation_rules import get_interpreter
         print("[ai_utils] 成功直接导入 ImageProcessor 和 ReportGenerator (后备)。")
     except ImportError as e:
         print(f"[ai_utils] CRITICAL ERROR: 无法导入必要的同级模块: {e}", file=sys.stderr)
         # 如果在 Celery 任务中，这可能导致任务失败
         raise e
 
+try:
+    from app.core.blob_storage import resolve_image
+except ImportError as e:
+    resolve_image = None # 无法使用内容寻址存储时，只按旧的 image_path 在 UPLOADS_DIR 中查找
+    print(f"[ai_utils] 警告: 无法导入 app.core.blob_storage: {e}", file=sys.stderr)
+
 # --- calculate_score_and_interpret 函数 (添加 HappyTest 逻辑) ---
 def calculate_score_and_interpret(scale_type, scale_answers, task_logger=None):
     """
@@ -58,91 +71,53 @@ def calculate_score_and_interpret(scale_type, scale_answers, task_logger=None):
 
     calculated_score = 0
     try:
-        # 确保值存在且可以转换为数字
-        valid_scores = []
-        for key, value in scale_answers.items():
-            if value is not None:
-                try:
-                    # 尝试转换为浮点数，然后转整数（如果可能）
-                    score_float = float(value)
-                    # 检查是否为整数
-                    if score_float.is_integer():
-                         valid_scores.append(int(score_float))
-                    else:
-                         valid_scores.append(score_float)
-                except (ValueError, TypeError):
-                    current_logger.warning(f"无法将答案 '{key}':'{value}' 转换为数字，已忽略。")
-
-        # 如果没有任何有效分数
-        if not valid_scores:
-             current_logger.warning(f"在类型 {scale_type} 的量表答案中未找到有效的数字分数: {scale_answers}")
-             return 0, f"量表 '{scale_type}' 无有效得分项"
-
-        # 计算总分
-        calculated_score = sum(valid_scores)
-        current_logger.debug(f"计算得到的分数: {calculated_score} (来自: {valid_scores})")
+        compiled = get_scoring_engine().get(scale_type)
+        if compiled is not None and compiled.dimensions == (TOTAL_DIMENSION,):
+            # 按量表定义编译的计分矩阵计分 (反向题、未知题号等见 src/scoring_engine.py)
+            result = compiled.score(scale_answers)
+            if result.answered == 0:
+                current_logger.warning(f"在类型 {scale_type} 的量表答案中未找到有效的数字分数: {scale_answers}")
+                return 0, f"量表 '{scale_type}' 无有效得分项"
+            calculated_score = result.total
+            current_logger.debug(f"计算得到的分数: {calculated_score} (作答 {result.answered}/{result.item_count} 题)")
+        else:
+            # 未登记定义的量表：沿用逐项求和
+            valid_scores = []
+            for key, value in scale_answers.items():
+                if value is not None:
+                    try:
+                        # 尝试转换为浮点数，然后转整数（如果可能）
+                        score_float = float(value)
+                        # 检查是否为整数
+                        if score_float.is_integer():
+                             valid_scores.append(int(score_float))
+                        else:
+                             valid_scores.append(score_float)
+                    except (ValueError, TypeError):
+                        current_logger.warning(f"无法将答案 '{key}':'{value}' 转换为数字，已忽略。")
+
+            # 如果没有任何有效分数
+            if not valid_scores:
+                 current_logger.warning(f"在类型 {scale_type} 的量表答案中未找到有效的数字分数: {scale_answers}")
+                 return 0, f"量表 '{scale_type}' 无有效得分项"
+
+            # 计算总分
+            calculated_score = sum(valid_scores)
+            current_logger.debug(f"计算得到的分数: {calculated_score} (来自: {valid_scores})")
     except Exception as e:
         current_logger.error(f"从答案 {scale_answers} 计算分数时出错: {e}", exc_info=True)
         # 返回错误标记和信息
         return "计算错误", f"分数计算出错: {e}"
 
     # --- 量表解释逻辑 ---
+    # 分段阈值来自量表 JSON 的 interpretation_rules (见 src/interpretation_rules.py)
     interpretation = f"量表 '{scale_type}' 总得分: {calculated_score}."
     current_logger.info(f"开始为量表 '{scale_type}' (得分: {calculated_score}) 生成解释。")
 
     try:
-        # --- 添加或更新解释逻辑 ---
-        if scale_type == 'SAS': # Anxiety Self-Rating Scale
-            standard_score = int(calculated_score * 1.25)
-            interpretation = f"量表 '{scale_type}' 原始得分: {calculated_score}, 标准分: {standard_score}."
-            if standard_score >= 70: interpretation += " (重度焦虑水平)"
-            elif standard_score >= 60: interpretation += " (中度焦虑水平)"
-            elif standard_score >= 50: interpretation += " (轻度焦虑水平)"
-            else: interpretation += " (焦虑水平在正常范围)"
-        elif scale_type == 'SDS': # Depression Self-Rating Scale
-             standard_score = int(calculated_score * 1.25)
-             interpretation = f"量表 '{scale_type}' 原始得分: {calculated_score}, 标准分: {standard_score}."
-             if standard_score >= 73: interpretation += " (重度抑郁水平)" # 按量表文件界限
-             elif standard_score >= 63: interpretation += " (中度抑郁水平)"
-             elif standard_score >= 53: interpretation += " (轻度抑郁水平)"
-             else: interpretation += " (抑郁水平在正常范围)"
-        elif scale_type == 'ParentChild':
-            if calculated_score >= 80: interpretation += " (亲子关系非常和谐)"
-            elif calculated_score >= 60: interpretation += " (亲子关系良好)"
-            else: interpretation += " (亲子关系可能存在挑战，建议关注)"
-        elif scale_type == 'Personality':
-            if calculated_score >= 101: interpretation += " (倾向：积极热情)"
-            elif calculated_score >= 90: interpretation += " (倾向：领导人特质)"
-            elif calculated_score >= 79: interpretation += " (倾向：感性)"
-            elif calculated_score >= 60: interpretation += " (倾向：理性&淡定)"
-            elif calculated_score >= 40: interpretation += " (倾向：双重&孤寂)"
-            else: interpretation += " (倾向：现实&自我)"
-            interpretation += " (具体解释需参考原始量表得分范围)"
-        elif scale_type == 'InterpersonalRelationship':
-            if calculated_score <= 8: interpretation += " (人际关系困扰较少)"
-            elif calculated_score <= 14: interpretation += " (人际关系存在一定困扰)"
-            else: interpretation += " (人际关系困扰较严重)"
-        elif scale_type == 'EmotionalStability':
-             if calculated_score <= 20: interpretation += " (情绪稳定，自信心强)"
-             elif calculated_score <= 40: interpretation += " (情绪基本稳定，但可能较为深沉或消极)"
-             else: interpretation += " (情绪不稳定，可能需要关注)"
-        elif scale_type == 'HAMD24':
-            if calculated_score >= 36: interpretation += " (重度抑郁)"
-            elif calculated_score >= 21: interpretation += " (肯定有抑郁)"
-            elif calculated_score >= 8: interpretation += " (可能有抑郁)"
-            else: interpretation += " (无抑郁症状)"
-        elif scale_type == 'EPQ85':
-             interpretation = f"艾森克人格问卷 (EPQ-85)，总得分无直接意义，需分析 P, E, N, L 各维度得分。"
-             # 实际分析需要在 generate_report_content 中单独处理 EPQ85
-        # +++ 添加 HappyTest 的解释 +++
-        elif scale_type == 'HappyTest':
-             if calculated_score == 1:
-                  interpretation += " (初步判断：用户表示今天很开心。)"
-             elif calculated_score == 0:
-                  interpretation += " (初步判断：用户表示今天感到悲伤。)"
-             else:
-                  interpretation += " (得分异常，无法解释。)" # 处理意外得分
-        # --- HappyTest 解释结束 ---
+        interpreter = get_interpreter(scale_type)
+        if interpreter is not None:
+            interpretation = interpreter.describe_total(calculated_score)
         else:
             # 未知量表类型
             current_logger.warning(f"未找到量表类型 '{scale_type}' 的特定解释规则。")
@@ -156,39 +131,44 @@ def calculate_score_and_interpret(scale_type, scale_answers, task_logger=None):
     return calculated_score, interpretation
 
 
-# --- 重命名并重构核心函数 ---
-def generate_report_content(submission_data: dict, config: dict, task_logger: logging.Logger) -> str:
-    """
-    根据传入的评估数据和配置，生成报告文本。不再直接操作数据库。
-
-    Args:
-        submission_data (dict): 从数据库异步加载的评估数据字典.
-        config (dict): 应用程序配置字典 (来自 settings.model_dump()).
-        task_logger (logging.Logger): 用于记录日志的 logger 实例.
+# --- 报告生成流水线的各个阶段 ---
+# 这些函数彼此独立，可由 run_report_pipeline 并发调度，也可被分阶段的 Celery 任务单独调用。
 
-    Returns:
-        str: 生成的报告文本或错误信息字符串.
+def resolve_image_path(submission_data: dict, config: dict, logger: logging.Logger) -> Optional[str]:
     """
-    logger = task_logger
-    submission_id = submission_data.get("id", "未知ID")
-    logger.info(f"开始为评估 ID: {submission_id} 生成报告内容")
-
-    # --- 提取数据 ---
-    image_filename = submission_data.get('image_path') # 这是存储在 DB 中的相对路径或文件名
-    image_full_path = None
-    if image_filename:
-        # 从配置中获取上传目录
-        uploads_dir = config.get("UPLOADS_DIR")
-        if uploads_dir and os.path.isdir(uploads_dir):
-            image_full_path = os.path.join(uploads_dir, image_filename)
+    计算评估图片的本地路径 (通过 app/core/blob_storage.resolve_image，image_sha256 优先，
+    否则按 DB 中的旧文件名在 UPLOADS_DIR 中查找)。未提交图片时返回 None；
+    提交了图片但文件找不到时仍返回预期位置，由 describe_image 报告 "图片文件未找到" (该结果不会被缓存)。
+    """
+    image_sha256 = submission_data.get('image_sha256')
+    image_filename = submission_data.get('image_path') # 旧记录: 存储在 DB 中的相对路径或文件名
+    if not image_sha256 and not image_filename:
+        return None
+    # 从配置中获取上传目录
+    uploads_dir = config.get("UPLOADS_DIR")
+    if resolve_image is not None:
+        image_full_path = resolve_image(image_sha256, image_filename, uploads_dir)
+        if image_full_path:
             logger.info(f"将使用的图片文件路径: {image_full_path}")
-        elif not uploads_dir:
-            logger.warning(f"配置中未找到 UPLOADS_DIR，无法定位图片文件: {image_filename}")
-        else: # uploads_dir 存在但不是目录
-             logger.warning(f"配置的 UPLOADS_DIR '{uploads_dir}' 不是有效目录，无法定位图片文件: {image_filename}")
+            return image_full_path
+        logger.warning(f"未能在图片存储中找到评估图片 (sha256={image_sha256}, image_path={image_filename})")
+        if image_sha256:
+            return f"blob:{image_sha256}"
+    if not image_filename:
+        return None
+    if uploads_dir and os.path.isdir(uploads_dir):
+        image_full_path = os.path.join(uploads_dir, image_filename)
+        logger.info(f"将使用的图片文件路径: {image_full_path}")
+        return image_full_path
+    elif not uploads_dir:
+        logger.warning(f"配置中未找到 UPLOADS_DIR，无法定位图片文件: {image_filename}")
+    else: # uploads_dir 存在但不是目录
+        logger.warning(f"配置的 UPLOADS_DIR '{uploads_dir}' 不是有效目录，无法定位图片文件: {image_filename}")
+    return None
 
-    scale_type = submission_data.get('questionnaire_type')
-    scale_answers_json = submission_data.get('questionnaire_data')
+
+def build_subject_info(submission_data: dict) -> dict:
+    """整理报告模板所需的被测者基础信息。"""
     # 确保 basic_info 包含所有可能的键，并提供默认值
     basic_info = {
         "subject_name": submission_data.get("subject_name", '未提供'),
@@ -209,48 +189,111 @@ def generate_report_content(submission_data: dict, config: dict, task_logger: lo
     }
     # 确保 'name' 键存在，用于报告模板
     basic_info['name'] = basic_info.get('subject_name', '未知')
+    return basic_info
 
-    logger.debug(f"用于报告生成的基础信息 (ID {submission_id}): {basic_info}")
 
-    # --- 准备 AI 配置 ---
+def prepare_ai_config(config: dict, logger: logging.Logger) -> Optional[dict]:
+    """复制配置并确保包含 'api_key'；缺少 API Key 时返回 None。"""
     ai_config = config.copy()
-    # 确保 api_key 存在
     if 'api_key' not in ai_config:
         api_key_from_env = config.get('DASHSCOPE_API_KEY')
-        if api_key_from_env:
-            logger.info("复制 DASHSCOPE_API_KEY 到 'api_key' 以供 AI 处理器使用。")
-            ai_config['api_key'] = api_key_from_env
-        else:
-             logger.error(f"CRITICAL: AI 处理器的 API Key 未在配置中找到! (ID: {submission_id})")
-             # 返回错误信息，因为无法继续
-             return "错误：AI 服务配置不完整 (缺少 API Key)"
-
-    # --- 处理图片 ---
-    image_description = "未提供图片"
-    if image_full_path:
-        if os.path.exists(image_full_path):
-            logger.info(f"开始处理图片: {image_full_path}")
-            try:
-                # 使用配置初始化 ImageProcessor
-                image_processor = ImageProcessor(ai_config)
-                image_description = image_processor.process_image(image_full_path)
-                logger.info(f"图片描述生成成功 (ID {submission_id})。描述片段: {image_description[:100]}...")
-            except FileNotFoundError:
-                 logger.error(f"图片文件在处理时未找到: {image_full_path}")
-                 image_description = "图片文件未找到"
-            except Exception as img_err:
-                logger.error(f"图片处理失败 (ID {submission_id}): {img_err}", exc_info=True)
-                image_description = f"图片处理错误: {img_err}"
-        else:
-            logger.warning(f"图片路径存在但文件在处理时未找到: {image_full_path}")
-            image_description = "图片文件未找到"
-    else:
+        if not api_key_from_env:
+            return None
+        logger.info("复制 DASHSCOPE_API_KEY 到 'api_key' 以供 AI 处理器使用。")
+        ai_config['api_key'] = api_key_from_env
+    return ai_config
+
+
+# describe_image 在失败时返回的描述文本前缀；这类结果不应作为阶段产物缓存
+VISION_FAILURE_PREFIXES = ("图片文件未找到", "图片处理错误")
+
+def is_vision_failure(description: Optional[str]) -> bool:
+    return not description or description.startswith(VISION_FAILURE_PREFIXES)
+
+
+def describe_image(image_full_path: Optional[str], ai_config: dict, logger: logging.Logger, submission_id="未知ID",
+                   raise_on_error: bool = False, image_sha256: Optional[str] = None) -> str:
+    """
+    调用视觉模型描述图片。image_sha256 (图片存储中的键) 已知时直接用作图片描述缓存的键，不再重新计算。
+    默认出错时返回描述错误的文本、不抛出异常；raise_on_error=True 时视觉模型调用错误会抛出 (供可重试的阶段任务使用)。
+    """
+    if not image_full_path:
+        logger.info(f"评估 ID {submission_id} 未提供图片路径。")
+        return "未提供图片"
+    if not os.path.exists(image_full_path):
+        logger.warning(f"图片路径存在但文件在处理时未找到: {image_full_path}")
+        return "图片文件未找到"
+
+    logger.info(f"开始处理图片: {image_full_path}")
+    try:
+        # 使用配置初始化 ImageProcessor
+        image_processor = ImageProcessor(ai_config)
+        image_description = image_processor.process_image(image_full_path, image_sha256)
+        logger.info(f"图片描述生成成功 (ID {submission_id})。描述片段: {image_description[:100]}...")
+        return image_description
+    except FileNotFoundError:
+        logger.error(f"图片文件在处理时未找到: {image_full_path}")
+        return "图片文件未找到"
+    except Exception as img_err:
+        logger.error(f"图片处理失败 (ID {submission_id}): {img_err}", exc_info=True)
+        if raise_on_error:
+            raise
+        return f"图片处理错误: {img_err}"
+
+
+async def adescribe_image(image_full_path: Optional[str], ai_config: dict, logger: logging.Logger, submission_id="未知ID",
+                          async_client=None, raise_on_error: bool = False, image_sha256: Optional[str] = None) -> str:
+    """describe_image 的异步版本 (asyncio worker 使用)，错误处理语义相同。"""
+    if not image_full_path:
         logger.info(f"评估 ID {submission_id} 未提供图片路径。")
+        return "未提供图片"
+    if not os.path.exists(image_full_path):
+        logger.warning(f"图片路径存在但文件在处理时未找到: {image_full_path}")
+        return "图片文件未找到"
+
+    logger.info(f"开始处理图片 (async): {image_full_path}")
+    try:
+        image_processor = ImageProcessor(ai_config, async_client=async_client)
+        image_description = await image_processor.aprocess_image(image_full_path, image_sha256)
+        logger.info(f"图片描述生成成功 (ID {submission_id})。描述片段: {image_description[:100]}...")
+        return image_description
+    except FileNotFoundError:
+        logger.error(f"图片文件在处理时未找到: {image_full_path}")
+        return "图片文件未找到"
+    except Exception as img_err:
+        logger.error(f"图片处理失败 (ID {submission_id}): {img_err}", exc_info=True)
+        if raise_on_error:
+            raise
+        return f"图片处理错误: {img_err}"
 
-    # --- 处理量表数据 ---
+
+def _count_numeric_answers(scale_answers: dict) -> int:
+    """未登记计分定义的量表：能转换为数字的作答数 (与 calculate_score_and_interpret 的逐项求和一致)。"""
+    count = 0
+    for value in scale_answers.values():
+        try:
+            if value is not None:
+                float(value)
+                count += 1
+        except (TypeError, ValueError):
+            pass
+    return count
+
+
+def score_questionnaire(scale_type: Optional[str], scale_answers_json: Optional[str], logger: logging.Logger,
+                        submission_id="未知ID") -> dict:
+    """
+    解析量表答案并计分。
+    返回 {"answers": dict 或 None, "score": ..., "interpretation": str,
+          "raw_score", "standard_score", "band", "dimensions": {维度: {"score", "band"}}}
+    没有任何有效作答时 raw_score / standard_score / band 为 None、dimensions 为空，
+    不会被当作 0 分 (及其分段) 入库。
+    """
     scale_answers = None
     calculated_score = 0 # Default score
     scale_interpretation = "无量表数据" # Default interpretation
+    # 需要持久化到 analysis_data / assessment_dimension_scores 的计分结果 (见 crud.assessment.save_scores)
+    score_fields = {"raw_score": None, "standard_score": None, "band": None, "dimensions": {}}
 
     if scale_type and scale_answers_json:
         logger.info(f"开始处理量表数据，类型: {scale_type} (ID {submission_id})")
@@ -260,23 +303,38 @@ def generate_report_content(submission_data: dict, config: dict, task_logger: lo
 
             # 检查解析结果是否为字典
             if isinstance(scale_answers, dict):
-                 # 特殊处理 EPQ85，因为它需要计算四个维度
-                 if scale_type == 'EPQ85':
-                      # TODO: 实现 EPQ85 的计分逻辑
-                      # 这需要访问 EPQ85 的 JSON 文件来获取计分规则
-                      # 假设有一个辅助函数 `calculate_epq85_scores(scale_answers)`
-                      # 返回 {'P': score_p, 'E': score_e, 'N': score_n, 'L': score_l, 'interpretation': '...'}
-                      # epq_results = calculate_epq85_scores(scale_answers, logger)
-                      # calculated_score = epq_results # 或者只用某个主维度
-                      # scale_interpretation = epq_results['interpretation']
-                      logger.warning(f"EPQ85 量表计分逻辑尚未在此函数中完全实现 (ID: {submission_id})。")
-                      calculated_score = "N/A" # 标记为不适用总分
-                      scale_interpretation = "EPQ85 量表结果需单独分析各维度。"
+                 # 多维度量表 (如 EPQ85 的 E/N/P/L) 按 scoring_rules 分维度计分，没有单一总分
+                 compiled = get_scoring_engine().get(scale_type)
+                 if compiled is not None and compiled.dimensions != (TOTAL_DIMENSION,):
+                      result = compiled.score(scale_answers)
+                      if result.answered == 0:
+                          # 没有有效作答：不计分，维度得分不入库
+                          logger.warning(f"在类型 {scale_type} 的量表答案中未找到有效的作答 (ID {submission_id})")
+                          calculated_score = "N/A"
+                          scale_interpretation = f"量表 '{scale_type}' 无有效得分项"
+                      else:
+                          calculated_score = ", ".join(f"{d}={v}" for d, v in result.dimensions.items())
+                          scale_interpretation = (f"{compiled.name} 各维度原始分: {calculated_score} "
+                                                  f"(作答 {result.answered}/{result.item_count} 题)。")
+                          interpreter = get_interpreter(scale_type)
+                          for dimension, value in result.dimensions.items():
+                              conclusion = interpreter.band(dimension, value) if interpreter is not None else None
+                              score_fields["dimensions"][dimension] = {"score": value, "band": conclusion}
+                              if conclusion:
+                                  scale_interpretation += f" {dimension}: {conclusion}"
                  else:
                      # 对于其他量表，使用通用计分函数
                      calculated_score, scale_interpretation = calculate_score_and_interpret(
                          scale_type, scale_answers, task_logger=logger
                      )
+                     answered = (compiled.score(scale_answers).answered if compiled is not None
+                                 else _count_numeric_answers(scale_answers))
+                     if answered and isinstance(calculated_score, (int, float)):
+                         interpreter = get_interpreter(scale_type)
+                         score_fields["raw_score"] = calculated_score
+                         if interpreter is not None:
+                             score_fields["standard_score"] = interpreter.standard_score(calculated_score)
+                             score_fields["band"] = interpreter.total_band(calculated_score)
                  logger.info(f"量表处理完成: Score={calculated_score}, Interpretation='{scale_interpretation}' (ID {submission_id})")
             else:
                  # 如果 JSON 解析后不是字典
@@ -302,34 +360,129 @@ def generate_report_content(submission_data: dict, config: dict, task_logger: lo
          # 没有提供量表类型
          logger.info(f"评估 ID {submission_id} 未提供量表类型.")
 
-    # --- 调用 LLM 生成报告 ---
+    return {"answers": scale_answers, "score": calculated_score, "interpretation": scale_interpretation, **score_fields}
+
+
+def write_report(description: str, scoring: dict, basic_info: dict, scale_type: Optional[str],
+                 ai_config: dict, logger: logging.Logger, submission_id="未知ID",
+                 on_chunk: Optional[Callable[[str], None]] = None) -> str:
+    """用前面各阶段的结果调用 LLM 生成报告正文；失败时抛出异常。给出 on_chunk 时以流式方式调用并逐段回调。"""
     logger.info(f"开始调用 LLM 生成报告 (ID {submission_id})")
-    final_report_text = None
+    # 使用配置初始化 ReportGenerator
+    report_generator = ReportGenerator(ai_config)
+    final_report_text = report_generator.generate_report(
+         description=description,
+         questionnaire=scoring.get("answers"), # 传递解析后的字典或 None
+         subject_info=basic_info,
+         questionnaire_type=scale_type if scale_type else "未指定", # 提供默认值
+         score=scoring.get("score"), # 可能是数字，也可能是 "N/A" (如 EPQ)
+         scale_interpretation=scoring.get("interpretation"), # 使用上面处理后的解释
+         on_chunk=on_chunk
+     )
+    # 检查 ReportGenerator 的返回值
+    if final_report_text is None:
+         # ReportGenerator 应该返回字符串，即使是错误信息
+         logger.error(f"报告生成器意外返回了 None (ID: {submission_id})")
+         raise ValueError("报告生成器意外返回了 None") # 抛出错误以便捕获
+    logger.info(f"LLM 报告生成成功 (ID {submission_id}, 长度: {len(final_report_text)})")
+    return final_report_text
+
+
+async def awrite_report(description: str, scoring: dict, basic_info: dict, scale_type: Optional[str],
+                        ai_config: dict, logger: logging.Logger, submission_id="未知ID", async_client=None,
+                        on_chunk=None) -> str:
+    """write_report 的异步版本 (asyncio worker 使用)；失败时抛出异常。on_chunk 为可 await 的片段回调。"""
+    logger.info(f"开始调用 LLM 生成报告 (async, ID {submission_id})")
+    report_generator = ReportGenerator(ai_config, async_client=async_client)
+    final_report_text = await report_generator.agenerate_report(
+         description=description,
+         questionnaire=scoring.get("answers"),
+         subject_info=basic_info,
+         questionnaire_type=scale_type if scale_type else "未指定",
+         score=scoring.get("score"),
+         scale_interpretation=scoring.get("interpretation"),
+         on_chunk=on_chunk
+     )
+    if final_report_text is None:
+         logger.error(f"报告生成器意外返回了 None (ID: {submission_id})")
+         raise ValueError("报告生成器意外返回了 None")
+    logger.info(f"LLM 报告生成成功 (ID {submission_id}, 长度: {len(final_report_text)})")
+    return final_report_text
+
+
+def run_report_pipeline(submission_data: dict, config: dict, task_logger: logging.Logger,
+                        precomputed: Optional[Dict[str, Any]] = None,
+                        on_stage_complete: Optional[Callable[[str, Any], None]] = None,
+                        on_report_chunk: Optional[Callable[[str], None]] = None) -> Tuple[str, Dict[str, float]]:
+    """
+    以阶段 DAG 的方式生成报告文本:
+
+        vision  ──┐
+        scoring ──┼──> report
+        subject ──┘
+
+    vision / scoring / subject 三个阶段互不依赖，并发执行；report 阶段 (LLM 调用)
+    在三者全部就绪时立即开始。precomputed 可传入已完成阶段的结果以跳过这些阶段，
+    on_stage_complete(name, result) 可用于在每个阶段完成后持久化其产物；
+    on_report_chunk(delta) 给出时 report 阶段以流式方式调用 LLM。
+
+    Returns:
+        (报告文本或错误信息字符串, 各阶段耗时 (毫秒))
+    """
+    logger = task_logger
+    submission_id = submission_data.get("id", "未知ID")
+    logger.info(f"开始为评估 ID: {submission_id} 生成报告内容")
+
+    # --- 准备 AI 配置 ---
+    ai_config = prepare_ai_config(config, logger)
+    if ai_config is None:
+        logger.error(f"CRITICAL: AI 处理器的 API Key 未在配置中找到! (ID: {submission_id})")
+        # 返回错误信息，因为无法继续
+        return "错误：AI 服务配置不完整 (缺少 API Key)", {}
+
+    scale_type = submission_data.get('questionnaire_type')
+    image_full_path = resolve_image_path(submission_data, config, logger)
+
+    stages = [
+        Stage("vision", lambda: describe_image(image_full_path, ai_config, logger, submission_id,
+                                              image_sha256=submission_data.get('image_sha256'))),
+        Stage("scoring", lambda: score_questionnaire(scale_type, submission_data.get('questionnaire_data'), logger, submission_id)),
+        Stage("subject", lambda: build_subject_info(submission_data)),
+        Stage(
+            "report",
+            lambda vision, scoring, subject: write_report(vision, scoring, subject, scale_type, ai_config, logger,
+                                                          submission_id, on_chunk=on_report_chunk),
+            deps=("vision", "scoring", "subject"),
+        ),
+    ]
+
     try:
-        # 使用配置初始化 ReportGenerator
-        report_generator = ReportGenerator(ai_config)
-        final_report_text = report_generator.generate_report(
-             description=image_description,
-             questionnaire=scale_answers, # 传递解析后的字典或 None
-             subject_info=basic_info,
-             questionnaire_type=scale_type if scale_type else "未指定", # 提供默认值
-             score=calculated_score, # 可能是数字，也可能是 "N/A" (如 EPQ)
-             scale_interpretation=scale_interpretation # 使用上面处理后的解释
-         )
-        # 检查 ReportGenerator 的返回值
-        if final_report_text is None:
-             # ReportGenerator 应该返回字符串，即使是错误信息
-             logger.error(f"报告生成器意外返回了 None (ID: {submission_id})")
-             raise ValueError("报告生成器意外返回了 None") # 抛出错误以便捕获
-        logger.info(f"LLM 报告生成成功 (ID {submission_id}, 长度: {len(final_report_text)})")
-
-    except Exception as report_err:
-        logger.error(f"LLM 报告生成失败 (ID {submission_id}): {report_err}", exc_info=True)
+        result = run_stages(stages, precomputed=precomputed, logger=logger, on_stage_complete=on_stage_complete)
+        final_report_text = result["report"]
+        timings = result.timings
+    except PipelineError as pipeline_err:
+        report_err = pipeline_err.original
+        logger.error(f"LLM 报告生成失败 (ID {submission_id}, 阶段 {pipeline_err.stage}): {report_err}", exc_info=report_err)
         # 返回具体的错误信息，而不是仅仅标记失败
         final_report_text = f"报告生成错误: {type(report_err).__name__} - {str(report_err)}"
+        timings = pipeline_err.timings
 
-    # --- 返回最终文本 ---
+    logger.info(f"评估 ID {submission_id} 各阶段耗时 (ms): {timings}")
     # 注意：此函数不再负责数据库更新
-    return final_report_text
+    return final_report_text, timings
+
 
-# 移除旧的 process_data_and_generate_report_sync 函数定义（如果它还存在）
\ No newline at end of file
+def generate_report_content(submission_data: dict, config: dict, task_logger: logging.Logger) -> str:
+    """
+    根据传入的评估数据和配置，生成报告文本。不再直接操作数据库。
+
+    Args:
+        submission_data (dict): 从数据库异步加载的评估数据字典.
+        config (dict): 应用程序配置字典 (来自 settings.model_dump()).
+        task_logger (logging.Logger): 用于记录日志的 logger 实例.
+
+    Returns:
+        str: 生成的报告文本或错误信息字符串.
+    """
+    report_text, _ = run_report_pipeline(submission_data, config, task_logger)
+    return report_text
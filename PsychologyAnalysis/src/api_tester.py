@@ -16,7 +16,8 @@ class APITester:
         
         # 统一客户端配置
         self.api_key = config["api_key"]
-        self.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        # 与应用其他部分一致，可通过环境变量 LLM_BASE_URL 指向本地模拟服务 (src/mock_llm_server.py)
+        self.base_url = config.get("base_url") or os.environ.get("LLM_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.base_url,
@@ -0,0 +1,158 @@
+# 文件路径: PsychologyAnalysis/src/bench_worker_modes.py
+"""
+对比两种 worker 模式处理网络密集型 LLM 调用的吞吐和内存:
+
+  prefork: N 个子进程，每个子进程用同步 OpenAI 客户端一次处理一个任务 (对应 run_celery_worker.py 默认模式)
+  async:   单个进程，AsyncOpenAI + Semaphore(C) 并发处理 (对应 run_async_worker.py)
+
+每个任务模拟一次评估的两次调用 (图片描述 + 报告生成)。默认在进程内启动 src/mock_llm_server.py
+(--fake-latency-ms 为每次调用的固定延迟，不限制输出速率)，也可以用 --base-url 指向真实或单独运行的模拟服务。
+
+用法:
+    python src/bench_worker_modes.py --jobs 200 --processes 4 --concurrency 32 --fake-latency-ms 500
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+from openai import OpenAI, AsyncOpenAI
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.mock_llm_server import make_config, start_in_thread
+
+try:
+    import resource # 仅 Unix；Windows 上不统计内存
+except ImportError:
+    resource = None
+
+CALLS_PER_JOB = 2
+BENCH_MODEL = "bench-model"
+
+
+def fixed_latency_config(latency_ms: float):
+    """模拟服务配置：每次调用固定延迟 latency_ms，不限制输出速率，不注入错误。"""
+    return make_config(["--text-latency", f"fixed:{latency_ms}", "--vision-latency", f"fixed:{latency_ms}",
+                        "--tokens-per-second", "0"])
+
+
+def _messages(job_id: int):
+    return [{"role": "user", "content": f"bench job {job_id}"}]
+
+
+def _rss_mb() -> float:
+    """当前进程的峰值常驻内存 (MB)。Linux 上 ru_maxrss 单位是 KB，macOS 上是字节；Windows 上返回 nan。"""
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _children_rss_mb() -> float:
+    if resource is None:
+        return float("nan")
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# --- prefork 模式 ---
+def _prefork_init(base_url: str):
+    global _sync_client
+    _sync_client = OpenAI(api_key="bench", base_url=base_url)
+
+
+def _prefork_job(job_id: int) -> float:
+    started = time.perf_counter()
+    for _ in range(CALLS_PER_JOB):
+        _sync_client.chat.completions.create(model=BENCH_MODEL, messages=_messages(job_id))
+    return (time.perf_counter() - started) * 1000
+
+
+def run_prefork(base_url: str, jobs: int, processes: int):
+    started = time.perf_counter()
+    with multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn").Pool(
+            processes, initializer=_prefork_init, initargs=(base_url,)) as pool:
+        latencies = pool.map(_prefork_job, range(jobs), chunksize=1)
+    elapsed = time.perf_counter() - started
+    # 每个子进程同一时间只有一个任务在途，因此每个在途任务的内存 ≈ 一个子进程的峰值 RSS
+    return latencies, elapsed, _children_rss_mb(), processes
+
+
+# --- async 模式 ---
+async def _async_main(base_url: str, jobs: int, concurrency: int):
+    client = AsyncOpenAI(api_key="bench", base_url=base_url)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def job(job_id: int) -> float:
+        async with semaphore:
+            started = time.perf_counter()
+            for _ in range(CALLS_PER_JOB):
+                await client.chat.completions.create(model=BENCH_MODEL, messages=_messages(job_id))
+            return (time.perf_counter() - started) * 1000
+
+    try:
+        return await asyncio.gather(*(job(i) for i in range(jobs)))
+    finally:
+        await client.close()
+
+
+def _async_child(base_url: str, jobs: int, concurrency: int, conn):
+    baseline = _rss_mb()
+    started = time.perf_counter()
+    latencies = asyncio.run(_async_main(base_url, jobs, concurrency))
+    conn.send((latencies, time.perf_counter() - started, baseline, _rss_mb()))
+    conn.close()
+
+
+def run_async(base_url: str, jobs: int, concurrency: int):
+    # 在单独的子进程中运行，使 RSS 测量不受 prefork 模式和假服务的影响
+    ctx = multiprocessing.get_context("fork" if sys.platform != "win32" else "spawn")
+    parent_conn, child_conn = ctx.Pipe()
+    proc = ctx.Process(target=_async_child, args=(base_url, jobs, concurrency, child_conn))
+    proc.start()
+    latencies, elapsed, baseline_rss, peak_rss = parent_conn.recv()
+    proc.join()
+    return latencies, elapsed, peak_rss, concurrency, baseline_rss
+
+
+def _report(name: str, latencies, elapsed: float, rss_mb: float, inflight: int, jobs: int):
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"[{name}] jobs={jobs} wall={elapsed:.2f}s throughput={jobs / elapsed:.2f} jobs/s "
+          f"p50={statistics.median(ordered):.0f}ms p95={p95:.0f}ms "
+          f"peak_rss={rss_mb:.1f}MB in_flight={inflight} rss_per_in_flight_job={rss_mb / max(1, inflight):.2f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="prefork vs asyncio worker 模式基准测试")
+    parser.add_argument("--jobs", type=int, default=200, help="模拟的评估数量")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4, help="prefork 模式的子进程数")
+    parser.add_argument("--concurrency", type=int, default=32, help="async 模式的并发数")
+    parser.add_argument("--base-url", default=None, help="OpenAI 兼容服务地址；不提供时启动本地假服务")
+    parser.add_argument("--fake-latency-ms", type=float, default=500, help="本地假服务每次调用的延迟")
+    parser.add_argument("--mode", choices=["both", "prefork", "async"], default="both")
+    args = parser.parse_args()
+
+    base_url = args.base_url or start_in_thread(fixed_latency_config(args.fake_latency_ms))
+    print(f"目标服务: {base_url}，每个任务 {CALLS_PER_JOB} 次调用")
+
+    # 先跑 prefork：RUSAGE_CHILDREN 取的是所有已结束子进程的最大值，必须在 async 子进程结束前读取
+    if args.mode in ("both", "prefork"):
+        latencies, elapsed, child_rss, inflight = run_prefork(base_url, args.jobs, args.processes)
+        _report("prefork", latencies, elapsed, child_rss, 1, args.jobs)
+        print(f"[prefork] {inflight} 个子进程，每个子进程 (即每个在途任务) 峰值 RSS≈{child_rss:.1f}MB")
+    if args.mode in ("both", "async"):
+        latencies, elapsed, peak_rss, inflight, baseline_rss = run_async(base_url, args.jobs, args.concurrency)
+        _report("async", latencies, elapsed, peak_rss, inflight, args.jobs)
+        print(f"[async] 进程基线 RSS={baseline_rss:.1f}MB，每个在途任务的增量内存≈"
+              f"{(peak_rss - baseline_rss) / max(1, inflight):.3f}MB")
+
+
+if __name__ == "__main__":
+    main()
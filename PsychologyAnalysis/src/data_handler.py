@@ -2,12 +2,28 @@
 import sqlite3
 import json
 import os
+import threading
 from datetime import datetime
 
+# 本进程内已完成 schema 初始化的数据库路径 (_init_db 每个库只执行一次)
+_schema_initialised = set()
+_schema_lock = threading.Lock()
+
 class DataHandler:
-    def __init__(self, db_path="psychology_analysis.db"):
+    def __init__(self, db_path="psychology_analysis.db", init_schema=True):
         self.db_path = db_path
-        self._init_db()
+        if init_schema:
+            self.ensure_schema()
+
+    def ensure_schema(self):
+        """同一进程内每个数据库只执行一次 _init_db (供 main.py / data_entry.py 等本地脚本使用；API 进程的 schema 由 Alembic 迁移负责)。"""
+        key = os.path.abspath(self.db_path)
+        if key in _schema_initialised:
+            return
+        with _schema_lock:
+            if key not in _schema_initialised:
+                self._init_db()
+                _schema_initialised.add(key)
 
     def _init_db(self):
         """Initializes the database schema more robustly."""
@@ -35,11 +51,6 @@ class DataHandler:
             "phone_number": "TEXT",
             "domicile": "TEXT"
         }
-        # questionnaire_questions 列
-        required_columns_questions = {
-            "scale_name": "TEXT"
-        }
-
 
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
@@ -94,33 +105,7 @@ class DataHandler:
                         except sqlite3.OperationalError as e:
                             print(f"Warning: Could not add column '{col_name}': {e}")
 
-            # --- Handle questionnaire_questions Table ---
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='questionnaire_questions';")
-            q_table_exists = cursor.fetchone()
-            if not q_table_exists:
-                 print("Table 'questionnaire_questions' does not exist. Creating new table...")
-                 cursor.execute('''CREATE TABLE questionnaire_questions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    questionnaire_type TEXT NOT NULL,
-                    question_number INTEGER NOT NULL,
-                    question_text TEXT NOT NULL,
-                    options TEXT NOT NULL, -- JSON string
-                    scale_name TEXT, -- User-friendly name
-                    UNIQUE(questionnaire_type, question_number)
-                )''')
-                 print("Table 'questionnaire_questions' created successfully.")
-            else:
-                 print("Table 'questionnaire_questions' exists. Checking for missing columns...")
-                 cursor.execute("PRAGMA table_info(questionnaire_questions)")
-                 existing_q_columns = {info[1] for info in cursor.fetchall()}
-                 for col_name, col_type in required_columns_questions.items():
-                      if col_name not in existing_q_columns:
-                           try:
-                                cursor.execute(f"ALTER TABLE questionnaire_questions ADD COLUMN {col_name} {col_type}")
-                                print(f"Added column '{col_name}' to questionnaire_questions table.")
-                           except sqlite3.OperationalError as e:
-                                print(f"Warning: Could not add column '{col_name}' to questionnaire_questions: {e}")
-
+            # questionnaire_questions 表由 Alembic 迁移和 app/models/questionnaire.py 管理，这里不再创建
 
             # --- Ensure Triggers Exist ---
             # Trigger to update 'updated_at' timestamp (safe to run even if exists)
@@ -220,71 +205,7 @@ class DataHandler:
             conn.commit()
             print(f"Report text updated for submission ID: {submission_id}")
 
-    def load_questions_by_type(self, questionnaire_type_code):
-        """Loads questions based on the questionnaire type code (e.g., 'SAS')."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''SELECT question_number, question_text, options
-                            FROM questionnaire_questions
-                            WHERE questionnaire_type = ?
-                            ORDER BY question_number''', (questionnaire_type_code,))
-            results = cursor.fetchall()
-            questions = []
-            if not results:
-                 print(f"Warning: No questions found for type code '{questionnaire_type_code}'")
-                 return None # Return None or empty list based on how you want to handle this
-            for row in results:
-                try:
-                    options_list = json.loads(row[2])
-                    # Ensure options have 'text' (or 'name') and 'score' keys
-                    formatted_options = [
-                        {"text": opt.get("text", opt.get("name", "N/A")), "score": opt.get("score", 0)}
-                        for opt in options_list
-                    ]
-                    question = {
-                        "number": row[0],
-                        "text": row[1],
-                        "options": formatted_options
-                    }
-                    questions.append(question)
-                except json.JSONDecodeError:
-                    print(f"Warning: Could not decode options for question {row[0]} of type {questionnaire_type_code}")
-                except Exception as e:
-                     print(f"Error processing question {row[0]} options: {e}")
-            return questions
-
-
-    def insert_question(self, questionnaire_type, question_number, question_text, options_json_str, scale_name=None):
-        """Inserts a single question into the database."""
-        # The options should already be a JSON string here if coming from import_questions
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute('''INSERT OR REPLACE INTO questionnaire_questions
-                                (questionnaire_type, question_number, question_text, options, scale_name)
-                                VALUES (?, ?, ?, ?, ?)''', (
-                    questionnaire_type,
-                    question_number,
-                    question_text,
-                    options_json_str, # Store as JSON string
-                    scale_name if scale_name else questionnaire_type # Default scale_name to type if not provided
-                ))
-                conn.commit()
-                # print(f"Inserted/Replaced question: {questionnaire_type} - Q{question_number}")
-            except Exception as e:
-                 print(f"Error inserting question {questionnaire_type}-Q{question_number}: {e}")
-
-    def get_all_scale_types(self):
-        """Retrieves distinct scale types (code and name) from the database."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            # Use COALESCE to provide the type code if name is NULL
-            cursor.execute('''SELECT DISTINCT questionnaire_type, COALESCE(scale_name, questionnaire_type) as display_name
-                            FROM questionnaire_questions
-                            ORDER BY questionnaire_type''')
-            results = cursor.fetchall()
-            # Return as a list of dictionaries
-            return [{"code": row[0], "name": row[1]} for row in results]
+    # 量表题目的读写已迁移到异步 CRUD: app/crud/questionnaire.py
 
 
 def check_db_content(db_path="psychology_analysis.db"):
@@ -356,8 +277,6 @@ if __name__ == "__main__":
          handler = DataHandler(db_path=db_file_path)
          print("DataHandler initialized.")
          # Now check content
-         check_db_content(db_file_path)
-         print("\nAvailable scale types:")
-         print(handler.get_all_scale_types())
+         check_db_content(db_file_path) # 量表列表见其中的 questionnaire_questions 部分
      except Exception as e:
           print(f"Error during DataHandler initialization or check: {e}")
\ No newline at end of file
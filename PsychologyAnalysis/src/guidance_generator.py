@@ -1,7 +1,6 @@
 # FILE: src/guidance_generator.py (修正版)
 import logging
-from typing import Optional, Dict, Any # <--- 添加 Any 导入
-from openai import OpenAI
+from typing import Optional, Dict, Any, List, Tuple
 import os
 import sys # 添加sys导入
 
@@ -27,27 +26,24 @@ logger = logging.getLogger(settings.APP_NAME) # 使用统一的 APP_NAME
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
-# --- AI 客户端初始化 ---
+# --- AI 客户端 ---
+# 使用进程级共享客户端 (src/llm_clients.py)，连接池与其他大模型调用方共用配置
+from src.llm_clients import get_llm_client, get_async_llm_client, ROLE_GUIDANCE
+
 DASHSCOPE_API_KEY_GUIDANCE = settings.DASHSCOPE_API_KEY # 从 settings 获取
 if not DASHSCOPE_API_KEY_GUIDANCE:
     logger.error("CRITICAL: Dashscope API Key 未配置，指导方案生成功能将失败！")
 
-ai_client = None
-if DASHSCOPE_API_KEY_GUIDANCE:
+
+def _get_ai_client():
+    """返回共享的指导方案客户端；未配置 API Key 或创建失败时返回 None。"""
+    if not DASHSCOPE_API_KEY_GUIDANCE:
+        return None
     try:
-        safe_headers = {
-            "User-Agent": "MyPsychologyApp-GuidanceGenerator/1.0",
-            "Accept": "application/json",
-        }
-        ai_client = OpenAI(
-            api_key=DASHSCOPE_API_KEY_GUIDANCE,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            default_headers=safe_headers
-        )
-        logger.info("Guidance Generator AI client initialized.")
+        return get_llm_client(ROLE_GUIDANCE, api_key=DASHSCOPE_API_KEY_GUIDANCE)
     except Exception as e:
         logger.error(f"Failed to initialize OpenAI client for Guidance Generator: {e}", exc_info=True)
-        ai_client = None
+        return None
 
 # --- 指导方案 Prompt 设计 (保持不变) ---
 PROMPT_TEMPLATES: Dict[str, str] = {
@@ -84,6 +80,52 @@ PROMPT_TEMPLATES: Dict[str, str] = {
     """
 }
 
+def build_guidance_messages(report_text: str, scenario: str) -> Tuple[Optional[List[Dict[str, str]]], Optional[str]]:
+    """构造指导方案请求的 messages。返回 (messages, None)，出错时返回 (None, 错误信息字符串)。"""
+    if scenario not in PROMPT_TEMPLATES:
+        logger.error(f"Guidance Gen: 未知的指导方案场景类型: '{scenario}'")
+        return None, f"错误：未知的指导方案场景类型 '{scenario}'。"
+
+    # 格式化 Prompt
+    try:
+        prompt = PROMPT_TEMPLATES[scenario].format(report_text=report_text)
+    except KeyError as e:
+        logger.error(f"Guidance Gen: Prompt 模板格式化错误，缺少键 '{e}'。模板: {PROMPT_TEMPLATES[scenario][:100]}...")
+        return None, f"错误：内部模板格式错误，无法生成场景 '{scenario}' 的指导方案。"
+    except Exception as fmt_e:
+        logger.error(f"Guidance Gen: Prompt 格式化时发生意外错误: {fmt_e}", exc_info=True)
+        return None, f"错误：准备请求时出错，无法生成场景 '{scenario}' 的指导方案。"
+
+    messages = [
+        # 可以添加一个通用的 System Prompt
+        {"role": "system", "content": "你是一位专业的心理与策略顾问，请根据提供的报告和任务要求，生成具体、可行的建议方案。"},
+        {"role": "user", "content": prompt}
+    ]
+    return messages, None
+
+
+def _completion_kwargs(model_name: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    return {
+        "model": model_name,
+        "messages": messages,
+        "max_tokens": 1000, # 允许生成较长的方案
+        "temperature": 0.7, # 允许一定的创造性
+    }
+
+
+def _extract_guidance(completion, scenario: str) -> str:
+    # 检查是否有有效的响应内容
+    if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
+        guidance_text = completion.choices[0].message.content.strip()
+        if not guidance_text:
+            logger.warning(f"Guidance Gen: 模型返回空内容，场景: {scenario}")
+            return "AI 未能生成有效的指导方案。" # 返回提示信息
+        logger.info(f"Guidance Gen: 成功为场景 '{scenario}' 生成指导方案。")
+        return guidance_text
+    logger.error(f"Guidance Gen: 模型响应无效或内容为空，场景: {scenario}。响应对象: {completion}")
+    return "错误：AI 模型返回了无效的响应。"
+
+
 def generate_guidance(report_text: str, scenario: str, model_name: str = "qwen-plus") -> Optional[str]:
     """
     根据评估报告和场景生成指导方案。
@@ -96,54 +138,41 @@ def generate_guidance(report_text: str, scenario: str, model_name: str = "qwen-p
     Returns:
         Optional[str]: 生成的指导方案文本，或在错误时返回包含错误信息的字符串。
     """
-    global logger, ai_client # 引用全局（模块级）变量
-
     logger.info(f"Guidance Gen: 开始为场景 '{scenario}' 生成指导方案")
+    ai_client = _get_ai_client()
     if ai_client is None:
         logger.error("Guidance Gen: AI 客户端未初始化，无法生成指导方案。")
         return f"错误：AI 服务未配置，无法生成场景 '{scenario}' 的指导方案。"
 
-    if scenario not in PROMPT_TEMPLATES:
-        logger.error(f"Guidance Gen: 未知的指导方案场景类型: '{scenario}'")
-        return f"错误：未知的指导方案场景类型 '{scenario}'。"
+    messages, error = build_guidance_messages(report_text, scenario)
+    if messages is None:
+        return error
 
-    # 格式化 Prompt
     try:
-        prompt = PROMPT_TEMPLATES[scenario].format(report_text=report_text)
-    except KeyError as e:
-        logger.error(f"Guidance Gen: Prompt 模板格式化错误，缺少键 '{e}'。模板: {PROMPT_TEMPLATES[scenario][:100]}...")
-        return f"错误：内部模板格式错误，无法生成场景 '{scenario}' 的指导方案。"
-    except Exception as fmt_e:
-        logger.error(f"Guidance Gen: Prompt 格式化时发生意外错误: {fmt_e}", exc_info=True)
-        return f"错误：准备请求时出错，无法生成场景 '{scenario}' 的指导方案。"
+        logger.debug(f"Guidance Gen: 调用模型 '{model_name}'，场景: {scenario}")
+        completion = ai_client.chat.completions.create(**_completion_kwargs(model_name, messages))
+        return _extract_guidance(completion, scenario)
+    except Exception as e:
+        logger.error(f"Guidance Gen: 调用 AI 模型时出错 (场景: {scenario}): {e}", exc_info=True)
+        return f"错误：生成指导方案时发生错误 ({type(e).__name__})"
 
 
-    messages = [
-        # 可以添加一个通用的 System Prompt
-        {"role": "system", "content": "你是一位专业的心理与策略顾问，请根据提供的报告和任务要求，生成具体、可行的建议方案。"},
-        {"role": "user", "content": prompt}
-    ]
+async def agenerate_guidance(report_text: str, scenario: str, model_name: str = "qwen-plus") -> Optional[str]:
+    """generate_guidance 的异步版本 (FastAPI 路由使用，不阻塞事件循环)，返回值语义相同。"""
+    logger.info(f"Guidance Gen: 开始为场景 '{scenario}' 生成指导方案 (async)")
+    if not DASHSCOPE_API_KEY_GUIDANCE:
+        logger.error("Guidance Gen: AI 客户端未初始化，无法生成指导方案。")
+        return f"错误：AI 服务未配置，无法生成场景 '{scenario}' 的指导方案。"
 
-    try:
-        logger.debug(f"Guidance Gen: 调用模型 '{model_name}'，场景: {scenario}")
-        completion = ai_client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            max_tokens=1000, # 允许生成较长的方案
-            temperature=0.7 # 允许一定的创造性
-        )
-        # 检查是否有有效的响应内容
-        if completion.choices and completion.choices[0].message and completion.choices[0].message.content:
-            guidance_text = completion.choices[0].message.content.strip()
-            if not guidance_text:
-                logger.warning(f"Guidance Gen: 模型返回空内容，场景: {scenario}")
-                return "AI 未能生成有效的指导方案。" # 返回提示信息
-            logger.info(f"Guidance Gen: 成功为场景 '{scenario}' 生成指导方案。")
-            return guidance_text
-        else:
-            logger.error(f"Guidance Gen: 模型响应无效或内容为空，场景: {scenario}。响应对象: {completion}")
-            return "错误：AI 模型返回了无效的响应。"
+    messages, error = build_guidance_messages(report_text, scenario)
+    if messages is None:
+        return error
 
+    try:
+        ai_client = get_async_llm_client(ROLE_GUIDANCE, api_key=DASHSCOPE_API_KEY_GUIDANCE)
+        logger.debug(f"Guidance Gen: 调用模型 '{model_name}' (async)，场景: {scenario}")
+        completion = await ai_client.chat.completions.create(**_completion_kwargs(model_name, messages))
+        return _extract_guidance(completion, scenario)
     except Exception as e:
         logger.error(f"Guidance Gen: 调用 AI 模型时出错 (场景: {scenario}): {e}", exc_info=True)
-        return f"错误：生成指导方案时发生错误 ({type(e).__name__})"
\ No newline at end of file
+        return f"错误：生成指导方案时发生错误 ({type(e).__name__})"
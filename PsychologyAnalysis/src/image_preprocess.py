@@ -0,0 +1,160 @@
+# src/image_preprocess.py
+"""
+视觉模型调用前的图片预处理。
+
+- 按文件头 (magic bytes) 识别真实格式，不再一律标记为 image/jpeg；
+- 用 Pillow 按 EXIF 方向摆正后去掉全部元数据 (EXIF/GPS 等)，长边缩小到 VISION_MAX_EDGE，
+  以 VISION_JPEG_QUALITY 重新编码为 JPEG (透明背景铺白底，动图取第一帧)；
+- 生成的派生文件缓存在原图旁边 (<原文件名>.vision-<边长>-q<质量>.jpg)，原图未变化时直接复用；
+- 返回 bytes_in / bytes_out，便于观察请求体积的变化。
+
+未安装 Pillow、关闭预处理或图片无法解码时，原样返回原图字节 (使用识别出的真实 MIME 类型)。
+"""
+import io
+import logging
+import os
+import sys
+import time
+import uuid
+from typing import Optional
+
+# --- 导入 settings ---
+SRC_DIR_PREPROCESS = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_PREPROCESS = os.path.dirname(SRC_DIR_PREPROCESS) # PsychologyAnalysis/
+if PROJECT_ROOT_PREPROCESS not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_PREPROCESS)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        VISION_PREPROCESS_ENABLED = True
+        VISION_MAX_EDGE = 1280
+        VISION_JPEG_QUALITY = 85
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 image_preprocess.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+logger = logging.getLogger(settings.APP_NAME)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+    logger.warning("未安装 Pillow，图片预处理 (去除 EXIF / 缩放) 不可用，将直接上传原图。")
+
+DERIVATIVE_MARKER = ".vision-"
+
+
+def sniff_mime(data: bytes) -> Optional[str]:
+    """根据文件头识别图片格式，无法识别时返回 None。"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+
+class PreprocessedImage:
+    """预处理结果：发送给视觉模型的字节和 MIME 类型，以及处理前后的大小。"""
+
+    def __init__(self, data: bytes, mime: str, bytes_in: int, source_mime: Optional[str],
+                 derivative_path: Optional[str] = None, from_cache: bool = False, elapsed_ms: float = 0.0):
+        self.data = data
+        self.mime = mime
+        self.bytes_in = bytes_in
+        self.bytes_out = len(data)
+        self.source_mime = source_mime
+        self.derivative_path = derivative_path
+        self.from_cache = from_cache
+        self.elapsed_ms = elapsed_ms
+
+    def stats(self) -> dict:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "source_mime": self.source_mime,
+            "mime": self.mime,
+            "derivative_cached": self.from_cache,
+            "elapsed_ms": self.elapsed_ms,
+        }
+
+
+def derivative_path_for(image_path: str, max_edge: int, quality: int) -> str:
+    return f"{image_path}{DERIVATIVE_MARKER}{max_edge}-q{quality}.jpg"
+
+
+def preprocess_signature(max_edge: Optional[int] = None, quality: Optional[int] = None) -> str:
+    """决定发送给视觉模型的图片的预处理参数 (图片描述缓存键的一部分)；不做预处理时为 "original"。"""
+    if not settings.VISION_PREPROCESS_ENABLED or Image is None:
+        return "original"
+    return f"{max_edge or settings.VISION_MAX_EDGE}-q{quality or settings.VISION_JPEG_QUALITY}"
+
+
+def _normalise(data: bytes, max_edge: int, quality: int) -> bytes:
+    with Image.open(io.BytesIO(data)) as img:
+        img.seek(0) # 动图只取第一帧
+        img = ImageOps.exif_transpose(img) # 先按 EXIF 方向摆正，之后重新编码时不再写入任何元数据
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+
+
+def preprocess_image(image_path: str, max_edge: Optional[int] = None, quality: Optional[int] = None) -> PreprocessedImage:
+    """读取并规范化图片。文件读取失败时抛出 FileNotFoundError / OSError，由调用方处理。"""
+    started = time.perf_counter()
+    max_edge = max_edge or settings.VISION_MAX_EDGE
+    quality = quality or settings.VISION_JPEG_QUALITY
+    with open(image_path, "rb") as f:
+        data = f.read()
+    source_mime = sniff_mime(data)
+
+    def passthrough() -> PreprocessedImage:
+        return PreprocessedImage(data, source_mime or "image/jpeg", len(data), source_mime,
+                                 elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    if not settings.VISION_PREPROCESS_ENABLED or Image is None:
+        return passthrough()
+
+    derivative = derivative_path_for(image_path, max_edge, quality)
+    try:
+        if os.path.exists(derivative) and os.path.getmtime(derivative) >= os.path.getmtime(image_path):
+            with open(derivative, "rb") as f:
+                return PreprocessedImage(f.read(), "image/jpeg", len(data), source_mime, derivative, from_cache=True,
+                                         elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+    except OSError as e:
+        logger.warning(f"读取预处理缓存 {derivative} 失败，重新生成: {e}")
+
+    try:
+        normalised = _normalise(data, max_edge, quality)
+    except Exception as e:
+        logger.warning(f"图片预处理失败 ({os.path.basename(image_path)}, 识别格式 {source_mime})，使用原图: {e}")
+        return passthrough()
+
+    try:
+        # 先写临时文件再原子替换，避免并发任务读到写了一半的派生文件
+        tmp_path = f"{derivative}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(normalised)
+        os.replace(tmp_path, derivative)
+    except OSError as e:
+        logger.warning(f"写入预处理缓存 {derivative} 失败 (不影响本次识别): {e}")
+        derivative = None
+
+    return PreprocessedImage(normalised, "image/jpeg", len(data), source_mime, derivative,
+                             elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
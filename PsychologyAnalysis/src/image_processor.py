@@ -1,7 +1,7 @@
 # src/image_processor.py
+import asyncio
 import os
 import base64
-from openai import OpenAI
 import logging
 import sys # 添加sys导入
 
@@ -19,6 +19,7 @@ except ImportError as e:
     class MockSettings:
         DASHSCOPE_API_KEY = None
         VISION_MODEL = "qwen-vl-plus"
+        LLM_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
         APP_NAME = "FallbackApp"
     settings = MockSettings()
     print(f"警告: 无法在 image_processor.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
@@ -28,10 +29,22 @@ logger = logging.getLogger(settings.APP_NAME) # 使用统一的 APP_NAME
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+from src.llm_clients import get_llm_client, get_async_llm_client, ROLE_VISION
+from src.vision_cache import get_vision_cache, file_digest
+from src.image_preprocess import preprocess_image, preprocess_signature
+
+# 视觉 Prompt。修改任一 Prompt 时请同时递增 VISION_PROMPT_VERSION，使旧的缓存描述失效。
+VISION_PROMPT_VERSION = "1"
+VISION_SYSTEM_PROMPT = "You are a helpful assistant focused on image description."
+VISION_USER_PROMPT = "请详细描述这张图片的内容，包括物体、人物（如有）、场景氛围、颜色和构图等。"
+
 
 class ImageProcessor:
-    def __init__(self, config):
-        """Initializes ImageProcessor with configuration and explicit safe headers."""
+    def __init__(self, config, async_client=None):
+        """
+        Initializes ImageProcessor with configuration and the process-wide shared LLM client.
+        async_client: optional AsyncOpenAI client override used by aprocess_image (async worker mode).
+        """
         # 从 settings 获取 API Key 和模型名称，不再直接从 config.get() 优先
         self.api_key = settings.DASHSCOPE_API_KEY
         if not self.api_key:
@@ -39,55 +52,88 @@ class ImageProcessor:
             raise ValueError("API Key missing for ImageProcessor.")
 
         self.model = settings.VISION_MODEL # 从 settings 获取视觉模型
-        self.base_url = config.get("base_url", "https://dashscope.aliyuncs.com/compatible-mode/v1") # base_url 仍然可以从传入的 config 获取
+        self.base_url = config.get("base_url", settings.LLM_BASE_URL) # base_url 仍然可以从传入的 config 获取
 
-        # --- Explicitly set safe default headers ---
-        safe_headers = {
-            "User-Agent": "MyPsychologyApp-ImageProcessor/1.0",
-            "Accept": "application/json",
-        }
+        # 共享客户端 (连接池、keep-alive、超时、User-Agent 见 src/llm_clients.py)，不再为每次评估新建
+        self.client = get_llm_client(ROLE_VISION, api_key=self.api_key, base_url=self.base_url)
+        logger.debug(f"ImageProcessor using shared OpenAI client. Base URL: {self.base_url}.")
+        self.async_client = async_client
+        self.last_preprocess = None # 最近一次图片预处理的 bytes_in / bytes_out 等统计
 
-        try:
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                default_headers=safe_headers
-            )
-            logger.info(f"ImageProcessor OpenAI client initialized. Base URL: {self.base_url}. Using explicit safe headers.")
-        except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client in ImageProcessor: {e}", exc_info=True)
-            raise
-
-    def process_image(self, image_path):
-        """Processes an image using the configured vision model."""
+    def _read_image(self, image_path):
+        """Reads the image and normalises it for upload (real MIME type, EXIF stripped, downsized)."""
         logger.info(f"Processing image: {image_path}")
         try:
-            with open(image_path, "rb") as image_file:
-                image_base64 = base64.b64encode(image_file.read()).decode("utf-8")
+            prepared = preprocess_image(image_path)
         except FileNotFoundError:
             logger.error(f"Image file not found: {image_path}")
             raise FileNotFoundError(f"图片文件未找到: {image_path}")
         except Exception as e:
-            logger.error(f"Error reading or encoding image {image_path}: {e}", exc_info=True)
+            logger.error(f"Error reading image {image_path}: {e}", exc_info=True)
             raise Exception(f"读取或编码图片时出错: {e}") from e
+        self.last_preprocess = prepared.stats()
+        logger.info(f"Image pre-processed for {os.path.basename(image_path)}: {prepared.source_mime} -> {prepared.mime}, "
+                    f"bytes {prepared.bytes_in} -> {prepared.bytes_out}"
+                    f"{' (cached derivative)' if prepared.from_cache else ''}, {prepared.elapsed_ms}ms")
+        return prepared
 
+    def _build_messages(self, image_bytes, mime="image/jpeg"):
+        """Base64-encodes the image and builds the vision chat messages."""
+        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
         messages = [
             {
                 "role": "system",
-                "content": [{"type": "text", "text": "You are a helpful assistant focused on image description."}]
+                "content": [{"type": "text", "text": VISION_SYSTEM_PROMPT}]
             },
             {
                 "role": "user",
                 "content": [
                     {
                         "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
+                        "image_url": {"url": f"data:{mime};base64,{image_base64}"}
                     },
-                    {"type": "text", "text": "请详细描述这张图片的内容，包括物体、人物（如有）、场景氛围、颜色和构图等。"}
+                    {"type": "text", "text": VISION_USER_PROMPT}
                 ]
             }
         ]
+        return messages
+
+    def _cache_version(self):
+        """Prompt version plus preprocessing parameters; changing either invalidates cached descriptions."""
+        return f"{VISION_PROMPT_VERSION}/{preprocess_signature()}"
+
+    def _cached(self, image_path, image_sha256=None):
+        """
+        Looks up the description by the SHA-256 of the original image bytes, before any preprocessing.
+        image_sha256: the blob-store key when known; otherwise the file is hashed.
+        Returns (digest, description); digest is None when the cache is disabled.
+        """
+        cache = get_vision_cache()
+        if cache is None:
+            return None, None
+        if not image_sha256:
+            try:
+                image_sha256 = file_digest(image_path)
+            except FileNotFoundError:
+                logger.error(f"Image file not found: {image_path}")
+                raise FileNotFoundError(f"图片文件未找到: {image_path}")
+        description = cache.get(image_sha256, self.model, self._cache_version())
+        if description is not None:
+            logger.info(f"Vision cache hit for {os.path.basename(image_path)} (sha256 {image_sha256[:12]}), skipping preprocessing and vision API call.")
+        return image_sha256, description
+
+    def _store(self, digest, description):
+        cache = get_vision_cache()
+        if cache is not None and digest and description:
+            cache.put(digest, self.model, self._cache_version(), description)
 
+    def process_image(self, image_path, image_sha256=None):
+        """Processes an image using the configured vision model (cached by original image content, model, prompt version and preprocessing parameters)."""
+        digest, cached = self._cached(image_path, image_sha256)
+        if cached is not None:
+            return cached
+        prepared = self._read_image(image_path)
+        messages = self._build_messages(prepared.data, prepared.mime)
         try:
             logger.debug(f"Calling vision model '{self.model}' for image {os.path.basename(image_path)}")
             completion = self.client.chat.completions.create(
@@ -96,7 +142,32 @@ class ImageProcessor:
             )
             description = completion.choices[0].message.content
             logger.info(f"Image description received successfully for {os.path.basename(image_path)}.")
-            return description
         except Exception as e:
             logger.error(f"Error calling vision API for {os.path.basename(image_path)}: {type(e).__name__} - {e}", exc_info=True)
-            raise Exception(f"图像识别失败: {str(e)}") from e
\ No newline at end of file
+            raise Exception(f"图像识别失败: {str(e)}") from e
+        self._store(digest, description)
+        return description
+
+    async def aprocess_image(self, image_path, image_sha256=None):
+        """Async variant of process_image using an AsyncOpenAI client (for the asyncio worker)."""
+        if self.async_client is None:
+            self.async_client = get_async_llm_client(ROLE_VISION, api_key=self.api_key, base_url=self.base_url)
+        # SQLite 缓存查询和文件读取/预处理放到线程中，避免阻塞事件循环
+        digest, cached = await asyncio.to_thread(self._cached, image_path, image_sha256)
+        if cached is not None:
+            return cached
+        prepared = await asyncio.to_thread(self._read_image, image_path)
+        messages = self._build_messages(prepared.data, prepared.mime)
+        try:
+            logger.debug(f"Calling vision model '{self.model}' (async) for image {os.path.basename(image_path)}")
+            completion = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+            )
+            description = completion.choices[0].message.content
+            logger.info(f"Image description received successfully for {os.path.basename(image_path)}.")
+        except Exception as e:
+            logger.error(f"Error calling vision API for {os.path.basename(image_path)}: {type(e).__name__} - {e}", exc_info=True)
+            raise Exception(f"图像识别失败: {str(e)}") from e
+        await asyncio.to_thread(self._store, digest, description)
+        return description
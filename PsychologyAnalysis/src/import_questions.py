@@ -1,179 +1,175 @@
 # 文件路径: src/import_questions.py
-import os
+"""
+把 input/questionnaires/*.json 中的量表题目导入 questionnaire_questions 表。
+
+通过异步 CRUD (app/crud/questionnaire.py) 写入 settings.DATABASE_URL 指向的数据库
+(本地 SQLite 或 docker-compose 中的 Postgres)：
+  1. 先读取并校验全部 JSON 文件，任何文件有错误时默认不写数据库；
+  2. 每个量表与库中现有题目做差异比较，在一个事务中用批量语句只写入新增/变化/删除的题目。
+用法 (在 PsychologyAnalysis 目录下): python src/import_questions.py [--skip-invalid]
+"""
+import argparse
+import asyncio
 import json
-import sqlite3
-# Correct import assuming data_handler.py is in the same directory (src)
-try:
-    from data_handler import DataHandler
-except ImportError:
-    print("Error: data_handler.py not found in the same directory.")
-    # Fallback for running directly from PsychologyAnalysis root
-    try:
-        # 修正：从 src 包导入
-        from src.data_handler import DataHandler
-    except ImportError:
-         print("Error: Could not import DataHandler. Make sure you run this script correctly.")
-         exit(1)
-
+import os
+import sys
+import time
 
-def import_questions_from_json():
-    """Loads scale questions from JSON files in input/questionnaires/ into the SQLite DB."""
-    # 获取项目根目录（假设此脚本在 src 下，根目录是上一级）
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    db_path = os.path.join(project_root, "psychology_analysis.db") # 数据库文件在根目录
-    handler = DataHandler(db_path=db_path)
-    questionnaire_dir = os.path.join(project_root, "input", "questionnaires") # 问卷目录
+# --- 路径设置：保证从 src 目录或项目根目录运行时都能导入 app 包 ---
+SRC_DIR_IMPORT = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_IMPORT = os.path.dirname(SRC_DIR_IMPORT) # PsychologyAnalysis/
+if PROJECT_ROOT_IMPORT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_IMPORT)
 
+try:
+    from app.crud import questionnaire as crud_questionnaire
+    from app.db.session import AsyncSessionLocal, async_engine
+    from app.core.scale_catalog import publish_catalog_invalidation
+    from src.scale_definitions import QUESTIONNAIRE_DIR, resolve_scale_info, option_score
+except ImportError as e:
+    print(f"Error: Could not import app modules: {e}. Make sure dependencies are installed.")
+    sys.exit(1)
+
+
+class ValidationError(Exception):
+    """量表 JSON 校验失败。"""
+
+
+def build_question_rows(json_file, questions_in_file):
+    """
+    把 JSON 中的题目校验并转换为 sync_scale_questions 需要的行。
+    题号缺失/非整数/重复、题干为空、options 不是列表时抛出 ValidationError (列出全部问题)。
+    """
+    rows = []
+    problems = []
+    seen_numbers = set()
+    for index, question in enumerate(questions_in_file):
+        label = f"question #{index + 1}"
+        if not isinstance(question, dict):
+            problems.append(f"{label}: not an object")
+            continue
+        try:
+            q_num = int(question["number"])
+        except KeyError:
+            problems.append(f"{label}: missing key 'number'")
+            continue
+        except (TypeError, ValueError):
+            problems.append(f"{label}: invalid number {question.get('number')!r}")
+            continue
+        if q_num in seen_numbers:
+            problems.append(f"Q{q_num}: duplicate question number")
+            continue
+        seen_numbers.add(q_num)
+        q_text = question.get("text")
+        if not isinstance(q_text, str) or not q_text.strip():
+            problems.append(f"Q{q_num}: missing or empty 'text'")
+            continue
+        raw_options = question.get("options", [])
+        if not isinstance(raw_options, list):
+            problems.append(f"Q{q_num}: 'options' is not a list")
+            continue
+
+        # 是/否题 (如 EPQ85) 的选项只有 value，按 yes=1 / no=0 换算为 score，并保留 value
+        options_list = []
+        for opt in raw_options:
+            if not isinstance(opt, dict): # Ensure each option is a dictionary
+                continue
+            option = {"text": opt.get("text", "N/A"), "score": option_score(opt)}
+            if "value" in opt:
+                option["value"] = opt["value"]
+            options_list.append(option)
+        rows.append({
+            "question_number": q_num,
+            "question_text": q_text,
+            "options": json.dumps(options_list, ensure_ascii=False),
+        })
+    if not rows and not problems:
+        problems.append("no 'questions' array found")
+    if problems:
+        raise ValidationError(f"{json_file}: " + "; ".join(problems))
+    return rows
+
+
+def load_scale_files(questionnaire_dir):
+    """
+    第一阶段：读取并校验目录下全部 JSON，不访问数据库。
+    返回 (scales, errors)；scales 为 [{"file", "code", "name", "rows"}]，同一量表代码出现在多个文件中也视为错误。
+    """
+    scales, errors = [], []
+    codes = {}
+    for json_file in sorted(f for f in os.listdir(questionnaire_dir) if f.endswith('.json')):
+        try:
+            with open(os.path.join(questionnaire_dir, json_file), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValidationError(f"{json_file}: root element is not an object")
+            # 文件名/标题 -> 量表代码的映射统一在 src/scale_definitions.py 中维护
+            scale_info = resolve_scale_info(json_file, data)
+            if scale_info["code"] in codes:
+                raise ValidationError(f"{json_file}: scale code '{scale_info['code']}' already defined in {codes[scale_info['code']]}")
+            codes[scale_info["code"]] = json_file
+            rows = build_question_rows(json_file, data.get("questions", []))
+            scales.append({"file": json_file, "code": scale_info["code"], "name": scale_info["name"], "rows": rows})
+        except (OSError, json.JSONDecodeError) as e:
+            errors.append(f"{json_file}: {e}")
+        except ValidationError as e:
+            errors.append(str(e))
+    return scales, errors
+
+
+async def import_questions_from_json(questionnaire_dir=QUESTIONNAIRE_DIR, skip_invalid=False):
+    """
+    Loads scale questions from JSON files in input/questionnaires/ into the database.
+    先校验全部文件 (有错误时默认整批放弃，不写数据库)，再逐个量表在单个事务中做差异同步。
+    返回统计信息。
+    """
+    started = time.perf_counter()
     print(f"Scanning for JSON questionnaires in: {questionnaire_dir}")
-
-    # 确保目录存在
     if not os.path.isdir(questionnaire_dir):
         print(f"Error: Questionnaire directory not found: {questionnaire_dir}")
-        return
-
-    json_files = [f for f in os.listdir(questionnaire_dir) if f.endswith('.json')]
-    if not json_files:
-        print(f"No .json files found in {questionnaire_dir}")
-        return
-
-    imported_count = 0
-    error_count = 0
-
-    # --- 更新映射 ---
-    # Define mapping from filename (or title) to scale type code and name
-    # Prioritize title if available, otherwise use filename mapping
-    scale_mapping = {
-        "1测你性格最真实的一面.json": {"code": "Personality", "name": "测你性格最真实的一面"},
-        "2亲子关系问卷量表.json": {"code": "ParentChild", "name": "亲子关系问卷量表"},
-        "3焦虑症自评量表 (SAS).json": {"code": "SAS", "name": "焦虑症自评量表 (SAS)"},
-        "4标准量表：抑郁症自测量表 (SDS).json": {"code": "SDS", "name": "抑郁症自测量表 (SDS)"},
-        "5人际关系综合诊断量表.json": {"code": "InterpersonalRelationship", "name": "人际关系综合诊断量表"},
-        "6情绪稳定性测验量表.json": {"code": "EmotionalStability", "name": "情绪稳定性测验量表"},
-        "7汉密尔顿抑郁量表HAMD24.json": {"code": "HAMD24", "name": "汉密尔顿抑郁量表 (HAMD-24)"},
-        "8艾森克人格问卷EPQ85成人版.json": {"code": "EPQ85", "name": "艾森克人格问卷 (EPQ-85成人版)"},
-        # +++ 添加新量表的映射 +++
-        "9开心测试.json": {"code": "HappyTest", "name": "开心测试"},
-        # Add more mappings as needed
-    }
-    # 也可以基于 title 映射，如果 JSON 文件中有 title 字段
-    title_mapping = {
-        "测你性格最真实的一面": {"code": "Personality", "name": "测你性格最真实的一面"},
-        "亲子关系问卷量表": {"code": "ParentChild", "name": "亲子关系问卷量表"},
-        "焦虑症自评量表 (SAS)": {"code": "SAS", "name": "焦虑症自评量表 (SAS)"},
-        "标准量表：抑郁症自测量表 (SDS)": {"code": "SDS", "name": "抑郁症自测量表 (SDS)"},
-        "人际关系综合诊断量表": {"code": "InterpersonalRelationship", "name": "人际关系综合诊断量表"},
-        "情绪稳定性测验量表": {"code": "EmotionalStability", "name": "情绪稳定性测验量表"},
-        "汉密尔顿抑郁量表HAMD24": {"code": "HAMD24", "name": "汉密尔顿抑郁量表 (HAMD-24)"}, # 移除 .json
-        "艾森克人格问卷EPQ85成人版": {"code": "EPQ85", "name": "艾森克人格问卷 (EPQ-85成人版)"}, # 移除 .json
-        # +++ 添加新量表的 title 映射 +++
-        "开心测试": {"code": "HappyTest", "name": "开心测试"},
-    }
-    # --- 映射结束 ---
-
-
-    for json_file in json_files:
-        file_path = os.path.join(questionnaire_dir, json_file)
-        print(f"\nProcessing file: {json_file}")
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+        return None
+
+    scales, errors = load_scale_files(questionnaire_dir)
+    validate_ms = (time.perf_counter() - started) * 1000
+    print(f"Validated {len(scales)} scale file(s), {sum(len(s['rows']) for s in scales)} questions in {validate_ms:.1f} ms.")
+    for error in errors:
+        print(f"  Error: {error}")
+    if errors and not skip_invalid:
+        print("Import aborted: fix the errors above or rerun with --skip-invalid. Database was not modified.")
+        return None
+
+    totals = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    for scale in scales:
+        scale_started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            counts = await crud_questionnaire.sync_scale_questions(session, scale["code"], scale["name"], scale["rows"])
+        for key in totals:
+            totals[key] += counts[key]
+        print(f"  {scale['code']:<28} +{counts['inserted']} ~{counts['updated']} -{counts['deleted']} "
+              f"={counts['unchanged']}  ({(time.perf_counter() - scale_started) * 1000:.1f} ms)")
+
+    total_ms = (time.perf_counter() - started) * 1000
+    print(f"\nImport finished in {total_ms:.1f} ms (validation {validate_ms:.1f} ms): "
+          f"{totals['inserted']} inserted, {totals['updated']} updated, {totals['deleted']} deleted, "
+          f"{totals['unchanged']} unchanged.")
+
+    # 有变化时通知运行中的 API 进程重新加载量表目录 (ETag 随内容变化，客户端下次请求会拿到新题目)
+    if totals["inserted"] or totals["updated"] or totals["deleted"]:
+        receivers = publish_catalog_invalidation(reason="import_questions")
+        print(f"Scale catalog invalidation published to {receivers} API process(es).")
+    return dict(totals, errors=len(errors), validate_ms=round(validate_ms, 2), total_ms=round(total_ms, 2))
+
+
+async def main(questionnaire_dir, skip_invalid):
+    try:
+        await import_questions_from_json(questionnaire_dir, skip_invalid=skip_invalid)
+    finally:
+        await async_engine.dispose()
 
-            # Determine scale type code and name
-            title = data.get("title")
-            scale_info = None
-            # 优先使用 title 映射
-            if title and title in title_mapping:
-                scale_info = title_mapping[title]
-            # 其次使用文件名映射
-            elif json_file in scale_mapping:
-                 scale_info = scale_mapping[json_file]
-            # 最后使用后备方案
-            else:
-                # Fallback: use filename without extension as code and title as name
-                scale_code = os.path.splitext(json_file)[0]
-                scale_name = title if title else scale_code # Use title if present, else filename part
-                scale_info = {"code": scale_code, "name": scale_name}
-                print(f"  Warning: No specific mapping found for file '{json_file}' or title '{title}'. Using fallback code='{scale_code}', name='{scale_name}'.")
-
-            questionnaire_type = scale_info["code"]
-            scale_display_name = scale_info["name"]
-
-            print(f"  Identified as: Code='{questionnaire_type}', Name='{scale_display_name}'")
-
-            # Clear old questions for this type before inserting new ones (optional but recommended)
-            with sqlite3.connect(handler.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM questionnaire_questions WHERE questionnaire_type = ?", (questionnaire_type,))
-                conn.commit()
-            print(f"  Cleared existing questions for type '{questionnaire_type}'.")
-
-
-            # Insert questions
-            questions_in_file = data.get("questions", [])
-            if not questions_in_file:
-                 print(f"  Warning: No 'questions' array found in {json_file}")
-                 error_count += 1
-                 continue
-
-            for question in questions_in_file:
-                try:
-                    q_num = question["number"]
-                    q_text = question["text"]
-                    # Prepare options as JSON string, ensuring 'text' and 'score' keys exist
-                    # Provide defaults if keys are missing in the source JSON
-                    options_list = []
-                    raw_options = question.get("options", [])
-                    if isinstance(raw_options, list): # Check if options is actually a list
-                        options_list = [
-                            {"text": opt.get("text", "N/A"), "score": opt.get("score", 0)}
-                            for opt in raw_options
-                            if isinstance(opt, dict) # Ensure each option is a dictionary
-                        ]
-                    else:
-                        print(f"    Warning: 'options' for question {q_num} is not a list, skipping options.")
-
-                    options_json = json.dumps(options_list, ensure_ascii=False)
-
-                    # Use the enhanced insert_question method
-                    handler.insert_question(
-                        questionnaire_type,
-                        q_num,
-                        q_text,
-                        options_json, # Pass JSON string directly
-                        scale_display_name # Pass the scale name
-                        )
-                    imported_count += 1
-                except KeyError as ke:
-                     print(f"    Error processing question in {json_file}: Missing key {ke}")
-                     error_count += 1
-                except TypeError as te:
-                    print(f"    Error processing options for question {question.get('number', 'N/A')} in {json_file}: Likely not a list of dicts. Details: {te}")
-                    error_count += 1
-                except Exception as e_inner:
-                     print(f"    Error processing question {question.get('number', 'N/A')} in {json_file}: {e_inner}")
-                     error_count += 1
-
-        except json.JSONDecodeError as jde:
-            print(f"  Error decoding JSON from {json_file}: {jde}")
-            error_count += 1
-        except Exception as e_outer:
-            print(f"  Error processing file {json_file}: {e_outer}")
-            error_count += 1
-
-    print(f"\nImport finished. Successfully imported {imported_count} questions.")
-    if error_count > 0:
-        print(f"Encountered {error_count} errors during import.")
 
 if __name__ == "__main__":
-    import_questions_from_json()
-    # Optional: Check DB content after import
-    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    db_file_path = os.path.join(project_root, "psychology_analysis.db")
-    try:
-        # 修正：从 src 包导入
-        from src.data_handler import check_db_content
-        check_db_content(db_file_path)
-    except ImportError:
-         print("\nRun `python src/data_handler.py` to check database content.")
-    except Exception as e:
-        print(f"\nError checking DB content after import: {e}")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Import scale questions from JSON files")
+    parser.add_argument("--dir", default=QUESTIONNAIRE_DIR, help="questionnaire JSON directory")
+    parser.add_argument("--skip-invalid", action="store_true", help="import valid files even if others fail validation")
+    args = parser.parse_args()
+    asyncio.run(main(args.dir, args.skip_invalid))
@@ -0,0 +1,185 @@
+# 文件路径: PsychologyAnalysis/src/interpretation_rules.py
+"""
+表驱动的量表结果解释。
+
+解释分段写在量表 JSON 的 interpretation_rules 中 (格式与 EPQ85 一致):
+    "interpretation_rules": {"<维度>": [{"range": {"min": 70, "max": 100}, "conclusion": "..."}, ...]}
+  - min 省略表示无下限；max 省略表示一直延续到下一个分段的 min (即 "≥ min")；
+  - 各分段不允许重叠，允许有空隙 (落在空隙中的分数没有分段结论)；
+其他可选字段:
+  - standard_score: {"multiplier": 1.25}  标准分 = int(原始分 × multiplier)，总分维度按标准分查分段；
+  - interpretation_note: 附加在分段结论之后的说明；
+  - interpretation_fallback: 分数不落在任何分段时使用的结论。
+
+每个维度编译为按下限排序的阈值数组 (lows / highs)，单个分数用 bisect 做 O(log n) 查找，
+分数数组用 numpy.searchsorted 一次完成，便于批量统计分析。
+"""
+import bisect
+import logging
+import math
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+SRC_DIR_INTERP = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_INTERP = os.path.dirname(SRC_DIR_INTERP) # PsychologyAnalysis/
+if PROJECT_ROOT_INTERP not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_INTERP)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 interpretation_rules.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+from src.scale_definitions import get_scale_definitions
+from src.scoring_engine import TOTAL_DIMENSION
+
+logger = logging.getLogger(settings.APP_NAME)
+
+
+class BandTable:
+    """单个维度的分段表：lows 升序，第 i 段覆盖 [lows[i], highs[i]]。"""
+
+    def __init__(self, dimension: str, lows: Sequence[float], highs: Sequence[float], conclusions: Sequence[str]):
+        self.dimension = dimension
+        self.lows = list(lows)
+        self.highs = list(highs)
+        self.conclusions = list(conclusions)
+        self._lows_array = np.asarray(self.lows, dtype=np.float64)
+        self._highs_array = np.asarray(self.highs, dtype=np.float64)
+
+    def index(self, value: float) -> int:
+        """分数所在分段的下标，不在任何分段内时返回 -1。"""
+        i = bisect.bisect_right(self.lows, value) - 1
+        if i < 0 or value > self.highs[i]:
+            return -1
+        return i
+
+    def lookup(self, value: float) -> Optional[str]:
+        i = self.index(value)
+        return self.conclusions[i] if i >= 0 else None
+
+    def index_many(self, values) -> np.ndarray:
+        """向量化的 index()：返回与 values 同形状的分段下标数组 (-1 表示无分段)。"""
+        values = np.asarray(values, dtype=np.float64)
+        idx = np.searchsorted(self._lows_array, values, side="right") - 1
+        safe = np.clip(idx, 0, max(len(self.lows) - 1, 0))
+        inside = (idx >= 0) & (values <= self._highs_array[safe]) if self.lows else np.zeros(values.shape, bool)
+        return np.where(inside, idx, -1)
+
+    def lookup_many(self, values) -> List[Optional[str]]:
+        return [self.conclusions[i] if i >= 0 else None for i in self.index_many(values).ravel().tolist()]
+
+
+def compile_band_table(dimension: str, rules: Sequence[Dict[str, Any]]) -> BandTable:
+    """把 [{"range": {...}, "conclusion": ...}] 编译为 BandTable；分段重叠或缺少结论时抛出 ValueError。"""
+    bands = []
+    for rule in rules:
+        rng = rule.get("range") or {}
+        conclusion = rule.get("conclusion")
+        if not conclusion:
+            raise ValueError(f"维度 '{dimension}' 的分段缺少 conclusion: {rule}")
+        low = float(rng["min"]) if rng.get("min") is not None else -math.inf
+        high = float(rng["max"]) if rng.get("max") is not None else math.inf
+        if high < low:
+            raise ValueError(f"维度 '{dimension}' 的分段上限小于下限: {rng}")
+        bands.append((low, high, conclusion))
+    bands.sort(key=lambda band: band[0])
+    for (low, high, _), (next_low, _, _) in zip(bands, bands[1:]):
+        if next_low == low or (high != math.inf and high >= next_low):
+            raise ValueError(f"维度 '{dimension}' 的分段存在重叠: 下限 {low} 与 {next_low}")
+    return BandTable(dimension, [b[0] for b in bands], [b[1] for b in bands], [b[2] for b in bands])
+
+
+class ScaleInterpreter:
+    """单个量表的解释规则。"""
+
+    def __init__(self, code: str, name: str, tables: Dict[str, BandTable], standard_multiplier: Optional[float] = None,
+                 note: Optional[str] = None, fallback: Optional[str] = None):
+        self.code = code
+        self.name = name
+        self.tables = tables
+        self.standard_multiplier = standard_multiplier
+        self.note = note
+        self.fallback = fallback
+
+    def standard_score(self, raw_score: float) -> Optional[int]:
+        if self.standard_multiplier is None:
+            return None
+        return int(raw_score * self.standard_multiplier)
+
+    def band(self, dimension: str, value: float) -> Optional[str]:
+        """value 为该维度用于查分段的分数 (总分维度有标准分时应传入标准分)。"""
+        table = self.tables.get(dimension)
+        conclusion = table.lookup(value) if table is not None else None
+        return conclusion if conclusion is not None else self.fallback
+
+    def total_band(self, raw_score: float) -> Optional[str]:
+        standard = self.standard_score(raw_score)
+        return self.band(TOTAL_DIMENSION, standard if standard is not None else raw_score)
+
+    def total_bands_many(self, raw_scores) -> List[Optional[str]]:
+        """批量版 total_band：raw_scores 为原始总分数组。"""
+        table = self.tables.get(TOTAL_DIMENSION)
+        raw_scores = np.asarray(raw_scores, dtype=np.float64)
+        if table is None:
+            return [self.fallback] * raw_scores.size
+        basis = np.trunc(raw_scores * self.standard_multiplier) if self.standard_multiplier is not None else raw_scores
+        return [c if c is not None else self.fallback for c in table.lookup_many(basis)]
+
+    def describe_total(self, raw_score) -> str:
+        """生成与原先 calculate_score_and_interpret 相同格式的总分解释文本。"""
+        standard = self.standard_score(raw_score)
+        if standard is not None:
+            text = f"量表 '{self.code}' 原始得分: {raw_score}, 标准分: {standard}."
+        else:
+            text = f"量表 '{self.code}' 总得分: {raw_score}."
+        conclusion = self.band(TOTAL_DIMENSION, standard if standard is not None else raw_score)
+        if conclusion:
+            text += f" ({conclusion})"
+        if self.note:
+            text += f" ({self.note})"
+        return text
+
+
+def compile_interpreter(definition: Dict[str, Any]) -> ScaleInterpreter:
+    code = definition.get("code") or definition.get("title")
+    tables = {dimension: compile_band_table(dimension, rules)
+              for dimension, rules in (definition.get("interpretation_rules") or {}).items()}
+    multiplier = (definition.get("standard_score") or {}).get("multiplier")
+    return ScaleInterpreter(code, definition.get("name", code), tables,
+                            standard_multiplier=float(multiplier) if multiplier is not None else None,
+                            note=definition.get("interpretation_note"),
+                            fallback=definition.get("interpretation_fallback"))
+
+
+_interpreters: Optional[Dict[str, ScaleInterpreter]] = None
+_interpreters_lock = threading.Lock()
+
+
+def get_interpreters(reload: bool = False) -> Dict[str, ScaleInterpreter]:
+    """进程内共享的 {量表代码: ScaleInterpreter}，首次调用时编译。只收录定义了 interpretation_rules 的量表。"""
+    global _interpreters
+    if _interpreters is None or reload:
+        with _interpreters_lock:
+            if _interpreters is None or reload:
+                compiled = {}
+                for code, definition in get_scale_definitions(reload=reload).items():
+                    if not definition.get("interpretation_rules"):
+                        continue
+                    try:
+                        compiled[code] = compile_interpreter(definition)
+                    except (KeyError, TypeError, ValueError) as e:
+                        logger.error(f"编译量表 '{code}' 的解释规则失败，该量表将没有分段解释: {e}")
+                _interpreters = compiled
+    return _interpreters
+
+
+def get_interpreter(scale_code: str) -> Optional[ScaleInterpreter]:
+    return get_interpreters().get(scale_code)
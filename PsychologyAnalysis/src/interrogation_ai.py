@@ -3,7 +3,6 @@ import os
 import sys
 import json
 from typing import List, Dict, Any
-from openai import OpenAI
 
 # --- Import settings ---
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -29,21 +28,20 @@ if not logger.hasHandlers():
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     )
 
-# --- Initialize AI client ---
-ai_client = None
-if settings.DASHSCOPE_API_KEY:
+# --- AI client ---
+# Uses the process-wide shared client from src/llm_clients.py instead of a private module-level one.
+from src.llm_clients import get_llm_client, get_async_llm_client, ROLE_INTERROGATION
+
+
+def _get_ai_client():
+    """Return the shared interrogation client, or None if no API key is configured."""
+    if not settings.DASHSCOPE_API_KEY:
+        return None
     try:
-        ai_client = OpenAI(
-            api_key=settings.DASHSCOPE_API_KEY,
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            default_headers={
-                "User-Agent": "MyPsychologyApp-InterrogationAI/1.0",
-                "Accept": "application/json"
-            }
-        )
-        logger.info("Interrogation AI client initialized successfully.")
+        return get_llm_client(ROLE_INTERROGATION, api_key=settings.DASHSCOPE_API_KEY)
     except Exception as e:
         logger.error(f"Failed to initialize OpenAI client: {e}", exc_info=True)
+        return None
 
 def format_history_for_prompt(history: List[Dict[str, str]]) -> str:
     """Format conversation history into a prompt string."""
@@ -52,19 +50,12 @@ def format_history_for_prompt(history: List[Dict[str, str]]) -> str:
         formatted += f"Q{i+1}: {qa.get('q', 'No question text')}\nA{i+1}: {qa.get('a', 'No answer text')}\n\n"
     return formatted.strip()
 
-def suggest_next_question(
+def build_suggestion_messages(
     basic_info: Dict[str, Any],
     history: List[Dict[str, str]],
-    model_name: str = "qwen-plus",
     num_suggestions: int = 3
-) -> List[str]:
-    """Generate suggested follow-up questions based on provided information and history."""
-    if ai_client is None:
-        logger.error("AI client not initialized, cannot generate suggestions.")
-        return ["Error: AI service not configured"]
-
-    model_name = settings.TEXT_MODEL if hasattr(settings, 'TEXT_MODEL') else model_name
-
+) -> List[Dict[str, str]]:
+    """Build the chat messages for the follow-up question suggestion request."""
     system_prompt = f"""You are a top-tier interrogation expert and psychological analyst skilled in strategic questioning.
 Your task is to propose {num_suggestions} follow-up questions based on the subject's information and conversation history, each with a distinct strategic intent to guide the interrogation:
 1. **Detail-oriented**: Focus on the last answer, requesting specific details like time, place, people, or methods.
@@ -89,30 +80,78 @@ Return exactly {num_suggestions} questions, each on a single line, without numbe
 Generate {num_suggestions} distinct follow-up questions as per the system instructions.
 """
 
-    messages = [
+    return [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
 
+
+def _completion_kwargs(model_name: str, messages: List[Dict[str, str]], num_suggestions: int) -> Dict[str, Any]:
+    return {
+        "model": model_name,
+        "messages": messages,
+        "max_tokens": 200 * num_suggestions,
+        "temperature": 0.75,
+        "n": 1,
+    }
+
+
+def _parse_suggestions(response_content: str, num_suggestions: int) -> List[str]:
+    suggestions = [line.strip() for line in response_content.strip().split('\n') if line.strip()]
+
+    if not suggestions:
+        logger.warning("Model returned no valid suggestions.")
+        return ["AI failed to generate suggestions"]
+
+    logger.info(f"Successfully generated {len(suggestions)} suggestions.")
+    return suggestions[:num_suggestions]
+
+
+def suggest_next_question(
+    basic_info: Dict[str, Any],
+    history: List[Dict[str, str]],
+    model_name: str = "qwen-plus",
+    num_suggestions: int = 3
+) -> List[str]:
+    """Generate suggested follow-up questions based on provided information and history."""
+    ai_client = _get_ai_client()
+    if ai_client is None:
+        logger.error("AI client not initialized, cannot generate suggestions.")
+        return ["Error: AI service not configured"]
+
+    model_name = settings.TEXT_MODEL if hasattr(settings, 'TEXT_MODEL') else model_name
+    messages = build_suggestion_messages(basic_info, history, num_suggestions)
+
     try:
         logger.debug(f"Calling model '{model_name}' for suggestions...")
-        completion = ai_client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            max_tokens=200 * num_suggestions,
-            temperature=0.75,
-            n=1
-        )
-        response_content = completion.choices[0].message.content
-        suggestions = [line.strip() for line in response_content.strip().split('\n') if line.strip()]
-
-        if not suggestions:
-            logger.warning("Model returned no valid suggestions.")
-            return ["AI failed to generate suggestions"]
-
-        logger.info(f"Successfully generated {len(suggestions)} suggestions.")
-        return suggestions[:num_suggestions]
+        completion = ai_client.chat.completions.create(**_completion_kwargs(model_name, messages, num_suggestions))
+        return _parse_suggestions(completion.choices[0].message.content, num_suggestions)
+
+    except Exception as e:
+        logger.error(f"Error calling AI model: {e}", exc_info=True)
+        return [f"Error: Failed to retrieve AI suggestions ({type(e).__name__})"]
+
+
+async def asuggest_next_question(
+    basic_info: Dict[str, Any],
+    history: List[Dict[str, str]],
+    model_name: str = "qwen-plus",
+    num_suggestions: int = 3
+) -> List[str]:
+    """Async variant of suggest_next_question for FastAPI routes (does not block the event loop)."""
+    if not settings.DASHSCOPE_API_KEY:
+        logger.error("AI client not initialized, cannot generate suggestions.")
+        return ["Error: AI service not configured"]
+
+    model_name = settings.TEXT_MODEL if hasattr(settings, 'TEXT_MODEL') else model_name
+    messages = build_suggestion_messages(basic_info, history, num_suggestions)
+
+    try:
+        ai_client = get_async_llm_client(ROLE_INTERROGATION, api_key=settings.DASHSCOPE_API_KEY)
+        logger.debug(f"Calling model '{model_name}' (async) for suggestions...")
+        completion = await ai_client.chat.completions.create(**_completion_kwargs(model_name, messages, num_suggestions))
+        return _parse_suggestions(completion.choices[0].message.content, num_suggestions)
 
     except Exception as e:
         logger.error(f"Error calling AI model: {e}", exc_info=True)
-        return [f"Error: Failed to retrieve AI suggestions ({type(e).__name__})"]
\ No newline at end of file
+        return [f"Error: Failed to retrieve AI suggestions ({type(e).__name__})"]
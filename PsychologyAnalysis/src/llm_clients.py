@@ -0,0 +1,180 @@
+# src/llm_clients.py
+"""
+进程级共享的大模型客户端注册表。
+
+每个 OpenAI/AsyncOpenAI 客户端自带一个 httpx 连接池；以前每次评估 (ImageProcessor / ReportGenerator)
+或每个请求 (admin AI 分析) 都新建客户端，连接池和 TLS 握手都无法复用。这里按
+(base_url, api_key, role) 缓存客户端，连接上限、keep-alive 和超时由 settings 中的 LLM_* 配置控制。
+
+- role 决定 User-Agent (沿用各模块原来的 "MyPsychologyApp-xxx/1.0")；
+- 同步客户端线程安全，可跨线程共享；
+- 异步客户端的连接池绑定到创建它的事件循环，因此额外按事件循环区分；
+- fork 之后 (Celery prefork 子进程) 自动丢弃父进程的客户端并重新创建。
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from openai import OpenAI, AsyncOpenAI
+
+# --- 导入 settings ---
+SRC_DIR_LLM_CLIENTS = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_LLM_CLIENTS = os.path.dirname(SRC_DIR_LLM_CLIENTS) # PsychologyAnalysis/
+if PROJECT_ROOT_LLM_CLIENTS not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_LLM_CLIENTS)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        DASHSCOPE_API_KEY = None
+        LLM_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        LLM_MAX_CONNECTIONS = 20
+        LLM_MAX_KEEPALIVE = 10
+        LLM_KEEPALIVE_EXPIRY = 30.0
+        LLM_TIMEOUT = 120.0
+        LLM_CONNECT_TIMEOUT = 10.0
+        LLM_MAX_RETRIES = 2
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 llm_clients.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+logger = logging.getLogger(settings.APP_NAME)
+
+# --- 客户端角色 ---
+ROLE_VISION = "vision"
+ROLE_REPORT = "report"
+ROLE_GUIDANCE = "guidance"
+ROLE_INTERROGATION = "interrogation"
+ROLE_ADMIN = "admin"
+
+ROLE_USER_AGENTS: Dict[str, str] = {
+    ROLE_VISION: "MyPsychologyApp-ImageProcessor/1.0",
+    ROLE_REPORT: "MyPsychologyApp-ReportGenerator/1.0",
+    ROLE_GUIDANCE: "MyPsychologyApp-GuidanceGenerator/1.0",
+    ROLE_INTERROGATION: "MyPsychologyApp-InterrogationAI/1.0",
+    ROLE_ADMIN: "MyPsychologyApp-Admin/1.0",
+}
+
+ClientKey = Tuple[str, str, str]
+
+_lock = threading.Lock()
+_pid = os.getpid()
+_sync_clients: Dict[ClientKey, OpenAI] = {}
+_async_clients: Dict[Tuple[ClientKey, int], AsyncOpenAI] = {}
+
+
+def _headers(role: str) -> Dict[str, str]:
+    return {
+        "User-Agent": ROLE_USER_AGENTS.get(role, f"MyPsychologyApp-{role}/1.0"),
+        "Accept": "application/json",
+    }
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+
+
+def _resolve_key(role: str, api_key: Optional[str], base_url: Optional[str]) -> ClientKey:
+    api_key = api_key or settings.DASHSCOPE_API_KEY
+    if not api_key:
+        raise ValueError(f"API Key missing for LLM client (role '{role}').")
+    return (base_url or settings.LLM_BASE_URL, api_key, role)
+
+
+def _check_pid():
+    """fork 后子进程不能继续使用父进程的连接 (调用方需持有 _lock)。"""
+    global _pid
+    if _pid != os.getpid():
+        _sync_clients.clear()
+        _async_clients.clear()
+        _pid = os.getpid()
+
+
+def get_llm_client(role: str, api_key: Optional[str] = None, base_url: Optional[str] = None) -> OpenAI:
+    """返回 (base_url, api_key, role) 对应的共享同步客户端；api_key/base_url 默认取 settings。"""
+    key = _resolve_key(role, api_key, base_url)
+    with _lock:
+        _check_pid()
+        client = _sync_clients.get(key)
+        if client is None:
+            client = OpenAI(
+                api_key=key[1],
+                base_url=key[0],
+                default_headers=_headers(role),
+                timeout=_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
+                http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+            )
+            _sync_clients[key] = client
+            logger.info(f"LLM clients: 已创建同步客户端 (role={role}, base_url={key[0]}, PID {os.getpid()})")
+        return client
+
+
+def get_async_llm_client(role: str, api_key: Optional[str] = None, base_url: Optional[str] = None) -> AsyncOpenAI:
+    """返回当前事件循环内共享的异步客户端；必须在事件循环中调用。"""
+    key = _resolve_key(role, api_key, base_url)
+    loop_id = id(asyncio.get_running_loop())
+    with _lock:
+        _check_pid()
+        client = _async_clients.get((key, loop_id))
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=key[1],
+                base_url=key[0],
+                default_headers=_headers(role),
+                timeout=_timeout(),
+                max_retries=settings.LLM_MAX_RETRIES,
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+            _async_clients[(key, loop_id)] = client
+            logger.info(f"LLM clients: 已创建异步客户端 (role={role}, base_url={key[0]}, PID {os.getpid()})")
+        return client
+
+
+def close_llm_clients():
+    """关闭所有同步客户端 (进程退出时调用)。"""
+    with _lock:
+        clients = list(_sync_clients.values())
+        _sync_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"LLM clients: 关闭同步客户端时出错: {e}")
+
+
+async def aclose_llm_clients():
+    """关闭当前事件循环创建的异步客户端 (事件循环结束前调用)。"""
+    loop_id = id(asyncio.get_running_loop())
+    with _lock:
+        keys = [k for k in _async_clients if k[1] == loop_id]
+        clients = [_async_clients.pop(k) for k in keys]
+    for client in clients:
+        try:
+            await client.close()
+        except Exception as e:
+            logger.warning(f"LLM clients: 关闭异步客户端时出错: {e}")
+
+
+def registry_stats() -> Dict[str, Any]:
+    """当前进程已创建的客户端数量 (按角色)。"""
+    with _lock:
+        by_role: Dict[str, int] = {}
+        for (_, _, role) in _sync_clients:
+            by_role[f"sync:{role}"] = by_role.get(f"sync:{role}", 0) + 1
+        for ((_, _, role), _) in _async_clients:
+            by_role[f"async:{role}"] = by_role.get(f"async:{role}", 0) + 1
+        return {"pid": _pid, "sync": len(_sync_clients), "async": len(_async_clients), "by_role": by_role}
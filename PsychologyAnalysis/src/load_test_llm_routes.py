@@ -0,0 +1,131 @@
+# 文件路径: PsychologyAnalysis/src/load_test_llm_routes.py
+"""
+负载测试：多个大模型调用在途时，其他 API 的延迟是否保持平稳。
+
+1. 基线阶段：只探测一个轻量接口 (默认 GET /) 的延迟；
+2. 负载阶段：同时发出 --llm-requests 个 POST /api/v1/admin/stats/ai-analysis (慢的大模型调用)，
+   期间持续探测同一个轻量接口。
+如果路由里的大模型调用阻塞了事件循环，负载阶段的探测延迟会接近大模型延迟；走异步网关时应与基线接近。
+超过路由并发上限 (LLM_ROUTE_LIMITS / LLM_ROUTE_CONCURRENCY) 的请求会在等待超时后得到 503。
+
+为了得到可重复的大模型延迟，可以启动模拟服务 (src/mock_llm_server.py)，并让后端通过 LLM_BASE_URL 指向它:
+    python src/load_test_llm_routes.py --serve-fake-llm 9100 --fake-latency-ms 3000   # 终端 1 (固定延迟)
+    # 或直接运行模拟服务，使用延迟分布/输出速率/错误注入:
+    # python src/mock_llm_server.py --port 9100 --text-latency lognormal:3000,0.3 --error-rate 0.05
+    LLM_BASE_URL=http://127.0.0.1:9100/v1 uvicorn app.main:app                         # 终端 2
+    python src/load_test_llm_routes.py --username admin --password password            # 终端 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+try:
+    import httpx
+except ImportError:
+    print("错误: 'httpx' 库未安装。请运行 'pip install httpx' 进行安装。")
+    sys.exit(1)
+
+AI_ANALYSIS_BODY = {
+    "demographics": {
+        "ageData": {"labels": ["18-25", "26-35", "36-45"], "values": [10, 20, 5]},
+        "genderData": {"labels": ["男", "女"], "values": [20, 15]},
+    }
+}
+
+
+def _summary(latencies_ms: List[float]) -> str:
+    if not latencies_ms:
+        return "无数据"
+    ordered = sorted(latencies_ms)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"n={len(ordered)} p50={statistics.median(ordered):.1f}ms p95={p95:.1f}ms max={ordered[-1]:.1f}ms"
+
+
+async def _login(client: httpx.AsyncClient, api_prefix: str, username: str, password: str) -> str:
+    resp = await client.post(f"{api_prefix}/auth/token", data={"username": username, "password": password})
+    resp.raise_for_status()
+    return resp.json()["access_token"]
+
+
+async def _probe(client: httpx.AsyncClient, path: str, duration_s: float, interval_s: float) -> List[float]:
+    latencies = []
+    deadline = time.perf_counter() + duration_s
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await client.get(path)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval_s)
+    return latencies
+
+
+async def _llm_call(client: httpx.AsyncClient, api_prefix: str, headers: dict) -> Tuple[int, float]:
+    started = time.perf_counter()
+    try:
+        resp = await client.post(f"{api_prefix}/admin/stats/ai-analysis", json=AI_ANALYSIS_BODY, headers=headers)
+        code = resp.status_code
+    except httpx.HTTPError:
+        code = -1
+    return code, (time.perf_counter() - started) * 1000
+
+
+async def run(args):
+    timeout = httpx.Timeout(args.timeout)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=timeout) as client:
+        token = await _login(client, args.api_prefix, args.username, args.password)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        baseline = await _probe(client, args.probe_path, args.baseline_seconds, args.probe_interval)
+        print(f"[基线] {args.probe_path}: {_summary(baseline)}")
+
+        llm_tasks = [asyncio.create_task(_llm_call(client, args.api_prefix, headers)) for _ in range(args.llm_requests)]
+        await asyncio.sleep(0.2) # 让大模型请求先进入在途状态
+        loaded = await _probe(client, args.probe_path, args.load_seconds, args.probe_interval)
+        results = await asyncio.gather(*llm_tasks)
+
+        print(f"[负载] {args.llm_requests} 个大模型请求在途时 {args.probe_path}: {_summary(loaded)}")
+        by_code = {}
+        for code, _ in results:
+            by_code[code] = by_code.get(code, 0) + 1
+        print(f"[负载] 大模型请求状态码分布: {by_code}，耗时: {_summary([ms for _, ms in results])}")
+        if baseline and loaded:
+            ratio = statistics.median(loaded) / max(statistics.median(baseline), 0.001)
+            print(f"[结论] 负载阶段探测 p50 / 基线 p50 = {ratio:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大模型路由负载测试")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--probe-path", default="/", help="用于测量事件循环响应性的轻量接口")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    parser.add_argument("--load-seconds", type=float, default=5.0)
+    parser.add_argument("--llm-requests", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=180.0)
+    parser.add_argument("--serve-fake-llm", type=int, default=None, metavar="PORT",
+                        help="只启动模拟大模型服务 (src/mock_llm_server.py，固定延迟) 并阻塞，不执行负载测试")
+    parser.add_argument("--fake-latency-ms", type=float, default=3000)
+    args = parser.parse_args()
+
+    if args.serve_fake_llm is not None:
+        from src.bench_worker_modes import fixed_latency_config
+        from src.mock_llm_server import serve
+        print(f"每次调用延迟 {args.fake_latency_ms}ms，Ctrl+C 退出")
+        serve(fixed_latency_config(args.fake_latency_ms), port=args.serve_fake_llm)
+        return
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# 文件路径: PsychologyAnalysis/src/mock_llm_server.py
+"""
+本地 OpenAI 兼容的模拟大模型服务，用于离线测试和基准测试。
+
+支持:
+  - POST /v1/chat/completions: 普通文本请求、视觉请求 (content 中含 image_url)、stream=True 流式输出
+  - GET  /v1/models
+  - GET  /mock/stats: 请求数、错误数、按类型统计
+可配置:
+  - 首 token 延迟分布 (文本/视觉分别配置): fixed:MS | uniform:LO,HI | normal:MEAN,STD | lognormal:MEDIAN,SIGMA
+  - 输出速率 (tokens/秒) 和输出长度 (tokens)
+  - 错误注入: HTTP 错误比例及状态码、超时 (挂起) 比例、流式中途断开比例
+  - 随机种子: 同样的种子 + 同样的请求序列得到同样的延迟、错误和输出
+
+让所有客户端 (报告/视觉/指导方案/审讯/管理端 AI 分析) 都指向它，只需设置一个配置:
+    python src/mock_llm_server.py --port 9100 --text-latency lognormal:800,0.4 --tokens-per-second 60
+    LLM_BASE_URL=http://127.0.0.1:9100/v1 DASHSCOPE_API_KEY=mock python run_celery_worker.py
+
+其他脚本 (src/bench_worker_modes.py、src/load_test_llm_routes.py) 通过 make_config() / start_in_thread() / serve()
+在进程内启动同一个服务，不再各自实现假服务。
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+TEXT_VOCAB = [
+    "被测者", "情绪", "整体", "稳定", "表现出", "一定的", "焦虑", "倾向", "在", "人际", "交往", "中", "较为",
+    "谨慎", "，", "建议", "关注", "其", "压力", "来源", "。", "绘画", "显示", "安全感", "需求", "较高", "；",
+    "沟通", "时", "应", "保持", "耐心", "并", "给予", "积极", "反馈", "认知", "功能", "正常", "自我", "评价",
+]
+VISION_VOCAB = [
+    "画面", "中", "有", "一座", "房子", "、", "一棵", "大树", "和", "一个", "人物", "，", "线条", "较", "轻",
+    "，", "构图", "偏", "左", "，", "颜色", "以", "蓝色", "为主", "。", "天空", "有", "太阳", "与", "云朵",
+]
+
+
+class LatencyDistribution:
+    """首 token 延迟分布 (毫秒)。"""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"无效的延迟分布: '{spec}' (示例: fixed:500, uniform:200,800, normal:500,100, lognormal:500,0.5)")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, rng.gauss(*self.params))
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(max(median, 0.001)), sigma)
+
+
+class MockConfig:
+    def __init__(self, args: argparse.Namespace):
+        self.seed = args.seed
+        self.text_latency = LatencyDistribution(args.text_latency)
+        self.vision_latency = LatencyDistribution(args.vision_latency)
+        self.tokens_per_second = args.tokens_per_second
+        self.text_tokens = args.text_tokens
+        self.vision_tokens = args.vision_tokens
+        self.error_rate = args.error_rate
+        self.error_statuses = [int(s) for s in args.error_statuses.split(",") if s.strip()]
+        self.timeout_rate = args.timeout_rate
+        self.timeout_seconds = args.timeout_seconds
+        self.stream_abort_rate = args.stream_abort_rate
+
+
+class MockStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {}
+
+    def incr(self, *names: str):
+        with self._lock:
+            for name in names:
+                self.counters[name] = self.counters.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+
+def _is_vision(messages: List[Dict[str, Any]]) -> bool:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(isinstance(part, dict) and part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+
+def _prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """粗略估算输入 token 数：文本按字符数/2，图片按固定 1000。"""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += len(content) // 2 + 1
+        elif isinstance(content, list):
+            for part in content:
+                if part.get("type") == "text":
+                    total += len(part.get("text", "")) // 2 + 1
+                elif part.get("type") == "image_url":
+                    total += 1000
+    return total
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM Server")
+    stats = MockStats()
+    # 相同请求体出现的次数，用于在确定性的前提下区分重复请求 (例如重试)
+    occurrences: Dict[str, int] = {}
+    occurrences_lock = threading.Lock()
+
+    def request_rng(body: bytes) -> random.Random:
+        digest = hashlib.sha256(body).hexdigest()
+        with occurrences_lock:
+            n = occurrences.get(digest, 0)
+            occurrences[digest] = n + 1
+        return random.Random(f"{config.seed}:{digest}:{n}")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/mock/stats")
+    async def mock_stats():
+        return stats.snapshot()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        raw = await request.body()
+        try:
+            payload = json.loads(raw)
+        except json.JSONDecodeError:
+            return JSONResponse({"error": {"message": "invalid JSON body", "type": "invalid_request_error"}}, status_code=400)
+
+        rng = request_rng(raw)
+        messages = payload.get("messages") or []
+        model = payload.get("model", "mock-model")
+        stream = bool(payload.get("stream"))
+        vision = _is_vision(messages)
+        kind = "vision" if vision else "text"
+        stats.incr("requests", f"requests_{kind}", "requests_stream" if stream else "requests_plain")
+
+        # --- 错误注入 ---
+        roll = rng.random()
+        if roll < config.timeout_rate:
+            stats.incr("injected_timeouts")
+            await asyncio.sleep(config.timeout_seconds)
+        elif roll < config.timeout_rate + config.error_rate and config.error_statuses:
+            status_code = rng.choice(config.error_statuses)
+            stats.incr("injected_errors", f"injected_errors_{status_code}")
+            return JSONResponse({"error": {"message": f"mock injected error {status_code}", "type": "mock_error"}},
+                                status_code=status_code)
+
+        ttft_s = (config.vision_latency if vision else config.text_latency).sample(rng) / 1000.0
+        vocab = VISION_VOCAB if vision else TEXT_VOCAB
+        max_tokens = payload.get("max_tokens") or payload.get("max_completion_tokens")
+        n_tokens = config.vision_tokens if vision else config.text_tokens
+        if max_tokens:
+            n_tokens = min(n_tokens, int(max_tokens))
+        tokens = [rng.choice(vocab) for _ in range(max(1, n_tokens))]
+        per_token_s = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        completion_id = f"chatcmpl-mock-{uuid.UUID(int=rng.getrandbits(128)).hex[:24]}"
+        created = int(time.time())
+        usage = {"prompt_tokens": _prompt_tokens(messages), "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not stream:
+            await asyncio.sleep(ttft_s + per_token_s * len(tokens))
+            stats.incr("completed")
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens)}}],
+                "usage": usage,
+            }
+
+        abort_at = rng.randrange(1, len(tokens) + 1) if rng.random() < config.stream_abort_rate else None
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            body = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+        async def event_stream():
+            await asyncio.sleep(ttft_s)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if abort_at is not None and i == abort_at:
+                    stats.incr("injected_stream_aborts")
+                    return # 不发送 [DONE]，模拟连接中途断开
+                yield chunk({"content": token})
+                if per_token_s:
+                    await asyncio.sleep(per_token_s)
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+            stats.incr("completed")
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的模拟大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--text-latency", default="lognormal:800,0.4", help="文本请求首 token 延迟分布 (毫秒)")
+    parser.add_argument("--vision-latency", default="lognormal:1500,0.3", help="视觉请求首 token 延迟分布 (毫秒)")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="输出速率，0 表示不限速")
+    parser.add_argument("--text-tokens", type=int, default=600, help="文本请求输出 token 数 (受 max_tokens 限制)")
+    parser.add_argument("--vision-tokens", type=int, default=200, help="视觉请求输出 token 数")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 错误的请求比例")
+    parser.add_argument("--error-statuses", default="500,429,503", help="注入的 HTTP 错误状态码，逗号分隔")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="挂起 (模拟超时) 的请求比例")
+    parser.add_argument("--timeout-seconds", type=float, default=300.0, help="挂起时长")
+    parser.add_argument("--stream-abort-rate", type=float, default=0.0, help="流式响应中途断开的比例")
+    return parser
+
+
+def make_config(argv: Optional[List[str]] = None) -> MockConfig:
+    """按命令行参数 (未给出的取默认值) 创建配置，例如 make_config(["--text-latency", "fixed:500"])。"""
+    return MockConfig(build_arg_parser().parse_args(argv or []))
+
+
+def serve(config: MockConfig, host: str = "127.0.0.1", port: int = 9100):
+    """在前台运行服务直到退出 (Ctrl+C)。"""
+    import uvicorn
+    print(f"模拟大模型服务: http://{host}:{port}/v1 (设置 LLM_BASE_URL 指向该地址)")
+    uvicorn.run(create_app(config), host=host, port=port, log_level="warning")
+
+
+def start_in_thread(config: MockConfig, host: str = "127.0.0.1", port: int = 0, startup_timeout: float = 10.0) -> str:
+    """在后台守护线程中启动服务 (port=0 时自动选择空闲端口)，就绪后返回 base URL (.../v1)。"""
+    import uvicorn
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    server = uvicorn.Server(uvicorn.Config(create_app(config), log_level="warning"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    deadline = time.monotonic() + startup_timeout
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"模拟大模型服务未能在 {startup_timeout}s 内启动")
+        time.sleep(0.05)
+    return f"http://{host}:{sock.getsockname()[1]}/v1"
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    serve(MockConfig(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# src/pipeline.py
+"""
+报告生成流水线用的小型 DAG 执行器。
+
+每个 Stage 声明自己依赖的上游 Stage；依赖全部完成后立即提交到线程池执行，
+互不依赖的阶段 (如图片识别、量表计分、基础信息准备) 并发运行。
+阶段函数以关键字参数的形式接收其依赖阶段的返回值。
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+
+class Stage:
+    """流水线中的一个阶段。func(**{dep_name: dep_result, ...}) -> result"""
+
+    def __init__(self, name: str, func: Callable[..., Any], deps: Sequence[str] = ()):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+
+    def __repr__(self):
+        return f"<Stage {self.name} deps={list(self.deps)}>"
+
+
+class PipelineError(Exception):
+    """某个阶段执行失败；original 为原始异常，timings 为已完成阶段的耗时。"""
+
+    def __init__(self, stage: str, original: BaseException, timings: Dict[str, float]):
+        super().__init__(f"阶段 '{stage}' 执行失败: {type(original).__name__} - {original}")
+        self.stage = stage
+        self.original = original
+        self.timings = timings
+
+
+class PipelineResult:
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, float]):
+        self.results = results
+        # 各阶段耗时 (毫秒)，另含 "total" 为整体墙钟时间
+        self.timings = timings
+
+    def __getitem__(self, name: str) -> Any:
+        return self.results[name]
+
+
+def _validate(stages: Sequence[Stage], precomputed: Dict[str, Any]):
+    names = [s.name for s in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"阶段名称重复: {names}")
+    known = set(names) | set(precomputed)
+    for stage in stages:
+        missing = [d for d in stage.deps if d not in known]
+        if missing:
+            raise ValueError(f"阶段 '{stage.name}' 依赖未定义的阶段: {missing}")
+    # 拓扑检查，防止环
+    resolved = set(precomputed)
+    pending = [s for s in stages if s.name not in resolved]
+    while pending:
+        ready = [s for s in pending if all(d in resolved for d in s.deps)]
+        if not ready:
+            raise ValueError(f"阶段依赖存在环: {pending}")
+        resolved.update(s.name for s in ready)
+        pending = [s for s in pending if s.name not in resolved]
+
+
+def run_stages(stages: Iterable[Stage], max_workers: Optional[int] = None,
+               precomputed: Optional[Dict[str, Any]] = None,
+               logger: Optional[logging.Logger] = None,
+               on_stage_complete: Optional[Callable[[str, Any], None]] = None) -> PipelineResult:
+    """
+    执行阶段 DAG。precomputed 中已有结果的阶段会被跳过 (用于断点续跑)。
+    on_stage_complete(name, result) 在调用线程中、每个阶段成功后调用 (例如持久化阶段产物)，
+    其自身的异常只记录日志，不影响流水线。
+    任一阶段抛出异常时，不再提交新的阶段，等待已运行的阶段结束后抛出 PipelineError。
+    """
+    stages: List[Stage] = list(stages)
+    results: Dict[str, Any] = dict(precomputed or {})
+    _validate(stages, results)
+    log = logger or logging.getLogger(__name__)
+
+    timings: Dict[str, float] = {}
+    remaining = [s for s in stages if s.name not in results]
+    started_at = time.perf_counter()
+    failure: Optional[PipelineError] = None
+
+    def timed(stage: Stage, kwargs: Dict[str, Any]):
+        t0 = time.perf_counter()
+        try:
+            return stage.func(**kwargs)
+        finally:
+            timings[stage.name] = round((time.perf_counter() - t0) * 1000, 2)
+
+    workers = max_workers or max(1, len(remaining))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline") as pool:
+        running = {}
+        while remaining or running:
+            if failure is None:
+                ready = [s for s in remaining if all(d in results for d in s.deps)]
+                for stage in ready:
+                    remaining.remove(stage)
+                    kwargs = {d: results[d] for d in stage.deps}
+                    log.debug(f"Pipeline: 提交阶段 '{stage.name}'")
+                    running[pool.submit(timed, stage, kwargs)] = stage
+            elif not running:
+                break
+            if not running:
+                # 没有在运行的阶段却仍有剩余阶段，说明依赖无法满足 (不应出现，已在 _validate 中检查)
+                raise ValueError(f"无法继续执行的阶段: {remaining}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                    log.debug(f"Pipeline: 阶段 '{stage.name}' 完成，耗时 {timings.get(stage.name)}ms")
+                    if on_stage_complete is not None:
+                        try:
+                            on_stage_complete(stage.name, results[stage.name])
+                        except Exception as cb_err:
+                            log.warning(f"Pipeline: 阶段 '{stage.name}' 的完成回调出错: {cb_err}", exc_info=True)
+                except Exception as e:
+                    log.error(f"Pipeline: 阶段 '{stage.name}' 失败: {e}")
+                    if failure is None:
+                        failure = PipelineError(stage.name, e, timings)
+
+    timings["total"] = round((time.perf_counter() - started_at) * 1000, 2)
+    if failure is not None:
+        raise failure
+    return PipelineResult(results, timings)
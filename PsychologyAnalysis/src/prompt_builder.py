@@ -0,0 +1,206 @@
+# src/prompt_builder.py
+"""
+报告 Prompt 的紧凑编码与 token 预算。
+
+- 量表答案不再以缩进 JSON 形式嵌入，而是编码为按题号排序的分值向量，例如
+  "q1-q85: 1,0,1,...". 题号不连续时写成 "q1=3 q4=2 ..."，未作答的题目在向量中记为 "-"；
+  实际采用的编码 (向量 / 逐题 / JSON) 的说明通过模板中的 {questionnaire_format} 写入 Prompt；
+- 格式化前删除模板中只引用了未填写 ('未提供') 基础信息字段的行，不再把 15 个基础信息字段全部发送；
+- 本地估算 token 数 (不依赖分词器，中文按每字 1 token，其余字符约 4 个 1 token，换行缩进按 1 token)，
+  并按 PROMPT_SECTION_BUDGETS 对各段 (绘画描述、量表答案、量表解释、单个基础信息字段) 截断；
+- 返回各段 token 数和旧编码方式 (缩进 JSON) 下的估算值，便于在日志中对比。
+"""
+import json
+import logging
+import math
+import os
+import re
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+# --- 导入 settings ---
+SRC_DIR_PROMPT = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_PROMPT = os.path.dirname(SRC_DIR_PROMPT) # PsychologyAnalysis/
+if PROJECT_ROOT_PROMPT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_PROMPT)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        PROMPT_COMPACT_ENABLED = True
+        PROMPT_SECTION_BUDGETS = {"description": 1500, "questionnaire": 800, "interpretation": 400, "subject_field": 120}
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 prompt_builder.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+logger = logging.getLogger(settings.APP_NAME)
+
+UNFILLED = "未提供"
+TRUNCATED_MARK = "…(已截断)"
+SUBJECT_KEYS = ["name", "gender", "id_card", "age", "occupation", "case_name", "case_type", "identity_type",
+                "person_type", "marital_status", "children_info", "criminal_record", "health_status",
+                "phone_number", "domicile"]
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_NEWLINE_RUN_RE = re.compile(r"\n\s*")
+_ITEM_ID_RE = re.compile(r"^([A-Za-z_]*)(\d+)$")
+_SUBJECT_FIELD_RE = re.compile(r"\{subject_info\[(\w+)\]\}")
+_PLACEHOLDER_RE = re.compile(r"(?<!\{)\{(?!\{)[^{}]*\}")
+
+# {questionnaire_format}: 对应各编码方式的说明
+FORMAT_VECTOR = "题号范围: 按题号顺序的分值，未作答记为 -"
+FORMAT_SPARSE = "题号=分值"
+FORMAT_JSON = "JSON，题号: 分值"
+FORMAT_RAW = "原始内容"
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """粗略估算 token 数：中日文字符及全角标点按 1 个，其余非空白字符按 4 个 1 个，每段换行 (含缩进) 按 1 个。"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = sum(1 for ch in text if not ch.isspace()) - cjk
+    return cjk + math.ceil(other / 4) + len(_NEWLINE_RUN_RE.findall(text))
+
+
+def truncate_to_budget(text: str, budget: Optional[int]) -> Tuple[str, bool]:
+    """把 text 截断到约 budget 个 token 以内；budget 为空或不超出时原样返回。"""
+    if not text or not budget or estimate_tokens(text) <= budget:
+        return text, False
+    # 二分查找能放进预算的最长前缀 (预留截断标记的 token)
+    limit = max(budget - estimate_tokens(TRUNCATED_MARK), 0)
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= limit:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo].rstrip() + TRUNCATED_MARK, True
+
+
+def _format_value(value: Any) -> str:
+    if value is None or value == "":
+        return "-"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).replace(",", "，")
+
+
+def encode_answers_with_format(answers: Any) -> Tuple[str, str]:
+    """
+    把 {'q1': 3, 'q2': 1, ...} 编码为紧凑的分值向量，返回 (编码结果, 编码说明)。
+    无法识别题号格式时退回紧凑 JSON。
+    """
+    if not answers:
+        return "无", FORMAT_RAW
+    if isinstance(answers, str):
+        return answers, FORMAT_RAW
+    if not isinstance(answers, dict):
+        return str(answers), FORMAT_RAW
+
+    parsed = {}
+    prefixes = set()
+    for key, value in answers.items():
+        match = _ITEM_ID_RE.match(str(key))
+        if not match:
+            return json.dumps(answers, ensure_ascii=False, separators=(",", ":")), FORMAT_JSON
+        prefixes.add(match.group(1))
+        parsed[int(match.group(2))] = value
+    if len(prefixes) != 1:
+        return json.dumps(answers, ensure_ascii=False, separators=(",", ":")), FORMAT_JSON
+
+    prefix = prefixes.pop()
+    numbers = sorted(parsed)
+    first, last = numbers[0], numbers[-1]
+    # 缺题不多时用向量 (缺的题记为 "-")，否则逐题列出
+    if (last - first + 1) <= len(numbers) * 1.25:
+        vector = ",".join(_format_value(parsed.get(n)) for n in range(first, last + 1))
+        return f"{prefix}{first}-{prefix}{last}: {vector}", FORMAT_VECTOR
+    return " ".join(f"{prefix}{n}={_format_value(parsed[n])}" for n in numbers), FORMAT_SPARSE
+
+
+def encode_answers(answers: Any) -> str:
+    """encode_answers_with_format 的编码结果。"""
+    return encode_answers_with_format(answers)[0]
+
+
+def drop_unfilled_lines(template: str, subject: Dict[str, Any]) -> str:
+    """
+    删除模板中只引用了未填写基础信息字段的行 (在格式化之前，只看 {subject_info[...]} 占位符)。
+    同一行还有其他占位符时保留，绘画描述、量表解释等内容中的文字不受影响。
+    """
+    kept = []
+    for line in template.splitlines(keepends=True):
+        fields = _SUBJECT_FIELD_RE.findall(line)
+        if (fields and all(subject.get(field) == UNFILLED for field in fields)
+                and not _PLACEHOLDER_RE.search(_SUBJECT_FIELD_RE.sub("", line))):
+            continue
+        kept.append(line)
+    return "".join(kept)
+
+
+def build_report_prompt(template: str, description, questionnaire, subject_info, questionnaire_type, score,
+                        scale_interpretation) -> Tuple[str, Dict[str, Any]]:
+    """
+    格式化报告 Prompt。返回 (prompt, stats)；stats 含各段 token 估算、截断的段、总 token 数
+    以及旧编码 (缩进 JSON + 全部字段) 下的总 token 估算。模板缺少键时抛出 KeyError。
+    """
+    compact = settings.PROMPT_COMPACT_ENABLED
+    budgets = settings.PROMPT_SECTION_BUDGETS if compact else {}
+    truncated = []
+
+    def budgeted(section: str, text: str) -> str:
+        text, was_truncated = truncate_to_budget(text, budgets.get(section))
+        if was_truncated:
+            truncated.append(section)
+        return text
+
+    subject = dict(subject_info) if isinstance(subject_info, dict) else {}
+    if not isinstance(subject_info, dict):
+        logger.warning(f"subject_info was not a dictionary (type: {type(subject_info)}). Creating default context.")
+    for key in SUBJECT_KEYS:
+        if subject.get(key) in (None, ""):
+            subject[key] = UNFILLED
+    if compact:
+        for key in SUBJECT_KEYS:
+            if isinstance(subject[key], str) and subject[key] != UNFILLED:
+                subject[key] = budgeted("subject_field", subject[key])
+
+    if isinstance(questionnaire, dict):
+        legacy_questionnaire, legacy_format = json.dumps(questionnaire, ensure_ascii=False, indent=2), FORMAT_JSON
+    else:
+        legacy_questionnaire, legacy_format = (str(questionnaire) if questionnaire else "N/A"), FORMAT_RAW
+    if compact:
+        questionnaire_str, questionnaire_format = encode_answers_with_format(questionnaire)
+    else:
+        questionnaire_str, questionnaire_format = legacy_questionnaire, legacy_format
+
+    context = {
+        'description': budgeted("description", description) if description else "无",
+        'questionnaire': budgeted("questionnaire", questionnaire_str),
+        'questionnaire_format': questionnaire_format,
+        'subject_info': subject,
+        'questionnaire_type': questionnaire_type if questionnaire_type else "未知",
+        'score': score if score is not None else "N/A",
+        'scale_interpretation': budgeted("interpretation", scale_interpretation) if scale_interpretation else "无",
+        'criminal_record_text': '是' if subject.get('criminal_record', 0) == 1 else '否',
+    }
+    prompt = (drop_unfilled_lines(template, subject) if compact else template).format(**context)
+    legacy_tokens = estimate_tokens(template.format(**dict(context, questionnaire=legacy_questionnaire,
+                                                           questionnaire_format=legacy_format,
+                                                           description=description or "无",
+                                                           scale_interpretation=scale_interpretation or "无")))
+
+    stats = {
+        "sections": {
+            "description": estimate_tokens(context['description']),
+            "questionnaire": estimate_tokens(context['questionnaire']),
+            "interpretation": estimate_tokens(context['scale_interpretation']),
+        },
+        "truncated": truncated,
+        "prompt_tokens": estimate_tokens(prompt),
+        "legacy_prompt_tokens": legacy_tokens,
+    }
+    return prompt, stats
@@ -1,9 +1,8 @@
 # src/report_generator.py
-from openai import OpenAI
-import json
 import os
 import logging
 import sys # 添加sys导入
+import time
 
 # --- 导入 settings ---
 # 确保路径正确，以便能够导入 settings
@@ -19,6 +18,7 @@ except ImportError as e:
         DASHSCOPE_API_KEY = None
         TEXT_MODEL = "qwen-plus"
         REPORT_PROMPT_TEMPLATE = None
+        LLM_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
         APP_NAME = "FallbackApp"
     settings = MockSettings()
     print(f"警告: 无法在 report_generator.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
@@ -29,10 +29,16 @@ logger = logging.getLogger(settings.APP_NAME)
 if not logger.hasHandlers():
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+from src.llm_clients import get_llm_client, get_async_llm_client, ROLE_REPORT
+from src.prompt_builder import build_report_prompt, SUBJECT_KEYS
+
 
 class ReportGenerator:
-    def __init__(self, config):
-        """Initializes ReportGenerator with configuration and explicit safe headers."""
+    def __init__(self, config, async_client=None):
+        """
+        Initializes ReportGenerator with configuration and the process-wide shared LLM client.
+        async_client: optional AsyncOpenAI client override used by agenerate_report (async worker mode).
+        """
         self.config = config # Store config if needed elsewhere
         # 从 settings 获取 API Key 和模型名称
         self.api_key = settings.DASHSCOPE_API_KEY
@@ -41,24 +47,13 @@ class ReportGenerator:
             raise ValueError("API Key missing for ReportGenerator.")
 
         self.model = settings.TEXT_MODEL # 从 settings 获取文本模型
-        self.base_url = config.get("base_url", "https://dashscope.aliyuncs.com/compatible-mode/v1")
-
-        # --- Explicitly set safe default headers ---
-        safe_headers = {
-            "User-Agent": "MyPsychologyApp-ReportGenerator/1.0",
-            "Accept": "application/json",
-        }
+        self.base_url = config.get("base_url", settings.LLM_BASE_URL)
 
-        try:
-            self.client = OpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                default_headers=safe_headers
-            )
-            logger.info(f"ReportGenerator OpenAI client initialized. Base URL: {self.base_url}. Using explicit safe headers.")
-        except Exception as e:
-            logger.error(f"Failed to initialize OpenAI client in ReportGenerator: {e}", exc_info=True)
-            raise
+        # 共享客户端 (连接池、keep-alive、超时、User-Agent 见 src/llm_clients.py)，不再为每次评估新建
+        self.client = get_llm_client(ROLE_REPORT, api_key=self.api_key, base_url=self.base_url)
+        logger.debug(f"ReportGenerator using shared OpenAI client. Base URL: {self.base_url}.")
+        self.async_client = async_client
+        self.last_prompt_stats = None
 
         # --- Default prompt template definition (moved inside init for clarity) ---
         self.default_prompt_template = """
@@ -87,7 +82,7 @@ class ReportGenerator:
 **III. 量表分析:**
 量表类型: {questionnaire_type}
 量表得分: {score}
-量表答案详情 (JSON):
+量表答案 ({questionnaire_format}):
 {questionnaire}
 初步解释: {scale_interpretation}
 
@@ -110,84 +105,111 @@ class ReportGenerator:
             self.prompt_template = self.default_prompt_template
 
 
-    # 确保 generate_report 方法也正确包含 self 和所有需要的参数
-    def generate_report(self, description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation):
-        """Generates the report by formatting the prompt and calling the LLM API."""
-        logger.info(f"Generating report for subject: {subject_info.get('name', 'N/A')}")
-
-        # --- 在这里计算 criminal_record_text ---
-        criminal_record_text = '是' if subject_info.get('criminal_record', 0) == 1 else '否'
-        # ------------------------------------
-
-        # Safely format questionnaire data (which should be a dictionary passed from ai_utils)
-        questionnaire_str = "N/A"
-        if questionnaire and isinstance(questionnaire, dict): # Check if it's a dict
-            try:
-                # Dump the dictionary to a pretty JSON string for the prompt
-                questionnaire_str = json.dumps(questionnaire, ensure_ascii=False, indent=2)
-            except Exception as json_err:
-                logger.warning(f"Could not dump questionnaire dict to JSON: {json_err}. Using raw dict string.")
-                questionnaire_str = str(questionnaire) # Fallback
-        elif isinstance(questionnaire, str): # If it's already a string (e.g., JSON string)
-            questionnaire_str = questionnaire
-        elif questionnaire:
-            logger.warning(f"Unexpected type for questionnaire data: {type(questionnaire)}. Using raw string.")
-            questionnaire_str = str(questionnaire)
-
-
-        # --- 构建 prompt_context，包含所有模板需要的键 ---
-        prompt_context = {
-            'description': description if description else "无",
-            'questionnaire': questionnaire_str, # Use formatted string
-            'subject_info': subject_info if subject_info else {}, # Ensure it's a dict
-            'questionnaire_type': questionnaire_type if questionnaire_type else "未知",
-            'score': score if score is not None else "N/A",
-            'scale_interpretation': scale_interpretation if scale_interpretation else "无",
-            'criminal_record_text': criminal_record_text # <--- 添加计算出的文本
-        }
-        # ---------------------------------------------
-
-        # Ensure all required keys for the template exist in subject_info context
-        default_keys = ["name", "gender", "id_card", "age", "occupation", "case_name", "case_type", "identity_type", "person_type", "marital_status", "children_info", "criminal_record", "health_status", "phone_number", "domicile"]
-        # Ensure subject_info itself is a dict before iterating
-        if isinstance(prompt_context['subject_info'], dict):
-            for key in default_keys:
-                prompt_context['subject_info'].setdefault(key, '未提供') # Set default if key missing
-        else: # If subject_info is somehow not a dict, create a default one
-            logger.warning(f"subject_info was not a dictionary (type: {type(prompt_context['subject_info'])}). Creating default context.")
-            prompt_context['subject_info'] = {key: '未提供' for key in default_keys}
-
+    def build_messages(self, description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation):
+        """Formats the prompt template and returns the chat messages for the report model."""
+        logger.info(f"Generating report for subject: {subject_info.get('name', 'N/A') if isinstance(subject_info, dict) else 'N/A'}")
 
+        # 紧凑编码量表答案、省略未填写字段、按段 token 预算截断 (见 src/prompt_builder.py)
         try:
-            # --- 使用 self.prompt_template 和构建好的 context 格式化 ---
-            final_prompt = self.prompt_template.format(**prompt_context)
+            final_prompt, self.last_prompt_stats = build_report_prompt(
+                self.prompt_template, description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation
+            )
             logger.debug(f"Formatted Prompt (first 500 chars): {final_prompt[:500]}...")
         except KeyError as e:
-            logger.error(f"Prompt template formatting error: Missing key {e}. Context keys available: {list(prompt_context.keys())}", exc_info=True)
+            logger.error(f"Prompt template formatting error: Missing key {e}.", exc_info=True)
             # Check if the missing key is expected in subject_info
-            if str(e).strip("'") in default_keys:
-                logger.error(f"Missing key '{e}' likely expected within subject_info dictionary: {prompt_context.get('subject_info')}")
+            if str(e).strip("'") in SUBJECT_KEYS:
+                logger.error(f"Missing key '{e}' likely expected within subject_info dictionary: {subject_info}")
             raise KeyError(f"Prompt template formatting error: Missing key {e}") from e
         except Exception as e_fmt:
             logger.error(f"Prompt template formatting error: {e_fmt}", exc_info=True)
             raise Exception(f"Prompt template formatting error: {e_fmt}") from e_fmt
 
+        stats = self.last_prompt_stats
+        logger.info(f"Report prompt tokens (估算): {stats['prompt_tokens']} "
+                    f"(旧编码约 {stats['legacy_prompt_tokens']}), sections={stats['sections']}"
+                    + (f", truncated={stats['truncated']}" if stats['truncated'] else ""))
 
         messages = [
             # Refined system prompt
             {"role": "system", "content": "你是一位专业的心理分析师。请根据用户提供的多维度信息（基础信息、绘画描述、量表结果与解释），结合心理学知识和警务场景，生成一份结构清晰、分析深入、建议具体的综合心理评估报告。"},
             {"role": "user", "content": final_prompt}
         ]
+        return messages
 
+    # 确保 generate_report 方法也正确包含 self 和所有需要的参数
+    def generate_report(self, description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation,
+                        on_chunk=None):
+        """
+        Generates the report by formatting the prompt and calling the LLM API.
+        If on_chunk is given, the model is called in streaming mode and on_chunk(delta) is invoked for
+        every text fragment; the full concatenated text is still returned.
+        """
+        messages = self.build_messages(description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation)
+        started = time.perf_counter()
         try:
+            if on_chunk is not None:
+                logger.debug(f"Calling text model '{self.model}' (streaming)...")
+                stream = self.client.chat.completions.create(model=self.model, messages=messages, stream=True)
+                parts = []
+                for chunk in stream:
+                    delta = _chunk_text(chunk)
+                    if delta:
+                        parts.append(delta)
+                        on_chunk(delta)
+                report_content = "".join(parts)
+                logger.info(f"Report content streamed successfully ({len(parts)} chunks, {(time.perf_counter() - started) * 1000:.0f}ms).")
+                return report_content
             logger.debug(f"Calling text model '{self.model}'...")
             completion = self.client.chat.completions.create(
                 model=self.model, # 使用 self.model
                 messages=messages,
             )
             report_content = completion.choices[0].message.content
-            logger.info("Report content received successfully.")
+            logger.info(f"Report content received successfully ({(time.perf_counter() - started) * 1000:.0f}ms).")
             return report_content
         except Exception as e:
             logger.error(f"Error calling text generation API: {type(e).__name__} - {e}", exc_info=True)
-            raise Exception(f"调用大模型 API 时出错 - {str(e)}") from e
\ No newline at end of file
+            raise Exception(f"调用大模型 API 时出错 - {str(e)}") from e
+
+    async def agenerate_report(self, description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation,
+                               on_chunk=None):
+        """
+        Async variant of generate_report using an AsyncOpenAI client (for the asyncio worker).
+        on_chunk, if given, is an async callable awaited with each streamed text fragment.
+        """
+        if self.async_client is None:
+            self.async_client = get_async_llm_client(ROLE_REPORT, api_key=self.api_key, base_url=self.base_url)
+        messages = self.build_messages(description, questionnaire, subject_info, questionnaire_type, score, scale_interpretation)
+        started = time.perf_counter()
+        try:
+            if on_chunk is not None:
+                logger.debug(f"Calling text model '{self.model}' (async, streaming)...")
+                stream = await self.async_client.chat.completions.create(model=self.model, messages=messages, stream=True)
+                parts = []
+                async for chunk in stream:
+                    delta = _chunk_text(chunk)
+                    if delta:
+                        parts.append(delta)
+                        await on_chunk(delta)
+                report_content = "".join(parts)
+                logger.info(f"Report content streamed successfully ({len(parts)} chunks, {(time.perf_counter() - started) * 1000:.0f}ms).")
+                return report_content
+            logger.debug(f"Calling text model '{self.model}' (async)...")
+            completion = await self.async_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+            )
+            report_content = completion.choices[0].message.content
+            logger.info(f"Report content received successfully ({(time.perf_counter() - started) * 1000:.0f}ms).")
+            return report_content
+        except Exception as e:
+            logger.error(f"Error calling text generation API: {type(e).__name__} - {e}", exc_info=True)
+            raise Exception(f"调用大模型 API 时出错 - {str(e)}") from e
+
+
+def _chunk_text(chunk):
+    """Extracts the text delta from a streamed chat completion chunk (None for role/usage-only chunks)."""
+    if not chunk.choices:
+        return None
+    return chunk.choices[0].delta.content
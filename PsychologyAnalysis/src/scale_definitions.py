@@ -0,0 +1,121 @@
+# 文件路径: PsychologyAnalysis/src/scale_definitions.py
+"""
+量表定义 (input/questionnaires/*.json) 的统一加载入口。
+
+文件名/标题到量表代码 (questionnaire_type) 的映射原先写在 import_questions.py 中，
+现在集中在这里，供题库导入、计分引擎等共用。新增量表时只需放入 JSON 文件并在映射中登记代码。
+"""
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Dict, Optional
+
+SRC_DIR_SCALES = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_SCALES = os.path.dirname(SRC_DIR_SCALES) # PsychologyAnalysis/
+if PROJECT_ROOT_SCALES not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_SCALES)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 scale_definitions.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+logger = logging.getLogger(settings.APP_NAME)
+
+QUESTIONNAIRE_DIR = os.path.join(PROJECT_ROOT_SCALES, "input", "questionnaires")
+
+# 文件名 -> 量表代码和名称
+SCALE_FILE_MAPPING = {
+    "1测你性格最真实的一面.json": {"code": "Personality", "name": "测你性格最真实的一面"},
+    "2亲子关系问卷量表.json": {"code": "ParentChild", "name": "亲子关系问卷量表"},
+    "3焦虑症自评量表 (SAS).json": {"code": "SAS", "name": "焦虑症自评量表 (SAS)"},
+    "4标准量表：抑郁症自测量表 (SDS).json": {"code": "SDS", "name": "抑郁症自测量表 (SDS)"},
+    "5人际关系综合诊断量表.json": {"code": "InterpersonalRelationship", "name": "人际关系综合诊断量表"},
+    "6情绪稳定性测验量表.json": {"code": "EmotionalStability", "name": "情绪稳定性测验量表"},
+    "7汉密尔顿抑郁量表HAMD24.json": {"code": "HAMD24", "name": "汉密尔顿抑郁量表 (HAMD-24)"},
+    "8艾森克人格问卷EPQ85成人版.json": {"code": "EPQ85", "name": "艾森克人格问卷 (EPQ-85成人版)"},
+    "9开心测试.json": {"code": "HappyTest", "name": "开心测试"},
+}
+# JSON 中的 title -> 量表代码和名称 (优先于文件名映射)
+SCALE_TITLE_MAPPING = {
+    "测你性格最真实的一面": {"code": "Personality", "name": "测你性格最真实的一面"},
+    "亲子关系问卷量表": {"code": "ParentChild", "name": "亲子关系问卷量表"},
+    "焦虑症自评量表 (SAS)": {"code": "SAS", "name": "焦虑症自评量表 (SAS)"},
+    "标准量表：抑郁症自测量表 (SDS)": {"code": "SDS", "name": "抑郁症自测量表 (SDS)"},
+    "人际关系综合诊断量表": {"code": "InterpersonalRelationship", "name": "人际关系综合诊断量表"},
+    "情绪稳定性测验量表": {"code": "EmotionalStability", "name": "情绪稳定性测验量表"},
+    "汉密尔顿抑郁量表HAMD24": {"code": "HAMD24", "name": "汉密尔顿抑郁量表 (HAMD-24)"},
+    "艾森克人格问卷EPQ85成人版": {"code": "EPQ85", "name": "艾森克人格问卷 (EPQ-85成人版)"},
+    "开心测试": {"code": "HappyTest", "name": "开心测试"},
+}
+
+# 是/否 题 (如 EPQ) 选项 value 对应的作答分值：是=1，否=0
+YES_NO_SCORES = {"yes": 1, "no": 0}
+
+
+def resolve_scale_info(filename: str, data: Dict[str, Any]) -> Dict[str, str]:
+    """按 title、文件名的顺序确定量表代码和名称；都未登记时以文件名 (不含扩展名) 作为代码。"""
+    title = data.get("title")
+    if title and title in SCALE_TITLE_MAPPING:
+        return dict(SCALE_TITLE_MAPPING[title])
+    if filename in SCALE_FILE_MAPPING:
+        return dict(SCALE_FILE_MAPPING[filename])
+    code = os.path.splitext(filename)[0]
+    logger.warning(f"量表文件 '{filename}' (title: '{title}') 未登记代码，使用文件名 '{code}' 作为代码。")
+    return {"code": code, "name": title or code}
+
+
+def option_score(option: Dict[str, Any]) -> Any:
+    """选项的作答分值：优先使用 score，是/否题按 value 换算 (yes=1, no=0)。"""
+    if option.get("score") is not None:
+        return option["score"]
+    return YES_NO_SCORES.get(str(option.get("value", "")).lower(), 0)
+
+
+def load_scale_definitions(directory: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    读取目录下全部量表 JSON，返回 {量表代码: 定义}。
+    定义即 JSON 内容，另外补充 code、name、file 三个键。解析失败的文件记录日志后跳过。
+    """
+    directory = directory or QUESTIONNAIRE_DIR
+    definitions: Dict[str, Dict[str, Any]] = {}
+    if not os.path.isdir(directory):
+        logger.error(f"量表目录不存在: {directory}")
+        return definitions
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"读取量表文件 '{filename}' 失败: {e}")
+            continue
+        if not isinstance(data, dict):
+            logger.error(f"量表文件 '{filename}' 格式错误 (根元素不是对象)，已跳过。")
+            continue
+        info = resolve_scale_info(filename, data)
+        data.update(code=info["code"], name=info["name"], file=filename)
+        definitions[info["code"]] = data
+    return definitions
+
+
+_definitions: Optional[Dict[str, Dict[str, Any]]] = None
+_definitions_lock = threading.Lock()
+
+
+def get_scale_definitions(reload: bool = False) -> Dict[str, Dict[str, Any]]:
+    """进程内缓存的量表定义 (首次调用时加载)。"""
+    global _definitions
+    if _definitions is None or reload:
+        with _definitions_lock:
+            if _definitions is None or reload:
+                _definitions = load_scale_definitions()
+                logger.info(f"已加载 {len(_definitions)} 个量表定义: {sorted(_definitions)}")
+    return _definitions
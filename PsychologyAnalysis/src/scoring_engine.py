@@ -0,0 +1,269 @@
+# 文件路径: PsychologyAnalysis/src/scoring_engine.py
+"""
+数据驱动的向量化量表计分引擎。
+
+每个量表定义 (src/scale_definitions.py) 编译为两个 (题目数 × 维度数) 的矩阵 W、C：
+    维度得分 = A @ W + M @ C
+其中 A 为作答矩阵 (每行一份答卷，每列一道题的作答分值)，M 为作答掩码 (已作答 = 1)。
+  - 普通题:  W = 维度权重, C = 0
+  - 反向题:  W = -权重,    C = 权重 × (选项最小分 + 最大分)       (反向分 = min + max - a)
+  - 是/否题: 作答 是=1 否=0；"是" 计分题 W = 权重，"否" 计分题 W = -权重、C = 权重 (计 1 - a)
+未作答的题在 A 和 M 中都为 0，不计入任何维度。
+
+量表 JSON 可选的计分字段:
+  - scoring_rules: {维度: {"yes": [题号], "no": [题号]}} (是/否题，如 EPQ85)
+                   或 {维度: {"items": [题号], "reverse": [题号]}}；每个维度可带 "weight" (默认 1)
+  - reverse_items: [题号] (无 scoring_rules 时，对总分维度生效)
+没有 scoring_rules 的量表只有一个维度 "total" (全部题目得分之和)。
+新增量表只需放入 JSON 文件，不需要修改代码。
+"""
+import logging
+import os
+import re
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SRC_DIR_SCORING = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_SCORING = os.path.dirname(SRC_DIR_SCORING) # PsychologyAnalysis/
+if PROJECT_ROOT_SCORING not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_SCORING)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 scoring_engine.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+from src.scale_definitions import get_scale_definitions, option_score
+
+logger = logging.getLogger(settings.APP_NAME)
+
+TOTAL_DIMENSION = "total"
+_ITEM_KEY_RE = re.compile(r"^[A-Za-z_]*(\d+)$")
+# 是/否题允许的文本作答
+_YES_NO_TEXT = {"yes": 1.0, "no": 0.0, "是": 1.0, "否": 0.0, "true": 1.0, "false": 0.0}
+
+
+class ScaleScore:
+    """单份答卷的计分结果。"""
+
+    def __init__(self, scale_code: str, dimensions: Dict[str, float], answered: int, item_count: int):
+        self.scale_code = scale_code
+        self.dimensions = dimensions
+        self.answered = answered
+        self.item_count = item_count
+
+    @property
+    def total(self) -> Optional[float]:
+        """单维度量表的总分；多维度量表 (如 EPQ85) 没有有意义的总分，返回 None。"""
+        return self.dimensions.get(TOTAL_DIMENSION)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"scale_code": self.scale_code, "dimensions": self.dimensions,
+                "answered": self.answered, "item_count": self.item_count}
+
+
+class CompiledScale:
+    """编译后的量表：题号 -> 列号映射、维度列表以及计分矩阵 W、C。"""
+
+    def __init__(self, code: str, name: str, item_numbers: Sequence[int], dimensions: Sequence[str],
+                 weights: np.ndarray, constants: np.ndarray, yes_no: bool):
+        self.code = code
+        self.name = name
+        self.item_numbers = np.asarray(item_numbers, dtype=np.int64)
+        self.column = {int(n): i for i, n in enumerate(self.item_numbers)}
+        self._key_columns: Dict[Any, Optional[int]] = {}
+        self.dimensions = tuple(dimensions)
+        self.weights = weights
+        self.constants = constants
+        self.yes_no = yes_no
+
+    @property
+    def item_count(self) -> int:
+        return len(self.item_numbers)
+
+    # --- 编码 ---
+    def _column_for_key(self, key: Any) -> Optional[int]:
+        """答案键 ('q12' / '12' / 12) -> 列号；结果按键缓存，批量编码时不再重复做正则匹配。"""
+        try:
+            return self._key_columns[key]
+        except KeyError:
+            match = _ITEM_KEY_RE.match(str(key))
+            col = self.column.get(int(match.group(1))) if match else None
+            self._key_columns[key] = col
+            return col
+
+    def _parse_value(self, value: Any) -> Optional[float]:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if value is None or value == "":
+            return None
+        if self.yes_no and isinstance(value, str) and value.strip().lower() in _YES_NO_TEXT:
+            return _YES_NO_TEXT[value.strip().lower()]
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    def encode(self, answers: Dict[str, Any], out_a: List[float], out_m: List[float]) -> int:
+        """把 {'q1': 3, ...} 写入作答行 out_a / 掩码行 out_m，返回无法识别的作答数。"""
+        invalid = 0
+        column_for_key = self._column_for_key
+        parse_value = self._parse_value
+        for key, value in answers.items():
+            col = column_for_key(key)
+            parsed = parse_value(value) if col is not None else None
+            if parsed is None:
+                invalid += 1
+                continue
+            out_a[col] = parsed
+            out_m[col] = 1.0
+        return invalid
+
+    def encode_batch(self, answer_sets: Sequence[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        # 先在 Python 列表中填值，最后一次性转成数组 (逐元素写 ndarray 比写列表慢得多)
+        rows_a = [[0.0] * self.item_count for _ in answer_sets]
+        rows_m = [[0.0] * self.item_count for _ in answer_sets]
+        invalid = 0
+        for row, answers in enumerate(answer_sets):
+            if answers:
+                invalid += self.encode(answers, rows_a[row], rows_m[row])
+        a = np.array(rows_a, dtype=np.float64).reshape(len(answer_sets), self.item_count)
+        m = np.array(rows_m, dtype=np.float64).reshape(len(answer_sets), self.item_count)
+        if invalid:
+            logger.warning(f"量表 '{self.code}' 计分时忽略了 {invalid} 个无法识别的作答 (未知题号或非数值)。")
+        return a, m
+
+    # --- 计分 ---
+    def score_matrix(self, a: np.ndarray, m: np.ndarray) -> np.ndarray:
+        """A @ W + M @ C，返回 (答卷数 × 维度数) 的得分矩阵。"""
+        return a @ self.weights + m @ self.constants
+
+    def score(self, answers: Dict[str, Any]) -> ScaleScore:
+        a, m = self.encode_batch([answers or {}])
+        scores = self.score_matrix(a, m)[0]
+        return ScaleScore(self.code, {d: as_number(v) for d, v in zip(self.dimensions, scores)},
+                          int(m.sum()), self.item_count)
+
+    def score_batch(self, answer_sets: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """一次计算多份答卷，返回 (答卷数 × 维度数) 的得分矩阵，列顺序同 self.dimensions。"""
+        a, m = self.encode_batch(answer_sets)
+        return self.score_matrix(a, m)
+
+
+def as_number(value: float):
+    """numpy 得分 -> int (整数值) 或保留 4 位小数的 float，便于 JSON 序列化和入库。"""
+    value = float(value)
+    return int(value) if value.is_integer() else round(value, 4)
+
+
+def compile_scale(definition: Dict[str, Any]) -> CompiledScale:
+    """把一个量表定义编译为 CompiledScale。定义不合法时抛出 ValueError。"""
+    code = definition.get("code") or definition.get("title")
+    questions = definition.get("questions") or []
+    if not questions:
+        raise ValueError(f"量表 '{code}' 没有题目")
+
+    item_numbers = sorted(int(q["number"]) for q in questions)
+    column = {n: i for i, n in enumerate(item_numbers)}
+    # 每题选项分值的最小/最大值 (反向计分用)
+    option_range = {}
+    yes_no = True
+    for q in questions:
+        options = [o for o in q.get("options", []) if isinstance(o, dict)]
+        if any(o.get("score") is not None or str(o.get("value", "")).lower() not in ("yes", "no") for o in options):
+            yes_no = False
+        scores = [float(option_score(o)) for o in options]
+        option_range[int(q["number"])] = (min(scores), max(scores)) if scores else (0.0, 0.0)
+
+    rules = definition.get("scoring_rules") or {}
+    if not rules:
+        rules = {TOTAL_DIMENSION: {"items": item_numbers, "reverse": definition.get("reverse_items", [])}}
+    dimensions = list(rules)
+    weights = np.zeros((len(item_numbers), len(dimensions)), dtype=np.float64)
+    constants = np.zeros_like(weights)
+
+    def col_of(number) -> int:
+        if int(number) not in column:
+            raise ValueError(f"量表 '{code}' 的计分规则引用了不存在的题号 {number}")
+        return column[int(number)]
+
+    for d, dimension in enumerate(dimensions):
+        rule = rules[dimension]
+        weight = float(rule.get("weight", 1))
+        reverse = {int(n) for n in rule.get("reverse", [])}
+        for n in rule.get("items", []):
+            if int(n) in reverse:
+                continue
+            weights[col_of(n), d] = weight
+        for n in reverse:
+            low, high = option_range.get(n, (0.0, 0.0))
+            weights[col_of(n), d] = -weight
+            constants[col_of(n), d] = weight * (low + high)
+        for n in rule.get("yes", []):
+            weights[col_of(n), d] = weight
+        for n in rule.get("no", []):
+            weights[col_of(n), d] = -weight
+            constants[col_of(n), d] = weight
+
+    return CompiledScale(code, definition.get("name", code), item_numbers, dimensions, weights, constants, yes_no)
+
+
+class ScoringEngine:
+    """所有量表的编译结果。scale_code 未登记时 score() / score_batch() 抛出 KeyError。"""
+
+    def __init__(self, definitions: Dict[str, Dict[str, Any]]):
+        self.scales: Dict[str, CompiledScale] = {}
+        for code, definition in definitions.items():
+            try:
+                self.scales[code] = compile_scale(definition)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"编译量表 '{code}' 的计分矩阵失败，该量表将无法计分: {e}")
+
+    def get(self, scale_code: str) -> Optional[CompiledScale]:
+        return self.scales.get(scale_code)
+
+    def score(self, scale_code: str, answers: Dict[str, Any]) -> ScaleScore:
+        return self.scales[scale_code].score(answers)
+
+    def score_batch(self, scale_code: str, answer_sets: Sequence[Dict[str, Any]]) -> np.ndarray:
+        return self.scales[scale_code].score_batch(answer_sets)
+
+    def score_many(self, submissions: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Optional[ScaleScore]]:
+        """按量表分组后批量计分；输入为 (量表代码, 答案) 序列，未知量表对应 None，顺序与输入一致。"""
+        submissions = list(submissions)
+        results: List[Optional[ScaleScore]] = [None] * len(submissions)
+        groups: Dict[str, List[int]] = {}
+        for idx, (scale_code, _) in enumerate(submissions):
+            if scale_code in self.scales:
+                groups.setdefault(scale_code, []).append(idx)
+        for scale_code, indices in groups.items():
+            scale = self.scales[scale_code]
+            a, m = scale.encode_batch([submissions[i][1] or {} for i in indices])
+            scores = scale.score_matrix(a, m)
+            answered = m.sum(axis=1)
+            for row, idx in enumerate(indices):
+                results[idx] = ScaleScore(scale_code, {d: as_number(v) for d, v in zip(scale.dimensions, scores[row])},
+                                          int(answered[row]), scale.item_count)
+        return results
+
+
+_engine: Optional[ScoringEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_scoring_engine(reload: bool = False) -> ScoringEngine:
+    """进程内共享的计分引擎，首次调用 (或 reload=True) 时从量表定义编译。"""
+    global _engine
+    if _engine is None or reload:
+        with _engine_lock:
+            if _engine is None or reload:
+                _engine = ScoringEngine(get_scale_definitions(reload=reload))
+                logger.info(f"计分引擎已编译 {len(_engine.scales)} 个量表: "
+                            + ", ".join(f"{s.code}({s.item_count}题×{len(s.dimensions)}维)" for s in _engine.scales.values()))
+    return _engine
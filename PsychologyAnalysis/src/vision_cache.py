@@ -0,0 +1,254 @@
+# src/vision_cache.py
+"""
+图片描述的内容寻址缓存。
+
+同一张图片 (按原图字节的 SHA-256 判断，与文件名/上传时间无关) 在相同的视觉模型、Prompt 版本和预处理参数下，
+描述结果直接复用，不再调用视觉模型，也不再做预处理。
+缓存键 = sha256(原图字节，即图片存储中的键) + 模型名 + 版本 (Prompt 版本/预处理参数，见 src/image_processor.py)。
+
+两级缓存:
+  1. 本地 SQLite 文件 (VISION_CACHE_DB_PATH)，持久化，按最近访问时间做 LRU 淘汰 (VISION_CACHE_MAX_ENTRIES)；
+  2. 可选的 Redis 层 (VISION_CACHE_REDIS_ENABLED)，多台 worker 共享，条目带 TTL，
+     由 Redis 的 maxmemory-policy (建议 allkeys-lru) 负责内存淘汰。
+查找顺序为本地 -> Redis，Redis 命中时回填本地。只缓存成功的描述。
+命中/未命中计数: 进程内按层统计 (cache_stats())，启用 Redis 时另外用 INCR 维护全局计数。
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# --- 导入 settings ---
+SRC_DIR_VISION_CACHE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT_VISION_CACHE = os.path.dirname(SRC_DIR_VISION_CACHE) # PsychologyAnalysis/
+if PROJECT_ROOT_VISION_CACHE not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT_VISION_CACHE)
+
+try:
+    from app.core.config import settings
+except ImportError as e:
+    class MockSettings:
+        VISION_CACHE_ENABLED = True
+        VISION_CACHE_DB_PATH = os.path.join(PROJECT_ROOT_VISION_CACHE, "vision_cache.db")
+        VISION_CACHE_MAX_ENTRIES = 10000
+        VISION_CACHE_REDIS_ENABLED = False
+        VISION_CACHE_REDIS_TTL = 30 * 24 * 3600
+        REDIS_URL = "redis://localhost:6379/0"
+        APP_NAME = "FallbackApp"
+    settings = MockSettings()
+    print(f"警告: 无法在 vision_cache.py 中导入 app.core.config.settings: {e}", file=sys.stderr)
+
+logger = logging.getLogger(settings.APP_NAME)
+
+REDIS_KEY_PREFIX = "vision-cache:"
+REDIS_HITS_KEY = "vision-cache-stats:hits"
+REDIS_MISSES_KEY = "vision-cache-stats:misses"
+# 每写入多少条检查一次本地条目数并淘汰
+EVICT_CHECK_EVERY = 50
+
+
+def image_digest(image_bytes: bytes) -> str:
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """按块计算文件内容的 SHA-256，结果与 image_digest(文件字节) 相同。"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(digest: str, model: str, prompt_version: str) -> str:
+    return f"{digest}:{model}:{prompt_version}"
+
+
+class VisionCache:
+    """两级图片描述缓存。线程安全；fork 后由 get_vision_cache() 重新创建。"""
+
+    def __init__(self, db_path: str, max_entries: int, redis_url: Optional[str] = None, redis_ttl: int = 0):
+        self.pid = os.getpid()
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.redis_ttl = redis_ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vision_cache (
+                cache_key TEXT PRIMARY KEY,
+                image_sha256 TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                description TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_vision_cache_last_access ON vision_cache (last_access)")
+        self._conn.commit()
+
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, decode_responses=True, socket_timeout=2)
+            except Exception as e:
+                logger.warning(f"Vision cache: Redis 层初始化失败，仅使用本地缓存: {e}")
+
+    # --- 本地 SQLite 层 ---
+    def _local_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT description FROM vision_cache WHERE cache_key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE vision_cache SET last_access = ?, hits = hits + 1 WHERE cache_key = ?",
+                               (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def _local_put(self, key: str, digest: str, model: str, prompt_version: str, description: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO vision_cache (cache_key, image_sha256, model, prompt_version, description, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(cache_key) DO UPDATE SET description = excluded.description, last_access = excluded.last_access",
+                (key, digest, model, prompt_version, description, now, now),
+            )
+            self._writes += 1
+            if self._writes % EVICT_CHECK_EVERY == 0:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _evict_locked(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM vision_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM vision_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM vision_cache ORDER BY last_access ASC LIMIT ?)", (overflow,)
+            )
+            self.stats["evictions"] += overflow
+            logger.info(f"Vision cache: 本地缓存超过 {self.max_entries} 条，按 LRU 淘汰 {overflow} 条")
+
+    # --- 对外接口 ---
+    def get(self, digest: str, model: str, prompt_version: str) -> Optional[str]:
+        key = cache_key(digest, model, prompt_version)
+        try:
+            description = self._local_get(key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Vision cache: 读取本地缓存失败: {e}")
+            description = None
+        if description is not None:
+            self.stats["local_hits"] += 1
+            self._count_redis(REDIS_HITS_KEY)
+            return description
+
+        if self._redis is not None:
+            try:
+                description = self._redis.get(REDIS_KEY_PREFIX + key)
+                if description is not None:
+                    self._redis.expire(REDIS_KEY_PREFIX + key, self.redis_ttl)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Vision cache: 读取 Redis 缓存失败: {e}")
+                description = None
+            if description is not None:
+                self.stats["redis_hits"] += 1
+                self._count_redis(REDIS_HITS_KEY)
+                try:
+                    self._local_put(key, digest, model, prompt_version, description) # 回填本地
+                except Exception as e:
+                    logger.warning(f"Vision cache: 回填本地缓存失败: {e}")
+                return description
+
+        self.stats["misses"] += 1
+        self._count_redis(REDIS_MISSES_KEY)
+        return None
+
+    def put(self, digest: str, model: str, prompt_version: str, description: str):
+        key = cache_key(digest, model, prompt_version)
+        try:
+            self._local_put(key, digest, model, prompt_version, description)
+            self.stats["stores"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"Vision cache: 写入本地缓存失败: {e}")
+        if self._redis is not None:
+            try:
+                self._redis.set(REDIS_KEY_PREFIX + key, description, ex=self.redis_ttl or None)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Vision cache: 写入 Redis 缓存失败: {e}")
+
+    def _count_redis(self, counter_key: str):
+        if self._redis is None:
+            return
+        try:
+            self._redis.incr(counter_key)
+        except Exception:
+            pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["local_hits"] + stats["redis_hits"]) / lookups, 4) if lookups else 0.0
+        if self._redis is not None:
+            try:
+                hits, misses = self._redis.mget(REDIS_HITS_KEY, REDIS_MISSES_KEY)
+                hits, misses = int(hits or 0), int(misses or 0)
+                stats["global_hit_rate"] = round(hits / (hits + misses), 4) if hits + misses else 0.0
+            except Exception:
+                pass
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[VisionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> Optional[VisionCache]:
+    """返回当前进程的缓存实例；VISION_CACHE_ENABLED 为 False 或初始化失败时返回 None。"""
+    global _cache
+    if not settings.VISION_CACHE_ENABLED:
+        return None
+    cache = _cache
+    if cache is not None and cache.pid == os.getpid():
+        return cache
+    with _cache_lock:
+        if _cache is None or _cache.pid != os.getpid():
+            try:
+                _cache = VisionCache(
+                    settings.VISION_CACHE_DB_PATH,
+                    settings.VISION_CACHE_MAX_ENTRIES,
+                    redis_url=settings.REDIS_URL if settings.VISION_CACHE_REDIS_ENABLED else None,
+                    redis_ttl=settings.VISION_CACHE_REDIS_TTL,
+                )
+                logger.info(f"Vision cache: 已打开本地缓存 {settings.VISION_CACHE_DB_PATH} (PID {os.getpid()})")
+            except Exception as e:
+                logger.error(f"Vision cache: 初始化失败，本进程不使用缓存: {e}", exc_info=True)
+                return None
+        return _cache
+
+
+def cache_stats() -> Dict[str, Any]:
+    cache = _cache
+    if cache is None or cache.pid != os.getpid():
+        return {}
+    return cache.snapshot()
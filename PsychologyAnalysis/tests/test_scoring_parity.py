@@ -0,0 +1,198 @@
+# 文件路径: PsychologyAnalysis/tests/test_scoring_parity.py
+"""
+计分引擎 (src/scoring_engine.py) 和表驱动解释 (src/interpretation_rules.py) 与原先
+ai_utils.calculate_score_and_interpret 中 if/elif 逻辑的一致性测试。
+
+运行: cd PsychologyAnalysis && python -m pytest -q tests
+"""
+import math
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from src.interpretation_rules import BandTable, compile_band_table, get_interpreters
+from src.scale_definitions import get_scale_definitions, option_score
+from src.scoring_engine import TOTAL_DIMENSION, get_scoring_engine
+
+SINGLE_TOTAL_SCALES = ["SAS", "SDS", "ParentChild", "Personality", "InterpersonalRelationship",
+                       "EmotionalStability", "HAMD24", "HappyTest"]
+SUBMISSIONS_PER_SCALE = 200
+
+
+def legacy_interpretation(scale_type, calculated_score):
+    """原 calculate_score_and_interpret 的解释分支 (逐字保留阈值和文本)，作为对照。"""
+    interpretation = f"量表 '{scale_type}' 总得分: {calculated_score}."
+    if scale_type == 'SAS':
+        standard_score = int(calculated_score * 1.25)
+        interpretation = f"量表 '{scale_type}' 原始得分: {calculated_score}, 标准分: {standard_score}."
+        if standard_score >= 70: interpretation += " (重度焦虑水平)"
+        elif standard_score >= 60: interpretation += " (中度焦虑水平)"
+        elif standard_score >= 50: interpretation += " (轻度焦虑水平)"
+        else: interpretation += " (焦虑水平在正常范围)"
+    elif scale_type == 'SDS':
+        standard_score = int(calculated_score * 1.25)
+        interpretation = f"量表 '{scale_type}' 原始得分: {calculated_score}, 标准分: {standard_score}."
+        if standard_score >= 73: interpretation += " (重度抑郁水平)"
+        elif standard_score >= 63: interpretation += " (中度抑郁水平)"
+        elif standard_score >= 53: interpretation += " (轻度抑郁水平)"
+        else: interpretation += " (抑郁水平在正常范围)"
+    elif scale_type == 'ParentChild':
+        if calculated_score >= 80: interpretation += " (亲子关系非常和谐)"
+        elif calculated_score >= 60: interpretation += " (亲子关系良好)"
+        else: interpretation += " (亲子关系可能存在挑战，建议关注)"
+    elif scale_type == 'Personality':
+        if calculated_score >= 101: interpretation += " (倾向：积极热情)"
+        elif calculated_score >= 90: interpretation += " (倾向：领导人特质)"
+        elif calculated_score >= 79: interpretation += " (倾向：感性)"
+        elif calculated_score >= 60: interpretation += " (倾向：理性&淡定)"
+        elif calculated_score >= 40: interpretation += " (倾向：双重&孤寂)"
+        else: interpretation += " (倾向：现实&自我)"
+        interpretation += " (具体解释需参考原始量表得分范围)"
+    elif scale_type == 'InterpersonalRelationship':
+        if calculated_score <= 8: interpretation += " (人际关系困扰较少)"
+        elif calculated_score <= 14: interpretation += " (人际关系存在一定困扰)"
+        else: interpretation += " (人际关系困扰较严重)"
+    elif scale_type == 'EmotionalStability':
+        if calculated_score <= 20: interpretation += " (情绪稳定，自信心强)"
+        elif calculated_score <= 40: interpretation += " (情绪基本稳定，但可能较为深沉或消极)"
+        else: interpretation += " (情绪不稳定，可能需要关注)"
+    elif scale_type == 'HAMD24':
+        if calculated_score >= 36: interpretation += " (重度抑郁)"
+        elif calculated_score >= 21: interpretation += " (肯定有抑郁)"
+        elif calculated_score >= 8: interpretation += " (可能有抑郁)"
+        else: interpretation += " (无抑郁症状)"
+    elif scale_type == 'HappyTest':
+        if calculated_score == 1:
+            interpretation += " (初步判断：用户表示今天很开心。)"
+        elif calculated_score == 0:
+            interpretation += " (初步判断：用户表示今天感到悲伤。)"
+        else:
+            interpretation += " (得分异常，无法解释。)"
+    return interpretation
+
+
+def legacy_total(answers):
+    """原先的逐项求和 (忽略 None 和非数值)。"""
+    scores = []
+    for value in answers.values():
+        if value is None:
+            continue
+        try:
+            score = float(value)
+        except (TypeError, ValueError):
+            continue
+        scores.append(int(score) if score.is_integer() else score)
+    return sum(scores)
+
+
+def random_submission(definition, rng):
+    """随机作答：每题以 90% 的概率作答 (随机选项)，键为 'q<题号>'。"""
+    answers = {}
+    for question in definition["questions"]:
+        if rng.random() < 0.9:
+            option = rng.choice(question["options"])
+            answers[f"q{question['number']}"] = option_score(option)
+    return answers
+
+
+@pytest.fixture(scope="module")
+def definitions():
+    return get_scale_definitions()
+
+
+@pytest.mark.parametrize("scale_code", SINGLE_TOTAL_SCALES)
+def test_single_total_scales_match_legacy(definitions, scale_code):
+    compiled = get_scoring_engine().get(scale_code)
+    interpreter = get_interpreters()[scale_code]
+    assert compiled.dimensions == (TOTAL_DIMENSION,)
+
+    rng = random.Random(f"parity:{scale_code}")
+    submissions = [random_submission(definitions[scale_code], rng) for _ in range(SUBMISSIONS_PER_SCALE)]
+    batch = compiled.score_batch(submissions)[:, 0]
+    for row, answers in enumerate(submissions):
+        expected = legacy_total(answers)
+        result = compiled.score(answers)
+        assert result.total == expected
+        assert batch[row] == expected
+        if result.answered:
+            assert interpreter.describe_total(result.total) == legacy_interpretation(scale_code, expected)
+
+
+@pytest.mark.parametrize("scale_code", SINGLE_TOTAL_SCALES)
+def test_interpretation_boundaries_match_legacy(scale_code):
+    """逐个整数总分 (覆盖所有阈值) 比较解释文本，以及批量分段与逐个查找的结果。"""
+    interpreter = get_interpreters()[scale_code]
+    totals = list(range(-5, 200))
+    for total in totals:
+        assert interpreter.describe_total(total) == legacy_interpretation(scale_code, total)
+    assert interpreter.total_bands_many(totals) == [interpreter.total_band(t) for t in totals]
+
+
+def _epq_expected(rules, answers):
+    """按 scoring_rules 逐题计数：'是' 计分题答是 +1，'否' 计分题答否 +1。"""
+    expected = {}
+    for dimension, rule in rules.items():
+        score = 0
+        for n in rule.get("yes", []):
+            score += answers.get(f"q{n}") == "yes"
+        for n in rule.get("no", []):
+            score += answers.get(f"q{n}") == "no"
+        expected[dimension] = score
+    return expected
+
+
+def test_epq85_dimensions(definitions):
+    compiled = get_scoring_engine().get("EPQ85")
+    rules = definitions["EPQ85"]["scoring_rules"]
+    assert compiled.dimensions == ("E", "N", "P", "L")
+
+    all_yes = {f"q{n}": "yes" for n in range(1, 86)}
+    all_no = {f"q{n}": "no" for n in range(1, 86)}
+    assert compiled.score(all_yes).dimensions == {d: len(r.get("yes", [])) for d, r in rules.items()}
+    assert compiled.score(all_no).dimensions == {d: len(r.get("no", [])) for d, r in rules.items()}
+    # 中文文本作答与 1/0 作答等价
+    assert compiled.score({k: "是" for k in all_yes}).dimensions == compiled.score(all_yes).dimensions
+    assert compiled.score({k: 0 for k in all_no}).dimensions == compiled.score(all_no).dimensions
+
+    rng = random.Random("parity:EPQ85")
+    submissions = []
+    for _ in range(SUBMISSIONS_PER_SCALE):
+        answers = {f"q{n}": rng.choice(["yes", "no"]) for n in range(1, 86) if rng.random() < 0.9}
+        submissions.append(answers)
+        assert compiled.score(answers).dimensions == _epq_expected(rules, answers)
+    batch = compiled.score_batch(submissions)
+    expected = np.array([[_epq_expected(rules, a)[d] for d in compiled.dimensions] for a in submissions])
+    assert np.array_equal(batch, expected)
+
+
+def _assert_index_many_matches(table: BandTable, values):
+    assert table.index_many(values).tolist() == [table.index(v) for v in values]
+
+
+def test_band_table_index_many_matches_index():
+    rng = random.Random("parity:bands")
+    for interpreter in get_interpreters().values():
+        for table in interpreter.tables.values():
+            edges = [v for v in table.lows + table.highs if math.isfinite(v)]
+            values = edges + [e + d for e in edges for d in (-1, -0.5, 0.5, 1)]
+            values += [rng.uniform(-50, 250) for _ in range(200)] + [-math.inf, math.inf]
+            _assert_index_many_matches(table, values)
+
+    # 有空隙、两端开放的分段
+    gapped = compile_band_table("x", [
+        {"range": {"max": 0}, "conclusion": "低"},
+        {"range": {"min": 10, "max": 20}, "conclusion": "中"},
+        {"range": {"min": 30}, "conclusion": "高"},
+    ])
+    _assert_index_many_matches(gapped, [-math.inf, -1, 0, 0.5, 9.99, 10, 15, 20, 25, 29.9, 30, 1e9, math.inf])
+    assert gapped.index_many(np.array([[0, 25], [30, 15]])).tolist() == [[0, -1], [2, 1]]
+
+    empty = BandTable("empty", [], [], [])
+    assert empty.index_many([1, 2]).tolist() == [-1, -1]